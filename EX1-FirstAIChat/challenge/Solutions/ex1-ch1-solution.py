@@ -3,10 +3,13 @@ Interactive Chat Loop with Azure OpenAI (15‑min challenge)
 ----------------------------------------------------------
 Basic + Bonus features:
 - Asks for user's name
-- While loop until user types 'quit'
+- While loop until user types 'quit' or says goodbye
 - System prompt personalized with user's name
 - Shows token usage after each response
 - BONUS: /help command, question counter, summary on exit
+- Static prompt first, name last, so the prompt prefix is cached across users
+- Prompt tokens are counted before each call; budgets cap max_completion_tokens
+- Circuit breakers fail over from AzureOpenAI to the OpenAI base_url client
 
 Prereqs (env vars):
 - AZURE_OPENAI_ENDPOINT
@@ -18,8 +21,19 @@ All messages/logs in English.
 """
 import os
 import sys
+import time
+import uuid
 from dotenv import load_dotenv
-from openai import AzureOpenAI
+
+# Make the repo-level "shared" package importable when running from this folder
+REPO_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..", ".."))
+sys.path.append(REPO_ROOT)
+from shared.lazy import Deferred
+from shared.prompts import PromptCacheStats, PromptTemplate, cached_tokens
+from shared.resilience import CircuitOpen, failover_from_env
+from shared.retrieval import ground_messages, retriever_from_env
+from shared.router import Router
+from shared.tokens import BudgetExceeded, TokenAccountant
 
 load_dotenv()
 
@@ -28,17 +42,22 @@ API_KEY = os.getenv("AZURE_OPENAI_API_KEY")
 API_VERSION = os.getenv("AZURE_OPENAI_API_VERSION")
 DEPLOYMENT = os.getenv("AZURE_OPENAI_DEPLOYMENT_NAME")
 
-client = AzureOpenAI(
-    azure_endpoint=ENDPOINT,
-    api_key=API_KEY,
-    api_version=API_VERSION,
-    azure_deployment=DEPLOYMENT,
-)
+# AzureOpenAI first, OpenAI(base_url=...) as the fallback route; an endpoint that keeps
+# failing is skipped (circuit open) instead of paying timeouts and retries on every turn.
+# Built on the first question, so the prompt appears without waiting for the SDK.
+chat = Deferred(failover_from_env)
+
+# Course material index used to ground answers (only top passages are sent); synced on the first question
+def make_retriever():
+    return retriever_from_env(REPO_ROOT, os.path.join(REPO_ROOT, ".retrieval"))
+
+retriever = Deferred(make_retriever)
 
 print("🤖 Welcome to your AI Assistant! (type /help for options)")
 user_name = input("What's your name? ").strip() or "friend"
 
 question_count = 0
+session_id = uuid.uuid4().hex[:8]
 usage_totals = {"prompt": 0, "completion": 0, "total": 0}
 
 HELP_TEXT = (
@@ -47,11 +66,23 @@ HELP_TEXT = (
     "  quit    Exit the chat\n"
 )
 
+# Pre-flight token accounting (USER_/SESSION_TOKEN_BUDGET, *_COST_BUDGET, *_PRICE_PER_1K)
+accountant = TokenAccountant.from_env(DEPLOYMENT)
+
+# Commands and trivial messages are answered locally, without a model call
+router = Router()
+router.command("/help", lambda ctx: HELP_TEXT)
+
+# Static instructions first, the user's name last: every user shares the cached prompt prefix
+ASSISTANT_PROMPT = PromptTemplate(
+    "assistant",
+    "You are a helpful assistant. Keep answers clear and concise.",
+    "You are talking to {name}.",
+)
+cache_stats = PromptCacheStats()
+
 def system_prompt(name: str) -> str:
-    return (
-        f"You are a helpful assistant. You are talking to {name}. "
-        "Keep answers clear and concise."
-    )
+    return ASSISTANT_PROMPT.render(name=name)
 
 print(f"Hi {user_name}! Ask me anything. Type 'quit' to exit.")
 
@@ -61,16 +92,25 @@ while True:
     if not user_input:
         continue
 
-    if user_input.lower() == "quit":
+    route = None if user_input.lower() == "quit" else router.route(user_input)
+    if route is None or route.intent == "goodbye":
+        # "quit" or a goodbye ("bye", "see you later") ends the chat
+        if route is not None:
+            print(f"\nassistant> {route.response}")
         print("\n[info] Exiting...")
         print(
             f"Goodbye {user_name}! You asked {question_count} question(s). "
             f"Total tokens used: {usage_totals['total']} (prompt: {usage_totals['prompt']}, completion: {usage_totals['completion']})."
         )
+        print(f"[router] {router.stats.summary()}")
+        print(f"[prompt cache] {cache_stats.summary()}")
+        print(f"[tokens] {accountant.summary()}")
+        if chat.built:
+            print(f"[failover] {chat.summary()}")
         break
 
-    if user_input.lower() == "/help":
-        print(HELP_TEXT)
+    if route.is_local:
+        print(route.response if route.kind == "command" else f"\nassistant> {route.response}")
         continue
 
     # Build a minimal message list (single-turn style) — simple for the 15-min challenge
@@ -78,14 +118,27 @@ while True:
         {"role": "system", "content": system_prompt(user_name)},
         {"role": "user", "content": user_input},
     ]
+    try:
+        messages = ground_messages(messages, retriever, user_input)
+    except Exception as e:
+        # The excerpts are a bonus: a broken index or search service must not cost the answer
+        print(f"[retrieval] Answering without course excerpts: {e}")
+
+    # Refuse oversized or over-budget prompts before paying for them
+    try:
+        plan = accountant.preflight(messages, user=user_name, session=session_id, max_completion_tokens=1000)
+    except BudgetExceeded as e:
+        print(f"[budget] {e}")
+        continue
 
     try:
-        resp = client.chat.completions.create(
-            model=DEPLOYMENT,
+        started = time.perf_counter()
+        resp = chat.create(
             messages=messages,
             temperature=0.7,
-            max_completion_tokens=1000,
+            max_completion_tokens=plan.max_completion_tokens,
         )
+        router.stats.observe_model(time.perf_counter() - started)
         answer = resp.choices[0].message.content or "(no content)"
         print(f"\nassistant> {answer}")
 
@@ -96,10 +149,17 @@ while True:
         usage_totals["prompt"] += pt
         usage_totals["completion"] += ct
         usage_totals["total"] += tt
+        cache_stats.record(ASSISTANT_PROMPT.name, resp.usage)
+        accountant.record(resp.usage, user=user_name, session=session_id, plan=plan)
         
-        print(f"[usage] prompt={pt} | completion={ct} | total={tt}")
+        print(f"[usage] prompt={pt} | completion={ct} | total={tt} | cached={cached_tokens(resp.usage)}")
 
         question_count += 1
 
+    except CircuitOpen as e:
+        print(f"[error] No endpoint available right now ({e}); try again shortly.")
     except Exception as e:
         print(f"[error] Chat request failed: {e}")
+    finally:
+        # A failed call gives its reserved tokens back (no-op once recorded)
+        accountant.release(plan)
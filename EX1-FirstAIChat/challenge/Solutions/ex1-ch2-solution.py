@@ -7,6 +7,9 @@ Basic + Bonus features:
 - Uses name in responses and system prompts
 - Shows personalized goodbye when chat ends
 - BONUS: /info command, message counter, goodbye with stats
+- Name and message counter are persisted, so a resumed chat remembers them
+- Static prompt first, name last, so the prompt prefix is cached across users
+- Prompt tokens are counted before each call; budgets cap max_completion_tokens
 
 Prereqs (env vars):
 - AZURE_OPENAI_ENDPOINT
@@ -18,21 +21,63 @@ Run with: chainlit run ex1-ch2-solution.py
 
 All messages/logs in English.
 """
+import asyncio
 import os
+import sys
+import time
 import chainlit as cl
-from openai import AzureOpenAI
 from dotenv import load_dotenv
 
+# Make the repo-level "shared" package importable when running from this folder
+REPO_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..", ".."))
+sys.path.append(REPO_ROOT)
+from shared.conversation_store import ConversationStore
+from shared.lazy import Deferred
+from shared.prompts import PromptCacheStats, PromptTemplate
+from shared.retrieval import ground_messages, retriever_from_env
+from shared.router import Router
+from shared.tokens import BudgetExceeded, TokenAccountant
+
 # Load environment variables
 load_dotenv()
 
-# Azure OpenAI setup
-client = AzureOpenAI(
-    azure_endpoint=os.getenv("AZURE_OPENAI_ENDPOINT"),
-    api_version=os.getenv("AZURE_OPENAI_API_VERSION"),
-    api_key=os.getenv("AZURE_OPENAI_API_KEY"),
-    azure_deployment=os.getenv("AZURE_OPENAI_DEPLOYMENT_NAME")
+# Azure OpenAI setup (the openai import and the client are deferred to the first request)
+def make_client():
+    from openai import AzureOpenAI
+
+    return AzureOpenAI(
+        azure_endpoint=os.getenv("AZURE_OPENAI_ENDPOINT"),
+        api_version=os.getenv("AZURE_OPENAI_API_VERSION"),
+        api_key=os.getenv("AZURE_OPENAI_API_KEY"),
+        azure_deployment=os.getenv("AZURE_OPENAI_DEPLOYMENT_NAME")
+    )
+
+client = Deferred(make_client)
+
+# Course material index used to ground answers (only top passages are sent).
+# Synced on first use in a worker thread, not when the app is imported.
+def make_retriever():
+    return retriever_from_env(REPO_ROOT, os.path.join(REPO_ROOT, ".retrieval"))
+
+retriever = Deferred(make_retriever)
+
+# User name and message counter persisted per thread (survives restarts)
+conversations = ConversationStore(os.path.join(REPO_ROOT, ".conversations"))
+
+# Static instructions first, the user's name last: every user shares the cached prompt prefix
+CHAT_PROMPT = PromptTemplate(
+    "chat",
+    "You are a helpful assistant. Keep answers friendly and concise.",
+    "You are talking to {name}.",
 )
+cache_stats = PromptCacheStats()
+
+# Pre-flight token accounting (USER_/SESSION_TOKEN_BUDGET, *_COST_BUDGET, *_PRICE_PER_1K)
+accountant = TokenAccountant.from_env(os.getenv("AZURE_OPENAI_DEPLOYMENT_NAME"))
+
+# Commands and trivial messages are answered locally, without a model call
+router = Router()
+router.command("/info", lambda ctx: f"📊 User: {ctx['user_name']} | Messages sent: {ctx['message_count']}")
 
 @cl.on_chat_start
 async def start():
@@ -51,6 +96,17 @@ async def start():
     cl.user_session.set("waiting_for_name", True)
     cl.user_session.set("message_count", 0)
 
+@cl.on_chat_resume
+async def resume(thread):
+    """
+    Called when the user reopens a previous conversation.
+    Restore name and counter from the conversation store.
+    """
+    stored = conversations.get(cl.context.session.thread_id)
+    cl.user_session.set("user_name", stored.get("user_name"))
+    cl.user_session.set("waiting_for_name", stored.get("user_name") is None)
+    cl.user_session.set("message_count", stored.get("message_count", 0))
+
 @cl.on_message
 async def main(message: cl.Message):
     """
@@ -64,6 +120,7 @@ async def main(message: cl.Message):
         user_name = message.content.strip()
         cl.user_session.set("user_name", user_name)
         cl.user_session.set("waiting_for_name", False)
+        conversations.set(cl.context.session.thread_id, "user_name", user_name)
         
         await cl.Message(
             content=f"Nice to meet you, {user_name}! How can I help you today? (Type /info for your stats)",
@@ -75,23 +132,34 @@ async def main(message: cl.Message):
     user_name = cl.user_session.get("user_name", "friend")
     message_count = cl.user_session.get("message_count", 0) + 1
     cl.user_session.set("message_count", message_count)
+    conversations.set(cl.context.session.thread_id, "message_count", message_count)
     
-    # Handle special commands
-    if message.content.strip().lower() == "/info":
+    # Handle special commands and trivial messages locally
+    route = router.route(message.content, {"user_name": user_name, "message_count": message_count})
+    if route.is_local:
         await cl.Message(
-            content=f"📊 User: {user_name} | Messages sent: {message_count}",
-            author="System"
+            content=route.response,
+            author="System" if route.kind == "command" else "Assistant"
         ).send()
         return
     
     # Build personalized system prompt
-    system_message = f"You are a helpful assistant talking to {user_name}. Keep answers friendly and concise."
+    system_message = CHAT_PROMPT.render(name=user_name)
     
     # Prepare messages for Azure OpenAI
     messages = [
         {"role": "system", "content": system_message},
         {"role": "user", "content": message.content}
     ]
+    messages = await asyncio.to_thread(ground_messages, messages, retriever, message.content)
+    
+    # Refuse oversized or over-budget prompts before paying for them
+    thread_id = cl.context.session.thread_id
+    try:
+        plan = accountant.preflight(messages, user=user_name, session=thread_id, max_completion_tokens=1000)
+    except BudgetExceeded as e:
+        await cl.Message(content=f"⚠️ {e}", author="System").send()
+        return
     
     # Show loading message
     msg = cl.Message(content="")
@@ -99,17 +167,22 @@ async def main(message: cl.Message):
     
     try:
         # Call Azure OpenAI with streaming
+        started = time.perf_counter()
         response = client.chat.completions.create(
             model=os.getenv("AZURE_OPENAI_DEPLOYMENT_NAME"),
             messages=messages,
             temperature=0.7,
-            max_completion_tokens=1000,
-            stream=True
+            max_completion_tokens=plan.max_completion_tokens,
+            stream=True,
+            stream_options={"include_usage": True}
         )
         
         # Stream the response
         content = ""
         for chunk in response:
+            if getattr(chunk, "usage", None):
+                cache_stats.record(CHAT_PROMPT.name, chunk.usage)
+                accountant.record(chunk.usage, user=user_name, session=thread_id, plan=plan)
             if chunk.choices and len(chunk.choices) > 0:
                 if chunk.choices[0].delta.content is not None:
                     content += chunk.choices[0].delta.content
@@ -117,12 +190,16 @@ async def main(message: cl.Message):
         
         # Finalize the streamed message
         await msg.update()
+        router.stats.observe_model(time.perf_counter() - started)
         
     except Exception as e:
         # Handle errors gracefully
         error_message = f"❌ Sorry {user_name}, I encountered an error: {str(e)}"
         error_msg = cl.Message(content=error_message, author="System")
         await error_msg.send()
+    finally:
+        # A failed call gives its reserved tokens back (no-op once recorded)
+        accountant.release(plan)
 
 @cl.on_chat_end
 async def end():
@@ -134,6 +211,9 @@ async def end():
     message_count = cl.user_session.get("message_count", 0)
     
     print(f"Chat ended - User: {user_name}, Messages: {message_count}")
+    print(f"[router] {router.stats.summary()}")
+    print(f"[prompt cache] {cache_stats.summary()}")
+    print(f"[tokens] {accountant.summary()}")
     
     # Note: on_chat_end doesn't support sending messages to the user
     # but we can log the session info for debugging/analytics
@@ -1,8 +1,14 @@
 # 0. Import necessary libraries and set up environment variables
 import os
+import sys
 from openai import AzureOpenAI
 from dotenv import load_dotenv
 
+# Make the repo-level "shared" package importable when running from this folder
+REPO_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", ".."))
+sys.path.append(REPO_ROOT)
+from shared.prompts import PromptCacheStats, PromptTemplate
+
 # Load environment variables from a .env file
 load_dotenv()
 
@@ -24,11 +30,16 @@ print("🤖 Welcome to your AI Assistant!")
 user_name = input("What's your name? ").strip()
 
 
+# Static instructions first, the user's name last: every user shares the cached prompt prefix
+ASSISTANT_PROMPT = PromptTemplate(
+    "assistant",
+    "You are a helpful assistant. Keep answers clear and concise.",
+    "You are talking to {name}.",
+)
+cache_stats = PromptCacheStats()
+
 def system_prompt(name: str) -> str:
-    return (
-        f"You are a helpful assistant. You are talking to {name}. "
-        "Keep answers clear and concise."
-    )
+    return ASSISTANT_PROMPT.render(name=name)
 
 print(f"Hi {user_name}! Ask me anything. Type 'quit' to exit.")
 
@@ -68,6 +79,7 @@ while(True):
         usage_totals["prompt"] += pt
         usage_totals["completion"] += ct
         usage_totals["total"] += tt
+        cache_stats.record(ASSISTANT_PROMPT.name, resp.usage)
         
         print(f"[usage] prompt={pt} | completion={ct} | total={tt}")
 
@@ -79,4 +91,5 @@ print(
     f"Total tokens used: {usage_totals['total']} "
     f"(prompt: {usage_totals['prompt']}, completion: {usage_totals['completion']})."
 )
+print(f"[prompt cache] {cache_stats.summary()}")
 
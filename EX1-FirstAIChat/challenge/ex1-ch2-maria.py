@@ -1,9 +1,15 @@
 # 0. Import necessary libraries and set up environment variables
 import os
+import sys
 import chainlit as cl
 from openai import AzureOpenAI
 from dotenv import load_dotenv
 
+# Make the repo-level "shared" package importable when running from this folder
+REPO_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", ".."))
+sys.path.append(REPO_ROOT)
+from shared.prompts import PromptCacheStats, PromptTemplate
+
 # Load environment variables from a .env file
 load_dotenv()
 
@@ -20,6 +26,14 @@ client = AzureOpenAI(
     azure_deployment=azureServices_deployment
 )
 
+# Static instructions first, the user's name last: every user shares the cached prompt prefix
+CHAT_PROMPT = PromptTemplate(
+    "chat",
+    "You are a helpful assistant. Keep answers friendly and concise.",
+    "You are talking to {name}.",
+)
+cache_stats = PromptCacheStats()
+
 # 2. ChainLit Event Handlers for Interactive Chat
 # ---------------------------------------------------------------------
 # ChainLit provides decorators to handle different events in the chat interface:
@@ -65,7 +79,7 @@ async def main(message: cl.Message):
     
     user_name = cl.user_session.get("user_name", "friend")
 
-    system_message = f"You are a helpful assistant talking to {user_name}. Keep answers friendly and concise."
+    system_message = CHAT_PROMPT.render(name=user_name)
 
     conversation_history = cl.user_session.get("conversation_history", [])
     
@@ -101,7 +115,8 @@ async def main(message: cl.Message):
             frequency_penalty=0.0,
             presence_penalty=0.0,
             messages=messages,
-            stream=True  # Enable streaming for better user experience
+            stream=True,  # Enable streaming for better user experience
+            stream_options={"include_usage": True}  # last chunk carries usage (incl. cached tokens)
         )
         
         # 4. Stream the response and update the message in real-time
@@ -111,6 +126,8 @@ async def main(message: cl.Message):
         # ---------------------------------------------------------------------
         content = ""
         for chunk in response:
+            if getattr(chunk, "usage", None):
+                cache_stats.record(CHAT_PROMPT.name, chunk.usage)
             # Check if the chunk has choices and delta content
             if chunk.choices and len(chunk.choices) > 0:
                 if chunk.choices[0].delta.content is not None:
@@ -152,6 +169,7 @@ async def end():
 
     user_name = cl.user_session.get("user_name", "friend")
     print(f"Chat session ended. Goodbye {user_name}!")
+    print(f"[prompt cache] {cache_stats.summary()}")
 
 # 6. Additional ChainLit Configuration (Optional)
 # ---------------------------------------------------------------------
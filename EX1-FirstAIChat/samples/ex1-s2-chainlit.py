@@ -1,9 +1,21 @@
 # 0. Import necessary libraries and set up environment variables
 import os
+import sys
+import asyncio
 import chainlit as cl
-from openai import AzureOpenAI
 from dotenv import load_dotenv
 
+# Make the repo-level "shared" package importable when running from this folder
+REPO_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", ".."))
+sys.path.append(REPO_ROOT)
+from shared.conversation_store import ConversationStore
+from shared.hedging import pool_from_env
+from shared.ingest import CsvIngestJob, DEFAULT_CHUNK_ROWS, expire_stores, remove_store, store_dir_for
+from shared.lazy import Deferred
+from shared.retrieval import LocalIndex, ground_messages, retriever_from_env
+from shared.scheduler import ScheduledChat, current_requester, scheduler_from_env
+from shared.singleflight import SingleFlight
+
 # Load environment variables from a .env file
 load_dotenv()
 
@@ -12,26 +24,51 @@ azureServices_key = os.getenv("AZURE_OPENAI_API_KEY")
 azureServices_deployment = os.getenv("AZURE_OPENAI_DEPLOYMENT_NAME")
 azureServices_apiVersion = os.getenv("AZURE_OPENAI_API_VERSION")
 
-# 1. Authentication / Client setup (AzureOpenAI)
+# 1. Authentication / Client setup (AsyncAzureOpenAI pool)
 # ---------------------------------------------------------------------
 # To interact with Azure OpenAI you first need a client object.
 # This client is responsible for:
 #   - Knowing which Azure resource (endpoint) to talk to
 #   - Handling authentication (API key or Azure Entra ID token)
 #   - Optionally: setting default deployment, timeout, retries, etc.
+# The pool builds one async client per endpoint from the variables above.
+# List equivalent deployments in AZURE_OPENAI_DEPLOYMENTS ("dep-a,dep-b@https://...")
+# and a response whose first token is slower than the recent p95 is hedged on
+# another deployment; with a single deployment it is a plain call.
+# Identical requests in flight at the same time (same messages and parameters, e.g.
+# everyone asking the same question after a talk) share one streamed completion.
+# Calls wait for a slot of the fair scheduler, so one heavy user cannot take the
+# whole deployment quota (SCHEDULER_MAX_CONCURRENCY, SCHEDULER_CLASSES).
+# The pool (and the openai import) is built on the first request, not at startup.
 # ---------------------------------------------------------------------
-client = AzureOpenAI(
-    azure_endpoint=azureServices_endpoint,
-    api_version=azureServices_apiVersion,
-    api_key=azureServices_key,
-    azure_deployment=azureServices_deployment
-)
+pool = Deferred(pool_from_env)
+scheduler = scheduler_from_env()
+
+def make_chat():
+    return SingleFlight(ScheduledChat(pool.get(), scheduler))
+
+chat = Deferred(make_chat)
+
+# Retrieval index over the course material (built once, then loaded from disk).
+# Synced on first use in a worker thread, not when the app is imported.
+def make_retriever():
+    return retriever_from_env(REPO_ROOT, os.path.join(REPO_ROOT, ".retrieval"))
+
+retriever = Deferred(make_retriever)
+
+# Conversation history persisted per thread; only the recent turns are kept in memory
+conversations = ConversationStore(os.path.join(REPO_ROOT, ".conversations"))
+conversations.start_background_compaction()
+
+# Columnar stores of uploaded CSV files; removed when the chat ends
+INGEST_ROOT = os.path.join(REPO_ROOT, ".ingest")
 
 # 2. ChainLit Event Handlers for Interactive Chat
 # ---------------------------------------------------------------------
 # ChainLit provides decorators to handle different events in the chat interface:
 # - @cl.on_chat_start: Called when a new chat session begins
 # - @cl.on_message: Called when the user sends a message
+# - @cl.on_chat_resume: Called when the user reopens a previous conversation
 # - @cl.on_chat_end: Called when the chat session ends
 # ---------------------------------------------------------------------
 
@@ -50,7 +87,18 @@ async def start():
     
     # Store the system message in the user session for context
     cl.user_session.set("system_message", "You are a helpful assistant.")
-    cl.user_session.set("conversation_history", [])
+
+    # Upload stores left behind by sessions that never ended cleanly (INGEST_STORE_TTL_SECONDS)
+    await asyncio.to_thread(expire_stores, INGEST_ROOT)
+
+@cl.on_chat_resume
+async def resume(thread):
+    """
+    Called when the user reopens a previous conversation.
+    Only the recent turns are read back from the conversation store.
+    """
+    cl.user_session.set("system_message", "You are a helpful assistant.")
+    conversations.get(cl.context.session.thread_id)
 
 @cl.on_message
 async def main(message: cl.Message):
@@ -59,36 +107,59 @@ async def main(message: cl.Message):
     It processes the message and generates a response using Azure OpenAI.
     """
     
-    # Get the conversation history and system message from the session
+    # Get the system message from the session; the history lives in the conversation store
     system_message = cl.user_session.get("system_message")
-    conversation_history = cl.user_session.get("conversation_history", [])
-    
-    # Add the new user message to the conversation history
-    conversation_history.append({
-        "role": "user",
-        "content": message.content
-    })
-    
-    # Build the messages array for the API call
-    messages = [
-        {
-            "role": "system",
-            "content": system_message
-        }
-    ] + conversation_history
+    thread_id = cl.context.session.thread_id
+
+    # Model calls of this message are queued fairly per user (or per session when not logged in)
+    user = cl.user_session.get("user")
+    current_requester.set(getattr(user, "identifier", None) or cl.context.session.id)
+
+    # Ingest any CSV files attached to this message (streamed, chunk by chunk)
+    # Text/markdown uploads are indexed for this session only
+    for element in message.elements or []:
+        if not getattr(element, "path", None):
+            continue
+        if element.name.lower().endswith(".csv"):
+            try:
+                summary = await ingest_upload(element)
+            except Exception as e:
+                # A bad upload is reported in the chat; the question itself is still answered
+                await cl.Message(content=f"❌ Could not read {element.name}: {str(e)}", author="System").send()
+                continue
+            conversations.append_message(thread_id, "system", f"The user uploaded '{element.name}': {summary}")
+        elif element.name.lower().endswith((".md", ".txt")):
+            uploads_index = cl.user_session.get("uploads_index") or LocalIndex()
+            uploads_index.add_file(element.path, element.name)
+            cl.user_session.set("uploads_index", uploads_index)
     
     # Show a loading message while processing
     msg = cl.Message(content="")
     await msg.send()
     
     try:
+        # Add the new user message to the conversation history (a store error is reported below)
+        session = conversations.append_message(thread_id, "user", message.content)
+        
+        # Build the messages array for the API call (recent turns only)
+        messages = [
+            {
+                "role": "system",
+                "content": system_message
+            }
+        ] + session.history()
+
+        # Ground the request: inject only the top passages for this question.
+        # The search runs in a worker thread so other sessions are not blocked meanwhile.
+        messages = await asyncio.to_thread(ground_messages, messages, retriever, message.content)
+        messages = await asyncio.to_thread(ground_messages, messages, cl.user_session.get("uploads_index"), message.content)
+        
         # 3. Creating a Chat Completion Request using the client
         # When you send a request to Azure OpenAI, you need to provide some information so the service knows 
         # which model to use and how to answer. 
         # ---------------------------------------------------------------------
         
-        response = client.chat.completions.create(
-            model=azureServices_deployment,
+        response = await chat.create(
             max_completion_tokens=1500,
             temperature=1.0,
             top_p=1.0,
@@ -103,25 +174,21 @@ async def main(message: cl.Message):
         # Streaming provides a better user experience by showing the response as it's generated
         # instead of waiting for the complete response.
         # ---------------------------------------------------------------------
+        # Leaving the block stops this session's stream only; other sessions sharing it keep theirs.
         content = ""
-        for chunk in response:
-            # Check if the chunk has choices and delta content
-            if chunk.choices and len(chunk.choices) > 0:
-                if chunk.choices[0].delta.content is not None:
-                    content += chunk.choices[0].delta.content
-                    await msg.stream_token(chunk.choices[0].delta.content)
+        async with response:
+            async for chunk in response:
+                # Check if the chunk has choices and delta content
+                if chunk.choices and len(chunk.choices) > 0:
+                    if chunk.choices[0].delta.content is not None:
+                        content += chunk.choices[0].delta.content
+                        await msg.stream_token(chunk.choices[0].delta.content)
         
         # Finalize the streamed message
         await msg.update()
         
-        # Add the assistant's response to the conversation history
-        conversation_history.append({
-            "role": "assistant",
-            "content": content
-        })
-        
-        # Update the conversation history in the session
-        cl.user_session.set("conversation_history", conversation_history)
+        # Add the assistant's response to the conversation history (appended to disk)
+        conversations.append_message(thread_id, "assistant", content)
         
         # 5. Display token usage information (optional)
         # ---------------------------------------------------------------------
@@ -137,6 +204,35 @@ async def main(message: cl.Message):
         error_msg = cl.Message(content=error_message, author="System")
         await error_msg.send()
 
+async def ingest_upload(element):
+    """
+    Streams an uploaded CSV into a columnar store without loading it in memory.
+    Each chunk is parsed in a worker thread and progress is shown in the chat.
+    """
+    status = cl.Message(content=f"📥 Reading {element.name}...", author="System")
+    await status.send()
+
+    store_dir = store_dir_for(element.path, INGEST_ROOT)
+    cl.user_session.set("upload_stores", (cl.user_session.get("upload_stores") or []) + [store_dir])
+    job = CsvIngestJob(element.path, store_dir, chunk_rows=DEFAULT_CHUNK_ROWS)
+    steps = job.run()
+    while True:
+        try:
+            progress = await asyncio.to_thread(next, steps, None)
+        except Exception:
+            # Nothing usable was written: drop the partial store now
+            await asyncio.to_thread(remove_store, store_dir)
+            raise
+        if progress is None:
+            break
+        status.content = f"📥 Reading {element.name}: {progress.rows} rows ({progress.percent:.0f}%)"
+        await status.update()
+
+    summary = job.store.describe()
+    status.content = f"✅ {element.name} ready: {summary}"
+    await status.update()
+    return summary
+
 @cl.on_chat_end
 async def end():
     """
@@ -144,6 +240,13 @@ async def end():
     It's useful for cleanup operations or logging.
     """
     print("Chat session ended")
+    for store_dir in cl.user_session.get("upload_stores") or []:
+        await asyncio.to_thread(remove_store, store_dir)
+    if chat.built:
+        print(f"[single-flight] {chat.summary()}")
+        print(f"[scheduler] {scheduler.summary()}")
+    if pool.built:
+        print(f"[hedging] {pool.summary()}")
 
 # 6. Additional ChainLit Configuration (Optional)
 # ---------------------------------------------------------------------
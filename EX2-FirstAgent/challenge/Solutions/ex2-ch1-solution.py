@@ -5,12 +5,25 @@
 # using Azure AI Foundry agents with Chainlit web interface.
 # ---------------------------------------------------------------------
 import os
+import sys
+import time
+import threading
 import chainlit as cl
-from azure.ai.projects import AIProjectClient
-from azure.identity import ClientSecretCredential
-from azure.ai.agents.models import ListSortOrder
 from dotenv import load_dotenv
 
+# Make the repo-level "shared" package importable when running from this folder
+REPO_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..", ".."))
+sys.path.append(REPO_ROOT)
+from shared.knowledge_packs import KnowledgePacks
+from shared.credentials import CachedCredential
+from shared.lazy import Deferred
+from shared.lifecycle import Reaper
+from shared.prewarm import Prewarm
+from shared.prompts import PromptCacheStats, PromptTemplate
+from shared.router import Router
+from shared.scheduler import scheduler_from_env
+from shared.session_state import SharedSession, backend_from_env
+
 # Load environment variables from a .env file
 load_dotenv()
 
@@ -21,21 +34,157 @@ azure_foundry_key = os.getenv("AI_FOUNDRY_API_KEY")
 azure_foundry_deployment = os.getenv("AI_FOUNDRY_DEPLOYMENT_NAME")
 
 # 2. Authentication Setup using Azure Service Principal
+# 3. AI Project Client Setup
+# ---------------------------------------------------------------------
+# Built on first use (the first chat or the reaper's first delete), so the
+# app starts serving without loading the Azure SDK or creating a credential.
 # ---------------------------------------------------------------------
-varCredential = ClientSecretCredential(
-    tenant_id=os.getenv("AZURE_TENANT_ID"),
-    client_id=os.getenv("AZURE_CLIENT_ID"),
-    client_secret=os.getenv("AZURE_CLIENT_SECRET"),
+def make_credential():
+    from azure.identity import ClientSecretCredential
+
+    # Tokens are cached encrypted in .tokens/ and renewed in the background before they expire
+    varCredential = CachedCredential(
+        ClientSecretCredential(
+            tenant_id=os.getenv("AZURE_TENANT_ID"),
+            client_id=os.getenv("AZURE_CLIENT_ID"),
+            client_secret=os.getenv("AZURE_CLIENT_SECRET"),
+        ),
+        os.path.join(REPO_ROOT, ".tokens"),
+    )
+    varCredential.start_background_refresh()
+    return varCredential
+
+credential = Deferred(make_credential)
+
+def make_project():
+    if os.getenv("AI_FOUNDRY_MOCK"):
+        # Started by `shared.loadtest --mock`: the offline mock takes any token over http
+        from shared.mock_backend import mock_project_client
+
+        return mock_project_client(azure_foundry_project_endpoint)
+
+    from azure.ai.projects import AIProjectClient
+
+    return AIProjectClient(
+        endpoint=azure_foundry_project_endpoint,
+        credential=credential.get()
+    )
+
+project = Deferred(make_project)
+
+# Trip details, counters and agent/thread ids live in a shared backend
+# (SESSION_BACKEND=sqlite|file|redis) so several workers can serve one conversation.
+sessions = backend_from_env(os.path.join(REPO_ROOT, ".sessions"))
+
+def session_state():
+    return SharedSession(sessions, cl.context.session.thread_id)
+
+# Every thread created here is recorded in a ledger; a background reaper deletes
+# it after the chat ends (or after RESOURCE_TTL_SECONDS idle if the end is missed).
+reaper = Reaper.for_project(project, os.path.join(REPO_ROOT, ".lifecycle"))
+
+# Agent runs wait for a slot of a fair scheduler (per-session queues), so one busy
+# session cannot take the whole deployment quota; they run in a worker thread.
+scheduler = scheduler_from_env()
+
+# Agent instructions: the static advice is the shared agent's instructions; the
+# trip details are sent per run (additional_instructions), after the cached prefix.
+TRAVEL_PROMPT = PromptTemplate(
+    "travel",
+    """You are an expert travel companion and advisor helping someone plan a trip.
+
+You specialize in providing personalized recommendations for:
+- Must-see attractions and activities at the destination
+- Local restaurants and authentic cuisine experiences
+- Transportation options and getting around
+- Cultural tips, etiquette, and local customs
+- Budget-friendly suggestions and money-saving tips
+- Hidden gems and local favorites that tourists often miss
+- Practical travel advice (weather, what to pack, etc.)
+
+Always be enthusiastic, helpful, and provide specific actionable advice.
+Tailor all your recommendations to the traveler's destination, dates and budget range given below.
+Be conversational and engaging, like a knowledgeable local friend.
+Use emojis occasionally to make responses more engaging, but don't overdo it.""",
+    """Trip details:
+- Destination: {destination}
+- Travel dates: {travel_dates}
+- Budget: {budget}""",
 )
+cache_stats = PromptCacheStats()
 
-# 3. AI Project Client Setup
+# 4. Message Router
 # ---------------------------------------------------------------------
-project = AIProjectClient(
-    endpoint=azure_foundry_project_endpoint,
-    credential=varCredential
-)
+# Commands and trivial messages ("thanks", "hi") are answered locally;
+# only real travel questions reach the agent.
+# ---------------------------------------------------------------------
+
+def trip_info(ctx):
+    return (
+        f"🎒 **Your Trip Information:**\n\n"
+        f"📍 **Destination:** {ctx['destination']}\n"
+        f"📅 **Travel Dates:** {ctx['travel_dates']}\n"
+        f"💰 **Budget:** {ctx['budget']}\n"
+        f"❓ **Questions Asked:** {ctx['question_count']}\n\n"
+        f"Ready to continue planning your amazing trip to {ctx['destination']}? 🌟"
+    )
+
+router = Router()
+router.command("/trip-info", trip_info)
 
-# 4. ChainLit Event Handlers for Travel Companion Chat
+# Destination knowledge packs (built offline with `python -m shared.knowledge_packs build`):
+# common questions are answered from the pack, the rest get it as cheap context.
+packs = KnowledgePacks(os.path.join(REPO_ROOT, ".packs"))
+packs.start_background_refresh()
+
+# 5. Shared Travel Agent
+# ---------------------------------------------------------------------
+# One long-lived agent holds the static travel-expert instructions; each run
+# gets the trip details as additional_instructions. The agent is found by name
+# and prompt hash (so workers and restarts reuse it) or created once.
+# Session setup is then a single thread create.
+# ---------------------------------------------------------------------
+AGENT_NAME = "Travel Companion Agent"
+_agent_lock = threading.Lock()
+_agent_id = os.getenv("TRAVEL_AGENT_ID")
+
+def travel_agent_id():
+    global _agent_id
+    with _agent_lock:
+        if _agent_id is None:
+            for agent in project.agents.list_agents():
+                if agent.name == AGENT_NAME and (agent.metadata or {}).get("prompt_hash") == TRAVEL_PROMPT.prefix_hash:
+                    _agent_id = agent.id
+                    break
+            else:
+                _agent_id = project.agents.create_agent(
+                    model=azure_foundry_deployment,
+                    name=AGENT_NAME,
+                    instructions=TRAVEL_PROMPT.static,
+                    metadata={"prompt_hash": TRAVEL_PROMPT.prefix_hash},
+                ).id
+                # Long-lived: tracked, but only deleted once released
+                reaper.ledger.record("agent", _agent_id, ttl=None)
+        return _agent_id
+
+def trip_instructions(values):
+    """Per-run instructions with this session's trip details."""
+    return TRAVEL_PROMPT.dynamic.format(
+        destination=values.get("destination", "Not set"),
+        travel_dates=values.get("travel_dates", "Not set"),
+        budget=values.get("budget", "Not set"),
+    )
+
+def prewarm_session(owner):
+    """Resolves the shared agent (cached after the first session) and creates the thread."""
+    agent_id, thread_id = travel_agent_id(), project.agents.threads.create().id
+    reaper.ledger.record("thread", thread_id, owner=owner)
+    return agent_id, thread_id
+
+# 6. ChainLit Event Handlers for Travel Companion Chat
+# ---------------------------------------------------------------------
+# The thread is created in a worker thread while the user answers the trip
+# questions, so the setup latency hides behind their think time.
 # ---------------------------------------------------------------------
 
 @cl.on_chat_start
@@ -44,6 +193,9 @@ async def start():
     This function is called when a new chat session starts.
     It initializes the Travel Companion AI Agent and collects trip details.
     """
+    state = session_state()
+    # Pre-warm agent and thread (runs while the questions below are answered)
+    setup = Prewarm("agent+thread", prewarm_session, cl.context.session.thread_id)
     try:
         # Send initial welcome message
         await cl.Message(
@@ -65,6 +217,8 @@ async def start():
                 content="❌ No destination provided. Please refresh and try again.",
                 author="System"
             ).send()
+            _, thread_id = await setup.result()
+            reaper.ledger.release("thread", thread_id, grace=0)
             return
             
         # Handle both dict and object response formats
@@ -72,7 +226,7 @@ async def start():
             destination = destination_response.get("output", "Unknown destination").strip()
         else:
             destination = destination_response.content.strip()
-        cl.user_session.set("destination", destination)
+        state.set("destination", destination)
         
         # BONUS: Ask for additional trip details
         travel_dates_response = await cl.AskUserMessage(
@@ -96,41 +250,16 @@ async def start():
         else:
             budget = budget_response.content.strip() if budget_response else "Not specified"
         
-        cl.user_session.set("travel_dates", travel_dates)
-        cl.user_session.set("budget", budget)
-        cl.user_session.set("question_count", 0)
-        
-        # 5. Create Travel-Specialized Agent
-        # ---------------------------------------------------------------------
-        agent = project.agents.create_agent(
-            model=azure_foundry_deployment,
-            name="Travel Companion Agent",
-            instructions=f"""You are an expert travel companion and advisor helping someone plan a trip to {destination}. 
-            
-            Your traveler is planning to visit {destination} around {travel_dates} with a {budget} budget.
-            
-            You specialize in providing personalized recommendations for:
-            - Must-see attractions and activities in {destination}
-            - Local restaurants and authentic cuisine experiences
-            - Transportation options and getting around
-            - Cultural tips, etiquette, and local customs
-            - Budget-friendly suggestions and money-saving tips
-            - Hidden gems and local favorites that tourists often miss
-            - Practical travel advice (weather, what to pack, etc.)
-            
-            Always be enthusiastic, helpful, and provide specific actionable advice.
-            Tailor all your recommendations specifically to {destination} and consider their budget range of {budget}.
-            Be conversational and engaging, like a knowledgeable local friend.
-            Use emojis occasionally to make responses more engaging, but don't overdo it.""",
-        )
+        state.set("travel_dates", travel_dates)
+        state.set("budget", budget)
+        state.set("question_count", 0)
         
-        # 6. Create conversation thread
-        # ---------------------------------------------------------------------
-        thread = project.agents.threads.create()
+        # Collect the pre-warmed agent and thread (usually ready by now)
+        agent_id, thread_id = await setup.result()
         
-        # Store agent and thread in session
-        cl.user_session.set("agent", agent)
-        cl.user_session.set("thread", thread)
+        # Store agent and thread ids in the shared session state
+        state.set("agent_id", agent_id)
+        state.set("thread_id", thread_id)
         
         # Send personalized welcome message with trip details
         await cl.Message(
@@ -151,7 +280,8 @@ async def start():
             author="Travel Agent"
         ).send()
         
-        print(f"🚀 Travel session started - Destination: {destination}, Agent: {agent.id}, Thread: {thread.id}")
+        print(f"🚀 Travel session started - Destination: {destination}, Agent: {agent_id}, Thread: {thread_id}")
+        print(f"[prewarm] {setup.report()}")
         
     except Exception as e:
         error_message = f"❌ Error initializing travel agent: {str(e)}"
@@ -164,30 +294,33 @@ async def main(message: cl.Message):
     This function processes user messages and provides travel advice.
     Includes bonus features like command handling and question counting.
     """
+    state = session_state()
     try:
-        # BONUS: Handle special commands
-        if message.content.lower() == "/trip-info":
-            destination = cl.user_session.get("destination", "Not set")
-            dates = cl.user_session.get("travel_dates", "Not set")
-            budget = cl.user_session.get("budget", "Not set")
-            question_count = cl.user_session.get("question_count", 0)
-            
-            await cl.Message(
-                content=f"🎒 **Your Trip Information:**\n\n"
-                       f"📍 **Destination:** {destination}\n"
-                       f"📅 **Travel Dates:** {dates}\n"
-                       f"💰 **Budget:** {budget}\n"
-                       f"❓ **Questions Asked:** {question_count}\n\n"
-                       f"Ready to continue planning your amazing trip to {destination}? 🌟",
-                author="Travel Agent"
-            ).send()
+        # BONUS: Handle special commands and trivial messages locally
+        values = state.values()
+        route = router.route(message.content, {
+            "destination": values.get("destination", "Not set"),
+            "travel_dates": values.get("travel_dates", "Not set"),
+            "budget": values.get("budget", "Not set"),
+            "question_count": values.get("question_count", 0),
+        })
+        if route.is_local:
+            await cl.Message(content=route.response, author="Travel Agent").send()
             return
         
-        # Get agent and thread from session
-        agent = cl.user_session.get("agent")
-        thread = cl.user_session.get("thread")
+        # Common destination questions ("what to see", "getting around") come from the knowledge pack
+        destination = values.get("destination", "")
+        pack_answer = packs.answer(message.content, destination)
+        if pack_answer:
+            state.incr("question_count")
+            await cl.Message(content=pack_answer, author="Travel Agent").send()
+            return
         
-        if not agent or not thread:
+        # Get agent and thread ids from the session state
+        agent_id = values.get("agent_id")
+        thread_id = values.get("thread_id")
+        
+        if not agent_id or not thread_id:
             await cl.Message(
                 content="❌ Session not properly initialized. Please refresh the page.",
                 author="System"
@@ -195,8 +328,8 @@ async def main(message: cl.Message):
             return
         
         # BONUS: Increment question counter
-        question_count = cl.user_session.get("question_count", 0) + 1
-        cl.user_session.set("question_count", question_count)
+        question_count = state.incr("question_count")
+        reaper.ledger.touch("thread", thread_id)
         
         # Show thinking message
         thinking_msg = cl.Message(content="🤔 Let me think about that travel question...", author="Travel Agent")
@@ -204,16 +337,24 @@ async def main(message: cl.Message):
         
         # Create user message in thread
         user_message = project.agents.messages.create(
-            thread_id=thread.id, 
+            thread_id=thread_id, 
             role="user", 
             content=message.content
         )
         
         # Process agent response
-        run = project.agents.runs.create_and_process(
-            thread_id=thread.id, 
-            agent_id=agent.id
+        started = time.perf_counter()
+        run = await scheduler.run(
+            project.agents.runs.create_and_process,
+            requester=cl.context.session.id,
+            thread_id=thread_id, 
+            agent_id=agent_id,
+            additional_instructions="\n\n".join(
+                part for part in (trip_instructions(values), packs.context(message.content, destination)) if part
+            )
         )
+        router.stats.observe_model(time.perf_counter() - started)
+        cache_stats.record(TRAVEL_PROMPT.name, getattr(run, "usage", None))
         
         # Handle errors
         if run.status == "failed":
@@ -224,8 +365,10 @@ async def main(message: cl.Message):
             return
         
         # Get agent response
+        from azure.ai.agents.models import ListSortOrder
+
         messages = project.agents.messages.list(
-            thread_id=thread.id, 
+            thread_id=thread_id, 
             order=ListSortOrder.ASCENDING
         )
         
@@ -265,23 +408,15 @@ async def end():
     Provides a travel summary and helpful resources.
     """
     try:
-        destination = cl.user_session.get("destination", "your destination")
-        question_count = cl.user_session.get("question_count", 0)
-        
-        # BONUS: Provide city-specific resources and trip summary
-        resources_by_city = {
-            "tokyo": "🗾 **Helpful Resources:**\n• Official Tokyo Tourism: https://www.gotokyo.org/\n• JR Pass Information: https://www.jrpass.com/\n• Tokyo Metro Map: Download the official app",
-            "paris": "🇫🇷 **Helpful Resources:**\n• Official Paris Tourism: https://en.parisinfo.com/\n• Museum Pass: https://www.parismuseumpass.com/\n• Metro/RER Maps: Download Citymapper app",
-            "london": "🇬🇧 **Helpful Resources:**\n• Visit London: https://www.visitlondon.com/\n• Oyster Card Info: https://tfl.gov.uk/\n• Theatre Tickets: https://www.officiallondontheatre.com/",
-            "new york": "🗽 **Helpful Resources:**\n• NYC Tourism: https://www.nycgo.com/\n• MetroCard/OMNY: https://new.mta.info/\n• Broadway Shows: https://www.broadway.com/",
-        }
+        state = session_state()
+        destination = state.get("destination", "your destination")
+        question_count = state.get("question_count", 0)
         
+        # BONUS: Provide city-specific resources (from the knowledge pack) and trip summary
         city_resources = ""
-        destination_lower = destination.lower()
-        for city, resources in resources_by_city.items():
-            if city in destination_lower:
-                city_resources = f"\n\n{resources}"
-                break
+        pack = packs.lookup(destination)
+        if pack is not None and pack.sections.get("resources"):
+            city_resources = f"\n\n{pack.emoji} **Helpful Resources:**\n{pack.sections['resources']}"
         
         if not city_resources:
             city_resources = f"\n\n🌐 **Don't forget to:**\n• Check official tourism websites for {destination}\n• Download helpful travel apps\n• Verify visa/passport requirements\n• Check current weather forecasts"
@@ -305,6 +440,18 @@ async def end():
         await cl.Message(content=goodbye_message, author="Travel Agent").send()
         
         print(f"🔚 Travel session ended - {destination}, {question_count} questions asked")
+        print(f"[router] {router.stats.summary()}")
+        print(f"[prompt cache] {cache_stats.summary()}")
+        print(f"[packs] {packs.stats.summary()}")
+        
+        # Hand the thread to the reaper (deleted in the background after the grace period)
+        thread_id = state.get("thread_id")
+        if thread_id:
+            reaper.ledger.release("thread", thread_id)
+        print(f"[reaper] {reaper.summary()}")
+        print(f"[scheduler] {scheduler.summary()}")
+        if credential.built:
+            print(f"[tokens] {credential.summary()}")
         
     except Exception as e:
         print(f"Error during chat end: {e}")
@@ -8,11 +8,16 @@
 #   - Manage their own internal state and memory
 # ---------------------------------------------------------------------
 import os
+import sys
 from azure.ai.projects import AIProjectClient
-from azure.identity import DefaultAzureCredential
 from azure.ai.agents.models import ListSortOrder
 from dotenv import load_dotenv
 
+# Make the repo-level "shared" package importable when running from this folder
+REPO_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", ".."))
+sys.path.append(REPO_ROOT)
+from shared.credentials import CachedCredential
+
 # Load environment variables from a .env file
 load_dotenv()
 
@@ -69,9 +74,12 @@ azure_foundry_deployment = os.getenv("AI_FOUNDRY_DEPLOYMENT_NAME")
 #   - Request/response serialization
 #   - Error handling and status reporting
 # ---------------------------------------------------------------------
+# DefaultAzureCredential pinned to the provider that worked last time, with the
+# token kept in an encrypted cache (.tokens/) for the next run.
+varCredential = CachedCredential.default(os.path.join(REPO_ROOT, ".tokens"))
 project = AIProjectClient(
     endpoint=azure_foundry_project_endpoint,
-    credential=DefaultAzureCredential()
+    credential=varCredential
 )
 
 # 4. Agent Creation
@@ -224,6 +232,8 @@ for message in messages:
     if message.run_id == run.id and message.text_messages:
         print(f"{message.role}: {message.text_messages[-1].text.value}")
 
+print(f"[tokens] {varCredential.summary()}")
+
 # 11. Summary of What Happened
 # ---------------------------------------------------------------------
 # This example demonstrated the complete AI Agent workflow:
@@ -8,11 +8,17 @@
 #   - Manage their own internal state and memory
 # ---------------------------------------------------------------------
 import os
+import sys
 from azure.ai.projects import AIProjectClient
 from azure.identity import ClientSecretCredential, DefaultAzureCredential
 from azure.ai.agents.models import ListSortOrder
 from dotenv import load_dotenv
 
+# Make the repo-level "shared" package importable when running from this folder
+REPO_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", ".."))
+sys.path.append(REPO_ROOT)
+from shared.credentials import CachedCredential
+
 # Load environment variables from a .env file
 load_dotenv()
 
@@ -49,11 +55,17 @@ azure_foundry_deployment = os.getenv("AI_FOUNDRY_DEPLOYMENT_NAME")
 #   - Audit trails for security compliance
 #   - Token-based authentication with automatic renewal
 #   - Integration with Azure security policies
+#
+# CachedCredential keeps the token in an encrypted cache (.tokens/), so the
+# next run reuses it instead of requesting a new one.
 # ---------------------------------------------------------------------
-varCredential = ClientSecretCredential(
-    tenant_id=os.getenv("AZURE_TENANT_ID"),
-    client_id=os.getenv("AZURE_CLIENT_ID"),
-    client_secret=os.getenv("AZURE_CLIENT_SECRET"),
+varCredential = CachedCredential(
+    ClientSecretCredential(
+        tenant_id=os.getenv("AZURE_TENANT_ID"),
+        client_id=os.getenv("AZURE_CLIENT_ID"),
+        client_secret=os.getenv("AZURE_CLIENT_SECRET"),
+    ),
+    os.path.join(REPO_ROOT, ".tokens"),
 )
 
 # 3. AI Project Client Setup
@@ -226,6 +238,8 @@ for message in messages:
     if message.run_id == run.id and message.text_messages:
         print(f"{message.role}: {message.text_messages[-1].text.value}")
 
+print(f"[tokens] {varCredential.summary()}")
+
 # 11. Summary of What Happened
 # ---------------------------------------------------------------------
 # This example demonstrated the complete AI Agent workflow:
@@ -5,12 +5,18 @@
 # chat interface for interactive conversations.
 # ---------------------------------------------------------------------
 import os
+import sys
 import chainlit as cl
-from azure.ai.projects import AIProjectClient
-from azure.identity import DefaultAzureCredential
-from azure.ai.agents.models import ListSortOrder
 from dotenv import load_dotenv
 
+# Make the repo-level "shared" package importable when running from this folder
+REPO_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", ".."))
+sys.path.append(REPO_ROOT)
+from shared.credentials import CachedCredential
+from shared.lazy import Deferred
+from shared.lifecycle import Reaper
+from shared.scheduler import scheduler_from_env
+
 # Load environment variables from a .env file
 load_dotenv()
 
@@ -35,10 +41,41 @@ azure_foundry_deployment = os.getenv("AI_FOUNDRY_DEPLOYMENT_NAME")
 
 # 3. AI Project Client Setup
 # ---------------------------------------------------------------------
-project = AIProjectClient(
-    endpoint=azure_foundry_project_endpoint,
-    credential=DefaultAzureCredential()
-)
+# The credential and client are built on first use, so the app starts without
+# loading the Azure SDK; `project` then behaves like the AIProjectClient.
+# ---------------------------------------------------------------------
+def make_credential():
+    # DefaultAzureCredential pinned to the provider that worked last time; tokens are
+    # cached encrypted in .tokens/ and renewed in the background before they expire
+    varCredential = CachedCredential.default(os.path.join(REPO_ROOT, ".tokens"))
+    varCredential.start_background_refresh()
+    return varCredential
+
+credential = Deferred(make_credential)
+
+def make_project():
+    if os.getenv("AI_FOUNDRY_MOCK"):
+        # Started by `shared.loadtest --mock`: the offline mock takes any token over http
+        from shared.mock_backend import mock_project_client
+
+        return mock_project_client(azure_foundry_project_endpoint)
+
+    from azure.ai.projects import AIProjectClient
+
+    return AIProjectClient(
+        endpoint=azure_foundry_project_endpoint,
+        credential=credential.get()
+    )
+
+project = Deferred(make_project)
+
+# Agents and threads created per session are recorded in a ledger and deleted
+# by a background reaper after the chat ends (see shared/lifecycle.py).
+reaper = Reaper.for_project(project, os.path.join(REPO_ROOT, ".lifecycle"))
+
+# Agent runs wait for a slot of a fair scheduler (per-session queues), so one busy
+# session cannot take the whole deployment quota; they run in a worker thread.
+scheduler = scheduler_from_env()
 
 # 4. ChainLit Event Handlers for Interactive Chat
 # ---------------------------------------------------------------------
@@ -79,7 +116,9 @@ async def start():
         # ---------------------------------------------------------------------
         thread = project.agents.threads.create()
         
-        # Store the agent and thread in the user session for later use
+        # Record both for cleanup, then store them in the user session for later use
+        reaper.ledger.record("agent", agent.id, owner=cl.context.session.id)
+        reaper.ledger.record("thread", thread.id, owner=cl.context.session.id)
         cl.user_session.set("agent", agent)
         cl.user_session.set("thread", thread)
         
@@ -108,6 +147,10 @@ async def main(message: cl.Message):
             ).send()
             return
         
+        # An active session keeps its agent and thread alive: push their idle deadline forward
+        reaper.ledger.touch("agent", agent.id)
+        reaper.ledger.touch("thread", thread.id)
+        
         # Show a loading message while processing
         thinking_msg = cl.Message(content="🤔 Thinking...", author="IBM Agent")
         await thinking_msg.send()
@@ -126,7 +169,9 @@ async def main(message: cl.Message):
         # ---------------------------------------------------------------------
         # Create and process a run to generate the agent's response
         # ---------------------------------------------------------------------
-        run = project.agents.runs.create_and_process(
+        run = await scheduler.run(
+            project.agents.runs.create_and_process,
+            requester=cl.context.session.id,
             thread_id=thread.id, 
             agent_id=agent.id
         )
@@ -147,6 +192,8 @@ async def main(message: cl.Message):
         # ---------------------------------------------------------------------
         # Get the agent's response from the thread
         # ---------------------------------------------------------------------
+        from azure.ai.agents.models import ListSortOrder
+
         messages = project.agents.messages.list(
             thread_id=thread.id, 
             order=ListSortOrder.ASCENDING
@@ -199,9 +246,13 @@ async def end():
         else:
             print("🔚 Chat session ended")
             
-        # Note: Azure AI Foundry agents and threads are managed by the service
-        # and don't require explicit cleanup. They will be automatically 
-        # garbage collected based on the service's retention policies.
+        # Agents and threads are not cleaned up by the service: release them so the
+        # reaper deletes them in the background without delaying this handler.
+        reaper.ledger.release_owner(cl.context.session.id)
+        print(f"[reaper] {reaper.summary()}")
+        print(f"[scheduler] {scheduler.summary()}")
+        if credential.built:
+            print(f"[tokens] {credential.summary()}")
         
     except Exception as e:
         print(f"Error during chat end: {e}")
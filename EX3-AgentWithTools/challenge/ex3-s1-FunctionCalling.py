@@ -1,5 +1,4 @@
-import os, time
-from azure.identity import DefaultAzureCredential
+import os, sys, time
 from azure.ai.projects import AIProjectClient
 from azure.ai.agents.models import FunctionTool
 import json
@@ -11,6 +10,13 @@ from typing import Any, Callable, Set, Dict, List, Optional
 
 from dotenv import load_dotenv
 
+# Make the repo-level "shared" package importable when running from this folder
+REPO_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", ".."))
+sys.path.append(REPO_ROOT)
+from shared.codec import decoders_from_definitions, get_codec
+from shared.credentials import CachedCredential
+from shared.tool_output import ToolOutputCompactor
+
 load_dotenv()
 
 azure_foundry_project_endpoint = os.getenv("AI_FOUNDRY_ENDPOINT")
@@ -82,19 +88,35 @@ def generate_password(length: int = 12, include_symbols: bool = True) -> str:
     password = ''.join(password_chars)
     return json.dumps({"password": password})
 
+# Tool outputs are re-read by the model on every later step of the run, so they
+# are sent in compact form: only the declared fields, no extra whitespace.
+compactor = ToolOutputCompactor(max_chars=2000)
+compactor.register("fetch_weather", {"type": "object", "properties": {"weather": {
+    "type": "object", "properties": {"temp": {}, "condition": {}, "humidity": {}}}}})
+compactor.register("get_current_time", {"type": "object", "properties": {"current_time": {}, "timezone": {}, "error": {}}})
+compactor.register("generate_password", {"type": "object", "properties": {"password": {}, "error": {}}})
+
 # Define user functions
 user_functions = {fetch_weather, get_current_time, generate_password}
 
 # Initialize the AIProjectClient
 
+# DefaultAzureCredential pinned to the provider that worked last time; the token is
+# cached encrypted in .tokens/ and renewed in the background before it expires
+credential = CachedCredential.default(os.path.join(REPO_ROOT, ".tokens"))
+credential.start_background_refresh()
 project_client = AIProjectClient(
     endpoint=azure_foundry_project_endpoint,
-    credential=DefaultAzureCredential(),
+    credential=credential,
 )
 
 # Initialize the FunctionTool with user-defined functions
 functions = FunctionTool(functions=user_functions)
 
+# Tool-call arguments are decoded (and validated) against each function's parameter schema
+codec = get_codec()
+decoders = decoders_from_definitions(functions.definitions)
+
 with project_client:
     # Create an agent with custom functions
     agent = project_client.agents.create_agent(
@@ -130,20 +152,28 @@ with project_client:
             tool_calls = run.required_action.submit_tool_outputs.tool_calls
             tool_outputs = []
             for tool_call in tool_calls:
+                decoder = decoders.get(tool_call.function.name)
+                try:
+                    arguments = decoder.decode(tool_call.function.arguments) if decoder else {}
+                except ValueError as e:
+                    tool_outputs.append({"tool_call_id": tool_call.id, "output": codec.dumps({"error": str(e)})})
+                    continue
                 if tool_call.function.name == "fetch_weather":
-                    output = fetch_weather("Barcelona")
-                    tool_outputs.append({"tool_call_id": tool_call.id, "output": output})
+                    output = fetch_weather(**arguments)
+                    tool_outputs.append({"tool_call_id": tool_call.id, "output": compactor.encode(tool_call.function.name, output)})
                 elif tool_call.function.name == "get_current_time":
-                    output = get_current_time("CET")
-                    tool_outputs.append({"tool_call_id": tool_call.id, "output": output})
+                    output = get_current_time(**arguments)
+                    tool_outputs.append({"tool_call_id": tool_call.id, "output": compactor.encode(tool_call.function.name, output)})
                 elif tool_call.function.name == "generate_password":
-                    output = generate_password(16, True)
-                    tool_outputs.append({"tool_call_id": tool_call.id, "output": output})
+                    output = generate_password(**arguments)
+                    tool_outputs.append({"tool_call_id": tool_call.id, "output": compactor.encode(tool_call.function.name, output)})
                 else:
                     print(f"Unknown function call: {tool_call.function.name}")  
             project_client.agents.runs.submit_tool_outputs(thread_id=thread.id, run_id=run.id, tool_outputs=tool_outputs)
 
     print(f"Run completed with status: {run.status}")
+    print(f"[tool output] {compactor.report()}")
+    print(f"[tokens] {credential.summary()}")
 
     # Fetch and log all messages from the thread
     messages = project_client.agents.messages.list(thread_id=thread.id)
@@ -1,5 +1,4 @@
-import os, time
-from azure.identity import DefaultAzureCredential
+import os, sys, time
 from azure.ai.projects import AIProjectClient
 from azure.ai.agents.models import FunctionTool
 import json
@@ -8,6 +7,12 @@ from typing import Any, Callable, Set, Dict, List, Optional
 
 from dotenv import load_dotenv
 
+# Make the repo-level "shared" package importable when running from this folder
+REPO_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", ".."))
+sys.path.append(REPO_ROOT)
+from shared.credentials import CachedCredential
+from shared.tool_output import ToolOutputCompactor
+
 load_dotenv()
 
 azure_foundry_project_endpoint = os.getenv("AI_FOUNDRY_ENDPOINT")
@@ -31,14 +36,23 @@ def fetch_weather(location: str) -> str:
     weather = mock_weather_data.get(location, "Weather data not available for this location.")
     return json.dumps({"weather": weather})
 
+# Tool outputs are re-read by the model on every later step of the run, so they
+# are sent in compact form: only the declared fields, no extra whitespace.
+compactor = ToolOutputCompactor(max_chars=2000)
+compactor.register("fetch_weather", {"type": "object", "properties": {"weather": {"type": "string"}}})
+
 # Define user functions
 user_functions = {fetch_weather}
 
 # Initialize the AIProjectClient
 
+# DefaultAzureCredential pinned to the provider that worked last time; the token is
+# cached encrypted in .tokens/ and renewed in the background before it expires
+credential = CachedCredential.default(os.path.join(REPO_ROOT, ".tokens"))
+credential.start_background_refresh()
 project_client = AIProjectClient(
     endpoint=azure_foundry_project_endpoint,
-    credential=DefaultAzureCredential(),
+    credential=credential,
 )
 
 # Initialize the FunctionTool with user-defined functions
@@ -81,10 +95,12 @@ with project_client:
             for tool_call in tool_calls:
                 if tool_call.function.name == "fetch_weather":
                     output = fetch_weather("Barcelona")
-                    tool_outputs.append({"tool_call_id": tool_call.id, "output": output})
+                    tool_outputs.append({"tool_call_id": tool_call.id, "output": compactor.encode(tool_call.function.name, output)})
             project_client.agents.runs.submit_tool_outputs(thread_id=thread.id, run_id=run.id, tool_outputs=tool_outputs)
 
     print(f"Run completed with status: {run.status}")
+    print(f"[tool output] {compactor.report()}")
+    print(f"[tokens] {credential.summary()}")
 
     # Fetch and log all messages from the thread
     messages = project_client.agents.messages.list(thread_id=thread.id)
@@ -1,12 +1,18 @@
 # 0. Import necessary libraries and set up environment variables
 # ---------------------------------------------------------------------
 import os
+import sys
 import jsonref
 from azure.ai.projects import AIProjectClient
-from azure.identity import DefaultAzureCredential
 from azure.ai.agents.models import ListSortOrder, OpenApiTool, OpenApiAnonymousAuthDetails
 from dotenv import load_dotenv
 
+# Make the repo-level "shared" package importable when running from this folder
+REPO_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", ".."))
+sys.path.append(REPO_ROOT)
+from shared.codec import get_codec
+from shared.credentials import CachedCredential
+
 # Load environment variables from a .env file
 load_dotenv()
 
@@ -18,19 +24,25 @@ azure_foundry_deployment = os.getenv("AI_FOUNDRY_DEPLOYMENT_NAME")
 
 # 2. Authentication Setup using DefaultAzureCredential
 # ---------------------------------------------------------------------
+# DefaultAzureCredential pinned to the provider that worked last time; the token is
+# cached encrypted in .tokens/ and renewed in the background before it expires
+credential = CachedCredential.default(os.path.join(REPO_ROOT, ".tokens"))
+credential.start_background_refresh()
+
 # 3. AI Project Client Setup with context manager
 # ---------------------------------------------------------------------
 
 with AIProjectClient(
     endpoint=azure_foundry_project_endpoint,
-    credential=DefaultAzureCredential()
+    credential=credential
 ) as project:
 
     # 4. Create the OpenAPI Tool loading the specification from a local file
     # ---------------------------------------------------------------------
     # Load the OpenAPI specification for the inventory service from a local JSON file
-    with open(os.path.join(os.path.dirname(__file__), "./openApiDef/InventoryAPI.json"), "r") as f:
-        openapi_inventory = jsonref.loads(f.read())
+    # (parsed with the fast JSON codec, then the $refs are resolved by jsonref)
+    with open(os.path.join(os.path.dirname(__file__), "./openApiDef/InventoryAPI.json"), "rb") as f:
+        openapi_inventory = jsonref.replace_refs(get_codec().loads(f.read()))
 
     # Create Auth object for the OpenApiTool (note: using anonymous auth here; connection or managed identity requires additional setup)
     auth = OpenApiAnonymousAuthDetails()
@@ -85,3 +97,4 @@ with AIProjectClient(
         if message.run_id == run.id and message.text_messages:
             print(f"{message.role}: {message.text_messages[-1].text.value}")
 
+    print(f"[tokens] {credential.summary()}")
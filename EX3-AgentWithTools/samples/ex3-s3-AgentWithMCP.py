@@ -1,8 +1,7 @@
 # Import necessary libraries
 
-import os, time
+import os, sys, time
 from azure.ai.projects import AIProjectClient
-from azure.identity import DefaultAzureCredential
 from azure.ai.agents.models import (
     ListSortOrder,
     McpTool,
@@ -13,6 +12,11 @@ from azure.ai.agents.models import (
 )
 from dotenv import load_dotenv
 
+# Make the repo-level "shared" package importable when running from this folder
+REPO_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", ".."))
+sys.path.append(REPO_ROOT)
+from shared.credentials import CachedCredential
+
 load_dotenv()
 
 azure_foundry_project_endpoint = os.getenv("AI_FOUNDRY_ENDPOINT")
@@ -22,9 +26,13 @@ azure_foundry_deployment = os.getenv("AI_FOUNDRY_DEPLOYMENT_NAME")
 mcp_server_url = "https://gitmcp.io/Azure/azure-rest-api-specs"
 mcp_server_label = "github"
 
+# DefaultAzureCredential pinned to the provider that worked last time; the token is
+# cached encrypted in .tokens/ and renewed in the background before it expires
+credential = CachedCredential.default(os.path.join(REPO_ROOT, ".tokens"))
+credential.start_background_refresh()
 project_client = AIProjectClient(
     endpoint=azure_foundry_project_endpoint,
-    credential=DefaultAzureCredential(),
+    credential=credential,
 )
 # Initialize agent MCP tool
 mcp_tool = McpTool(
@@ -148,3 +156,4 @@ with project_client:
             print(f"{msg.role.upper()}: {last_text.text.value}")
             print("-" * 50)
 
+    print(f"[tokens] {credential.summary()}")
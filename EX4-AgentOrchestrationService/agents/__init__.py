@@ -0,0 +1,8 @@
+"""
+Specialized agents for the orchestration service.
+"""
+from agents.base import Agent, AgentResult, compose_prompt, run_in_thread
+from agents.foundry import FoundryAgent
+from agents.stub import StubAgent, stub_agents
+
+__all__ = ["Agent", "AgentResult", "FoundryAgent", "StubAgent", "compose_prompt", "run_in_thread", "stub_agents"]
@@ -0,0 +1,66 @@
+"""
+Agent interface used by the orchestration engine
+------------------------------------------------
+Every specialized agent exposes one coroutine:
+
+    result = await agent.run(task, inputs)
+
+- task: the instruction for this step of the workflow
+- inputs: {step_id: summary} with the results of the steps this one depends on
+
+Agents only ever receive the summaries of their dependencies, never the full
+transcript of other agents, which keeps each call small.
+"""
+import asyncio
+import time
+
+# Upper bound for the summary handed to downstream agents
+MAX_SUMMARY_CHARS = 800
+
+
+class AgentResult:
+    def __init__(self, output, data=None, summary=None, elapsed=0.0):
+        self.output = output
+        self.data = data
+        self.summary = summary if summary is not None else output[:MAX_SUMMARY_CHARS]
+        self.elapsed = elapsed
+
+
+class Agent:
+    """Base class: subclasses implement `_run` and get timing for free."""
+
+    def __init__(self, name):
+        self.name = name
+
+    async def run(self, task, inputs=None):
+        start = time.perf_counter()
+        result = await self._run(task, inputs or {})
+        result.elapsed = time.perf_counter() - start
+        return result
+
+    async def _run(self, task, inputs):
+        raise NotImplementedError
+
+
+def compose_prompt(task, inputs):
+    """Task plus the upstream summaries, as a single user message."""
+    if not inputs:
+        return task
+    lines = [task, "", "Results from other agents:"]
+    for step_id, summary in inputs.items():
+        lines.append(f"- {step_id}: {summary}")
+    return "\n".join(lines)
+
+
+async def run_in_thread(fn, *args):
+    """
+    Runs a blocking call (e.g. the Foundry SDK) in a worker thread. A thread
+    cannot be interrupted, so a cancelled caller first waits for the call to
+    end: whoever holds a concurrency slot for this call keeps it until then.
+    """
+    worker = asyncio.ensure_future(asyncio.to_thread(fn, *args))
+    try:
+        return await asyncio.shield(worker)
+    except asyncio.CancelledError:
+        await asyncio.wait({worker})
+        raise
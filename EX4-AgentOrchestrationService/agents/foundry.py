@@ -0,0 +1,95 @@
+"""
+Azure AI Foundry agents
+-----------------------
+Wraps an Azure AI Foundry agent (optionally with an OpenAPI tool, as in
+EX3 ex3-s2-AgentWithOpenAPI.py) behind the orchestration Agent interface.
+
+- The Foundry agent is created once and reused for every run
+- Each run uses a fresh thread holding a single message: the task plus the
+  upstream summaries, so no transcript is re-sent between agents
+- The synchronous SDK calls run in a worker thread so independent workflow
+  branches really run concurrently
+- The run's thread is deleted even when the run fails or raises
+"""
+import threading
+
+from agents.base import Agent, AgentResult, compose_prompt, run_in_thread
+
+
+class FoundryAgent(Agent):
+    """
+    :param project: An AIProjectClient.
+    :param model: Model deployment name.
+    :param name: Agent name.
+    :param instructions: Static agent instructions.
+    :param openapi_spec: Optional path to an OpenAPI JSON definition used as a tool.
+    """
+
+    def __init__(self, project, model, name, instructions, openapi_spec=None):
+        super().__init__(name)
+        self.project = project
+        self.model = model
+        self.instructions = instructions
+        self.openapi_spec = openapi_spec
+        self._agent = None
+        self._lock = threading.Lock()
+
+    def _tools(self):
+        if not self.openapi_spec:
+            return None
+        import jsonref
+        from azure.ai.agents.models import OpenApiAnonymousAuthDetails, OpenApiTool
+
+        with open(self.openapi_spec, "r") as f:
+            spec = jsonref.loads(f.read())
+        tool = OpenApiTool(
+            name=self.name.replace(" ", "_").lower(),
+            spec=spec,
+            description=spec.get("info", {}).get("description", self.name),
+            auth=OpenApiAnonymousAuthDetails(),
+        )
+        return tool.definitions
+
+    def _ensure_agent(self):
+        with self._lock:
+            if self._agent is None:
+                self._agent = self.project.agents.create_agent(
+                    model=self.model,
+                    name=self.name,
+                    instructions=self.instructions,
+                    tools=self._tools(),
+                )
+        return self._agent
+
+    def _run_sync(self, prompt):
+        agent = self._ensure_agent()
+        thread = self.project.agents.threads.create()
+        try:
+            self.project.agents.messages.create(thread_id=thread.id, role="user", content=prompt)
+            run = self.project.agents.runs.create_and_process(thread_id=thread.id, agent_id=agent.id)
+            if run.status == "failed":
+                raise RuntimeError(f"{self.name} run failed: {run.last_error}")
+            from azure.ai.agents.models import ListSortOrder
+
+            messages = self.project.agents.messages.list(thread_id=thread.id, order=ListSortOrder.ASCENDING)
+            output = ""
+            for msg in messages:
+                if msg.run_id == run.id and msg.role == "assistant" and msg.text_messages:
+                    output = msg.text_messages[-1].text.value
+            return output
+        finally:
+            # The thread is deleted whether the run succeeded, failed or raised
+            try:
+                self.project.agents.threads.delete(thread.id)
+            except Exception as e:
+                print(f"[orchestration] could not delete thread {thread.id}: {e}")
+
+    async def _run(self, task, inputs):
+        output = await run_in_thread(self._run_sync, compose_prompt(task, inputs))
+        return AgentResult(output)
+
+    def close(self):
+        """Deletes the Foundry agent created by this wrapper."""
+        if self._agent is not None:
+            self.project.agents.delete_agent(self._agent.id)
+            self._agent = None
@@ -0,0 +1,75 @@
+"""
+Local stub agents
+-----------------
+Deterministic agents that need no Azure resources. They answer from canned
+data (shaped like the InventoryAPI / MaintenanceAPI responses) after an
+optional delay, so workflows can be run and timed on a laptop.
+"""
+import asyncio
+import json
+
+from agents.base import Agent, AgentResult, compose_prompt
+
+
+class StubAgent(Agent):
+    """
+    :param name: Agent name.
+    :param responder: Either a fixed string, or a function (task, inputs) -> str | (str, data).
+    :param delay: Seconds to sleep per run, to mimic a remote call.
+    """
+
+    def __init__(self, name, responder="", delay=0.0):
+        super().__init__(name)
+        self.responder = responder
+        self.delay = delay
+        self.calls = []  # prompts received, useful to check what was passed in
+
+    async def _run(self, task, inputs):
+        self.calls.append(compose_prompt(task, inputs))
+        if self.delay:
+            await asyncio.sleep(self.delay)
+        if callable(self.responder):
+            answer = self.responder(task, inputs)
+        else:
+            answer = self.responder
+        if isinstance(answer, tuple):
+            output, data = answer
+            return AgentResult(output, data=data)
+        return AgentResult(answer)
+
+
+# Canned data shaped like the EX3 OpenAPI definitions
+STUB_INVENTORY = [
+    {"item_id": "BRG-001", "name": "Ball bearing 6204", "category": "bearings", "stock_quantity": 3, "min_stock_level": 10},
+    {"item_id": "BLT-010", "name": "V-belt A42", "category": "belts", "stock_quantity": 25, "min_stock_level": 5},
+    {"item_id": "FLT-100", "name": "Hydraulic filter", "category": "filters", "stock_quantity": 0, "min_stock_level": 4},
+]
+STUB_TECHNICIANS = [
+    {"technician_id": "T-01", "name": "Ana Lopez", "skills": ["bearings", "hydraulics"], "status": "available"},
+    {"technician_id": "T-02", "name": "Marc Puig", "skills": ["electrical"], "status": "busy"},
+]
+
+
+def inventory_responder(task, inputs):
+    low = [item for item in STUB_INVENTORY if item["stock_quantity"] < item["min_stock_level"]]
+    names = ", ".join(f"{item['name']} ({item['stock_quantity']} left)" for item in low)
+    return f"Low stock: {names}", {"low_stock": low}
+
+
+def maintenance_responder(task, inputs):
+    available = [t for t in STUB_TECHNICIANS if t["status"] == "available"]
+    names = ", ".join(f"{t['name']} [{', '.join(t['skills'])}]" for t in available)
+    return f"Available technicians: {names}. Next free slot: tomorrow 09:00", {"available": available}
+
+
+def planner_responder(task, inputs):
+    return "Plan: " + json.dumps(inputs, separators=(",", ":"))
+
+
+def stub_agents(delay=0.2):
+    """Stub versions of the agents referenced in config/maintenance_workflow.json."""
+    return {
+        "inventory": StubAgent("inventory", inventory_responder, delay),
+        "maintenance": StubAgent("maintenance", maintenance_responder, delay),
+        "planner": StubAgent("planner", planner_responder, delay),
+    }
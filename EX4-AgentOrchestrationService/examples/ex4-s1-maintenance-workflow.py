@@ -0,0 +1,92 @@
+# 0. Import necessary libraries and set up environment variables
+# ---------------------------------------------------------------------
+# Multi-agent maintenance planning workflow
+# An inventory agent (InventoryAPI) and a maintenance agent (MaintenanceAPI)
+# run in parallel; a planner agent combines their summaries.
+#
+# Run with local stub agents (no Azure needed):
+#   python examples/ex4-s1-maintenance-workflow.py --stub
+# Run with Azure AI Foundry agents:
+#   python examples/ex4-s1-maintenance-workflow.py
+# ---------------------------------------------------------------------
+import argparse
+import asyncio
+import json
+import os
+import sys
+
+from dotenv import load_dotenv
+
+# The agents/ and orchestration/ packages live one folder up
+SERVICE_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+sys.path.append(SERVICE_ROOT)
+from agents import FoundryAgent, stub_agents
+from orchestration import Workflow, WorkflowEngine
+
+load_dotenv()
+
+CONFIG_PATH = os.path.join(SERVICE_ROOT, "config", "maintenance_workflow.json")
+
+
+# 1. Agent setup
+# ---------------------------------------------------------------------
+
+def foundry_agents(config):
+    """Creates one reusable Foundry agent per entry in the config."""
+    from azure.ai.projects import AIProjectClient
+    from azure.identity import DefaultAzureCredential
+
+    project = AIProjectClient(
+        endpoint=os.getenv("AI_FOUNDRY_ENDPOINT"),
+        credential=DefaultAzureCredential(),
+    )
+    agents = {}
+    for key, spec in config["agents"].items():
+        openapi_spec = spec.get("openapi_spec")
+        if openapi_spec:
+            openapi_spec = os.path.join(SERVICE_ROOT, openapi_spec)
+        agents[key] = FoundryAgent(
+            project,
+            os.getenv("AI_FOUNDRY_DEPLOYMENT_NAME"),
+            spec["name"],
+            spec["instructions"],
+            openapi_spec,
+        )
+    return agents
+
+
+# 2. Run the workflow
+# ---------------------------------------------------------------------
+
+async def main(use_stub):
+    with open(CONFIG_PATH, "r") as f:
+        config = json.load(f)
+
+    agents = stub_agents() if use_stub else foundry_agents(config)
+    workflow = Workflow.from_config(config, agents)
+    engine = WorkflowEngine(max_concurrency=config.get("max_concurrency", 4))
+
+    try:
+        run = await engine.run(workflow)
+    finally:
+        for agent in agents.values():
+            if hasattr(agent, "close"):
+                agent.close()
+
+    print("\n" + "=" * 50)
+    print(f"🧭 Workflow '{workflow.name}' finished in {run.elapsed:.2f}s (max {run.max_running} agents in parallel)")
+    print("=" * 50)
+    print(run.timeline())
+    for step_id, record in run.records.items():
+        if record.error:
+            print(f"❌ {step_id}: {record.error}")
+    final = workflow.order[-1]
+    if final in run.results:
+        print("\n📋 Result:\n" + run.results[final].output)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run the maintenance planning workflow")
+    parser.add_argument("--stub", action="store_true", help="use local stub agents instead of Azure AI Foundry")
+    args = parser.parse_args()
+    asyncio.run(main(args.stub))
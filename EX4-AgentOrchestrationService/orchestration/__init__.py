@@ -0,0 +1,7 @@
+"""
+Orchestration logic: workflow definitions and the asyncio engine that runs them.
+"""
+from orchestration.engine import WorkflowEngine, WorkflowRun
+from orchestration.workflow import Step, Workflow, WorkflowError
+
+__all__ = ["Step", "Workflow", "WorkflowEngine", "WorkflowError", "WorkflowRun"]
@@ -0,0 +1,139 @@
+"""
+Workflow engine: runs a DAG of agents on asyncio
+------------------------------------------------
+- A step starts as soon as all the steps it needs have finished
+- Independent branches run concurrently, capped by max_concurrency
+- Each step receives only the summaries of its dependencies
+- A failed step marks its dependents as skipped; other branches keep going
+- A step over step_timeout fails at once, but keeps its concurrency slot until
+  the agent's call has really ended (a worker thread cannot be interrupted)
+
+Usage:
+    engine = WorkflowEngine(max_concurrency=4)
+    run = await engine.run(workflow)
+    print(run.results["plan"].output)
+"""
+import asyncio
+import time
+
+PENDING, RUNNING, DONE, FAILED, SKIPPED = "pending", "running", "done", "failed", "skipped"
+
+
+class StepRecord:
+    def __init__(self, step_id):
+        self.id = step_id
+        self.status = PENDING
+        self.started = None
+        self.finished = None
+        self.error = None
+
+    @property
+    def elapsed(self):
+        if self.started is None or self.finished is None:
+            return 0.0
+        return self.finished - self.started
+
+
+class WorkflowRun:
+    def __init__(self, workflow):
+        self.workflow = workflow
+        self.results = {}  # {step_id: AgentResult}
+        self.records = {step_id: StepRecord(step_id) for step_id in workflow.steps}
+        self.started = time.perf_counter()
+        self.finished = None
+        self.max_running = 0
+
+    @property
+    def ok(self):
+        return all(record.status == DONE for record in self.records.values())
+
+    @property
+    def elapsed(self):
+        return (self.finished or time.perf_counter()) - self.started
+
+    def timeline(self):
+        """One line per step with its offset and duration, in start order."""
+        lines = []
+        started = sorted(self.records.values(), key=lambda r: r.started if r.started is not None else float("inf"))
+        for record in started:
+            offset = (record.started - self.started) if record.started is not None else 0.0
+            lines.append(f"{record.id:<14} {record.status:<8} +{offset:6.2f}s  {record.elapsed:6.2f}s")
+        return "\n".join(lines)
+
+
+class WorkflowEngine:
+    """
+    :param max_concurrency: Maximum number of agent calls in flight at once.
+    :param step_timeout: Seconds before a single step is cancelled and marked failed.
+    """
+
+    def __init__(self, max_concurrency=4, step_timeout=120.0):
+        self.max_concurrency = max(1, int(max_concurrency))
+        self.step_timeout = step_timeout
+
+    async def _run_step(self, run, step, semaphore):
+        record = run.records[step.id]
+        inputs = {need: run.results[need].summary for need in step.needs}
+        async with semaphore:
+            record.status = RUNNING
+            record.started = time.perf_counter()
+            running = sum(1 for r in run.records.values() if r.status == RUNNING)
+            run.max_running = max(run.max_running, running)
+            task = asyncio.ensure_future(step.agent.run(step.task, inputs))
+            try:
+                done, _ = await asyncio.wait({task}, timeout=self.step_timeout)
+            except asyncio.CancelledError:
+                task.cancel()
+                raise
+            record.finished = time.perf_counter()
+            if not done:
+                record.status = FAILED
+                record.error = TimeoutError(f"step {step.id!r} timed out after {self.step_timeout}s")
+                task.cancel()
+                # An agent blocked in a worker thread (run_in_thread) only ends when its call
+                # does; the slot is held until then so max_concurrency bounds real calls
+                await asyncio.wait({task})
+                return
+            if task.exception() is not None:
+                record.status = FAILED
+                record.error = task.exception()
+                return
+            run.results[step.id] = task.result()
+            record.status = DONE
+
+    def _skip_dependents(self, run, step_id, dependents):
+        for dependent in dependents[step_id]:
+            record = run.records[dependent]
+            if record.status == PENDING:
+                record.status = SKIPPED
+                self._skip_dependents(run, dependent, dependents)
+
+    async def run(self, workflow):
+        run = WorkflowRun(workflow)
+        semaphore = asyncio.Semaphore(self.max_concurrency)
+        dependents = workflow.dependents()
+        waiting = {step_id: len(step.needs) for step_id, step in workflow.steps.items()}
+        tasks = {}
+
+        def launch(step_id):
+            task = asyncio.create_task(self._run_step(run, workflow.steps[step_id], semaphore))
+            tasks[task] = step_id
+
+        for step_id, count in waiting.items():
+            if count == 0:
+                launch(step_id)
+
+        while tasks:
+            done, _ = await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                step_id = tasks.pop(task)
+                if run.records[step_id].status != DONE:
+                    self._skip_dependents(run, step_id, dependents)
+                    continue
+                for dependent in dependents[step_id]:
+                    waiting[dependent] -= 1
+                    if waiting[dependent] == 0 and run.records[dependent].status == PENDING:
+                        launch(dependent)
+
+        run.finished = time.perf_counter()
+        return run
@@ -0,0 +1,77 @@
+"""
+Workflow definition: a DAG of agent steps
+-----------------------------------------
+A workflow is a list of steps. Each step names the agent that runs it, the
+task it gets and the steps it needs. Steps without a path between them are
+independent and can run at the same time.
+
+Config format (see config/maintenance_workflow.json):
+    {
+        "name": "maintenance-planning",
+        "steps": [
+            {"id": "inventory", "agent": "inventory", "task": "..."},
+            {"id": "plan", "agent": "planner", "task": "...", "needs": ["inventory"]}
+        ]
+    }
+"""
+
+
+class WorkflowError(Exception):
+    """Raised for invalid workflow definitions (unknown agents/steps, cycles)."""
+
+
+class Step:
+    def __init__(self, step_id, agent, task, needs=None):
+        self.id = step_id
+        self.agent = agent
+        self.task = task
+        self.needs = list(needs or [])
+
+
+class Workflow:
+    def __init__(self, name, steps):
+        self.name = name
+        self.steps = {step.id: step for step in steps}
+        if len(self.steps) != len(steps):
+            raise WorkflowError(f"workflow {name!r} has duplicate step ids")
+        self.order = self._topological_order()
+
+    @classmethod
+    def from_config(cls, config, agents):
+        """Builds a workflow from a config dict, resolving agent names in agents."""
+        steps = []
+        for item in config["steps"]:
+            agent = agents.get(item["agent"])
+            if agent is None:
+                raise WorkflowError(f"step {item['id']!r} uses unknown agent {item['agent']!r}")
+            steps.append(Step(item["id"], agent, item["task"], item.get("needs")))
+        return cls(config.get("name", "workflow"), steps)
+
+    def dependents(self):
+        """{step_id: [ids of steps that need it]}"""
+        result = {step_id: [] for step_id in self.steps}
+        for step in self.steps.values():
+            for need in step.needs:
+                result[need].append(step.id)
+        return result
+
+    def _topological_order(self):
+        for step in self.steps.values():
+            for need in step.needs:
+                if need not in self.steps:
+                    raise WorkflowError(f"step {step.id!r} needs unknown step {need!r}")
+        remaining = {step_id: len(step.needs) for step_id, step in self.steps.items()}
+        dependents = self.dependents()
+        ready = [step_id for step_id, count in remaining.items() if count == 0]
+        order = []
+        while ready:
+            step_id = ready.pop(0)
+            order.append(step_id)
+            for dependent in dependents[step_id]:
+                remaining[dependent] -= 1
+                if remaining[dependent] == 0:
+                    ready.append(dependent)
+        if len(order) != len(self.steps):
+            cycle = sorted(set(self.steps) - set(order))
+            raise WorkflowError(f"workflow {self.name!r} has a cycle between {cycle}")
+        return order
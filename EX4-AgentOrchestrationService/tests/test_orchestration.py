@@ -0,0 +1,195 @@
+"""
+Tests for the workflow engine, run against local stub agents (no Azure needed).
+
+Run from the repository root or from this service folder:
+    python -m pytest EX4-AgentOrchestrationService/tests
+    python -m unittest discover -s EX4-AgentOrchestrationService/tests
+"""
+import os
+import sys
+import threading
+import time
+import unittest
+
+# The agents/ and orchestration/ packages live one folder up
+SERVICE_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+sys.path.insert(0, SERVICE_ROOT)
+from agents import Agent, AgentResult, FoundryAgent, StubAgent, run_in_thread, stub_agents
+from orchestration import Step, Workflow, WorkflowEngine, WorkflowError
+from orchestration.engine import DONE, FAILED, SKIPPED
+
+
+class FailingAgent(Agent):
+    async def _run(self, task, inputs):
+        raise RuntimeError("inventory API unavailable")
+
+
+class BlockingAgent(Agent):
+    """Blocks a worker thread like the Foundry SDK does, and records how many calls overlap."""
+
+    def __init__(self, name, seconds, tracker):
+        super().__init__(name)
+        self.seconds = seconds
+        self.tracker = tracker
+
+    def _call(self):
+        with self.tracker["lock"]:
+            self.tracker["running"] += 1
+            self.tracker["max"] = max(self.tracker["max"], self.tracker["running"])
+        time.sleep(self.seconds)
+        with self.tracker["lock"]:
+            self.tracker["running"] -= 1
+        return self.name
+
+    async def _run(self, task, inputs):
+        return AgentResult(await run_in_thread(self._call))
+
+
+def tracker():
+    return {"lock": threading.Lock(), "running": 0, "max": 0}
+
+
+def diamond(agents):
+    """a -> (b, c) -> d"""
+    return Workflow("diamond", [
+        Step("a", agents["a"], "first"),
+        Step("b", agents["b"], "left", needs=["a"]),
+        Step("c", agents["c"], "right", needs=["a"]),
+        Step("d", agents["d"], "join", needs=["b", "c"]),
+    ])
+
+
+class WorkflowDefinitionTests(unittest.TestCase):
+    def test_topological_order(self):
+        agents = {name: StubAgent(name, name) for name in "abcd"}
+        order = diamond(agents).order
+        self.assertEqual(order[0], "a")
+        self.assertEqual(order[-1], "d")
+        self.assertEqual(set(order[1:3]), {"b", "c"})
+
+    def test_cycle_and_unknown_step_are_rejected(self):
+        agent = StubAgent("x", "x")
+        with self.assertRaises(WorkflowError):
+            Workflow("cycle", [Step("a", agent, "t", needs=["b"]), Step("b", agent, "t", needs=["a"])])
+        with self.assertRaises(WorkflowError):
+            Workflow("unknown", [Step("a", agent, "t", needs=["missing"])])
+
+
+class WorkflowEngineTests(unittest.IsolatedAsyncioTestCase):
+    async def test_dag_order_and_inputs(self):
+        agents = {name: StubAgent(name, f"{name}-out", delay=0.01) for name in "abcd"}
+        run = await WorkflowEngine().run(diamond(agents))
+
+        self.assertTrue(run.ok)
+        records = run.records
+        self.assertLessEqual(records["a"].finished, records["b"].started)
+        self.assertLessEqual(records["a"].finished, records["c"].started)
+        self.assertLessEqual(max(records["b"].finished, records["c"].finished), records["d"].started)
+        # Each step only receives the summaries of the steps it needs
+        self.assertIn("- b: b-out", agents["d"].calls[0])
+        self.assertIn("- c: c-out", agents["d"].calls[0])
+        self.assertNotIn("a-out", agents["d"].calls[0])
+
+    async def test_independent_branches_run_concurrently(self):
+        agents = {name: StubAgent(name, name, delay=0.2) for name in "abcd"}
+        run = await WorkflowEngine(max_concurrency=4).run(diamond(agents))
+
+        self.assertEqual(run.max_running, 2)
+        # Three levels of 0.2s; b and c overlap instead of adding up to 0.8s
+        self.assertLess(run.elapsed, 0.75)
+
+    async def test_concurrency_cap(self):
+        agents = {f"s{i}": StubAgent(f"s{i}", "ok", delay=0.05) for i in range(6)}
+        workflow = Workflow("flat", [Step(name, agent, "t") for name, agent in agents.items()])
+        run = await WorkflowEngine(max_concurrency=2).run(workflow)
+
+        self.assertTrue(run.ok)
+        self.assertEqual(run.max_running, 2)
+
+    async def test_failure_skips_dependents_only(self):
+        agents = stub_agents(delay=0.01)
+        agents["failing"] = FailingAgent("failing")
+        workflow = Workflow("partial", [
+            Step("inventory", agents["failing"], "check stock"),
+            Step("maintenance", agents["maintenance"], "find a technician"),
+            Step("plan", agents["planner"], "plan", needs=["inventory", "maintenance"]),
+            Step("notify", agents["planner"], "notify", needs=["maintenance"]),
+        ])
+        run = await WorkflowEngine().run(workflow)
+
+        self.assertFalse(run.ok)
+        self.assertEqual(run.records["inventory"].status, FAILED)
+        self.assertIsInstance(run.records["inventory"].error, RuntimeError)
+        self.assertEqual(run.records["plan"].status, SKIPPED)
+        self.assertEqual(run.records["maintenance"].status, DONE)
+        self.assertEqual(run.records["notify"].status, DONE)
+
+    async def test_timeout_fails_step_and_keeps_slot_until_thread_ends(self):
+        calls = tracker()
+        slow = BlockingAgent("slow", 0.4, calls)
+        fast = BlockingAgent("fast", 0.05, calls)
+        workflow = Workflow("timeout", [
+            Step("slow", slow, "t"),
+            Step("after", fast, "t", needs=["slow"]),
+            Step("other", fast, "t"),
+        ])
+        run = await WorkflowEngine(max_concurrency=1, step_timeout=0.1).run(workflow)
+
+        self.assertEqual(run.records["slow"].status, FAILED)
+        self.assertIsInstance(run.records["slow"].error, TimeoutError)
+        self.assertEqual(run.records["after"].status, SKIPPED)
+        self.assertEqual(run.records["other"].status, DONE)
+        # The timed-out call kept running in its thread; the cap still held
+        self.assertEqual(calls["max"], 1)
+
+
+class FoundryAgentTests(unittest.IsolatedAsyncioTestCase):
+    def project(self, status, fail_on=None):
+        deleted = []
+
+        class Obj:
+            def __init__(self, **kwargs):
+                self.__dict__.update(kwargs)
+
+        def fail(name):
+            if fail_on == name:
+                raise ConnectionError(name)
+
+        class Agents:
+            def create_agent(self, **kwargs):
+                return Obj(id="asst_1")
+
+            class threads:
+                create = staticmethod(lambda: Obj(id="thread_1"))
+                delete = staticmethod(lambda thread_id: deleted.append(thread_id))
+
+            class messages:
+                create = staticmethod(lambda **kwargs: fail("messages.create"))
+                list = staticmethod(lambda **kwargs: [])
+
+            class runs:
+                create_and_process = staticmethod(
+                    lambda **kwargs: fail("runs") or Obj(id="run_1", status=status, last_error="boom")
+                )
+
+        return Obj(agents=Agents()), deleted
+
+    async def run_agent(self, project):
+        agent = FoundryAgent(project, "gpt-4o", "inventory", "instructions")
+        return await agent.run("check stock")
+
+    async def test_thread_deleted_when_run_fails(self):
+        project, deleted = self.project("failed")
+        with self.assertRaises(RuntimeError):
+            await self.run_agent(project)
+        self.assertEqual(deleted, ["thread_1"])
+
+    async def test_thread_deleted_when_sdk_raises(self):
+        project, deleted = self.project("completed", fail_on="runs")
+        with self.assertRaises(ConnectionError):
+            await self.run_agent(project)
+        self.assertEqual(deleted, ["thread_1"])
+
+
+if __name__ == "__main__":
+    unittest.main()
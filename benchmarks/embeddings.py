@@ -0,0 +1,111 @@
+"""
+Embedding throughput: one request per text vs the micro-batcher
+----------------------------------------------------------------
+Concurrent callers each embed single texts (a retrieval query or a cache
+lookup per message) against the mock backend's embeddings endpoint:
+
+- per-text: every text is its own embeddings request
+- batched: `EmbeddingBatcher` with the LRU disabled (batching alone)
+- batched + LRU: the same with memoization; --distinct sets how many of the
+  texts are unique, the rest repeat earlier ones
+
+Reports texts per second, per-call latency and the number of HTTP requests
+the mock served.
+
+Usage (from the repository root):
+    python benchmarks/embeddings.py
+    python benchmarks/embeddings.py --callers 64 --texts 4000 --max-batch 128 --max-wait-ms 10
+"""
+import argparse
+import os
+import random
+import sys
+import threading
+import time
+
+REPO_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+sys.path.append(REPO_ROOT)
+from shared.embeddings import EmbeddingBatcher
+from shared.mock_backend import DEFAULT_CONFIG, WORDS, MockBackend
+from shared.retrieval import AzureOpenAIEmbedder
+from shared.stats import summarize
+
+
+def workload(count, distinct, seed=1):
+    rng = random.Random(seed)
+    pool = [" ".join(rng.choice(WORDS) for _ in range(rng.randint(4, 12))) + f" {i}"
+            for i in range(max(1, int(count * distinct)))]
+    return [pool[i] if i < len(pool) else rng.choice(pool) for i in range(count)]
+
+
+def run(embed_one, texts, callers):
+    """Wall seconds and per-call latencies of callers threads embedding texts one at a time."""
+    latencies = []
+    lock = threading.Lock()
+
+    def caller(share):
+        local = []
+        for text in share:
+            started = time.perf_counter()
+            embed_one(text)
+            local.append(time.perf_counter() - started)
+        with lock:
+            latencies.extend(local)
+
+    threads = [threading.Thread(target=caller, args=(texts[i::callers],)) for i in range(callers)]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return time.perf_counter() - started, latencies
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Embedding throughput with and without micro-batching")
+    parser.add_argument("--callers", type=int, default=32, help="concurrent callers")
+    parser.add_argument("--texts", type=int, default=2000)
+    parser.add_argument("--distinct", type=float, default=0.5, help="share of unique texts")
+    parser.add_argument("--max-batch", type=int, default=64)
+    parser.add_argument("--max-wait-ms", type=float, default=5.0)
+    parser.add_argument("--workers", type=int, default=2, help="batches in flight")
+    parser.add_argument("--latency", type=float, default=0.04, help="mock request latency, seconds")
+    args = parser.parse_args()
+
+    from openai import AzureOpenAI
+
+    texts = workload(args.texts, args.distinct)
+    config = {"embedding_latency": {"dist": "fixed", "value": args.latency}}
+    print(f"\n🧪 {args.texts} texts ({args.distinct:.0%} distinct), {args.callers} callers, "
+          f"mock latency {args.latency * 1000:.0f} ms + {DEFAULT_CONFIG['embedding_seconds_per_input'] * 1000:.1f} ms/input\n")
+    print(f"{'mode':<16} {'texts/s':>9} {'p50':>9} {'p95':>9} {'requests':>9}")
+    print("-" * 56)
+    with MockBackend(config) as backend:
+        client = AzureOpenAI(azure_endpoint=backend.url, api_key="mock", api_version="2024-10-21", max_retries=0)
+        embedder = AzureOpenAIEmbedder(client, "text-embedding-3-small", dim=256)
+        modes = [
+            ("per-text", None),
+            ("batched", dict(cache_size=0)),
+            ("batched + LRU", dict(cache_size=len(texts))),
+        ]
+        for label, options in modes:
+            batcher = None
+            if options is None:
+                embed_one = lambda text: embedder.embed([text])
+            else:
+                batcher = EmbeddingBatcher(embedder, args.max_batch, args.max_wait_ms, workers=args.workers, **options)
+                embed_one = lambda text, b=batcher: b.embed([text])
+            before = backend.state.stats["embeddings"]
+            seconds, latencies = run(embed_one, texts, args.callers)
+            stats = summarize(latencies)
+            requests = backend.state.stats["embeddings"] - before
+            print(f"{label:<16} {len(texts) / seconds:>9.0f} {stats['p50'] * 1000:>7.1f}ms "
+                  f"{stats['p95'] * 1000:>7.1f}ms {requests:>9}")
+            if batcher is not None:
+                print(f"    {batcher.summary()}")
+                batcher.close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
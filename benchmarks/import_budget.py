@@ -0,0 +1,194 @@
+"""
+Startup budget for the app entry points
+---------------------------------------
+Chainlit imports the app module before it serves the first page, and the
+interactive CLI imports it before the first prompt. Whatever an entry point
+imports or builds at module level is paid on every cold start. This check
+keeps that cost bounded:
+
+- The module-level imports of each entry point (read with `ast`, so nothing
+  else of the app runs) are executed under `python -X importtime`
+- The cost is the cumulative time of the entry point's direct imports,
+  best of --repeats runs. `chainlit`, `dotenv` and `asyncio` are needed at
+  import time (decorators, environment) and are reported but not counted
+- Module-level assignments that construct an SDK client, credential or index
+  (`AzureOpenAI(...)`, `AIProjectClient(...)`, `pool_from_env()`, ...) are
+  flagged; wrap them in `shared.lazy.Deferred` instead
+- Results are compared with benchmarks/import_budget.json; an entry point over
+  its budget or with an eager client fails the check (exit code 1)
+
+Modules that are not installed are skipped and listed, so the numbers from a
+partial environment only cover what could be imported.
+
+Usage (from the repository root):
+    python benchmarks/import_budget.py                  # measure and check
+    python benchmarks/import_budget.py --update         # write new budgets (measured x headroom)
+"""
+import argparse
+import ast
+import json
+import math
+import os
+import subprocess
+import sys
+
+REPO_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+BUDGET_PATH = os.path.join(os.path.dirname(__file__), "import_budget.json")
+# Smallest allowance over the measured time written by --update (small numbers are noisy)
+MIN_SLACK_MS = 20
+
+ENTRY_POINTS = [
+    "EX1-FirstAIChat/samples/ex1-s2-chainlit.py",
+    "EX1-FirstAIChat/challenge/Solutions/ex1-ch1-solution.py",
+    "EX1-FirstAIChat/challenge/Solutions/ex1-ch2-solution.py",
+    "EX2-FirstAgent/samples/ex2-s2-agentChainlit-aad.py",
+    "EX2-FirstAgent/samples/ex2-s2-agentChainlit-sp.py",
+    "EX2-FirstAgent/challenge/Solutions/ex2-ch1-solution.py",
+]
+# Needed at module level by every app (chainlit loads asyncio itself); reported, not counted
+EAGER_ALLOWED = ("chainlit", "dotenv", "asyncio")
+# Calls that build a client, credential or pool when run at module level
+CLIENT_FACTORIES = {
+    "AzureOpenAI", "AsyncAzureOpenAI", "OpenAI", "AsyncOpenAI", "AIProjectClient",
+    "ClientSecretCredential", "DefaultAzureCredential", "pool_from_env", "failover_from_env",
+    "retriever_from_env",
+}
+
+
+# 1. Reading the entry points
+# ---------------------------------------------------------------------
+
+def module_imports(path):
+    """Source lines of the module-level import statements."""
+    with open(path, encoding="utf-8") as f:
+        source = f.read()
+    lines = source.splitlines()
+    statements = []
+    for node in ast.parse(source).body:
+        if isinstance(node, (ast.Import, ast.ImportFrom)):
+            statements.append("\n".join(lines[node.lineno - 1:node.end_lineno]).strip())
+    return statements
+
+
+def eager_clients(path):
+    """[(line, name)] of module-level assignments whose value calls a client factory."""
+    with open(path, encoding="utf-8") as f:
+        tree = ast.parse(f.read())
+    found = []
+    for node in tree.body:
+        if isinstance(node, ast.Assign) and isinstance(node.value, ast.Call):
+            func = node.value.func
+            name = func.id if isinstance(func, ast.Name) else getattr(func, "attr", "")
+            if name in CLIENT_FACTORIES:
+                found.append((node.lineno, name))
+    return found
+
+
+# 2. Measuring
+# ---------------------------------------------------------------------
+
+def probe_script(statements):
+    """Runs each import on its own so a missing module skips only that statement."""
+    body = [f"sys.path.append({REPO_ROOT!r})", "missing = []"]
+    for statement in statements:
+        body.append("try:")
+        body.extend("    " + line for line in statement.splitlines())
+        body.append("except ImportError as e:")
+        body.append("    missing.append(e.name or '?')")
+    body.append("print(','.join(missing))")
+    return "import sys\n" + "\n".join(body) + "\n"
+
+
+def importtime(code):
+    """(stdout, [(depth, name, cumulative_us)]) of `python -X importtime -c code`."""
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", code],
+        capture_output=True, text=True, cwd=REPO_ROOT,
+    )
+    rows = []
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|")
+        depth = (len(name) - len(name.lstrip(" "))) // 2
+        rows.append((depth, name.strip(), int(cumulative)))
+    return result.stdout.strip(), rows
+
+
+def measure(path, startup, repeats):
+    """{"ms", "allowed_ms", "missing", "top"} for one entry point, best of repeats."""
+    code = probe_script(module_imports(path))
+    best = None
+    for _ in range(repeats):
+        stdout, rows = importtime(code)
+        direct = [(name, us) for depth, name, us in rows if depth == 0 and name not in startup]
+        allowed = [(name, us) for name, us in direct if name.split(".")[0] in EAGER_ALLOWED]
+        counted = [(name, us) for name, us in direct if name.split(".")[0] not in EAGER_ALLOWED]
+        total = sum(us for _, us in counted)
+        if best is None or total < best["ms"] * 1000:
+            best = {
+                "ms": total / 1000,
+                "allowed_ms": sum(us for _, us in allowed) / 1000,
+                "missing": sorted(set(filter(None, stdout.splitlines()[-1].split(",")))) if stdout else [],
+                "top": sorted(counted, key=lambda item: -item[1])[:3],
+            }
+    return best
+
+
+# 3. Report
+# ---------------------------------------------------------------------
+
+def main():
+    parser = argparse.ArgumentParser(description="Check the import-time budget of each app entry point")
+    parser.add_argument("--repeats", type=int, default=5)
+    parser.add_argument("--update", action="store_true", help="write measured x headroom as the new budgets")
+    parser.add_argument("--headroom", type=float, default=2.0, help="budget = measured x headroom (with --update)")
+    args = parser.parse_args()
+
+    budgets = {}
+    if os.path.exists(BUDGET_PATH):
+        with open(BUDGET_PATH, "r") as f:
+            budgets = json.load(f).get("budgets_ms", {})
+    _, rows = importtime("pass")
+    startup = {name for _, name, _ in rows}
+
+    print(f"\n🚀 Module-level import cost per entry point (best of {args.repeats})\n")
+    print(f"{'entry point':<58} {'import':>9} {'budget':>8} {'allowed':>9}")
+    print("-" * 88)
+    failures, measured = [], {}
+    for entry in ENTRY_POINTS:
+        path = os.path.join(REPO_ROOT, entry)
+        result = measure(path, startup, args.repeats)
+        measured[entry] = result["ms"]
+        budget = budgets.get(entry)
+        flag = ""
+        if budget is not None and result["ms"] > budget:
+            failures.append(f"{entry} ({result['ms']:.1f} ms > {budget} ms)")
+            flag = " ⚠️"
+        budget_text = f"{budget}ms" if budget is not None else "-"
+        print(f"{entry:<58} {result['ms']:>7.1f}ms {budget_text:>8} {result['allowed_ms']:>7.1f}ms{flag}")
+        if result["top"]:
+            print(f"    slowest: {', '.join(f'{name} {us / 1000:.1f}ms' for name, us in result['top'])}")
+        if result["missing"]:
+            print(f"    skipped (not installed): {', '.join(result['missing'])}")
+        for line, name in eager_clients(path):
+            failures.append(f"{entry}:{line} builds {name}(...) at import")
+            print(f"    ⚠️ line {line}: {name}(...) at module level; use shared.lazy.Deferred")
+
+    if args.update:
+        budgets.update({entry: math.ceil(max(ms * args.headroom, ms + MIN_SLACK_MS)) for entry, ms in measured.items()})
+        with open(BUDGET_PATH, "w") as f:
+            json.dump({"headroom": args.headroom, "budgets_ms": budgets}, f, indent=2, sort_keys=True)
+        print(f"\n💾 Budgets updated: {BUDGET_PATH}")
+        return 0
+    if failures:
+        print(f"\n❌ {len(failures)} problem(s):")
+        for failure in failures:
+            print(f"   - {failure}")
+        return 1
+    print("\n✅ All entry points within budget")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,91 @@
+"""
+JSON codec comparison on EX3 payloads
+-------------------------------------
+Times encoding and decoding with every codec `shared/codec.py` can load
+(stdlib always; orjson and msgspec when installed). The payloads have the shape
+the apps handle:
+
+- tool-call arguments and the fetch_weather output (ex3-s1)
+- inventory and maintenance list responses built from the OpenAPI schemas (ex3-s2)
+- the OpenAPI specs themselves
+- a conversation-store record
+
+"json (default)" is the previous code: `json.dumps(value)` / `json.loads(text)`.
+
+Usage (from the repository root):
+    python benchmarks/json_codecs.py
+    python benchmarks/json_codecs.py --items 200
+"""
+import argparse
+import json
+import os
+import random
+import sys
+
+REPO_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+sys.path.append(REPO_ROOT)
+from run_benchmarks import time_callable
+from shared.codec import ArgumentsDecoder, available_codecs, get_codec
+from shared.tool_output import response_schemas, sample_value
+
+SPEC_DIR = os.path.join(REPO_ROOT, "EX3-AgentWithTools", "samples", "openApiDef")
+WEATHER_PARAMETERS = {
+    "type": "object",
+    "properties": {"location": {"type": "string", "description": "The location to fetch weather for."}},
+    "required": ["location"],
+}
+
+
+def payloads(items):
+    rng = random.Random(1)
+    result = {
+        "tool arguments": {"location": "Barcelona"},
+        "weather output": {"weather": {"temp": "25°C", "condition": "Sunny", "humidity": "45%"}},
+    }
+    for spec_file, operation_id, label in (
+        ("InventoryAPI.json", "get_all_inventory_inventory_get", f"inventory[{items}]"),
+        ("MaintenanceAPI.json", "get_all_jobs_jobs_get", f"maintenance jobs[{items}]"),
+    ):
+        with open(os.path.join(SPEC_DIR, spec_file), encoding="utf-8") as f:
+            schema = response_schemas(json.load(f))[operation_id]
+        result[label] = [sample_value(schema["items"], "", rng, i) for i in range(items)]
+    for spec_file in ("InventoryAPI.json", "MaintenanceAPI.json"):
+        with open(os.path.join(SPEC_DIR, spec_file), encoding="utf-8") as f:
+            result[f"spec {spec_file}"] = json.load(f)
+    result["conversation record"] = {"k": "m", "r": "assistant", "c": "You could visit the Sagrada Familia and Park Guell. " * 8}
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare JSON codecs on EX3 payloads")
+    parser.add_argument("--items", type=int, default=40, help="items in the list responses")
+    parser.add_argument("--repeats", type=int, default=5)
+    args = parser.parse_args()
+
+    codecs = [get_codec(name) for name in available_codecs()]
+    print(f"\n🧪 codecs: json (default), {', '.join(c.name for c in codecs)}; default codec: {get_codec().name}\n")
+    print(f"{'payload':<28} {'op':<7} {'codec':<15} {'µs/call':>10} {'speedup':>8}")
+    print("-" * 72)
+    for label, value in payloads(args.items).items():
+        text = json.dumps(value)
+        for op in ("encode", "decode"):
+            baseline = None
+            candidates = [("json (default)", (lambda: json.dumps(value)) if op == "encode" else (lambda: json.loads(text)))]
+            for codec in codecs:
+                candidates.append((codec.name, (lambda c=codec: c.dumpb(value)) if op == "encode" else (lambda c=codec: c.loads(text))))
+            for name, fn in candidates:
+                seconds = time_callable(fn, repeats=args.repeats)["min"]
+                baseline = baseline or seconds
+                print(f"{label:<28} {op:<7} {name:<15} {seconds * 1e6:>10.2f} {baseline / seconds:>7.1f}x")
+
+    # Typed decoding of tool arguments: msgspec Struct when installed, parse + checks otherwise
+    arguments = json.dumps({"location": "Barcelona"})
+    decoder = ArgumentsDecoder("fetch_weather", WEATHER_PARAMETERS)
+    seconds = time_callable(lambda: decoder.decode(arguments), repeats=args.repeats)["min"]
+    mode = "msgspec Struct" if decoder.struct is not None else f"{decoder.codec.name} + checks"
+    print(f"\n🔎 typed tool-argument decode ({mode}): {seconds * 1e6:.2f} µs/call")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,293 @@
+"""
+Micro-benchmarks for the per-turn local work in EX1-EX3
+-------------------------------------------------------
+Measures the code that runs on every chat turn besides the model call:
+
+- ex1: building `[system] + conversation_history`, rendering the personalized
+  system prompt template, accumulating streamed chunks
+- ex2: scanning `messages.list` for the reply of the current run
+- ex3: dispatching tool calls to local functions and encoding their output
+- shared: routing a message and grounding it on the retrieval index
+
+Each benchmark reports the median and best time per call. The best time is
+divided by a fixed calibration loop so numbers from different machines are comparable,
+and compared with benchmarks/baseline.json; a benchmark slower than the
+baseline by more than --tolerance is flagged as a regression (exit code 1).
+tests/test_benchmarks.py runs the same comparison under pytest, so CI fails
+on a regression too.
+
+Usage (from the repository root):
+    python benchmarks/run_benchmarks.py                 # run and compare
+    python benchmarks/run_benchmarks.py --filter ex1    # subset
+    python benchmarks/run_benchmarks.py --update        # write a new baseline
+"""
+import argparse
+import json
+import os
+import statistics
+import sys
+import time
+from types import SimpleNamespace
+
+REPO_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+sys.path.append(REPO_ROOT)
+
+BASELINE_PATH = os.path.join(os.path.dirname(__file__), "baseline.json")
+BENCHMARKS = {}
+
+
+def benchmark(name):
+    """Registers a setup function returning the zero-argument callable to time."""
+    def register(setup):
+        BENCHMARKS[name] = setup
+        return setup
+    return register
+
+
+# 1. Fixtures shaped like the SDK objects the samples handle
+# ---------------------------------------------------------------------
+
+def make_history(turns):
+    history = []
+    for i in range(turns):
+        history.append({"role": "user", "content": f"Question {i}: what should I see in Barcelona on day {i}?"})
+        history.append({"role": "assistant", "content": "You could visit the Sagrada Familia and Park Guell. " * 8})
+    return history
+
+
+def make_stream_chunks(tokens):
+    chunks = [SimpleNamespace(choices=[SimpleNamespace(delta=SimpleNamespace(content="", role="assistant"))])]
+    for i in range(tokens):
+        chunks.append(SimpleNamespace(choices=[SimpleNamespace(delta=SimpleNamespace(content=f" token{i}", role=None))]))
+    chunks.append(SimpleNamespace(choices=[]))  # usage-only chunk
+    return chunks
+
+
+def make_agent_messages(count, run_id):
+    messages = []
+    for i in range(count):
+        role = "assistant" if i % 2 else "user"
+        text = SimpleNamespace(text=SimpleNamespace(value=f"message {i} " * 20))
+        messages.append(SimpleNamespace(run_id=run_id if i == count - 1 else f"run_{i}", role=role, text_messages=[text]))
+    return messages
+
+
+def make_tool_calls(count):
+    return [
+        SimpleNamespace(id=f"call_{i}", function=SimpleNamespace(name="fetch_weather", arguments='{"location": "Barcelona"}'))
+        for i in range(count)
+    ]
+
+
+# 2. Benchmarks
+# ---------------------------------------------------------------------
+# Each body mirrors the code in the named sample so the numbers describe what
+# the apps actually do today.
+
+@benchmark("ex1.build_messages[10 turns]")
+def bench_build_messages_10():
+    history = make_history(10)
+    system_message = "You are a helpful assistant."
+    return lambda: [{"role": "system", "content": system_message}] + history
+
+
+@benchmark("ex1.build_messages[100 turns]")
+def bench_build_messages_100():
+    history = make_history(100)
+    system_message = "You are a helpful assistant."
+    return lambda: [{"role": "system", "content": system_message}] + history
+
+
+@benchmark("ex1.system_prompt")
+def bench_system_prompt():
+    # ex1-ch1-solution.py system_prompt(name): static prefix, name last
+    from shared.prompts import PromptTemplate
+
+    template = PromptTemplate(
+        "assistant",
+        "You are a helpful assistant. Keep answers clear and concise.",
+        "You are talking to {name}.",
+    )
+    return lambda: template.render(name="Maria")
+
+
+@benchmark("ex1.stream_accumulate[300 chunks]")
+def bench_stream_accumulate():
+    # ex1-s2-chainlit.py streaming loop (without the network/UI await)
+    chunks = make_stream_chunks(300)
+    sink = []
+
+    def run():
+        content = ""
+        for chunk in chunks:
+            if chunk.choices and len(chunk.choices) > 0:
+                if chunk.choices[0].delta.content is not None:
+                    content += chunk.choices[0].delta.content
+                    sink.append(chunk.choices[0].delta.content)
+        sink.clear()
+        return content
+    return run
+
+
+@benchmark("ex2.find_run_reply[50 messages]")
+def bench_find_run_reply():
+    # ex2-ch1-solution.py: scan messages.list(order=ASCENDING) for this run's reply
+    messages = make_agent_messages(50, "run_current")
+
+    def run():
+        agent_response = None
+        for msg in messages:
+            if msg.run_id == "run_current" and msg.text_messages and msg.role == "assistant":
+                agent_response = msg.text_messages[-1].text.value
+                break
+        return agent_response
+    return run
+
+
+@benchmark("ex3.tool_dispatch[4 calls]")
+def bench_tool_dispatch():
+    # ex3-s1-FunctionCalling.py requires_action loop
+    def fetch_weather(location):
+        mock_weather_data = {"Barcelona": "Sunny, 25°C", "Madrid": "Cloudy, 22°C", "Frankfurt": "Rainy, 16°C"}
+        weather = mock_weather_data.get(location, "Weather data not available for this location.")
+        return json.dumps({"weather": weather})
+
+    tool_calls = make_tool_calls(4)
+
+    def run():
+        tool_outputs = []
+        for tool_call in tool_calls:
+            if tool_call.function.name == "fetch_weather":
+                output = fetch_weather(json.loads(tool_call.function.arguments)["location"])
+                tool_outputs.append({"tool_call_id": tool_call.id, "output": output})
+        return tool_outputs
+    return run
+
+
+@benchmark("shared.router.route")
+def bench_router():
+    from shared.router import Router
+
+    router = Router()
+    router.command("/info", lambda ctx: "info")
+    texts = ["/info", "thanks", "What should I see in Barcelona during my free time?"]
+    return lambda: [router.route(text) for text in texts]
+
+
+@benchmark("shared.retrieval.ground_messages")
+def bench_grounding():
+    from shared.retrieval import LocalIndex, default_corpus, ground_messages
+
+    index = LocalIndex()
+    for path in default_corpus(REPO_ROOT):
+        index.add_file(path, os.path.relpath(path, REPO_ROOT))
+    messages = [{"role": "system", "content": "You are a helpful assistant."}, {"role": "user", "content": "How do I stream responses in Chainlit?"}]
+    return lambda: ground_messages(messages, index, "How do I stream responses in Chainlit?")
+
+
+# 3. Runner
+# ---------------------------------------------------------------------
+
+def calibrate():
+    """Best seconds of a fixed pure-Python loop; results are reported in multiples of it."""
+    def loop():
+        total = 0
+        for i in range(10000):
+            total += i * i
+        return total
+    return time_callable(loop)["min"]
+
+
+def time_callable(fn, repeats=7, min_time=0.05):
+    """Auto-ranges the inner loop to at least min_time, then takes the median of repeats."""
+    number = 1
+    while True:
+        start = time.perf_counter()
+        for _ in range(number):
+            fn()
+        elapsed = time.perf_counter() - start
+        if elapsed >= min_time:
+            break
+        number *= 2 if elapsed * 10 > min_time else 10
+    samples = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        for _ in range(number):
+            fn()
+        samples.append((time.perf_counter() - start) / number)
+    return {"median": statistics.median(samples), "min": min(samples), "number": number}
+
+
+def run(selected, repeats):
+    unit = calibrate()
+    results = {}
+    for name in selected:
+        fn = BENCHMARKS[name]()
+        timing = time_callable(fn, repeats=repeats)
+        results[name] = {
+            "median_us": timing["median"] * 1e6,
+            "min_us": timing["min"] * 1e6,
+            # min is far less sensitive to scheduler noise than the median
+            "normalized": timing["min"] / unit,
+        }
+    return unit, results
+
+
+def load_baseline():
+    if not os.path.exists(BASELINE_PATH):
+        return {}
+    with open(BASELINE_PATH, "r") as f:
+        return json.load(f).get("results", {})
+
+
+def compare(results, baseline, tolerance):
+    """({name: normalized / baseline}, [names slower than the baseline by more than tolerance])."""
+    ratios = {name: result["normalized"] / baseline[name]["normalized"] for name, result in results.items() if name in baseline}
+    return ratios, [name for name, ratio in ratios.items() if ratio > 1 + tolerance]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run the hot-path micro-benchmarks")
+    parser.add_argument("--filter", default="", help="only run benchmarks whose name contains this text")
+    parser.add_argument("--repeats", type=int, default=7)
+    parser.add_argument("--tolerance", type=float, default=0.5, help="allowed slowdown vs baseline (0.5 = 50%%)")
+    parser.add_argument("--update", action="store_true", help="write the results as the new baseline")
+    parser.add_argument("--json", help="also write the results to this file")
+    args = parser.parse_args()
+
+    selected = [name for name in BENCHMARKS if args.filter in name]
+    unit, results = run(selected, args.repeats)
+
+    baseline = load_baseline()
+    ratios, regressions = compare(results, baseline, args.tolerance)
+
+    print(f"\n⏱️  calibration unit: {unit * 1e6:.1f} µs\n")
+    print(f"{'benchmark':<40} {'median':>12} {'normalized':>11} {'vs baseline':>12}")
+    print("-" * 78)
+    for name, result in results.items():
+        change = ""
+        if name in ratios:
+            change = f"{(ratios[name] - 1) * 100:+.1f}%"
+            if name in regressions:
+                change += " ⚠️"
+        print(f"{name:<40} {result['median_us']:>10.2f}µs {result['normalized']:>11.4f} {change:>12}")
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump({"unit_us": unit * 1e6, "results": results}, f, indent=2)
+    if args.update:
+        merged = dict(baseline)
+        merged.update(results)
+        with open(BASELINE_PATH, "w") as f:
+            json.dump({"unit_us": unit * 1e6, "results": merged}, f, indent=2, sort_keys=True)
+        print(f"\n💾 Baseline updated: {BASELINE_PATH}")
+        return 0
+    if regressions:
+        print(f"\n❌ {len(regressions)} regression(s) beyond {args.tolerance:.0%}: {', '.join(regressions)}")
+        return 1
+    print("\n✅ No regressions")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,116 @@
+"""
+Session-start latency of the EX2 travel agent
+---------------------------------------------
+Times the remote calls a new chat session makes before the first question can
+be answered:
+
+- per-session: create_agent with the trip baked into the instructions, then
+  threads.create (what ex2-ch1-solution.py did before it shared one agent)
+- shared: threads.create only; the long-lived agent is resolved once up front
+  and trip details travel as per-run additional_instructions
+
+Usage (from the repository root):
+    python benchmarks/session_start.py --mock --api-latency 0.15   # offline mock backend
+    python benchmarks/session_start.py --sessions 10                # Foundry project from .env
+"""
+import argparse
+import os
+import sys
+import time
+
+REPO_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+sys.path.append(REPO_ROOT)
+from shared.stats import summarize
+
+INSTRUCTIONS = "You are an expert travel companion and advisor helping someone plan a trip."
+
+
+def project_client(endpoint, mock):
+    if mock:
+        from shared.mock_backend import mock_project_client
+
+        # Bearer token over the mock's plain http
+        return mock_project_client(endpoint)
+
+    from azure.ai.projects import AIProjectClient
+    from azure.identity import ClientSecretCredential
+
+    credential = ClientSecretCredential(
+        tenant_id=os.getenv("AZURE_TENANT_ID"),
+        client_id=os.getenv("AZURE_CLIENT_ID"),
+        client_secret=os.getenv("AZURE_CLIENT_SECRET"),
+    )
+    return AIProjectClient(endpoint=endpoint, credential=credential)
+
+
+def per_session_start(project, deployment, i):
+    agent = project.agents.create_agent(
+        model=deployment,
+        name="Travel Companion Agent",
+        instructions=f"{INSTRUCTIONS}\n\nTrip details:\n- Destination: City {i}",
+    )
+    thread = project.agents.threads.create()
+    return agent.id, thread.id
+
+
+def shared_start(project, agent_id):
+    return agent_id, project.agents.threads.create().id
+
+
+def measure(label, start, sessions):
+    samples = []
+    created = []
+    for i in range(sessions):
+        started = time.perf_counter()
+        created.append(start(i))
+        samples.append(time.perf_counter() - started)
+    stats = summarize(samples)
+    print(f"{label:<12} mean={stats['mean'] * 1000:7.1f}ms  p50={stats['p50'] * 1000:7.1f}ms  p95={stats['p95'] * 1000:7.1f}ms")
+    return stats, created
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark EX2 session start: per-session agent vs shared agent")
+    parser.add_argument("--sessions", type=int, default=20)
+    parser.add_argument("--mock", action="store_true", help="run against the in-process mock backend")
+    parser.add_argument("--api-latency", type=float, default=0.15, help="mock latency per agents control-plane call (s)")
+    args = parser.parse_args()
+
+    backend = None
+    if args.mock:
+        from shared.mock_backend import MockBackend
+
+        backend = MockBackend({"agents_api_seconds": args.api_latency}).start()
+        endpoint, deployment = backend.url + "api/projects/mock", "mock-deployment"
+    else:
+        from dotenv import load_dotenv
+
+        load_dotenv()
+        endpoint, deployment = os.getenv("AI_FOUNDRY_ENDPOINT"), os.getenv("AI_FOUNDRY_DEPLOYMENT_NAME")
+
+    try:
+        project = project_client(endpoint, args.mock)
+        print(f"\n⏱️  {args.sessions} session starts against {'mock' if args.mock else endpoint}\n")
+        before, created = measure("per-session", lambda i: per_session_start(project, deployment, i), args.sessions)
+
+        shared_agent = project.agents.create_agent(model=deployment, name="Travel Companion Agent", instructions=INSTRUCTIONS)
+        after, threads = measure("shared", lambda i: shared_start(project, shared_agent.id), args.sessions)
+
+        saved = before["mean"] - after["mean"]
+        print(f"\n✅ shared agent saves {saved * 1000:.1f}ms per session start ({saved / before['mean']:.0%})")
+
+        # Clean up everything this benchmark created
+        for agent_id, thread_id in created:
+            project.agents.delete_agent(agent_id)
+            project.agents.threads.delete(thread_id)
+        for _, thread_id in threads:
+            project.agents.threads.delete(thread_id)
+        project.agents.delete_agent(shared_agent.id)
+    finally:
+        if backend is not None:
+            backend.stop()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
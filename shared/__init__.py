@@ -0,0 +1,10 @@
+"""
+Shared building blocks for the Masterclass exercises
+----------------------------------------------------
+Helpers used by more than one exercise live here so the sample scripts can
+stay short and readable.
+
+The sample scripts use hyphenated file names (e.g. ex1-s2-chainlit.py) and are
+started from their own folder, so they add the repository root to sys.path
+before importing from this package.
+"""
@@ -0,0 +1,232 @@
+"""
+Pluggable JSON codec
+--------------------
+JSON is on every hot path: tool arguments and outputs, OpenAPI specs,
+conversation records and session values. `get_codec()` picks the fastest
+library that is installed and keeps the same interface for all of them:
+
+- `orjson` (preferred), then `msgspec`, then the stdlib `json` module
+- `JSON_CODEC=orjson|msgspec|stdlib` forces one (auto by default)
+- Output is always compact (no spaces after separators) and UTF-8, so every
+  codec writes the same bytes and files stay readable by the others
+- Decoding errors are raised as `ValueError` by every codec
+
+`ArgumentsDecoder` decodes tool-call arguments against the tool's JSON
+schema. With msgspec installed the schema becomes a `msgspec.Struct` and is
+validated while parsing. Otherwise the arguments are parsed and then checked
+for required fields and basic types.
+
+Usage:
+    from shared.codec import get_codec
+    codec = get_codec()
+    data = codec.dumpb({"weather": "Sunny, 25°C"})      # bytes
+    text = codec.dumps(value)                           # str
+    value = codec.loads(data)                           # str or bytes
+
+    decoder = ArgumentsDecoder("fetch_weather", parameters_schema)
+    kwargs = decoder.decode(tool_call.function.arguments)
+"""
+import json
+import os
+
+DEFAULT_CODEC = os.getenv("JSON_CODEC", "auto")
+
+
+# 1. Codecs
+# ---------------------------------------------------------------------
+
+class StdlibCodec:
+    name = "stdlib"
+
+    def __init__(self):
+        self._encoder = json.JSONEncoder(separators=(",", ":"), ensure_ascii=False)
+        self._sorted = json.JSONEncoder(separators=(",", ":"), ensure_ascii=False, sort_keys=True)
+
+    def dumps(self, value, sort_keys=False):
+        return (self._sorted if sort_keys else self._encoder).encode(value)
+
+    def dumpb(self, value, sort_keys=False):
+        return self.dumps(value, sort_keys).encode("utf-8")
+
+    def loads(self, data):
+        return json.loads(data)
+
+
+class OrjsonCodec:
+    name = "orjson"
+
+    def __init__(self):
+        import orjson
+
+        self._orjson = orjson
+        self._options = orjson.OPT_NON_STR_KEYS
+        self._sorted = orjson.OPT_NON_STR_KEYS | orjson.OPT_SORT_KEYS
+
+    def dumps(self, value, sort_keys=False):
+        return self.dumpb(value, sort_keys).decode("utf-8")
+
+    def dumpb(self, value, sort_keys=False):
+        return self._orjson.dumps(value, option=self._sorted if sort_keys else self._options)
+
+    def loads(self, data):
+        return self._orjson.loads(data)  # orjson.JSONDecodeError is a ValueError
+
+
+class MsgspecCodec:
+    name = "msgspec"
+
+    def __init__(self):
+        import msgspec
+
+        self._msgspec = msgspec
+        self._encoder = msgspec.json.Encoder()
+        self._decoder = msgspec.json.Decoder()
+
+    def dumps(self, value, sort_keys=False):
+        return self.dumpb(value, sort_keys).decode("utf-8")
+
+    def dumpb(self, value, sort_keys=False):
+        if sort_keys:
+            return self._msgspec.json.encode(value, order="sorted")
+        return self._encoder.encode(value)
+
+    def loads(self, data):
+        try:
+            return self._decoder.decode(data)
+        except self._msgspec.DecodeError as e:
+            raise ValueError(str(e)) from e
+
+
+CODECS = {"orjson": OrjsonCodec, "msgspec": MsgspecCodec, "stdlib": StdlibCodec}
+_codecs = {}
+
+
+def get_codec(name=None):
+    """The named codec, or the fastest installed one for "auto" (JSON_CODEC overrides the default)."""
+    name = name or DEFAULT_CODEC
+    if name not in _codecs:
+        if name == "auto":
+            for candidate in CODECS:
+                try:
+                    _codecs[name] = get_codec(candidate)
+                    break
+                except ImportError:
+                    continue
+        else:
+            if name not in CODECS:
+                raise ValueError(f"unknown JSON codec {name!r}; expected one of {', '.join(CODECS)} or auto")
+            _codecs[name] = CODECS[name]()
+    return _codecs[name]
+
+
+def available_codecs():
+    names = []
+    for name in CODECS:
+        try:
+            get_codec(name)
+            names.append(name)
+        except ImportError:
+            pass
+    return names
+
+
+# 2. Typed decoding of tool arguments
+# ---------------------------------------------------------------------
+
+_STRUCT_TYPES = {"string": str, "integer": int, "number": float, "boolean": bool,
+                 "array": list, "object": dict, "null": type(None)}
+_PYTHON_TYPES = {"string": str, "integer": int, "number": (int, float), "boolean": bool,
+                 "array": list, "object": dict, "null": type(None)}
+
+
+def _struct_type(schema):
+    kind = schema.get("type")
+    if isinstance(kind, list):
+        result = _struct_type({**schema, "type": kind[0]})
+        for extra in kind[1:]:
+            result = result | _struct_type({**schema, "type": extra})
+        return result
+    if schema.get("enum") and all(isinstance(v, str) for v in schema["enum"]):
+        from typing import Literal
+
+        return Literal[tuple(schema["enum"])]
+    return _STRUCT_TYPES.get(kind, object)
+
+
+def schema_struct(name, schema):
+    """
+    A msgspec.Struct type for an object schema. Optional fields default to their schema
+    default, or to msgspec.UNSET so the function's own default applies.
+    """
+    import msgspec
+
+    required = set(schema.get("required", ()))
+    fields = []
+    for field, sub in schema.get("properties", {}).items():
+        field_type = _struct_type(sub)
+        if field in required:
+            fields.append((field, field_type))
+        else:
+            default = sub["default"] if "default" in sub else msgspec.UNSET
+            fields.append((field, field_type | None | msgspec.UnsetType, default))
+    return msgspec.defstruct(name, fields, kw_only=True, forbid_unknown_fields=False)
+
+
+class ArgumentsDecoder:
+    """
+    Decodes a tool call's JSON arguments into a dict of keyword arguments, validated
+    against the tool's parameters schema. Raises ValueError for invalid arguments.
+    """
+
+    def __init__(self, name, schema, codec=None):
+        self.name = name
+        self.schema = schema or {}
+        self.codec = codec or get_codec()
+        self.required = list(self.schema.get("required", ()))
+        self.properties = self.schema.get("properties", {})
+        self.struct = None
+        if not self.properties:
+            return
+        try:
+            import msgspec
+        except ImportError:
+            return
+        self._msgspec = msgspec
+        self.struct = schema_struct(f"{name}_arguments", self.schema)
+        self._decoder = msgspec.json.Decoder(self.struct)
+
+    def decode(self, arguments):
+        if self.struct is not None:
+            try:
+                value = self._decoder.decode(arguments or "{}")
+            except self._msgspec.DecodeError as e:
+                raise ValueError(f"{self.name}: {e}") from e
+            return {f: getattr(value, f) for f in value.__struct_fields__
+                    if getattr(value, f) is not self._msgspec.UNSET}
+        value = self.codec.loads(arguments or "{}")
+        if not isinstance(value, dict):
+            raise ValueError(f"{self.name}: arguments must be a JSON object")
+        missing = [f for f in self.required if f not in value]
+        if missing:
+            raise ValueError(f"{self.name}: missing required argument(s) {', '.join(missing)}")
+        for field, item in value.items():
+            expected = _PYTHON_TYPES.get(self.properties.get(field, {}).get("type"))
+            if expected is not None and item is not None and (
+                    not isinstance(item, expected) or (isinstance(item, bool) and expected is not bool)):
+                raise ValueError(f"{self.name}: argument {field!r} should be {self.properties[field]['type']}")
+        if not self.properties:
+            return value
+        # Same result as the Struct: declared fields only, absent ones only when the schema has a default
+        return {f: value[f] if f in value else self.properties[f]["default"]
+                for f in self.properties if f in value or "default" in self.properties[f]}
+
+
+def decoders_from_definitions(definitions, codec=None):
+    """{function name: ArgumentsDecoder} for FunctionTool.definitions (SDK objects or plain dicts)."""
+    decoders = {}
+    for definition in definitions:
+        function = definition["function"] if isinstance(definition, dict) else definition.function
+        name = function["name"] if isinstance(function, dict) else function.name
+        parameters = function.get("parameters") if isinstance(function, dict) else function.parameters
+        decoders[name] = ArgumentsDecoder(name, parameters, codec)
+    return decoders
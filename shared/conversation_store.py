@@ -0,0 +1,378 @@
+"""
+Persistent conversation store
+-----------------------------
+Conversation state (history, user name, counters) used to live only in
+`cl.user_session` and was lost on restart. This store keeps it on disk in a
+compact form and keeps recently used sessions in memory:
+
+- One append-only log file per session. Every record is framed as
+  [4-byte length][JSON payload][4-byte length], so the file can be read
+  backwards from the end as well as forwards.
+- Record kinds: "m" message, "s" session variable set, "c" checkpoint of
+  all variables, "x" history cleared.
+- A checkpoint is appended every `checkpoint_every` records, so resuming a
+  session only reads back to the last checkpoint and the last
+  `recent_messages` messages: O(recent turns), never the whole log.
+- Older messages are loaded lazily with `load_older()`.
+- Hot sessions stay in an in-memory LRU (`max_hot`). A hot copy is reloaded
+  when its log grew behind its back, and every append first checks (under the
+  log's lock) that nobody wrote since the copy was read, so several workers
+  can share the folder.
+- Logs larger than `max_log_bytes` are compacted (rewritten as one checkpoint
+  plus the last `retain_messages` messages), periodically in a background thread.
+- Appends and compaction hold the log's OS-level lock file, so a compaction in
+  one worker cannot drop a record appended by another.
+- A record is only read when its leading and trailing lengths match. A torn
+  record at the end (a crash mid-append) is cut off the log on the next resume.
+
+Usage:
+    store = ConversationStore(".conversations")
+    session = store.get(thread_id)
+    store.append_message(thread_id, "user", text)
+    store.set(thread_id, "user_name", "Maria")
+    messages = [system] + session.history()
+"""
+import os
+import re
+import struct
+import threading
+from collections import OrderedDict, deque
+
+from shared.codec import get_codec
+from shared.session_state import file_lock
+
+FRAME = struct.Struct(">I")
+codec = get_codec()
+
+DEFAULT_RECENT_MESSAGES = int(os.getenv("CONVERSATION_RECENT_MESSAGES", "40"))
+_MISSING = object()
+
+
+def encode_record(record):
+    payload = codec.dumpb(record)
+    header = FRAME.pack(len(payload))
+    return header + payload + header
+
+
+class CorruptLog(ValueError):
+    """A record's leading and trailing lengths do not match (torn or damaged log)."""
+
+
+def iter_records_backward(f, end=None):
+    """Yields records from the end of an open binary file towards the start."""
+    position = f.seek(0, os.SEEK_END) if end is None else end
+    while position > 0:
+        if position < 2 * FRAME.size:
+            raise CorruptLog(f"corrupt conversation log: {position} stray bytes at the start")
+        f.seek(position - FRAME.size)
+        trailer = f.read(FRAME.size)
+        (length,) = FRAME.unpack(trailer)
+        start = position - 2 * FRAME.size - length
+        if start < 0:
+            raise CorruptLog(f"corrupt conversation log: record ending at {position} is longer than the log")
+        f.seek(start)
+        if f.read(FRAME.size) != trailer:
+            raise CorruptLog(f"corrupt conversation log: record ending at {position} has mismatched lengths")
+        record = codec.loads(f.read(length))
+        yield start, record
+        position = start
+
+
+def iter_frames_forward(f):
+    """Yields (end offset, payload) for each complete record, stopping at a torn or damaged one."""
+    f.seek(0)
+    while True:
+        header = f.read(FRAME.size)
+        if len(header) < FRAME.size:
+            return
+        (length,) = FRAME.unpack(header)
+        payload = f.read(length)
+        if len(payload) < length or f.read(FRAME.size) != header:
+            return  # torn write at the end of the log; ignore it
+        yield f.tell(), payload
+
+
+def iter_records_forward(f):
+    for _, payload in iter_frames_forward(f):
+        yield codec.loads(payload)
+
+
+def valid_length(f):
+    """Offset just past the last complete record of an open binary file."""
+    end = 0
+    for end, _ in iter_frames_forward(f):
+        pass
+    return end
+
+
+# 1. Session state
+# ---------------------------------------------------------------------
+
+class SessionState:
+    """In-memory view of one session: all variables plus the most recent messages."""
+
+    def __init__(self, session_id):
+        self.session_id = session_id
+        self.vars = {}
+        self.messages = deque()
+        self.oldest_offset = 0         # file offset of the oldest loaded record
+        self.complete = True           # True when every message is loaded
+        self.records_since_checkpoint = 0
+        self.log_size = 0              # log size after our last read/write
+
+    def history(self, limit=None):
+        """Loaded messages as a list of {"role", "content"} dicts (oldest first)."""
+        items = list(self.messages)
+        return items[-limit:] if limit else items
+
+    def get(self, key, default=None):
+        return self.vars.get(key, default)
+
+
+# 2. Store
+# ---------------------------------------------------------------------
+
+class ConversationStore:
+    """
+    :param directory: Folder for the per-session log files.
+    :param max_hot: Sessions kept in memory (LRU).
+    :param recent_messages: Messages loaded (and kept) in memory per session.
+    :param checkpoint_every: Records between variable checkpoints.
+    :param max_log_bytes: Log size that triggers compaction.
+    :param retain_messages: Messages kept on disk by compaction.
+    """
+
+    def __init__(self, directory, max_hot=1000, recent_messages=DEFAULT_RECENT_MESSAGES,
+                 checkpoint_every=50, max_log_bytes=1 << 20, retain_messages=500):
+        self.directory = directory
+        self.max_hot = max_hot
+        self.recent_messages = recent_messages
+        self.checkpoint_every = checkpoint_every
+        self.max_log_bytes = max_log_bytes
+        self.retain_messages = retain_messages
+        self.hot = OrderedDict()  # {session_id: SessionState}
+        self.lock = threading.RLock()
+        self._compactor = None
+        self._stop = threading.Event()
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, session_id):
+        safe = re.sub(r"[^A-Za-z0-9_.-]", "_", str(session_id))
+        return os.path.join(self.directory, f"{safe}.log")
+
+    def _append(self, session, record):
+        """
+        Applies record to the session and appends it to the log; returns the session.
+        When another worker wrote to the log since this session was read, the session
+        is resumed from disk first (under the lock), so its copy never skips their records.
+        """
+        path = self._path(session.session_id)
+        with file_lock(path + ".lock"), open(path, "ab") as f:
+            if f.seek(0, os.SEEK_END) != session.log_size:
+                session = self._resume(session.session_id, locked=True)
+                self._keep_hot(session)
+            if record["k"] == "s" and session.vars.get(record["n"], _MISSING) == record["v"]:
+                return session
+            self._apply(session, record)
+            data = encode_record(record)
+            session.records_since_checkpoint += 1
+            if session.records_since_checkpoint >= self.checkpoint_every:
+                data += encode_record({"k": "c", "v": session.vars})
+                session.records_since_checkpoint = 0
+            f.write(data)
+            session.log_size = f.tell()
+        return session
+
+    def _apply(self, session, record):
+        kind = record["k"]
+        if kind == "m":
+            session.messages.append({"role": record["r"], "content": record["c"]})
+            while len(session.messages) > self.recent_messages:
+                session.messages.popleft()
+                session.complete = False
+        elif kind == "s":
+            session.vars[record["n"]] = record["v"]
+        elif kind == "x":
+            session.messages.clear()
+            session.complete = True
+
+    def _keep_hot(self, session):
+        self.hot[session.session_id] = session
+        self.hot.move_to_end(session.session_id)
+        while len(self.hot) > self.max_hot:
+            self.hot.popitem(last=False)
+
+    def _repair(self, path, locked=False):
+        """Cuts a torn record off the end of a log; returns True when bytes were dropped."""
+        if not locked:
+            # Under the lock an append from another worker is complete, so only real damage is cut
+            with file_lock(path + ".lock"):
+                return self._repair(path, locked=True)
+        with open(path, "r+b") as f:
+            size = f.seek(0, os.SEEK_END)
+            end = valid_length(f)
+            if end == size:
+                return False
+            f.truncate(end)
+        print(f"[conversation-store] dropped {size - end} bytes of a torn record at the end of {path}")
+        return True
+
+    def _resume(self, session_id, locked=False):
+        """Reads the log backwards until variables and recent messages are known."""
+        path = self._path(session_id)
+        try:
+            return self._read_recent(session_id, path)
+        except CorruptLog:
+            # A crash mid-append leaves a torn last record; cut it off and read again
+            self._repair(path, locked)
+            return self._read_recent(session_id, path)
+
+    def _read_recent(self, session_id, path):
+        session = SessionState(session_id)
+        if not os.path.exists(path):
+            return session
+        newer_sets = {}
+        found_checkpoint = False
+        history_done = False  # enough messages, or a clear was reached
+        messages = []
+        with open(path, "rb") as f:
+            session.log_size = f.seek(0, os.SEEK_END)
+            for offset, record in iter_records_backward(f, session.log_size):
+                kind = record["k"]
+                if kind == "c":
+                    if not found_checkpoint:
+                        session.vars = dict(record["v"])
+                        found_checkpoint = True
+                else:
+                    if not found_checkpoint:
+                        session.records_since_checkpoint += 1
+                    if kind == "s" and not found_checkpoint:
+                        newer_sets.setdefault(record["n"], record["v"])
+                    elif kind == "x":
+                        history_done = True
+                    elif kind == "m" and not history_done:
+                        messages.append({"role": record["r"], "content": record["c"]})
+                        session.oldest_offset = offset
+                        if len(messages) >= self.recent_messages:
+                            history_done = True
+                            session.complete = False
+                if found_checkpoint and history_done:
+                    break
+        session.vars.update(newer_sets)
+        session.messages.extend(reversed(messages))
+        return session
+
+    def get(self, session_id):
+        """Returns the session, loading its recent state from disk if it is not hot."""
+        with self.lock:
+            session = self.hot.get(session_id)
+            if session is not None and self._is_current(session):
+                self.hot.move_to_end(session_id)
+                return session
+            session = self._resume(session_id)
+            self._keep_hot(session)
+            return session
+
+    def _is_current(self, session):
+        try:
+            return os.path.getsize(self._path(session.session_id)) == session.log_size
+        except FileNotFoundError:
+            return session.log_size == 0
+
+    def append_message(self, session_id, role, content):
+        with self.lock:
+            return self._append(self.get(session_id), {"k": "m", "r": role, "c": content})
+
+    def set(self, session_id, key, value):
+        with self.lock:
+            # An unchanged value is not written; _append decides after catching up with other workers
+            return self._append(self.get(session_id), {"k": "s", "n": key, "v": value})
+
+    def clear_history(self, session_id):
+        with self.lock:
+            return self._append(self.get(session_id), {"k": "x"})
+
+    def load_older(self, session_id, count):
+        """Loads up to count older messages in front of the loaded ones; returns how many."""
+        with self.lock:
+            session = self.get(session_id)
+            if session.complete:
+                return 0
+            older = []
+            with open(self._path(session_id), "rb") as f:
+                for offset, record in iter_records_backward(f, session.oldest_offset):
+                    if record["k"] == "x":
+                        session.complete = True
+                        break
+                    if record["k"] == "m":
+                        older.append({"role": record["r"], "content": record["c"]})
+                        session.oldest_offset = offset
+                        if len(older) >= count:
+                            break
+                else:
+                    session.complete = True
+            session.messages.extendleft(older)
+            return len(older)
+
+    # 3. Compaction
+    # -----------------------------------------------------------------
+
+    def compact(self, session_id):
+        """Rewrites a log as one checkpoint plus the last retain_messages messages."""
+        with self.lock:
+            path = self._path(session_id)
+            if not os.path.exists(path):
+                return
+            # Appends wait on the same lock file, so none can land between the read and the replace
+            with file_lock(path + ".lock"):
+                self._rewrite(path)
+            # Offsets changed: drop the hot copy so the next access resumes cleanly
+            self.hot.pop(session_id, None)
+
+    def _rewrite(self, path):
+        """Writes the compacted log to a temporary file and swaps it in."""
+        variables, messages = {}, deque(maxlen=self.retain_messages)
+        with open(path, "rb") as f:
+            for record in iter_records_forward(f):
+                kind = record["k"]
+                if kind == "s":
+                    variables[record["n"]] = record["v"]
+                elif kind == "c":
+                    variables.update(record["v"])
+                elif kind == "m":
+                    messages.append(record)
+                elif kind == "x":
+                    messages.clear()
+        with open(path + ".tmp", "wb") as f:
+            for record in messages:
+                f.write(encode_record(record))
+            f.write(encode_record({"k": "c", "v": variables}))
+        os.replace(path + ".tmp", path)
+
+    def compact_all(self):
+        """Compacts every log above max_log_bytes; returns the number compacted."""
+        compacted = 0
+        for name in os.listdir(self.directory):
+            if not name.endswith(".log"):
+                continue
+            if os.path.getsize(os.path.join(self.directory, name)) > self.max_log_bytes:
+                self.compact(name[:-4])
+                compacted += 1
+        return compacted
+
+    def start_background_compaction(self, interval=300.0):
+        if self._compactor is not None:
+            return
+
+        def loop():
+            while not self._stop.wait(interval):
+                try:
+                    self.compact_all()
+                except Exception as e:
+                    print(f"[conversation-store] compaction failed: {e}")
+
+        self._compactor = threading.Thread(target=loop, name="conversation-compactor", daemon=True)
+        self._compactor.start()
+
+    def close(self):
+        self._stop.set()
@@ -0,0 +1,377 @@
+"""
+Cached Entra ID tokens
+----------------------
+Every sample process used to start with a token acquisition.
+`DefaultAzureCredential` first walks its provider chain (environment,
+managed identity, VS Code, Azure CLI, ...), and a token that expired during
+a long run was renewed inside the request that needed it.
+`CachedCredential` wraps any azure-identity credential:
+
+- Tokens are kept per identity, scopes and tenant, in memory and in an
+  encrypted file (`cryptography` Fernet, installed with azure-identity), so
+  the next process starts with a valid token
+- A background thread renews tokens `refresh_margin` seconds before they
+  expire, so requests never wait for a refresh
+- `CachedCredential.default()` pins the provider that worked: later processes
+  build that provider only instead of walking the chain again (and go back to
+  the full chain if it stops working)
+- `summary()`: tokens served from cache, acquisitions and the acquisition
+  latency saved
+
+The key comes from `TOKEN_CACHE_KEY` (a Fernet key) or is generated once into
+the cache directory with owner-only permissions. Without `cryptography` the
+cache stays in memory; tokens are never written in plain text.
+
+Usage:
+    credential = CachedCredential(ClientSecretCredential(...), ".tokens")
+    credential = CachedCredential.default(".tokens")      # pinned DefaultAzureCredential
+    credential.start_background_refresh()
+    project = AIProjectClient(endpoint=endpoint, credential=credential)
+    print(credential.summary())
+
+Inspect or clear the cache:
+    python -m shared.credentials status .tokens
+    python -m shared.credentials clear .tokens
+"""
+import base64
+import hashlib
+import os
+import sys
+import threading
+import time
+
+from shared.codec import get_codec
+
+CACHE_FILE = "tokens.bin"
+KEY_FILE = "cache.key"
+# Renew tokens this many seconds before they expire
+TOKEN_REFRESH_MARGIN_SECONDS = int(os.getenv("TOKEN_REFRESH_MARGIN_SECONDS", "300"))
+# Providers of DefaultAzureCredential that can be pinned, by class name
+PINNABLE_PROVIDERS = (
+    "EnvironmentCredential", "WorkloadIdentityCredential", "ManagedIdentityCredential",
+    "SharedTokenCacheCredential", "VisualStudioCodeCredential", "AzureCliCredential",
+    "AzurePowerShellCredential", "AzureDeveloperCliCredential",
+)
+
+codec = get_codec()
+
+
+# 1. Encrypted token file
+# ---------------------------------------------------------------------
+
+class TokenFile:
+    """
+    Encrypted JSON document {"provider": ..., "acquire_ms": {...}, "tokens": {key: entry}}.
+    persistent is False (memory only) when cryptography is not installed or directory is None.
+    """
+
+    def __init__(self, directory, key=None):
+        self.directory = directory
+        self.path = os.path.join(directory, CACHE_FILE) if directory else None
+        self.lock = threading.Lock()
+        self.fernet = None
+        if directory:
+            try:
+                from cryptography.fernet import Fernet
+            except ImportError:
+                print("[tokens] cryptography is not installed; tokens are cached in memory only")
+            else:
+                self.fernet = Fernet(key or os.getenv("TOKEN_CACHE_KEY") or self._local_key())
+        self.persistent = self.fernet is not None
+
+    def _local_key(self):
+        from cryptography.fernet import Fernet
+
+        os.makedirs(self.directory, exist_ok=True)
+        path = os.path.join(self.directory, KEY_FILE)
+        try:
+            with open(path, "rb") as f:
+                return f.read().strip()
+        except FileNotFoundError:
+            key = Fernet.generate_key()
+            try:
+                fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600)
+            except FileExistsError:
+                # Another process created it first
+                with open(path, "rb") as f:
+                    return f.read().strip()
+            with os.fdopen(fd, "wb") as f:
+                f.write(key)
+            return key
+
+    def read(self):
+        if not self.persistent:
+            return {}
+        try:
+            with open(self.path, "rb") as f:
+                data = f.read()
+        except FileNotFoundError:
+            return {}
+        try:
+            return codec.loads(self.fernet.decrypt(data))
+        except Exception:
+            # Wrong key or a damaged file: start over rather than fail authentication
+            print(f"[tokens] could not decrypt {self.path}; ignoring it")
+            return {}
+
+    def update(self, tokens=None, provider=None, acquire_ms=None):
+        """Merges changes into the file (other processes may have written other keys)."""
+        if not self.persistent:
+            return
+        with self.lock:
+            document = self.read()
+            document.setdefault("tokens", {}).update(tokens or {})
+            if provider is not None:
+                document["provider"] = provider
+            if acquire_ms:
+                document.setdefault("acquire_ms", {}).update(acquire_ms)
+            now = time.time()
+            document["tokens"] = {k: v for k, v in document["tokens"].items() if v["expires_on"] > now}
+            temp = f"{self.path}.{os.getpid()}.tmp"
+            fd = os.open(temp, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+            with os.fdopen(fd, "wb") as f:
+                f.write(self.fernet.encrypt(codec.dumpb(document)))
+            os.replace(temp, self.path)
+
+
+# 2. Credentials
+# ---------------------------------------------------------------------
+
+class TokenStats:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.hits = 0               # get_token answered from the cache
+        self.loaded = 0             # tokens read from the file at startup
+        self.acquired = 0           # acquisitions inside get_token (the caller waited)
+        self.refreshed = 0          # acquisitions ahead of expiry in the background
+        self.failures = 0
+        self.acquire_seconds = 0.0
+        self.previous_acquire_ms = None   # from earlier processes, for the saved estimate
+
+    def record(self, seconds, background):
+        with self.lock:
+            if background:
+                self.refreshed += 1
+            else:
+                self.acquired += 1
+            self.acquire_seconds += seconds
+
+    def mean_acquire_ms(self):
+        count = self.acquired + self.refreshed
+        if count:
+            return self.acquire_seconds / count * 1000
+        return self.previous_acquire_ms
+
+    def summary(self):
+        mean = self.mean_acquire_ms()
+        saved = f", ~{self.hits * mean / 1000:.1f}s of acquisition saved" if mean else ""
+        timing = f" | acquisition {mean:.0f} ms avg{saved}" if mean else ""
+        return (
+            f"{self.hits} tokens from cache ({self.loaded} loaded from disk), "
+            f"{self.acquired} acquired on demand, {self.refreshed} refreshed ahead of expiry, "
+            f"{self.failures} failures{timing}"
+        )
+
+
+class PinnedDefaultCredential:
+    """
+    DefaultAzureCredential that remembers which provider answered (provider) and, when
+    created with that name, uses only that provider; if it fails the full chain is used again.
+    """
+
+    def __init__(self, provider=None, **default_kwargs):
+        self.default_kwargs = default_kwargs
+        self.provider = provider if provider in PINNABLE_PROVIDERS else None
+        self.pinned = self._build(self.provider) if self.provider else None
+        self.chain = None
+
+    @staticmethod
+    def _build(provider):
+        from azure import identity
+
+        if provider == "ManagedIdentityCredential" and os.getenv("AZURE_CLIENT_ID"):
+            return identity.ManagedIdentityCredential(client_id=os.getenv("AZURE_CLIENT_ID"))
+        return getattr(identity, provider)()
+
+    def get_token(self, *scopes, **kwargs):
+        if self.pinned is not None:
+            try:
+                return self.pinned.get_token(*scopes, **kwargs)
+            except Exception as e:
+                print(f"[tokens] pinned provider {self.provider} failed ({type(e).__name__}); using the full chain")
+                self.pinned, self.provider = None, None
+        if self.chain is None:
+            from azure.identity import DefaultAzureCredential
+
+            self.chain = DefaultAzureCredential(**self.default_kwargs)
+        token = self.chain.get_token(*scopes, **kwargs)
+        # Set by the chain to the provider that answered
+        successful = getattr(self.chain, "_successful_credential", None)
+        self.provider = type(successful).__name__ if successful is not None else None
+        return token
+
+    def close(self):
+        for credential in (self.pinned, self.chain):
+            if credential is not None and hasattr(credential, "close"):
+                credential.close()
+
+
+class CachedCredential:
+    """
+    :param credential: The azure-identity credential to wrap (anything with get_token).
+    :param directory: Directory of the encrypted token file (None = memory only).
+    :param identity: Names the principal in cache keys (default: credential class, tenant and client id).
+    :param refresh_margin: Seconds before expiry a token is renewed in the background.
+    """
+
+    def __init__(self, credential, directory=None, identity=None, refresh_margin=TOKEN_REFRESH_MARGIN_SECONDS):
+        self.credential = credential
+        self.identity = identity or ":".join((
+            type(credential).__name__, os.getenv("AZURE_TENANT_ID", ""), os.getenv("AZURE_CLIENT_ID", "")))
+        self.refresh_margin = refresh_margin
+        self.file = TokenFile(directory)
+        self.stats = TokenStats()
+        self.tokens = {}                    # {key: {"token", "expires_on", "scopes", "tenant_id", "identity"}}
+        self.lock = threading.Lock()
+        self._acquiring = {}                # {key: Lock}, one acquisition per key at a time
+        self._stop = threading.Event()
+        self._refresher = None
+        self._provider = None
+        document = self.file.read()
+        now = time.time()
+        for key, entry in document.get("tokens", {}).items():
+            if entry.get("identity") == self.identity and entry["expires_on"] > now:
+                self.tokens[key] = entry
+        self.stats.loaded = len(self.tokens)
+        self.stats.previous_acquire_ms = document.get("acquire_ms", {}).get(self.identity)
+
+    @classmethod
+    def default(cls, directory=None, **kwargs):
+        """A cached DefaultAzureCredential, pinned to the provider that worked last time."""
+        document = TokenFile(directory).read()
+        credential = PinnedDefaultCredential(document.get("provider"))
+        identity = kwargs.pop("identity", None) or f"default:{os.getenv('AZURE_TENANT_ID', '')}"
+        return cls(credential, directory, identity=identity, **kwargs)
+
+    @property
+    def provider(self):
+        return getattr(self.credential, "provider", None) or type(self.credential).__name__
+
+    def _key(self, scopes, tenant_id):
+        raw = "|".join((self.identity, " ".join(sorted(scopes)), tenant_id or ""))
+        return hashlib.sha256(raw.encode("utf-8")).hexdigest()[:32]
+
+    def get_token(self, *scopes, claims=None, tenant_id=None, **kwargs):
+        if claims:
+            # A claims challenge (e.g. revoked session) always needs a fresh token
+            return self.credential.get_token(*scopes, claims=claims, tenant_id=tenant_id, **kwargs)
+        key = self._key(scopes, tenant_id)
+        entry = self.tokens.get(key)
+        if entry is None or entry["expires_on"] - time.time() < 30:
+            entry = self._acquire(key, scopes, tenant_id, background=False, **kwargs)
+        else:
+            with self.stats.lock:
+                self.stats.hits += 1
+        from azure.core.credentials import AccessToken
+
+        return AccessToken(entry["token"], int(entry["expires_on"]))
+
+    def _acquire(self, key, scopes, tenant_id, background, **kwargs):
+        with self.lock:
+            lock = self._acquiring.setdefault(key, threading.Lock())
+        with lock:
+            entry = self.tokens.get(key)
+            if entry is not None and entry["expires_on"] - time.time() > (self.refresh_margin if background else 30):
+                return entry          # another thread renewed it meanwhile
+            started = time.perf_counter()
+            try:
+                token = self.credential.get_token(*scopes, tenant_id=tenant_id, **kwargs)
+            except Exception:
+                with self.stats.lock:
+                    self.stats.failures += 1
+                raise
+            elapsed = time.perf_counter() - started
+            self.stats.record(elapsed, background)
+            entry = {"token": token.token, "expires_on": token.expires_on, "scopes": list(scopes),
+                     "tenant_id": tenant_id, "identity": self.identity}
+            self.tokens[key] = entry
+            provider = getattr(self.credential, "provider", None)
+            self.file.update({key: entry}, provider=provider, acquire_ms={self.identity: round(elapsed * 1000, 1)})
+            return entry
+
+    def refresh_due(self):
+        """Renews tokens that expire within refresh_margin; returns how many were renewed."""
+        now = time.time()
+        due = [(k, e) for k, e in list(self.tokens.items()) if e["expires_on"] - now < self.refresh_margin]
+        renewed = 0
+        for key, entry in due:
+            try:
+                self._acquire(key, tuple(entry["scopes"]), entry["tenant_id"], background=True)
+                renewed += 1
+            except Exception as e:
+                print(f"[tokens] background refresh failed: {e}")
+        return renewed
+
+    def start_background_refresh(self, interval=None):
+        """Checks for tokens close to expiry every interval seconds (default: a fifth of the margin)."""
+        if self._refresher is not None:
+            return
+        interval = interval or max(5.0, self.refresh_margin / 5)
+
+        def loop():
+            while not self._stop.wait(interval):
+                self.refresh_due()
+
+        self._refresher = threading.Thread(target=loop, name="token-refresh", daemon=True)
+        self._refresher.start()
+
+    def summary(self):
+        storage = "encrypted on disk" if self.file.persistent else "memory only"
+        return f"{self.stats.summary()} | provider {self.provider} | {storage}"
+
+    def close(self):
+        self._stop.set()
+        if hasattr(self.credential, "close"):
+            self.credential.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+# 3. CLI
+# ---------------------------------------------------------------------
+
+def main():
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Inspect or clear the encrypted token cache")
+    parser.add_argument("command", choices=("status", "clear"))
+    parser.add_argument("directory", nargs="?", default=".tokens")
+    args = parser.parse_args()
+
+    token_file = TokenFile(args.directory)
+    if not token_file.persistent:
+        print("❌ cryptography is not installed; there is no token file to inspect")
+        return 1
+    if args.command == "clear":
+        if os.path.exists(token_file.path):
+            os.remove(token_file.path)
+        print(f"🧹 Removed {token_file.path}")
+        return 0
+    document = token_file.read()
+    now = time.time()
+    print(f"\n🔐 {token_file.path}: provider {document.get('provider') or 'not pinned'}\n")
+    for key, entry in sorted(document.get("tokens", {}).items(), key=lambda item: item[1]["expires_on"]):
+        fingerprint = base64.urlsafe_b64encode(hashlib.sha256(entry["token"].encode()).digest()[:6]).decode()
+        print(f"{entry['identity']:<40} {' '.join(entry['scopes']):<45} "
+              f"expires in {(entry['expires_on'] - now) / 60:5.1f} min  [{fingerprint}]")
+    for identity, ms in document.get("acquire_ms", {}).items():
+        print(f"last acquisition for {identity}: {ms:.0f} ms")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
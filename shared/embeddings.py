@@ -0,0 +1,240 @@
+"""
+Micro-batched embeddings
+------------------------
+Anything that embeds per message (retrieval queries, a semantic cache, tool
+selection) would otherwise send one tiny embeddings request per text. The
+`EmbeddingBatcher` sits in front of an embedder and is itself an embedder
+(`embed(texts)` and `dim`), so it plugs into `LocalIndex` and
+`IncrementalIndex` unchanged:
+
+- Texts from all threads are queued; a worker sends them as one request once
+  `max_batch` texts are waiting or `max_wait_ms` after the first one arrived
+- Results are split back to the waiting callers (each gets its own rows)
+- Embeddings are memoized by text hash in an LRU of `cache_size` entries, and
+  identical texts already in flight share one slot of the batch
+- `workers` batches can be in flight at the same time
+- `summary()`: texts, cache hits, batches, mean batch size and request latency
+
+`aembed(texts)` is the awaitable version for async handlers. Batching only
+happens when callers overlap: threads calling `embed()` (e.g. through
+`asyncio.to_thread`) or tasks awaiting `aembed()`. A blocking `embed()` on the
+event loop stalls every other session, so each batch holds one caller's texts;
+the batcher prints a warning the first time that happens.
+
+Usage:
+    embedder = EmbeddingBatcher(AzureOpenAIEmbedder(client, "text-embedding-3-small", dim=1536))
+    vectors = embedder.embed(["tapas in barcelona"])        # batched with other threads' texts
+    index = IncrementalIndex(".retrieval", embedder)
+    print(embedder.summary())
+"""
+import hashlib
+import os
+import sys
+import threading
+import time
+from collections import OrderedDict, deque
+from concurrent.futures import Future
+
+from shared.retrieval import AzureOpenAIEmbedder, HashingEmbedder
+
+DEFAULT_MAX_BATCH = int(os.getenv("EMBEDDING_MAX_BATCH", "64"))
+DEFAULT_MAX_WAIT_MS = float(os.getenv("EMBEDDING_MAX_WAIT_MS", "5"))
+DEFAULT_CACHE_SIZE = int(os.getenv("EMBEDDING_CACHE_SIZE", "10000"))
+
+
+def text_key(text):
+    return hashlib.blake2b(text.encode("utf-8"), digest_size=16).digest()
+
+
+def _on_event_loop():
+    """True when called from a thread that is running an asyncio event loop."""
+    asyncio = sys.modules.get("asyncio")     # never imported: no loop can be running
+    if asyncio is None:
+        return False
+    try:
+        asyncio.get_running_loop()
+    except RuntimeError:
+        return False
+    return True
+
+
+# 1. Batcher
+# ---------------------------------------------------------------------
+
+class BatchStats:
+    """Counters of an EmbeddingBatcher (updated under its condition lock)."""
+
+    def __init__(self):
+        self.texts = 0          # texts requested
+        self.hits = 0           # answered from the LRU
+        self.coalesced = 0      # joined an identical text already queued or in flight
+        self.batches = 0
+        self.batched_texts = 0
+        self.failures = 0
+        self.request_seconds = 0.0
+
+    def summary(self):
+        mean_batch = self.batched_texts / self.batches if self.batches else 0.0
+        mean_ms = self.request_seconds / self.batches * 1000 if self.batches else 0.0
+        hit_rate = self.hits / self.texts if self.texts else 0.0
+        return (
+            f"{self.texts} texts: {self.hits} from cache ({hit_rate:.0%}), {self.coalesced} coalesced, "
+            f"{self.batched_texts} embedded in {self.batches} requests "
+            f"(mean batch {mean_batch:.1f}, {mean_ms:.0f} ms/request), {self.failures} failed batches"
+        )
+
+
+class EmbeddingBatcher:
+    """
+    :param embedder: The embedder doing the requests (anything with embed(texts) and dim).
+    :param max_batch: Most texts per request.
+    :param max_wait_ms: How long the first queued text waits for others before its batch is sent.
+    :param cache_size: Embeddings kept in the LRU (0 disables memoization).
+    :param workers: Batches in flight at the same time.
+    """
+
+    def __init__(self, embedder, max_batch=DEFAULT_MAX_BATCH, max_wait_ms=DEFAULT_MAX_WAIT_MS,
+                 cache_size=DEFAULT_CACHE_SIZE, workers=2):
+        self.embedder = embedder
+        self.max_batch = max(1, max_batch)
+        self.max_wait = max_wait_ms / 1000
+        self.cache_size = cache_size
+        self.cache = OrderedDict()      # {text key: vector}, least recently used first
+        self.pending = {}               # {text key: Future} queued or in flight
+        self.queue = deque()            # [(key, text, enqueued_at)]
+        self.condition = threading.Condition()
+        self.stats = BatchStats()
+        self._stop = False
+        self._warned_loop = False
+        self._workers = [
+            threading.Thread(target=self._worker, name=f"embedding-batcher-{i}", daemon=True)
+            for i in range(max(1, workers))
+        ]
+        for worker in self._workers:
+            worker.start()
+
+    @property
+    def dim(self):
+        return self.embedder.dim
+
+    def submit(self, texts):
+        """[Future] resolving to each text's vector (already resolved for cache hits)."""
+        futures = []
+        with self.condition:
+            self.stats.texts += len(texts)
+            for text in texts:
+                key = text_key(text)
+                vector = self.cache.get(key)
+                if vector is not None:
+                    self.cache.move_to_end(key)
+                    self.stats.hits += 1
+                    future = Future()
+                    future.set_result(vector)
+                elif key in self.pending:
+                    self.stats.coalesced += 1
+                    future = self.pending[key]
+                else:
+                    future = Future()
+                    self.pending[key] = future
+                    self.queue.append((key, text, time.perf_counter()))
+                futures.append(future)
+            self.condition.notify_all()
+        return futures
+
+    def embed(self, texts):
+        """
+        Vectors for texts, in order; raises what the embedder raised for their batch.
+        Blocks until the batch is back, so async code should use aembed() or run
+        embed() in asyncio.to_thread instead of calling it on the event loop.
+        """
+        futures = self.submit(list(texts))
+        if not self._warned_loop and not all(future.done() for future in futures) and _on_event_loop():
+            self._warned_loop = True
+            print("[embeddings] embed() is blocking an event loop: other sessions stall and batches "
+                  "hold one caller's texts; use aembed() or asyncio.to_thread(embed, ...)")
+        # The same vector objects are shared between callers and the cache: do not modify them
+        return [future.result() for future in futures]
+
+    async def aembed(self, texts):
+        import asyncio
+
+        futures = self.submit(list(texts))
+        return list(await asyncio.gather(*(asyncio.wrap_future(f) for f in futures)))
+
+    def _next_batch(self):
+        """Blocks until a batch is due: max_batch texts waiting or the oldest waited max_wait."""
+        with self.condition:
+            while True:
+                if self._stop:
+                    return None
+                if self.queue:
+                    due = self.queue[0][2] + self.max_wait
+                    remaining = due - time.perf_counter()
+                    if len(self.queue) >= self.max_batch or remaining <= 0:
+                        count = min(self.max_batch, len(self.queue))
+                        return [self.queue.popleft() for _ in range(count)]
+                    self.condition.wait(remaining)
+                else:
+                    self.condition.wait()
+
+    def _worker(self):
+        while True:
+            batch = self._next_batch()
+            if batch is None:
+                return
+            started = time.perf_counter()
+            try:
+                vectors = self.embedder.embed([text for _, text, _ in batch])
+                if len(vectors) != len(batch):
+                    raise ValueError(f"embedder returned {len(vectors)} vectors for {len(batch)} texts")
+            except Exception as e:
+                with self.condition:
+                    self.stats.failures += 1
+                    futures = [self.pending.pop(key) for key, _, _ in batch]
+                for future in futures:
+                    future.set_exception(e)
+                continue
+            elapsed = time.perf_counter() - started
+            with self.condition:
+                self.stats.batches += 1
+                self.stats.batched_texts += len(batch)
+                self.stats.request_seconds += elapsed
+                futures = [self.pending.pop(key) for key, _, _ in batch]
+                if self.cache_size:
+                    for (key, _, _), vector in zip(batch, vectors):
+                        self.cache[key] = vector
+                    while len(self.cache) > self.cache_size:
+                        self.cache.popitem(last=False)
+            for future, vector in zip(futures, vectors):
+                future.set_result(vector)
+
+    def summary(self):
+        return self.stats.summary()
+
+    def close(self):
+        with self.condition:
+            self._stop = True
+            self.condition.notify_all()
+
+
+# 2. Embedder from the environment
+# ---------------------------------------------------------------------
+
+def embedder_from_env(**kwargs):
+    """
+    AZURE_OPENAI_EMBEDDING_DEPLOYMENT set: a batcher over that deployment (AZURE_OPENAI_ENDPOINT,
+    AZURE_OPENAI_API_KEY, AZURE_OPENAI_API_VERSION; AZURE_OPENAI_EMBEDDING_DIM, default 1536).
+    Otherwise the offline HashingEmbedder, which needs no batching.
+    """
+    deployment = os.getenv("AZURE_OPENAI_EMBEDDING_DEPLOYMENT")
+    if not deployment:
+        return HashingEmbedder()
+    from openai import AzureOpenAI
+
+    client = AzureOpenAI(
+        azure_endpoint=os.getenv("AZURE_OPENAI_ENDPOINT"),
+        api_key=os.getenv("AZURE_OPENAI_API_KEY"),
+        api_version=os.getenv("AZURE_OPENAI_API_VERSION"),
+    )
+    dim = int(os.getenv("AZURE_OPENAI_EMBEDDING_DIM", "1536"))
+    return EmbeddingBatcher(AzureOpenAIEmbedder(client, deployment, dim=dim), **kwargs)
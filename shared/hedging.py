@@ -0,0 +1,335 @@
+"""
+Hedged chat completions over a pool of deployments
+--------------------------------------------------
+A chat turn normally waits on one deployment, so an occasional slow response
+(a "straggler") sets the p99. `HedgedChat` keeps a pool of equivalent
+deployments/endpoints and:
+
+- picks the primary at random, weighted by observed latency and health
+- when the primary has not produced its first token after a delay equal to the
+  recent p95 time to first token, sends the same request to another deployment
+- keeps whichever answers first and cancels the other (its stream is closed,
+  so the loser stops generating tokens)
+- fails over immediately when an attempt errors, and skips deployments whose
+  circuit breaker (see resilience.py) is open
+
+Hedging costs one extra prompt for about 5% of requests (those slower than the
+p95), and in exchange cuts the tail.
+
+Usage (async OpenAI clients):
+    chat = pool_from_env()                      # AZURE_OPENAI_DEPLOYMENTS="dep-a,dep-b@https://other.openai.azure.com/"
+    stream = await chat.create(messages=messages, max_completion_tokens=1000, stream=True)
+    async for chunk in stream:
+        ...
+    print(chat.summary())
+
+Compare single vs hedged against the mock backend with stragglers:
+    python -m shared.hedging --requests 200 --straggler-rate 0.05
+"""
+import asyncio
+import os
+import random
+import sys
+import time
+from collections import deque
+
+from shared.resilience import CircuitBreaker, CircuitOpen, is_caller_error
+from shared.stats import percentile, summarize
+
+
+# 1. Per-deployment statistics
+# ---------------------------------------------------------------------
+
+class Endpoint:
+    """One deployment on one endpoint, with its latency window and health score."""
+
+    def __init__(self, name, client, deployment, window=200, breaker=None):
+        self.name = name
+        self.client = client
+        self.deployment = deployment
+        self.breaker = breaker or CircuitBreaker(name)
+        self.latencies = deque(maxlen=window)  # seconds to first token (or to the response)
+        self.ewma = None
+        self.health = 1.0                      # EWMA of success (1) / failure (0)
+        self.requests = 0
+        self.wins = 0
+        self.failures = 0
+
+    def observe(self, seconds):
+        self.latencies.append(seconds)
+        self.ewma = seconds if self.ewma is None else 0.8 * self.ewma + 0.2 * seconds
+        self.health = 0.9 * self.health + 0.1
+
+    def fail(self):
+        self.failures += 1
+        self.health = 0.9 * self.health
+
+    def p95(self):
+        return percentile(list(self.latencies), 95)
+
+    def weight(self):
+        # Faster and healthier deployments get more traffic; a floor keeps probing the others
+        latency = self.ewma if self.ewma is not None else 0.5
+        return max(self.health, 0.05) / max(latency, 0.01)
+
+
+# 2. Hedged requests
+# ---------------------------------------------------------------------
+
+class _Attempt:
+    def __init__(self, endpoint, response, first, iterator):
+        self.endpoint = endpoint
+        self.response = response
+        self.first = first
+        self.iterator = iterator
+
+    async def close(self):
+        close = getattr(self.response, "close", None)
+        if close is not None:
+            result = close()
+            if asyncio.iscoroutine(result):
+                await result
+
+
+class HedgedChat:
+    """
+    :param endpoints: Endpoint objects wrapping async OpenAI/AzureOpenAI clients.
+    :param hedge_quantile: Percentile of recent latency used as the hedge delay.
+    :param default_delay: Hedge delay until min_samples latencies were observed.
+    :param max_attempts: Upper bound on requests sent for one call (primary included).
+    """
+
+    def __init__(self, endpoints, hedge_quantile=95, default_delay=1.0, min_delay=0.05,
+                 max_delay=10.0, min_samples=20, max_attempts=2, seed=None):
+        if not endpoints:
+            raise ValueError("HedgedChat needs at least one endpoint")
+        self.endpoints = list(endpoints)
+        self.hedge_quantile = hedge_quantile
+        self.default_delay = default_delay
+        self.min_delay = min_delay
+        self.max_delay = max_delay
+        self.min_samples = min_samples
+        self.max_attempts = max_attempts
+        self.random = random.Random(seed)
+        self.calls = 0
+        self.hedges = 0
+        self.hedge_wins = 0
+
+    def pick(self, exclude=()):
+        candidates = [e for e in self.endpoints if e not in exclude and e.breaker.available()]
+        if not candidates:
+            return None
+        return self.random.choices(candidates, weights=[e.weight() for e in candidates])[0]
+
+    def hedge_delay(self, endpoint):
+        samples = list(endpoint.latencies)
+        if len(samples) < self.min_samples:
+            # Fall back to the pool-wide latency while this deployment is new
+            samples = [s for e in self.endpoints for s in e.latencies]
+        if len(samples) < self.min_samples:
+            return self.default_delay
+        return min(self.max_delay, max(self.min_delay, percentile(samples, self.hedge_quantile)))
+
+    async def _attempt(self, endpoint, kwargs):
+        endpoint.breaker.before_call()
+        endpoint.requests += 1
+        started = time.perf_counter()
+        response = None
+        try:
+            response = await endpoint.client.chat.completions.create(model=endpoint.deployment, **kwargs)
+            first, iterator = None, None
+            if kwargs.get("stream"):
+                iterator = response.__aiter__()
+                try:
+                    first = await iterator.__anext__()
+                except StopAsyncIteration:
+                    pass
+            elapsed = time.perf_counter() - started
+            endpoint.observe(elapsed)
+            endpoint.breaker.on_success(elapsed)
+            return _Attempt(endpoint, response, first, iterator)
+        except asyncio.CancelledError:
+            endpoint.breaker.on_cancel()
+            # Lost the race: the elapsed time is a lower bound of this deployment's latency,
+            # only worth recording when it already exceeds the usual latency
+            elapsed = time.perf_counter() - started
+            if endpoint.ewma is not None and elapsed > endpoint.ewma:
+                endpoint.observe(elapsed)
+            if response is not None:
+                await _Attempt(endpoint, response, None, None).close()
+            raise
+        except Exception as e:
+            if is_caller_error(e):
+                endpoint.breaker.on_success()
+            else:
+                endpoint.fail()
+                endpoint.breaker.on_failure()
+            raise
+
+    async def create(self, **kwargs):
+        """Same arguments as chat.completions.create (without model); returns the winning response."""
+        self.calls += 1
+        loop = asyncio.get_running_loop()
+        launched = []
+        hedged = []   # endpoints started while an earlier attempt was still running
+        tasks = {}
+        errors = []
+
+        def launch():
+            endpoint = self.pick(exclude=launched)
+            if endpoint is None:
+                raise CircuitOpen("no deployment available: every circuit breaker is open")
+            launched.append(endpoint)
+            tasks[asyncio.create_task(self._attempt(endpoint, kwargs))] = endpoint
+            return endpoint
+
+        hedge_at = loop.time() + self.hedge_delay(launch())
+        pending = set(tasks)
+        try:
+            while True:
+                can_hedge = (len(launched) < min(self.max_attempts, len(self.endpoints))
+                             and any(e.breaker.available() for e in self.endpoints if e not in launched))
+                if pending:
+                    timeout = max(0.0, hedge_at - loop.time()) if can_hedge else None
+                    done, pending = await asyncio.wait(pending, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+                    succeeded = [task for task in done if task.exception() is None]
+                    errors.extend(task.exception() for task in done if task.exception() is not None)
+                    if errors and is_caller_error(errors[-1]):
+                        raise errors[-1]
+                    if succeeded:
+                        winner = succeeded[0].result()
+                        for task in succeeded[1:]:
+                            await task.result().close()
+                        winner.endpoint.wins += 1
+                        if winner.endpoint in hedged:
+                            self.hedge_wins += 1
+                        return self._result(winner, kwargs)
+                if can_hedge and (not pending or loop.time() >= hedge_at):
+                    endpoint = launch()
+                    if pending:
+                        self.hedges += 1
+                        hedged.append(endpoint)
+                    pending.add(next(t for t, e in tasks.items() if e is endpoint))
+                    hedge_at = loop.time() + self.hedge_delay(endpoint)
+                elif not pending:
+                    raise errors[-1]
+        finally:
+            for task in pending:
+                task.cancel()
+            if pending:
+                await asyncio.gather(*pending, return_exceptions=True)
+
+    def _result(self, attempt, kwargs):
+        if not kwargs.get("stream"):
+            return attempt.response
+
+        async def stream():
+            try:
+                if attempt.first is not None:
+                    yield attempt.first
+                async for chunk in attempt.iterator:
+                    yield chunk
+            finally:
+                await attempt.close()
+
+        return stream()
+
+    def summary(self):
+        parts = [f"{self.calls} calls, {self.hedges} hedged ({self.hedge_wins} won by the hedge)"]
+        for e in self.endpoints:
+            parts.append(
+                f"{e.name}: p95 {e.p95():.2f}s, health {e.health:.2f}, {e.wins}/{e.requests} won, "
+                f"{e.failures} failed, breaker {e.breaker.state}"
+            )
+        return " | ".join(parts)
+
+
+def pool_from_env(**kwargs):
+    """
+    Builds a HedgedChat from AZURE_OPENAI_DEPLOYMENTS (comma separated "deployment" or
+    "deployment@endpoint"; default AZURE_OPENAI_DEPLOYMENT_NAME on AZURE_OPENAI_ENDPOINT).
+    All endpoints use AZURE_OPENAI_API_KEY and AZURE_OPENAI_API_VERSION.
+    """
+    from openai import AsyncAzureOpenAI
+
+    default_endpoint = os.getenv("AZURE_OPENAI_ENDPOINT")
+    entries = os.getenv("AZURE_OPENAI_DEPLOYMENTS") or os.getenv("AZURE_OPENAI_DEPLOYMENT_NAME", "")
+    clients = {}
+    endpoints = []
+    for entry in [e.strip() for e in entries.split(",") if e.strip()]:
+        deployment, _, endpoint = entry.partition("@")
+        endpoint = endpoint or default_endpoint
+        if endpoint not in clients:
+            clients[endpoint] = AsyncAzureOpenAI(
+                azure_endpoint=endpoint,
+                api_key=os.getenv("AZURE_OPENAI_API_KEY"),
+                api_version=os.getenv("AZURE_OPENAI_API_VERSION"),
+            )
+        endpoints.append(Endpoint(entry, clients[endpoint], deployment))
+    return HedgedChat(endpoints, **kwargs)
+
+
+# 3. Evaluation against the mock backend
+# ---------------------------------------------------------------------
+
+async def _measure(chat, requests, concurrency):
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies = []
+
+    async def one(i):
+        async with semaphore:
+            started = time.perf_counter()
+            stream = await chat.create(
+                messages=[{"role": "user", "content": f"Question {i}: what should I see in Barcelona?"}],
+                max_completion_tokens=30,
+                stream=True,
+            )
+            async for _ in stream:
+                pass
+            latencies.append(time.perf_counter() - started)
+
+    await asyncio.gather(*(one(i) for i in range(requests)))
+    return summarize(latencies)
+
+
+def main():
+    import argparse
+
+    from openai import AsyncAzureOpenAI
+
+    from shared.mock_backend import MockBackend
+
+    parser = argparse.ArgumentParser(description="Compare single-deployment and hedged latency on the mock backend")
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=10)
+    parser.add_argument("--deployments", type=int, default=2)
+    parser.add_argument("--straggler-rate", type=float, default=0.05)
+    parser.add_argument("--straggler-factor", type=float, default=8.0)
+    args = parser.parse_args()
+
+    config = {
+        "ttft": {"dist": "lognormal", "median": 0.2, "sigma": 0.2},
+        "tokens_per_sec": 400,
+        "straggler_rate": args.straggler_rate,
+        "straggler_factor": args.straggler_factor,
+    }
+    with MockBackend(config) as backend:
+        def pool(count):
+            client = AsyncAzureOpenAI(azure_endpoint=backend.url, api_key="mock", api_version="2024-10-21")
+            return HedgedChat([Endpoint(f"mock-{i}", client, f"mock-{i}") for i in range(count)], min_samples=10, seed=1)
+
+        results = {
+            "single": asyncio.run(_measure(pool(1), args.requests, args.concurrency)),
+        }
+        hedged = pool(args.deployments)
+        results["hedged"] = asyncio.run(_measure(hedged, args.requests, args.concurrency))
+
+    print(f"\n{'mode':<8} {'p50':>8} {'p95':>8} {'p99':>8} {'max':>8}")
+    for mode, s in results.items():
+        print(f"{mode:<8} {s['p50']:>7.3f}s {s['p95']:>7.3f}s {s['p99']:>7.3f}s {s['max']:>7.3f}s")
+    print(f"\n🔀 {hedged.summary()}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,413 @@
+"""
+Incremental, segment-based retrieval index
+------------------------------------------
+Rebuilding the whole retrieval index when one markdown file changes does not
+scale. This indexer keeps the index on disk as immutable segments and tracks
+content hashes so that a sync only does the work that changed:
+
+- Per file: size + mtime, then a SHA-1 of the bytes only when those changed;
+  unchanged files are skipped without being read, so a warm start does not
+  grow with the corpus size
+- Per chunk: a SHA-1 of source + text; only new chunks are embedded and indexed
+- Chunks that disappear are tombstoned (hidden from search) instead of rewritten
+- A background thread compacts segments once tombstones or small segments pile up;
+  the files of a replaced segment are deleted once no search still reads it
+- Vector files are memory-mapped, and passages/postings are read lazily per
+  segment, so warm start only reads the manifest
+
+Layout of the index folder:
+    manifest.json           files, segments and tombstones
+    seg-000001.vec          float32 vectors (memory-mapped)
+    seg-000001.meta.jsonl   one passage per line
+    seg-000001.post.json    {term: {local_id: term_frequency}}
+
+Usage:
+    index = IncrementalIndex(".retrieval")
+    index.sync(paths, repo_root)
+    index.start_background_compaction()
+    index.search("how do I create a thread?")
+"""
+import hashlib
+import json
+import math
+import mmap
+import os
+import threading
+from array import array
+
+from shared.retrieval import (
+    BM25_B,
+    BM25_K1,
+    DEFAULT_KEYWORD_WEIGHT,
+    DEFAULT_TOP_K,
+    HashingEmbedder,
+    Passage,
+    chunk_text,
+    tokenize,
+)
+
+MANIFEST_FILE = "manifest.json"
+# Compact when this share of indexed chunks is tombstoned...
+COMPACT_TOMBSTONE_RATIO = 0.2
+# ...or when there are more segments than this
+COMPACT_MAX_SEGMENTS = 8
+
+
+def chunk_hash(source, text):
+    return hashlib.sha1(f"{source}\0{text}".encode("utf-8")).hexdigest()
+
+
+def file_hash(path):
+    digest = hashlib.sha1()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 16), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+# 1. Segments
+# ---------------------------------------------------------------------
+
+class Segment:
+    """
+    One immutable segment. Vectors are memory-mapped; the rest loads on first use.
+    `readers` counts searches (and compactions) using it, under the index lock; a
+    retired segment's files are removed when the last one is done.
+    """
+
+    def __init__(self, directory, name, dim):
+        self.directory = directory
+        self.name = name
+        self.dim = dim
+        self.readers = 0
+        self.retired = False
+        self._meta = None
+        self._postings = None
+        self._file = None
+        self._mmap = None
+        self._vectors = None
+
+    def _path(self, suffix):
+        return os.path.join(self.directory, f"{self.name}{suffix}")
+
+    @classmethod
+    def write(cls, directory, name, dim, passages, vectors):
+        """Writes passages [(hash, source, text)] and their vectors as a new segment."""
+        postings = {}
+        with open(os.path.join(directory, f"{name}.meta.jsonl"), "w", encoding="utf-8") as f:
+            for local_id, (hash_, source, text) in enumerate(passages):
+                tokens = tokenize(text)
+                f.write(json.dumps({"hash": hash_, "source": source, "text": text, "length": len(tokens)}) + "\n")
+                for token in tokens:
+                    entry = postings.setdefault(token, {})
+                    entry[local_id] = entry.get(local_id, 0) + 1
+        with open(os.path.join(directory, f"{name}.post.json"), "w", encoding="utf-8") as f:
+            json.dump(postings, f, separators=(",", ":"))
+        flat = array("f")
+        for vector in vectors:
+            flat.extend(vector)
+        with open(os.path.join(directory, f"{name}.vec"), "wb") as f:
+            flat.tofile(f)
+        return cls(directory, name, dim)
+
+    @property
+    def meta(self):
+        if self._meta is None:
+            with open(self._path(".meta.jsonl"), "r", encoding="utf-8") as f:
+                self._meta = [json.loads(line) for line in f]
+        return self._meta
+
+    @property
+    def postings(self):
+        if self._postings is None:
+            with open(self._path(".post.json"), "r", encoding="utf-8") as f:
+                raw = json.load(f)
+            self._postings = {t: {int(k): v for k, v in p.items()} for t, p in raw.items()}
+        return self._postings
+
+    @property
+    def vectors(self):
+        if self._vectors is None:
+            self._file = open(self._path(".vec"), "rb")
+            self._mmap = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+            self._vectors = memoryview(self._mmap).cast("f")
+        return self._vectors
+
+    def vector(self, local_id):
+        offset = local_id * self.dim
+        return self.vectors[offset:offset + self.dim]
+
+    def close(self):
+        if self._vectors is not None:
+            self._vectors.release()
+            self._mmap.close()
+            self._file.close()
+            self._vectors = self._mmap = self._file = None
+
+    def remove_files(self):
+        self.close()
+        for suffix in (".vec", ".meta.jsonl", ".post.json"):
+            try:
+                os.remove(self._path(suffix))
+            except OSError:
+                # Still open elsewhere (e.g. on Windows); the next compaction retries
+                pass
+
+
+# 2. Incremental index
+# ---------------------------------------------------------------------
+
+class IncrementalIndex:
+    """
+    Hybrid BM25 + vector index with content-hash based incremental updates.
+
+    :param directory: Folder holding the manifest and segment files.
+    :param embedder: Object with embed(texts) and dim; defaults to HashingEmbedder.
+    """
+
+    def __init__(self, directory, embedder=None):
+        self.directory = directory
+        self.embedder = embedder or HashingEmbedder()
+        self.lock = threading.Lock()
+        self.files = {}        # {source: {"hash": str, "chunks": [chunk_hash]}}
+        self.segments = []     # [Segment]
+        self.tombstones = set()
+        self.next_segment = 1
+        self._compactor = None
+        self._stop = threading.Event()
+        os.makedirs(directory, exist_ok=True)
+        self._load_manifest()
+
+    def _load_manifest(self):
+        try:
+            with open(os.path.join(self.directory, MANIFEST_FILE), "r", encoding="utf-8") as f:
+                manifest = json.load(f)
+        except (OSError, ValueError):
+            return
+        if manifest.get("dim") != self.embedder.dim:
+            # Embedder changed: every vector is stale, start from scratch
+            return
+        self.files = manifest["files"]
+        self.tombstones = set(manifest["tombstones"])
+        self.next_segment = manifest["next_segment"]
+        self.segments = [Segment(self.directory, name, self.embedder.dim) for name in manifest["segments"]]
+
+    def _save_manifest(self):
+        manifest = {
+            "dim": self.embedder.dim,
+            "files": self.files,
+            "segments": [segment.name for segment in self.segments],
+            "tombstones": sorted(self.tombstones),
+            "next_segment": self.next_segment,
+        }
+        path = os.path.join(self.directory, MANIFEST_FILE)
+        with open(path + ".tmp", "w", encoding="utf-8") as f:
+            json.dump(manifest, f, separators=(",", ":"))
+        os.replace(path + ".tmp", path)
+
+    def _new_segment_name(self):
+        name = f"seg-{self.next_segment:06d}"
+        self.next_segment += 1
+        return name
+
+    def _snapshot(self):
+        """Segments and tombstones to read outside the lock; release them with _release()."""
+        with self.lock:
+            segments = list(self.segments)
+            for segment in segments:
+                segment.readers += 1
+            return segments, set(self.tombstones)
+
+    def _release(self, segments):
+        with self.lock:
+            unused = []
+            for segment in segments:
+                segment.readers -= 1
+                if segment.retired and segment.readers == 0:
+                    unused.append(segment)
+        for segment in unused:
+            segment.remove_files()
+
+    def _retire(self, segments):
+        """Called under the lock once segments left self.segments; _release() removes their files."""
+        for segment in segments:
+            segment.retired = True
+
+    def sync(self, paths, repo_root=None):
+        """
+        Brings the index in line with paths. Returns counts of
+        {"files_changed", "chunks_added", "chunks_removed"}.
+        """
+        stats = {"files_changed": 0, "chunks_added": 0, "chunks_removed": 0}
+        wanted = {}
+        for path in paths:
+            wanted[os.path.relpath(path, repo_root) if repo_root else path] = path
+
+        new_passages = []
+        changed = False
+        with self.lock:
+            tombstoned_before = len(self.tombstones)
+            # Tombstoned chunks are still stored until compaction, so a chunk that
+            # comes back is revived instead of being embedded again
+            stored = {h for entry in self.files.values() for h in entry["chunks"]} | self.tombstones
+            files = dict(self.files)
+            for source in list(files):
+                if source not in wanted:
+                    self.tombstones.update(files.pop(source)["chunks"])
+                    stats["files_changed"] += 1
+                    changed = True
+            for source, path in wanted.items():
+                stat = os.stat(path)
+                previous = files.get(source)
+                if previous and previous.get("size") == stat.st_size and previous.get("mtime_ns") == stat.st_mtime_ns:
+                    continue
+                digest = file_hash(path)
+                changed = True
+                if previous and previous["hash"] == digest:
+                    # Touched but not modified: remember the new stat data, nothing to re-index
+                    files[source] = dict(previous, size=stat.st_size, mtime_ns=stat.st_mtime_ns)
+                    continue
+                with open(path, "r", encoding="utf-8", errors="ignore") as f:
+                    chunks = chunk_text(f.read())
+                hashes = [chunk_hash(source, text) for text in chunks]
+                for hash_, text in zip(hashes, chunks):
+                    if hash_ not in stored:
+                        new_passages.append((hash_, source, text))
+                        stored.add(hash_)
+                if previous:
+                    self.tombstones.update(set(previous["chunks"]) - set(hashes))
+                self.tombstones.difference_update(hashes)
+                files[source] = {"hash": digest, "size": stat.st_size, "mtime_ns": stat.st_mtime_ns, "chunks": hashes}
+                stats["files_changed"] += 1
+
+            if new_passages:
+                vectors = self.embedder.embed([text for _, _, text in new_passages])
+                segment = Segment.write(self.directory, self._new_segment_name(), self.embedder.dim, new_passages, vectors)
+                self.segments = self.segments + [segment]
+            stats["chunks_added"] = len(new_passages)
+            stats["chunks_removed"] = max(0, len(self.tombstones) - tombstoned_before)
+            self.files = files
+            if changed:
+                self._save_manifest()
+        return stats
+
+    def search(self, query, top_k=DEFAULT_TOP_K, keyword_weight=DEFAULT_KEYWORD_WEIGHT):
+        """Hybrid search across all segments, skipping tombstoned chunks."""
+        segments, tombstones = self._snapshot()
+        try:
+            return self._search(segments, tombstones, query, top_k, keyword_weight)
+        finally:
+            self._release(segments)
+
+    def _search(self, segments, tombstones, query, top_k, keyword_weight):
+        terms = set(tokenize(query))
+        query_vector = self.embedder.embed([query])[0]
+
+        live = []  # (segment, local_id, meta)
+        for segment in segments:
+            for local_id, meta in enumerate(segment.meta):
+                if meta["hash"] not in tombstones:
+                    live.append((segment, local_id, meta))
+        if not live:
+            return []
+        average = sum(meta["length"] for _, _, meta in live) / len(live)
+
+        # Document frequencies over live chunks only
+        df = {}
+        for term in terms:
+            for segment in segments:
+                for local_id in segment.postings.get(term, ()):
+                    if segment.meta[local_id]["hash"] not in tombstones:
+                        df[term] = df.get(term, 0) + 1
+
+        keyword, semantic = {}, {}
+        for segment, local_id, meta in live:
+            key = (segment.name, local_id)
+            score = 0.0
+            for term in terms:
+                tf = segment.postings.get(term, {}).get(local_id)
+                if tf:
+                    idf = math.log(1 + (len(live) - df[term] + 0.5) / (df[term] + 0.5))
+                    norm = 1 - BM25_B + BM25_B * meta["length"] / (average or 1.0)
+                    score += idf * tf * (BM25_K1 + 1) / (tf + BM25_K1 * norm)
+            if score:
+                keyword[key] = score
+            cosine = sum(q * v for q, v in zip(query_vector, segment.vector(local_id)))
+            if cosine > 0:
+                semantic[key] = cosine
+
+        best_keyword = max(keyword.values(), default=0.0) or 1.0
+        combined = {key: keyword_weight * score / best_keyword for key, score in keyword.items()}
+        for key, score in semantic.items():
+            combined[key] = combined.get(key, 0.0) + (1 - keyword_weight) * score
+        by_key = {(segment.name, local_id): meta for segment, local_id, meta in live}
+        ranked = sorted(combined.items(), key=lambda item: item[1], reverse=True)[:top_k]
+        return [
+            Passage(by_key[key]["hash"], by_key[key]["source"], by_key[key]["text"], score)
+            for key, score in ranked
+        ]
+
+    # 3. Compaction
+    # -----------------------------------------------------------------
+
+    def needs_compaction(self):
+        with self.lock:
+            total = sum(len(segment.meta) for segment in self.segments)
+            return len(self.segments) > COMPACT_MAX_SEGMENTS or (
+                total and len(self.tombstones) / total > COMPACT_TOMBSTONE_RATIO
+            )
+
+    def compact(self):
+        """Merges all segments into one, dropping tombstoned chunks. Vectors are copied, not re-embedded."""
+        old_segments, tombstones = self._snapshot()
+        try:
+            passages, vectors = self._live_passages(old_segments, lambda hash_: hash_ not in tombstones)
+            with self.lock:
+                # A sync during the merge may have revived tombstoned chunks: they are
+                # only stored in the old segments, so carry them over as well
+                revived = tombstones - self.tombstones
+                if revived:
+                    more_passages, more_vectors = self._live_passages(old_segments, lambda hash_: hash_ in revived)
+                    passages, vectors = passages + more_passages, vectors + more_vectors
+                merged = []
+                if passages:
+                    merged = [Segment.write(self.directory, self._new_segment_name(), self.embedder.dim, passages, vectors)]
+                # Keep segments written by a sync that ran while we were merging
+                self.segments = merged + [s for s in self.segments if s not in old_segments]
+                self.tombstones -= tombstones - revived
+                self._save_manifest()
+                self._retire(old_segments)
+        finally:
+            # Files of the old segments go once the last search still reading them is done
+            self._release(old_segments)
+
+    @staticmethod
+    def _live_passages(segments, keep):
+        passages, vectors = [], []
+        for segment in segments:
+            for local_id, meta in enumerate(segment.meta):
+                if keep(meta["hash"]):
+                    passages.append((meta["hash"], meta["source"], meta["text"]))
+                    vectors.append(segment.vector(local_id).tolist())
+        return passages, vectors
+
+    def start_background_compaction(self, interval=30.0):
+        """Starts a daemon thread that compacts whenever needs_compaction() says so."""
+        if self._compactor is not None:
+            return
+
+        def loop():
+            while not self._stop.wait(interval):
+                try:
+                    if self.needs_compaction():
+                        self.compact()
+                except Exception as e:
+                    print(f"[indexer] compaction failed: {e}")
+
+        self._compactor = threading.Thread(target=loop, name="index-compactor", daemon=True)
+        self._compactor.start()
+
+    def close(self):
+        self._stop.set()
+        for segment in self.segments:
+            segment.close()
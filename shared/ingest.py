@@ -0,0 +1,501 @@
+"""
+Streaming CSV ingestion for uploaded files
+------------------------------------------
+The Chainlit apps accept uploads of up to 500 MB, so an uploaded CSV must never
+be read into memory in one go. This module:
+
+- Parses the file in fixed-size row chunks (generator based)
+- Infers the column schema from the first chunk and caches it next to the store
+- Appends every chunk to an on-disk columnar store (one segment per chunk)
+- Maintains hash indexes (per-segment postings, on disk) and per-segment
+  min/max stats incrementally
+- Yields progress after each chunk so a UI can report it
+
+Peak memory is bounded by the chunk size: nothing grows with the file.
+Files that are not UTF-8 are read as cp1252 (or latin-1), and repeated or
+empty header names are made unique ("price", "price_2", "column_3").
+
+Usage:
+    job = CsvIngestJob(path, store_dir_for(path, root), chunk_rows=5000)
+    for progress in job.run():
+        print(progress.percent)
+    store = job.store
+    remove_store(store.directory)       # when the upload is no longer needed
+    expire_stores(root)                 # stores left behind by crashed sessions
+"""
+import csv
+import hashlib
+import json
+import os
+import shutil
+import time
+
+DEFAULT_CHUNK_ROWS = int(os.getenv("INGEST_CHUNK_ROWS", "5000"))
+# Stores untouched for this long are deleted by expire_stores()
+STORE_TTL_SECONDS = int(os.getenv("INGEST_STORE_TTL_SECONDS", "86400"))
+# Columns with more distinct values than this in one segment are not hash-indexed
+MAX_INDEX_CARDINALITY = 10000
+# Tried in order; latin-1 decodes any byte sequence
+FALLBACK_ENCODINGS = ("utf-8-sig", "cp1252", "latin-1")
+
+SCHEMA_FILE = "schema.json"
+MANIFEST_FILE = "manifest.json"
+
+
+# 1. Chunked reading
+# ---------------------------------------------------------------------
+
+def detect_encoding(path, block_size=1 << 20):
+    """First of FALLBACK_ENCODINGS that decodes the whole file (read in blocks, not in one go)."""
+    import codecs
+
+    for encoding in FALLBACK_ENCODINGS[:-1]:
+        decoder = codecs.getincrementaldecoder(encoding)()
+        try:
+            with open(path, "rb") as f:
+                for block in iter(lambda: f.read(block_size), b""):
+                    decoder.decode(block)
+            decoder.decode(b"", final=True)
+            return encoding
+        except UnicodeDecodeError:
+            continue
+    return FALLBACK_ENCODINGS[-1]
+
+
+def unique_header(header):
+    """Stripped column names, with empty names filled in and repeated names numbered."""
+    names = []
+    seen = set()
+    for position, name in enumerate(header, start=1):
+        base = name.strip() or f"column_{position}"
+        candidate, suffix = base, 2
+        while candidate in seen:
+            candidate, suffix = f"{base}_{suffix}", suffix + 1
+        seen.add(candidate)
+        names.append(candidate)
+    return names
+
+
+def iter_csv_chunks(path, chunk_rows=DEFAULT_CHUNK_ROWS, encoding=None):
+    """
+    Yields (header, rows, bytes_read) tuples with at most chunk_rows rows each.
+    Only one chunk is held in memory at a time.
+    """
+    with open(path, "r", newline="", encoding=encoding or detect_encoding(path)) as f:
+        reader = csv.reader(f)
+        header = next(reader, None)
+        if header is None:
+            return
+        header = unique_header(header)
+        rows = []
+        for row in reader:
+            if not row:
+                continue
+            rows.append(row)
+            if len(rows) >= chunk_rows:
+                yield header, rows, f.buffer.tell()
+                rows = []
+        if rows:
+            yield header, rows, os.path.getsize(path)
+
+
+# 2. Schema inference
+# ---------------------------------------------------------------------
+# Types go from narrowest to widest (empty < int < float < percent < str);
+# a column is widened whenever a value does not fit its current type.
+
+
+def infer_type(value):
+    """Returns the narrowest type name that can represent a raw CSV value."""
+    text = value.strip()
+    if not text:
+        return "empty"
+    if text.endswith("%"):
+        try:
+            float(text[:-1].replace(",", ""))
+            return "percent"
+        except ValueError:
+            return "str"
+    plain = text.replace(",", "")
+    try:
+        int(plain)
+        return "int"
+    except ValueError:
+        pass
+    try:
+        float(plain)
+        return "float"
+    except ValueError:
+        return "str"
+
+
+def widen(current, observed):
+    """Combines two type names into the narrowest type that holds both."""
+    if current == observed or observed == "empty":
+        return current
+    if current == "empty":
+        return observed
+    if {current, observed} == {"int", "float"}:
+        return "float"
+    return "str"
+
+
+def infer_schema(header, rows):
+    """Infers {column: type} from a sample of rows."""
+    schema = {name: "empty" for name in header}
+    for row in rows:
+        for name, value in zip(header, row):
+            if schema[name] != "str":
+                schema[name] = widen(schema[name], infer_type(value))
+    return schema
+
+
+def convert(value, type_name):
+    """Converts a raw CSV value to its schema type; raises ValueError if it does not fit."""
+    text = value.strip()
+    if not text:
+        return None
+    if type_name == "int":
+        return int(text.replace(",", ""))
+    if type_name == "float":
+        return float(text.replace(",", ""))
+    if type_name == "percent":
+        if not text.endswith("%"):
+            raise ValueError(f"not a percentage: {text!r}")
+        return float(text[:-1].replace(",", ""))
+    return text
+
+
+def to_text(value, type_name):
+    """Inverse of convert() for a column widened to str after some segments were written."""
+    if value is None or isinstance(value, str):
+        return value
+    if type_name == "percent":
+        return f"{value:g}%"
+    return str(value)
+
+
+def file_fingerprint(path):
+    """Cheap identity of a file (size + mtime + first 64 KB) used to key the schema cache."""
+    stat = os.stat(path)
+    digest = hashlib.sha1(f"{stat.st_size}:{stat.st_mtime_ns}".encode())
+    with open(path, "rb") as f:
+        digest.update(f.read(65536))
+    return digest.hexdigest()
+
+
+def load_cached_schema(store_dir, fingerprint):
+    """Returns (schema, encoding) cached for a fingerprint, or (None, None)."""
+    try:
+        with open(os.path.join(store_dir, SCHEMA_FILE), "r", encoding="utf-8") as f:
+            cached = json.load(f)
+    except (OSError, ValueError):
+        return None, None
+    if cached.get("fingerprint") != fingerprint:
+        return None, None
+    return cached["schema"], cached.get("encoding")
+
+
+def save_schema(store_dir, fingerprint, schema, encoding=None):
+    with open(os.path.join(store_dir, SCHEMA_FILE), "w", encoding="utf-8") as f:
+        json.dump({"fingerprint": fingerprint, "schema": schema, "encoding": encoding}, f)
+
+
+# 3. Columnar store
+# ---------------------------------------------------------------------
+# Each column is a JSON-lines file; line N holds the values of segment N.
+# The manifest records rows per segment and min/max per numeric column so
+# range queries can skip segments without reading them. A hash index is a
+# JSON-lines file too: line N maps each value of segment N to its row offsets,
+# so lookups stream the postings instead of keeping them in memory.
+
+class ColumnStore:
+    def __init__(self, directory):
+        self.directory = directory
+        self.columns = []
+        self.segments = []  # [{"rows": int, "stats": {column: [min, max]}}]
+        self.indexes = []   # hash-indexed columns (postings in idx_<column>.jsonl)
+        os.makedirs(directory, exist_ok=True)
+
+    @classmethod
+    def open(cls, directory):
+        """Opens an existing store (manifest only) without reading column data or postings."""
+        store = cls(directory)
+        with open(os.path.join(directory, MANIFEST_FILE), "r", encoding="utf-8") as f:
+            manifest = json.load(f)
+        store.columns = manifest["columns"]
+        store.segments = manifest["segments"]
+        store.indexes = manifest.get("indexes", [])
+        return store
+
+    @property
+    def row_count(self):
+        return sum(segment["rows"] for segment in self.segments)
+
+    def _safe(self, name):
+        return "".join(c if c.isalnum() or c in "-_" else "_" for c in name)
+
+    def _column_path(self, name):
+        return os.path.join(self.directory, f"col_{self._safe(name)}.jsonl")
+
+    def _index_path(self, name):
+        return os.path.join(self.directory, f"idx_{self._safe(name)}.jsonl")
+
+    def reset(self, columns, index_columns=()):
+        self.columns = list(columns)
+        self.segments = []
+        self.indexes = [name for name in index_columns if name in self.columns]
+        for name in self.columns:
+            open(self._column_path(name), "w", encoding="utf-8").close()
+            if os.path.exists(self._index_path(name)):
+                os.remove(self._index_path(name))
+        for name in self.indexes:
+            open(self._index_path(name), "w", encoding="utf-8").close()
+
+    def add_index(self, name):
+        """Starts an (empty) hash index for a column; postings are appended per segment from now on."""
+        if name not in self.indexes:
+            self.indexes.append(name)
+            open(self._index_path(name), "w", encoding="utf-8").close()
+
+    @staticmethod
+    def _postings(values):
+        postings = {}
+        for offset, value in enumerate(values):
+            if value is not None:
+                postings.setdefault(str(value), []).append(offset)
+        return postings
+
+    def _append_postings(self, name, values):
+        """Writes one segment's postings; drops the index when the segment has too many distinct values."""
+        postings = self._postings(values)
+        if len(postings) > MAX_INDEX_CARDINALITY:
+            # Too selective to be worth a hash index
+            self.indexes.remove(name)
+            os.remove(self._index_path(name))
+            return
+        with open(self._index_path(name), "a", encoding="utf-8") as f:
+            f.write(json.dumps(postings, separators=(",", ":")) + "\n")
+
+    def append_segment(self, values_by_column):
+        """Appends one chunk (already column-oriented) and updates stats and indexes."""
+        rows = len(next(iter(values_by_column.values()), []))
+        stats = {}
+        for name in self.columns:
+            values = values_by_column[name]
+            with open(self._column_path(name), "a", encoding="utf-8") as f:
+                f.write(json.dumps(values, separators=(",", ":")) + "\n")
+            numbers = [v for v in values if isinstance(v, (int, float))]
+            if numbers:
+                stats[name] = [min(numbers), max(numbers)]
+        for name in list(self.indexes):
+            self._append_postings(name, values_by_column[name])
+        self.segments.append({"rows": rows, "stats": stats})
+
+    def retype_as_text(self, name, type_name, index=False):
+        """
+        Rewrites the segments already written for a column widened to str mid-file, one
+        segment at a time, so every segment holds text; optionally starts indexing it.
+        """
+        path = self._column_path(name)
+        tmp = path + ".tmp"
+        if index:
+            self.add_index(name)
+        with open(path, "r", encoding="utf-8") as src, open(tmp, "w", encoding="utf-8") as dst:
+            for line in src:
+                values = [to_text(v, type_name) for v in json.loads(line)]
+                dst.write(json.dumps(values, separators=(",", ":")) + "\n")
+                if index and name in self.indexes:
+                    self._append_postings(name, values)
+        os.replace(tmp, path)
+        for segment in self.segments:
+            segment["stats"].pop(name, None)
+
+    def save_manifest(self):
+        manifest = {
+            "columns": self.columns,
+            "segments": self.segments,
+            "indexes": self.indexes,
+        }
+        with open(os.path.join(self.directory, MANIFEST_FILE), "w", encoding="utf-8") as f:
+            json.dump(manifest, f, separators=(",", ":"))
+
+    def iter_column(self, name, min_value=None, max_value=None):
+        """Yields the values of a column segment by segment, skipping segments outside [min, max]."""
+        with open(self._column_path(name), "r", encoding="utf-8") as f:
+            for segment, line in zip(self.segments, f):
+                low_high = segment["stats"].get(name)
+                if low_high and min_value is not None and low_high[1] < min_value:
+                    continue
+                if low_high and max_value is not None and low_high[0] > max_value:
+                    continue
+                yield from json.loads(line)
+
+    def lookup(self, column, value):
+        """Returns the row ids where column == value, streaming the column's postings."""
+        if column not in self.indexes:
+            raise KeyError(f"column {column!r} is not indexed")
+        key = str(value)
+        needle = json.dumps(key)    # the key as it is written in the postings lines
+        row_ids = []
+        start = 0
+        with open(self._index_path(column), "r", encoding="utf-8") as f:
+            for segment, line in zip(self.segments, f):
+                if needle in line:
+                    row_ids.extend(start + offset for offset in json.loads(line).get(key, []))
+                start += segment["rows"]
+        return row_ids
+
+    def rows(self, row_ids):
+        """Materializes the given rows as dicts, reading only the segments that contain them."""
+        wanted = sorted(set(row_ids))
+        result = {row_id: {} for row_id in wanted}
+        for name in self.columns:
+            with open(self._column_path(name), "r", encoding="utf-8") as f:
+                start = 0
+                position = 0
+                for segment, line in zip(self.segments, f):
+                    end = start + segment["rows"]
+                    if position < len(wanted) and wanted[position] < end:
+                        values = json.loads(line)
+                        while position < len(wanted) and wanted[position] < end:
+                            result[wanted[position]][name] = values[wanted[position] - start]
+                            position += 1
+                    start = end
+        return [result[row_id] for row_id in wanted]
+
+    def describe(self):
+        """Short text summary (schema + size) suitable for a model prompt."""
+        schema = {}
+        try:
+            with open(os.path.join(self.directory, SCHEMA_FILE), "r", encoding="utf-8") as f:
+                schema = json.load(f)["schema"]
+        except (OSError, ValueError):
+            pass
+        columns = ", ".join(f"{name} ({schema.get(name, '?')})" for name in self.columns)
+        return f"{self.row_count} rows; columns: {columns}"
+
+
+# 4. Ingestion job
+# ---------------------------------------------------------------------
+
+class IngestProgress:
+    def __init__(self, rows, bytes_read, total_bytes, chunks):
+        self.rows = rows
+        self.bytes_read = bytes_read
+        self.total_bytes = total_bytes
+        self.chunks = chunks
+
+    @property
+    def percent(self):
+        if not self.total_bytes:
+            return 100.0
+        return min(100.0, 100.0 * self.bytes_read / self.total_bytes)
+
+
+class CsvIngestJob:
+    """
+    Streams one CSV file into a ColumnStore.
+
+    :param path: CSV file to ingest.
+    :param store_dir: Directory for the columnar store and cached schema.
+    :param chunk_rows: Rows parsed and held in memory per step.
+    :param index_columns: Columns to hash-index; defaults to all text columns.
+    """
+
+    def __init__(self, path, store_dir, chunk_rows=DEFAULT_CHUNK_ROWS, index_columns=None):
+        self.path = path
+        self.chunk_rows = max(1, int(chunk_rows))
+        self.index_columns = index_columns
+        self.store = ColumnStore(store_dir)
+        self.schema = None
+        self.encoding = None
+
+    def run(self):
+        """Generator: ingests chunk by chunk and yields IngestProgress after each one."""
+        total_bytes = os.path.getsize(self.path)
+        fingerprint = file_fingerprint(self.path)
+        self.schema, self.encoding = load_cached_schema(self.store.directory, fingerprint)
+        self.encoding = self.encoding or detect_encoding(self.path)
+        index_text_columns = self.index_columns is None
+        rows_done = 0
+        chunks = 0
+        for header, rows, bytes_read in iter_csv_chunks(self.path, self.chunk_rows, self.encoding):
+            if chunks == 0:
+                if self.schema is None or list(self.schema) != header:
+                    self.schema = infer_schema(header, rows)
+                if index_text_columns:
+                    self.index_columns = [n for n, t in self.schema.items() if t == "str"]
+                self.store.reset(header, self.index_columns)
+            columns = {name: [] for name in header}
+            for row in rows:
+                for position, name in enumerate(header):
+                    value = row[position] if position < len(row) else ""
+                    try:
+                        converted = convert(value, self.schema[name])
+                    except ValueError:
+                        # Late surprise: widen the column to str, including what was already read
+                        previous = self.schema[name]
+                        self.schema[name] = "str"
+                        columns[name] = [to_text(v, previous) for v in columns[name]]
+                        if self.store.segments:
+                            self.store.retype_as_text(name, previous, index=index_text_columns)
+                        elif index_text_columns:
+                            self.store.add_index(name)
+                        converted = value.strip() or None
+                    columns[name].append(converted)
+            self.store.append_segment(columns)
+            rows_done += len(rows)
+            chunks += 1
+            yield IngestProgress(rows_done, bytes_read or total_bytes, total_bytes, chunks)
+        if self.schema is not None:
+            save_schema(self.store.directory, fingerprint, self.schema, self.encoding)
+        self.store.save_manifest()
+
+
+def ingest_csv(path, store_dir, chunk_rows=DEFAULT_CHUNK_ROWS, index_columns=None):
+    """Runs a CsvIngestJob to completion and returns the ColumnStore."""
+    job = CsvIngestJob(path, store_dir, chunk_rows, index_columns)
+    for _ in job.run():
+        pass
+    return job.store
+
+
+# 5. Store directories
+# ---------------------------------------------------------------------
+# One store per uploaded file under a root the app owns (not the working
+# directory). Stores of finished sessions are removed by the app, and any left
+# behind by a crash are expired by age.
+
+def store_dir_for(path, root):
+    """Stable store directory under root for an uploaded file."""
+    name = os.path.splitext(os.path.basename(path))[0]
+    digest = hashlib.sha1(os.path.abspath(path).encode()).hexdigest()[:8]
+    return os.path.join(root, f"{name}-{digest}")
+
+
+def remove_store(store_dir):
+    """Deletes a store directory; a store that is already gone is fine."""
+    shutil.rmtree(store_dir, ignore_errors=True)
+
+
+def expire_stores(root, max_age_seconds=STORE_TTL_SECONDS, now=None):
+    """
+    Deletes the stores under root not written for max_age_seconds; returns how many.
+    The age is taken from the newest file in the store, so an ingest still appending is kept.
+    """
+    if not os.path.isdir(root):
+        return 0
+    now = time.time() if now is None else now
+    expired = 0
+    for entry in os.scandir(root):
+        if not entry.is_dir(follow_symlinks=False):
+            continue
+        try:
+            newest = max([entry.stat().st_mtime] + [f.stat().st_mtime for f in os.scandir(entry.path)])
+        except OSError:
+            continue                # removed meanwhile
+        if now - newest > max_age_seconds:
+            remove_store(entry.path)
+            expired += 1
+    return expired
@@ -0,0 +1,522 @@
+"""
+Destination knowledge packs
+---------------------------
+The travel companion sent every "what should I see in X?" question to the
+agent from scratch. Its goodbye message also picked city resources with a
+substring scan over four hard-coded cities. This module precomputes compact
+knowledge packs (attractions, transport, etiquette, resources) for the top
+destinations and serves them locally:
+
+- `DestinationIndex` resolves a destination with a word-level trie over
+  normalized names and aliases ("New York City", "NYC", "São Paulo" ->
+  "sao paulo"). Typos ("Tokio") fall back to a fuzzy match.
+- `KnowledgePacks.answer()` replies to short, common questions ("what to see",
+  "how to get around", "tipping etiquette") instantly, without a model call
+- `KnowledgePacks.context()` returns the matching sections as cheap context for
+  everything else (e.g. the run's additional_instructions)
+- Packs record when they were built. Stale packs are rebuilt by the offline build
+  step, and a running app reloads the pack file when it changes.
+- `PackStats` reports the hit rate: resolved lookups, local answers and injections
+
+The four seeded cities work without a build. The build step fills the other
+top destinations with one small completion per section:
+
+    python -m shared.knowledge_packs build --top 20        # AZURE_OPENAI_* from .env
+    python -m shared.knowledge_packs build --mock          # offline, against the mock backend
+    python -m shared.knowledge_packs report                # pack ages and what is stale
+
+Usage:
+    packs = KnowledgePacks(".packs")
+    reply = packs.answer("What should I see in Tokyo?", destination)   # str or None
+    extra = packs.context(question, destination)                       # "" when no pack
+"""
+import difflib
+import json
+import os
+import re
+import sys
+import threading
+import time
+import unicodedata
+from functools import lru_cache
+
+DEFAULT_PACKS_DIR = os.getenv("KNOWLEDGE_PACKS_DIR", ".packs")
+PACKS_FILE = "packs.json"
+DEFAULT_MAX_AGE_DAYS = 30
+# Questions longer than this are too specific for a canned answer
+MAX_COMMON_QUESTION_WORDS = 12
+MAX_CONTEXT_CHARS = 1200
+FUZZY_CUTOFF = 0.8
+
+TOPICS = ("attractions", "transport", "etiquette", "resources")
+TOPIC_TITLES = {
+    "attractions": "Must-see attractions",
+    "transport": "Getting around",
+    "etiquette": "Local etiquette",
+    "resources": "Helpful Resources",
+}
+# Common questions per topic, matched against the normalized question
+COMMON_QUESTIONS = {
+    "attractions": r"\b(what|things|places) (to|should i|can i|could i|must i) (see|do|visit)\b"
+                   r"|\b(must see|top|main|best) (sights|attractions|places|things)\b|\battractions\b|\bsightseeing\b",
+    "transport": r"\b(get|getting|move|moving) around\b|\bpublic transport(ation)?\b|\btransport(ation)? (options|pass|card)\b"
+                 r"|\b(metro|subway|tube|train|bus) (pass|card|ticket|tickets|system)\b",
+    "etiquette": r"\betiquette\b|\b(local )?customs\b|\btipping\b|\bshould i tip\b|\bmanners\b|\bdos and don ?t?s\b",
+    "resources": r"\b(useful|helpful|official) (resources|websites|sites|apps|links)\b|\bwhich apps\b",
+}
+_COMMON_PATTERNS = {topic: re.compile(pattern) for topic, pattern in COMMON_QUESTIONS.items()}
+
+# Top destinations: (name, country, emoji, aliases); the build step covers the first N
+TOP_DESTINATIONS = [
+    ("Tokyo", "Japan", "🗾", ["tokio"]),
+    ("Paris", "France", "🇫🇷", []),
+    ("London", "United Kingdom", "🇬🇧", []),
+    ("New York", "United States", "🗽", ["new york city", "nyc", "manhattan"]),
+    ("Barcelona", "Spain", "🇪🇸", []),
+    ("Rome", "Italy", "🇮🇹", ["roma"]),
+    ("Bangkok", "Thailand", "🇹🇭", []),
+    ("Istanbul", "Turkey", "🇹🇷", []),
+    ("Dubai", "United Arab Emirates", "🇦🇪", []),
+    ("Singapore", "Singapore", "🇸🇬", []),
+    ("Amsterdam", "Netherlands", "🇳🇱", []),
+    ("Madrid", "Spain", "🇪🇸", []),
+    ("Lisbon", "Portugal", "🇵🇹", ["lisboa"]),
+    ("Berlin", "Germany", "🇩🇪", []),
+    ("Prague", "Czech Republic", "🇨🇿", ["praha"]),
+    ("Vienna", "Austria", "🇦🇹", ["wien"]),
+    ("Seoul", "South Korea", "🇰🇷", []),
+    ("Hong Kong", "China", "🇭🇰", []),
+    ("Sydney", "Australia", "🇦🇺", []),
+    ("Los Angeles", "United States", "🌴", []),
+    ("Mexico City", "Mexico", "🇲🇽", ["cdmx", "ciudad de mexico"]),
+    ("Rio de Janeiro", "Brazil", "🇧🇷", ["rio"]),
+    ("Sao Paulo", "Brazil", "🇧🇷", []),
+    ("Buenos Aires", "Argentina", "🇦🇷", []),
+    ("Cape Town", "South Africa", "🇿🇦", []),
+    ("Marrakech", "Morocco", "🇲🇦", ["marrakesh"]),
+    ("Kyoto", "Japan", "⛩️", []),
+    ("Bali", "Indonesia", "🇮🇩", []),
+    ("Athens", "Greece", "🇬🇷", []),
+    ("San Francisco", "United States", "🌉", ["sf"]),
+]
+
+# Hand-written sections; the build step never overwrites these
+SEED_SECTIONS = {
+    "tokyo": {
+        "attractions": "• Senso-ji and Asakusa\n• Meiji Jingu and Harajuku\n• Shibuya Crossing and Shinjuku at night\n"
+                       "• Tsukiji Outer Market\n• teamLab and Odaiba\n• Day trip to Nikko or Kamakura",
+        "transport": "• Suica/PASMO IC cards work on JR, metro and buses\n• Tokyo Metro 24/48/72-hour passes for visitors\n"
+                     "• The JR Yamanote loop links the main districts\n• Trains stop around midnight; taxis are expensive",
+        "etiquette": "• No tipping\n• Queue in line on platforms and keep phone calls off trains\n"
+                     "• Take shoes off where indicated\n• Avoid eating while walking",
+        "resources": "• Official Tokyo Tourism: https://www.gotokyo.org/\n• JR Pass Information: https://www.jrpass.com/\n"
+                     "• Tokyo Metro Map: Download the official app",
+    },
+    "paris": {
+        "attractions": "• Louvre and Musée d'Orsay\n• Eiffel Tower and Trocadéro\n• Notre-Dame and Île de la Cité\n"
+                       "• Montmartre and Sacré-Cœur\n• Le Marais\n• Day trip to Versailles",
+        "transport": "• Metro and RER cover the city; buy a Navigo Easy card\n• Navigo Découverte for week-long stays\n"
+                     "• Central Paris is very walkable\n• Vélib' bike share",
+        "etiquette": "• Greet with \"Bonjour\" when entering shops\n• Service is included; round up for good service\n"
+                     "• Keep your voice down in restaurants and on the metro",
+        "resources": "• Official Paris Tourism: https://en.parisinfo.com/\n• Museum Pass: https://www.parismuseumpass.com/\n"
+                     "• Metro/RER Maps: Download Citymapper app",
+    },
+    "london": {
+        "attractions": "• British Museum and National Gallery (free)\n• Tower of London and Tower Bridge\n"
+                       "• Westminster Abbey and Big Ben\n• South Bank and Tate Modern\n• Camden and Borough Market",
+        "transport": "• Tap in with a contactless card or Oyster; daily caps apply\n• The Tube plus buses cover the city\n"
+                     "• Stand on the right on escalators",
+        "etiquette": "• Queue patiently\n• 10-12.5% service is often added in restaurants; check the bill\n"
+                     "• Pubs: order and pay at the bar",
+        "resources": "• Visit London: https://www.visitlondon.com/\n• Oyster Card Info: https://tfl.gov.uk/\n"
+                     "• Theatre Tickets: https://www.officiallondontheatre.com/",
+    },
+    "new york": {
+        "attractions": "• Central Park and the Met\n• Statue of Liberty and Ellis Island\n• Times Square and Broadway\n"
+                       "• High Line and Chelsea Market\n• Brooklyn Bridge and DUMBO\n• 9/11 Memorial & Museum",
+        "transport": "• Subway runs 24/7; tap with OMNY or a contactless card\n• Weekly fare cap after 12 rides\n"
+                     "• Manhattan's grid makes walking easy",
+        "etiquette": "• Tip 18-20% in restaurants and bars\n• Walk fast and step aside to stop\n"
+                     "• Let people off the subway before boarding",
+        "resources": "• NYC Tourism: https://www.nycgo.com/\n• MetroCard/OMNY: https://new.mta.info/\n"
+                     "• Broadway Shows: https://www.broadway.com/",
+    },
+}
+
+SECTION_PROMPTS = {
+    "attractions": "List the 6 must-see attractions in {name}, {country} as short bullet points (• name and a few words).",
+    "transport": "Explain how visitors get around {name}, {country} in at most 4 short bullet points (•).",
+    "etiquette": "Give the 4 most important etiquette and tipping tips for visitors to {name}, {country} as short bullet points (•).",
+    "resources": "List 3 official visitor resources for {name}, {country} (tourism board, transport, tickets) as bullet points (•) with URLs.",
+}
+
+_NON_ALNUM = re.compile(r"[^a-z0-9]+")
+
+
+def normalize_name(text):
+    """Lowercase ASCII words: accents and punctuation removed ("São Paulo!" -> "sao paulo")."""
+    ascii_text = unicodedata.normalize("NFKD", text or "").encode("ascii", "ignore").decode()
+    return _NON_ALNUM.sub(" ", ascii_text.lower()).strip()
+
+
+# 1. Destination index
+# ---------------------------------------------------------------------
+
+class DestinationIndex:
+    """Word-level trie over normalized names and aliases, with a fuzzy fallback."""
+
+    END = "$"
+
+    def __init__(self):
+        self.trie = {}
+        self.names = {}   # {normalized name or alias: key}
+        self.resolve = lru_cache(maxsize=2048)(self._resolve)
+
+    def add(self, key, *names):
+        for name in names:
+            normalized = normalize_name(name)
+            if not normalized:
+                continue
+            node = self.trie
+            for word in normalized.split():
+                node = node.setdefault(word, {})
+            node[self.END] = key
+            self.names[normalized] = key
+        self.resolve.cache_clear()
+
+    def find(self, text):
+        """Longest exact name or alias mentioned anywhere in text, or None."""
+        words = normalize_name(text).split()
+        best, best_length = None, 0
+        for start in range(len(words)):
+            node = self.trie
+            for position in range(start, len(words)):
+                node = node.get(words[position])
+                if node is None:
+                    break
+                if self.END in node and position - start + 1 > best_length:
+                    best, best_length = node[self.END], position - start + 1
+        return best
+
+    def _resolve(self, text):
+        """find(), then a fuzzy match of the words and word pairs in text (for typos)."""
+        key = self.find(text)
+        if key is not None:
+            return key
+        words = normalize_name(text).split()
+        candidates = [" ".join(words)] + [" ".join(words[i:i + 2]) for i in range(len(words) - 1)] + words
+        for candidate in candidates:
+            if len(candidate) < 4:
+                continue
+            match = difflib.get_close_matches(candidate, self.names, n=1, cutoff=FUZZY_CUTOFF)
+            if match:
+                return self.names[match[0]]
+        return None
+
+
+# 2. Packs and statistics
+# ---------------------------------------------------------------------
+
+class KnowledgePack:
+    def __init__(self, key, name, country="", emoji="🌍", aliases=(), sections=None, built_at=None, source="seed"):
+        self.key = key
+        self.name = name
+        self.country = country
+        self.emoji = emoji
+        self.aliases = list(aliases)
+        self.sections = dict(sections or {})
+        self.built_at = built_at
+        self.source = source
+
+    def age_days(self, now=None):
+        if self.built_at is None:
+            return None
+        return ((now or time.time()) - self.built_at) / 86400
+
+    def to_dict(self):
+        return {
+            "name": self.name, "country": self.country, "emoji": self.emoji, "aliases": self.aliases,
+            "sections": self.sections, "built_at": self.built_at, "source": self.source,
+        }
+
+
+def seed_packs():
+    """Packs for TOP_DESTINATIONS holding only the hand-written sections."""
+    packs = {}
+    for name, country, emoji, aliases in TOP_DESTINATIONS:
+        key = normalize_name(name)
+        packs[key] = KnowledgePack(key, name, country, emoji, aliases, SEED_SECTIONS.get(key))
+    return packs
+
+
+class PackStats:
+    def __init__(self):
+        self.lookups = 0
+        self.resolved = 0
+        self.answered = 0
+        self.injected = 0
+        self.lock = threading.Lock()
+
+    def count(self, field):
+        with self.lock:
+            setattr(self, field, getattr(self, field) + 1)
+
+    @property
+    def hit_rate(self):
+        return self.resolved / self.lookups if self.lookups else 0.0
+
+    def summary(self):
+        return (
+            f"{self.lookups} lookups, {self.hit_rate:.0%} resolved to a pack | "
+            f"{self.answered} answered without the model, {self.injected} injected as context"
+        )
+
+
+class KnowledgePacks:
+    """
+    :param directory: Folder holding packs.json (written by the build step).
+    :param max_age_days: Packs older than this are reported stale and rebuilt.
+    """
+
+    def __init__(self, directory=DEFAULT_PACKS_DIR, max_age_days=DEFAULT_MAX_AGE_DAYS):
+        self.directory = directory
+        self.path = os.path.join(directory, PACKS_FILE)
+        self.max_age_days = max_age_days
+        self.stats = PackStats()
+        self.lock = threading.Lock()
+        self.mtime = None
+        self._stop = threading.Event()
+        self._refresher = None
+        self.load()
+
+    def load(self):
+        """Seed packs merged with the built pack file, if there is one."""
+        packs = seed_packs()
+        mtime = None
+        try:
+            mtime = os.path.getmtime(self.path)
+            with open(self.path, encoding="utf-8") as f:
+                stored = json.load(f)
+        except (OSError, ValueError):
+            stored = {}
+        for key, data in stored.get("packs", {}).items():
+            sections = dict(data.get("sections") or {})
+            sections.update(SEED_SECTIONS.get(key, {}))
+            packs[key] = KnowledgePack(
+                key, data["name"], data.get("country", ""), data.get("emoji", "🌍"), data.get("aliases", ()),
+                sections, data.get("built_at"), data.get("source", "build"),
+            )
+        index = DestinationIndex()
+        for key, pack in packs.items():
+            index.add(key, pack.name, *pack.aliases)
+        with self.lock:
+            self.packs, self.index, self.mtime = packs, index, mtime
+
+    def save(self):
+        os.makedirs(self.directory, exist_ok=True)
+        temp = self.path + ".tmp"
+        with open(temp, "w", encoding="utf-8") as f:
+            json.dump({"version": 1, "saved_at": time.time(),
+                       "packs": {key: pack.to_dict() for key, pack in self.packs.items()}}, f, ensure_ascii=False, indent=1)
+        os.replace(temp, self.path)
+        self.mtime = os.path.getmtime(self.path)
+
+    def reload_if_changed(self):
+        try:
+            mtime = os.path.getmtime(self.path)
+        except OSError:
+            return False
+        if mtime == self.mtime:
+            return False
+        self.load()
+        return True
+
+    # Serving ----------------------------------------------------------
+
+    def lookup(self, destination):
+        """The pack for a destination (exact, alias or fuzzy match), or None."""
+        self.stats.count("lookups")
+        key = self.index.resolve(destination or "")
+        pack = self.packs.get(key) if key else None
+        if pack is not None and pack.sections:
+            self.stats.count("resolved")
+            return pack
+        return None
+
+    def _pack_for_question(self, question, destination):
+        # A city named in the question wins over the session's destination
+        key = self.index.find(question)
+        if key is not None and self.packs[key].sections:
+            self.stats.count("lookups")
+            self.stats.count("resolved")
+            return self.packs[key]
+        return self.lookup(destination)
+
+    @staticmethod
+    def topics(question):
+        normalized = normalize_name(question)
+        return [topic for topic, pattern in _COMMON_PATTERNS.items() if pattern.search(normalized)]
+
+    def answer(self, question, destination=None):
+        """A ready reply for a short, common question about a packed destination, or None."""
+        topics = self.topics(question)
+        if len(topics) != 1 or len(normalize_name(question).split()) > MAX_COMMON_QUESTION_WORDS:
+            return None
+        pack = self._pack_for_question(question, destination)
+        section = pack.sections.get(topics[0]) if pack else None
+        if not section:
+            return None
+        self.stats.count("answered")
+        return (
+            f"{pack.emoji} **{TOPIC_TITLES[topics[0]]} in {pack.name}:**\n{section}\n\n"
+            f"Ask me anything more specific and I'll tailor it to your dates and budget!"
+        )
+
+    def context(self, question, destination=None):
+        """Compact pack text to add to the model's instructions ("" when there is no pack)."""
+        pack = self._pack_for_question(question, destination)
+        if pack is None:
+            return ""
+        wanted = self.topics(question) or [t for t in TOPICS if t != "resources"]
+        parts = [f"{TOPIC_TITLES[t]}:\n{pack.sections[t]}" for t in wanted if pack.sections.get(t)]
+        if not parts:
+            return ""
+        self.stats.count("injected")
+        text = f"Destination notes for {pack.name} (prepared offline, use when relevant):\n" + "\n".join(parts)
+        return text[:MAX_CONTEXT_CHARS]
+
+    # Refresh ----------------------------------------------------------
+
+    def stale(self, top=None, now=None):
+        """Keys of top destinations whose generated sections are missing or older than max_age_days."""
+        keys = [normalize_name(name) for name, *_ in TOP_DESTINATIONS[:top]]
+        result = []
+        for key in keys:
+            pack = self.packs[key]
+            missing = [t for t in TOPICS if t not in pack.sections]
+            age = pack.age_days(now)
+            generated = set(pack.sections) - set(SEED_SECTIONS.get(key, {}))
+            if missing or (generated and (age is None or age > self.max_age_days)):
+                result.append(key)
+        return result
+
+    def start_background_refresh(self, interval=300.0):
+        """Reloads packs.json whenever the build step rewrites it."""
+        if self._refresher is not None:
+            return
+
+        def loop():
+            while not self._stop.wait(interval):
+                try:
+                    if self.reload_if_changed():
+                        print(f"[packs] reloaded {len(self.packs)} destination packs")
+                except Exception as e:
+                    print(f"[packs] reload failed: {e}")
+
+        self._refresher = threading.Thread(target=loop, name="knowledge-pack-refresh", daemon=True)
+        self._refresher.start()
+
+    def close(self):
+        self._stop.set()
+
+
+# 3. Offline build step
+# ---------------------------------------------------------------------
+
+def build_packs(packs, client, deployment, top=20, force=False, max_completion_tokens=180):
+    """
+    Generates the missing or stale sections of the top destinations, one small
+    completion per section, and saves after each pack so an interrupted build keeps its progress.
+    """
+    keys = [normalize_name(name) for name, *_ in TOP_DESTINATIONS[:top]] if force else packs.stale(top)
+    for key in keys:
+        pack = packs.packs[key]
+        seeded = SEED_SECTIONS.get(key, {})
+        started = time.perf_counter()
+        for topic in TOPICS:
+            if topic in seeded:
+                continue
+            response = client.chat.completions.create(
+                model=deployment,
+                messages=[
+                    {"role": "system", "content": "You write compact, factual travel guide notes. No introduction."},
+                    {"role": "user", "content": SECTION_PROMPTS[topic].format(name=pack.name, country=pack.country)},
+                ],
+                max_completion_tokens=max_completion_tokens,
+            )
+            pack.sections[topic] = (response.choices[0].message.content or "").strip()
+        pack.built_at = time.time()
+        pack.source = deployment
+        packs.save()
+        print(f"📦 {pack.name}: {len(pack.sections)} sections in {time.perf_counter() - started:.1f}s")
+    return keys
+
+
+def report(packs, now=None):
+    stale = set(packs.stale(len(TOP_DESTINATIONS), now))
+    lines = []
+    for name, *_ in TOP_DESTINATIONS:
+        key = normalize_name(name)
+        pack = packs.packs[key]
+        age = pack.age_days(now)
+        if age is None:
+            age_text = "seed only" if pack.sections else "not built"
+        else:
+            age_text = f"{age:.0f} days old"
+        lines.append(f"{'⏳' if key in stale else '✅'} {pack.name:<16} {len(pack.sections)}/{len(TOPICS)} sections, {age_text}")
+    return "\n".join(lines)
+
+
+def main():
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Build and inspect destination knowledge packs")
+    parser.add_argument("command", choices=["build", "report", "resolve"])
+    parser.add_argument("text", nargs="?", help="destination text for 'resolve'")
+    parser.add_argument("--dir", default=DEFAULT_PACKS_DIR)
+    parser.add_argument("--top", type=int, default=20)
+    parser.add_argument("--max-age-days", type=float, default=DEFAULT_MAX_AGE_DAYS)
+    parser.add_argument("--force", action="store_true", help="rebuild even packs that are not stale")
+    parser.add_argument("--mock", action="store_true", help="build against the in-process mock backend")
+    args = parser.parse_args()
+
+    packs = KnowledgePacks(args.dir, args.max_age_days)
+    if args.command == "resolve":
+        pack = packs.lookup(args.text or "")
+        print(f"{args.text!r} -> {pack.name if pack else 'no pack'}")
+        return 0 if pack else 1
+    if args.command == "report":
+        print(report(packs))
+        return 0
+
+    from openai import AzureOpenAI
+
+    backend = None
+    if args.mock:
+        from shared.mock_backend import MockBackend
+
+        backend = MockBackend({"ttft": {"dist": "fixed", "value": 0.01}, "tokens_per_sec": 2000}).start()
+        client = AzureOpenAI(azure_endpoint=backend.url, api_key="mock", api_version="2024-10-21")
+        deployment = "mock-deployment"
+    else:
+        from dotenv import load_dotenv
+
+        load_dotenv()
+        client = AzureOpenAI(
+            azure_endpoint=os.getenv("AZURE_OPENAI_ENDPOINT"),
+            api_key=os.getenv("AZURE_OPENAI_API_KEY"),
+            api_version=os.getenv("AZURE_OPENAI_API_VERSION"),
+        )
+        deployment = os.getenv("AZURE_OPENAI_DEPLOYMENT_NAME")
+    try:
+        built = build_packs(packs, client, deployment, top=args.top, force=args.force)
+    finally:
+        if backend is not None:
+            backend.stop()
+    print(f"\n✅ {len(built)} packs built into {packs.path}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
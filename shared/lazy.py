@@ -0,0 +1,66 @@
+"""
+Deferred construction
+---------------------
+The apps used to build their SDK clients (credential, AIProjectClient,
+AzureOpenAI) at import time, before Chainlit could serve the first page.
+`Deferred` wraps the factory instead and builds the object on first use:
+
+- Attribute access is forwarded, so `project.agents.threads.create()` works
+  unchanged on a `Deferred`
+- Construction happens once, under a lock (concurrent first calls wait for
+  the same object)
+- `built` tells whether it has been constructed; `build_seconds` how long it took
+
+The SDK modules themselves are imported inside the factory, so importing the
+app does not load azure/openai either.
+
+Usage:
+    def make_project():
+        from azure.ai.projects import AIProjectClient
+        from azure.identity import DefaultAzureCredential
+        return AIProjectClient(endpoint=endpoint, credential=DefaultAzureCredential())
+
+    project = Deferred(make_project)
+    project.agents.threads.create()     # first use builds the client
+"""
+import threading
+import time
+
+
+class Deferred:
+    """
+    :param factory: Callable returning the object; called once, on first use.
+    :param name: Label for repr and error messages (default: the factory's name).
+    """
+
+    def __init__(self, factory, name=None):
+        self._factory = factory
+        self._name = name or getattr(factory, "__name__", "deferred")
+        self._lock = threading.Lock()
+        self._value = None
+        self.built = False
+        self.build_seconds = None
+
+    def get(self):
+        """The object, constructing it on the first call."""
+        if not self.built:
+            with self._lock:
+                if not self.built:
+                    start = time.perf_counter()
+                    self._value = self._factory()
+                    self.build_seconds = time.perf_counter() - start
+                    self.built = True
+        return self._value
+
+    def __getattr__(self, name):
+        # Only called for attributes Deferred itself does not have
+        if name.startswith("__"):
+            raise AttributeError(name)
+        return getattr(self.get(), name)
+
+    def __call__(self, *args, **kwargs):
+        return self.get()(*args, **kwargs)
+
+    def __repr__(self):
+        state = f"built in {self.build_seconds * 1000:.0f} ms" if self.built else "not built"
+        return f"<Deferred {self._name}: {state}>"
@@ -0,0 +1,340 @@
+"""
+Lifecycle of agents, threads and vector stores
+----------------------------------------------
+The EX2 Chainlit apps create an agent and/or a thread for every chat session
+and never delete them. The service does not clean them up either, so the
+project fills with orphans: listing gets slower and quotas run out. This module:
+
+- `ResourceLedger` records every created agent, thread and vector store in a
+  local sqlite ledger (shared by all workers), with its owner session and last use
+- `release()` marks a resource as no longer needed (e.g. in on_chat_end). Deletion
+  happens after a short grace period. Resources that were never released are
+  deleted once idle for longer than their TTL.
+- `Reaper` is a daemon thread that deletes due resources in small batches,
+  spaced out to a maximum rate. Resources already gone (404) count as deleted,
+  and failures are retried with backoff.
+  Request handlers only write one ledger row, so they never wait for a deletion.
+- `metrics()` reports the backlog: live/due/failed resources per kind and the age of the oldest due one
+
+TTLs come from RESOURCE_TTL_SECONDS (idle, default 24h) and
+RESOURCE_RELEASE_GRACE_SECONDS (after release, default 5 minutes).
+
+Usage:
+    reaper = Reaper.for_project(project, ".lifecycle")    # starts the background thread
+    reaper.ledger.record("thread", thread.id, owner=session_id)
+    reaper.ledger.touch("thread", thread.id)              # on every message
+    reaper.ledger.release("thread", thread.id)            # on_chat_end
+    print(reaper.summary())
+
+    python -m shared.lifecycle status .lifecycle           # backlog metrics
+    python -m shared.lifecycle sweep .lifecycle --dry-run  # what the reaper would delete now
+"""
+import os
+import sqlite3
+import sys
+import threading
+import time
+from contextlib import contextmanager
+
+DEFAULT_TTL = float(os.getenv("RESOURCE_TTL_SECONDS", str(24 * 3600)))
+DEFAULT_RELEASE_GRACE = float(os.getenv("RESOURCE_RELEASE_GRACE_SECONDS", "300"))
+LEDGER_FILE = "ledger.db"
+KINDS = ("agent", "thread", "vector_store")
+
+LIVE, RELEASED, DELETING, DELETED, FAILED = "live", "released", "deleting", "deleted", "failed"
+# A claim older than this belongs to a worker that died mid-batch
+CLAIM_TIMEOUT = 300.0
+MAX_ATTEMPTS = 5
+
+
+# 1. Ledger
+# ---------------------------------------------------------------------
+
+class ResourceLedger:
+    """
+    :param path: sqlite file (WAL mode; safe to share between worker processes).
+    :param ttl: Idle seconds after which a resource that was never released is deleted (None = never).
+    :param release_grace: Seconds between release() and deletion.
+    """
+
+    def __init__(self, path, ttl=DEFAULT_TTL, release_grace=DEFAULT_RELEASE_GRACE, busy_timeout=5.0):
+        self.path = path
+        self.ttl = ttl
+        self.release_grace = release_grace
+        self.busy_timeout = busy_timeout
+        self.local = threading.local()
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        with self._connect() as db:
+            db.execute("PRAGMA journal_mode=WAL")
+            db.execute(
+                "CREATE TABLE IF NOT EXISTS resources ("
+                "kind TEXT NOT NULL, id TEXT NOT NULL, owner TEXT, state TEXT NOT NULL, "
+                "created_at REAL NOT NULL, last_used REAL NOT NULL, due_at REAL, "
+                "attempts INTEGER NOT NULL DEFAULT 0, last_error TEXT, updated_at REAL NOT NULL, "
+                "PRIMARY KEY (kind, id))"
+            )
+            db.execute("CREATE INDEX IF NOT EXISTS resources_due ON resources (state, due_at)")
+
+    def _connect(self):
+        db = getattr(self.local, "db", None)
+        if db is None:
+            db = sqlite3.connect(self.path, timeout=self.busy_timeout, isolation_level=None)
+            db.execute("PRAGMA synchronous=NORMAL")
+            self.local.db = db
+        return db
+
+    @contextmanager
+    def _transaction(self):
+        db = self._connect()
+        db.execute("BEGIN IMMEDIATE")
+        try:
+            yield db
+            db.execute("COMMIT")
+        except BaseException:
+            db.execute("ROLLBACK")
+            raise
+
+    def record(self, kind, resource_id, owner=None, ttl="default"):
+        """Adds a created resource; ttl=None keeps it until released (e.g. a shared agent)."""
+        if kind not in KINDS:
+            raise ValueError(f"unknown resource kind {kind!r}; expected one of {', '.join(KINDS)}")
+        ttl = self.ttl if ttl == "default" else ttl
+        now = time.time()
+        self._connect().execute(
+            "INSERT OR REPLACE INTO resources (kind, id, owner, state, created_at, last_used, due_at, updated_at) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+            (kind, resource_id, owner, LIVE, now, now, None if ttl is None else now + ttl, now),
+        )
+
+    def touch(self, kind, resource_id):
+        """Pushes the idle deadline of a live resource forward."""
+        now = time.time()
+        self._connect().execute(
+            "UPDATE resources SET last_used = ?, updated_at = ?, "
+            "due_at = CASE WHEN due_at IS NULL THEN NULL ELSE ? + (due_at - last_used) END "
+            "WHERE kind = ? AND id = ? AND state = ?",
+            (now, now, now, kind, resource_id, LIVE),
+        )
+
+    def release(self, kind, resource_id, grace=None):
+        """The resource is no longer needed; the reaper deletes it after the grace period."""
+        now = time.time()
+        due = now + (self.release_grace if grace is None else grace)
+        self._connect().execute(
+            "UPDATE resources SET state = ?, due_at = ?, updated_at = ? WHERE kind = ? AND id = ? AND state = ?",
+            (RELEASED, due, now, kind, resource_id, LIVE),
+        )
+
+    def release_owner(self, owner, grace=None):
+        """Releases everything a session created."""
+        now = time.time()
+        due = now + (self.release_grace if grace is None else grace)
+        self._connect().execute(
+            "UPDATE resources SET state = ?, due_at = ?, updated_at = ? WHERE owner = ? AND state = ?",
+            (RELEASED, due, now, owner, LIVE),
+        )
+
+    def due(self, now=None, limit=None):
+        """(kind, id) pairs ready for deletion, oldest deadline first (read only)."""
+        now = now or time.time()
+        rows = self._connect().execute(
+            "SELECT kind, id FROM resources WHERE state IN (?, ?, ?) AND due_at IS NOT NULL AND due_at <= ? "
+            "ORDER BY due_at LIMIT ?",
+            (LIVE, RELEASED, FAILED, now, -1 if limit is None else limit),
+        ).fetchall()
+        return rows
+
+    def claim(self, limit, now=None):
+        """Atomically takes up to limit due resources for this worker (marks them deleting)."""
+        now = now or time.time()
+        with self._transaction() as db:
+            rows = db.execute(
+                "SELECT kind, id FROM resources WHERE "
+                "((state IN (?, ?, ?) AND due_at IS NOT NULL AND due_at <= ?) OR (state = ? AND updated_at <= ?)) "
+                "ORDER BY due_at LIMIT ?",
+                (LIVE, RELEASED, FAILED, now, DELETING, now - CLAIM_TIMEOUT, limit),
+            ).fetchall()
+            db.executemany(
+                "UPDATE resources SET state = ?, updated_at = ? WHERE kind = ? AND id = ?",
+                [(DELETING, now, kind, resource_id) for kind, resource_id in rows],
+            )
+        return rows
+
+    def mark_deleted(self, kind, resource_id):
+        self._connect().execute(
+            "UPDATE resources SET state = ?, due_at = NULL, updated_at = ? WHERE kind = ? AND id = ?",
+            (DELETED, time.time(), kind, resource_id),
+        )
+
+    def mark_failed(self, kind, resource_id, error, backoff=60.0):
+        """Retries later with exponential backoff; gives up (due_at NULL) after MAX_ATTEMPTS."""
+        now = time.time()
+        with self._transaction() as db:
+            row = db.execute("SELECT attempts FROM resources WHERE kind = ? AND id = ?", (kind, resource_id)).fetchone()
+            attempts = (row[0] if row else 0) + 1
+            due = None if attempts >= MAX_ATTEMPTS else now + backoff * 2 ** (attempts - 1)
+            db.execute(
+                "UPDATE resources SET state = ?, attempts = ?, last_error = ?, due_at = ?, updated_at = ? "
+                "WHERE kind = ? AND id = ?",
+                (FAILED, attempts, str(error)[:500], due, now, kind, resource_id),
+            )
+
+    def purge(self, older_than=7 * 86400):
+        """Forgets deleted resources after a week so the ledger stays small."""
+        self._connect().execute(
+            "DELETE FROM resources WHERE state = ? AND updated_at < ?", (DELETED, time.time() - older_than)
+        )
+
+    def metrics(self, now=None):
+        """{kind: {state: count}} plus the due backlog and the age of the oldest due resource."""
+        now = now or time.time()
+        db = self._connect()
+        result = {"by_kind": {}, "due": 0, "oldest_due_seconds": 0.0, "gave_up": 0}
+        for kind, state, count in db.execute("SELECT kind, state, COUNT(*) FROM resources GROUP BY kind, state"):
+            result["by_kind"].setdefault(kind, {})[state] = count
+        due, oldest = db.execute(
+            "SELECT COUNT(*), MIN(due_at) FROM resources WHERE state IN (?, ?, ?) AND due_at IS NOT NULL AND due_at <= ?",
+            (LIVE, RELEASED, FAILED, now),
+        ).fetchone()
+        result["due"] = due
+        result["oldest_due_seconds"] = now - oldest if oldest else 0.0
+        result["gave_up"] = db.execute(
+            "SELECT COUNT(*) FROM resources WHERE state = ? AND due_at IS NULL", (FAILED,)
+        ).fetchone()[0]
+        return result
+
+
+# 2. Reaper
+# ---------------------------------------------------------------------
+
+def is_not_found(error):
+    return getattr(error, "status_code", None) == 404 or type(error).__name__ == "ResourceNotFoundError"
+
+
+def project_deleters(project):
+    """Delete calls of an AIProjectClient, per resource kind (resolved per call, so a Deferred client stays unbuilt)."""
+    return {
+        "agent": lambda resource_id: project.agents.delete_agent(resource_id),
+        "thread": lambda resource_id: project.agents.threads.delete(resource_id),
+        "vector_store": lambda resource_id: project.agents.vector_stores.delete(resource_id),
+    }
+
+
+class Reaper:
+    """
+    :param deleters: {kind: callable(resource_id)} performing the deletion.
+    :param interval: Seconds between sweeps.
+    :param batch_size: Most resources claimed per sweep.
+    :param max_rate: Most delete calls per second (spread out within a batch).
+    """
+
+    def __init__(self, ledger, deleters, interval=30.0, batch_size=20, max_rate=5.0):
+        self.ledger = ledger
+        self.deleters = deleters
+        self.interval = interval
+        self.batch_size = batch_size
+        self.max_rate = max_rate
+        self.deleted = 0
+        self.already_gone = 0
+        self.failures = 0
+        self.sweeps = 0
+        self._stop = threading.Event()
+        self._thread = None
+
+    @classmethod
+    def for_project(cls, project, directory, start=True, **kwargs):
+        reaper = cls(ResourceLedger(os.path.join(directory, LEDGER_FILE)), project_deleters(project), **kwargs)
+        if start:
+            reaper.start()
+        return reaper
+
+    def sweep(self):
+        """Deletes one batch of due resources; returns how many were processed."""
+        claimed = self.ledger.claim(self.batch_size)
+        for position, (kind, resource_id) in enumerate(claimed):
+            if position and self.max_rate:
+                if self._stop.wait(1.0 / self.max_rate):
+                    break
+            try:
+                self.deleters[kind](resource_id)
+            except Exception as e:
+                if is_not_found(e):
+                    self.already_gone += 1
+                    self.ledger.mark_deleted(kind, resource_id)
+                else:
+                    self.failures += 1
+                    self.ledger.mark_failed(kind, resource_id, e)
+                continue
+            self.deleted += 1
+            self.ledger.mark_deleted(kind, resource_id)
+        self.sweeps += 1
+        return len(claimed)
+
+    def start(self):
+        if self._thread is not None:
+            return
+
+        def loop():
+            while not self._stop.is_set():
+                try:
+                    # Keep sweeping without waiting while a full batch was due
+                    if self.sweep() == self.batch_size:
+                        continue
+                    if self.sweeps % 100 == 0:
+                        self.ledger.purge()
+                except Exception as e:
+                    print(f"[reaper] sweep failed: {e}")
+                self._stop.wait(self.interval)
+
+        self._thread = threading.Thread(target=loop, name="resource-reaper", daemon=True)
+        self._thread.start()
+
+    def close(self):
+        self._stop.set()
+
+    def summary(self):
+        metrics = self.ledger.metrics()
+        live = sum(states.get(LIVE, 0) + states.get(RELEASED, 0) for states in metrics["by_kind"].values())
+        return (
+            f"{self.deleted} deleted ({self.already_gone} already gone, {self.failures} failed) | "
+            f"{live} tracked, backlog {metrics['due']} due (oldest {metrics['oldest_due_seconds']:.0f}s), "
+            f"{metrics['gave_up']} given up"
+        )
+
+
+def main():
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Inspect or sweep the resource ledger")
+    parser.add_argument("command", choices=["status", "sweep"])
+    parser.add_argument("directory", nargs="?", default=".lifecycle")
+    parser.add_argument("--dry-run", action="store_true", help="list what would be deleted")
+    parser.add_argument("--batch-size", type=int, default=20)
+    args = parser.parse_args()
+
+    ledger = ResourceLedger(os.path.join(args.directory, LEDGER_FILE))
+    if args.command == "status" or args.dry_run:
+        metrics = ledger.metrics()
+        for kind, states in sorted(metrics["by_kind"].items()):
+            print(f"{kind:<13} " + ", ".join(f"{state} {count}" for state, count in sorted(states.items())))
+        print(f"\nbacklog: {metrics['due']} due, oldest {metrics['oldest_due_seconds']:.0f}s, {metrics['gave_up']} given up")
+        if args.dry_run:
+            for kind, resource_id in ledger.due(limit=args.batch_size):
+                print(f"  would delete {kind} {resource_id}")
+        return 0
+
+    from azure.ai.projects import AIProjectClient
+    from azure.identity import DefaultAzureCredential
+    from dotenv import load_dotenv
+
+    load_dotenv()
+    project = AIProjectClient(endpoint=os.getenv("AI_FOUNDRY_ENDPOINT"), credential=DefaultAzureCredential())
+    reaper = Reaper(ledger, project_deleters(project), batch_size=args.batch_size)
+    while reaper.sweep():
+        pass
+    print(f"🧹 {reaper.summary()}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
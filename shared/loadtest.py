@@ -0,0 +1,436 @@
+"""
+End-to-end load test for the Chainlit apps
+------------------------------------------
+Opens N concurrent Chainlit websocket (socket.io) sessions, replays a
+scripted conversation in each one and records per turn:
+
+- TTFT: time from sending the message to the first streamed token
+- Full latency: time until Chainlit reports the turn as finished (task_end)
+- Errors: timeouts, disconnects and messages authored by "System" starting with ❌
+
+While the test runs the Chainlit server process is sampled for CPU and
+memory. The report is a JSON file named after the current git commit so runs
+can be compared commit by commit.
+
+Run against the offline mock backend (spawns both the mock and the app):
+    python -m shared.loadtest --app EX1-FirstAIChat/samples/ex1-s2-chainlit.py --mock --sessions 20
+The started app gets AI_FOUNDRY_MOCK=1, so the EX2 agent apps talk to the mock
+without Entra ID credentials (the EX2 challenge starter, which builds its
+client with DefaultAzureCredential at import, still needs real ones).
+Scale-out check: start 4 workers on consecutive ports sharing sqlite session state,
+and spread the sessions over them round-robin:
+    python -m shared.loadtest --app EX2-FirstAgent/challenge/Solutions/ex2-ch1-solution.py --mock \
+        --script ex2-travel --workers 4 --sessions 40
+Run against an already running app:
+    python -m shared.loadtest --url http://localhost:8000 --server-pid 12345 --script ex1-ch2
+Compare with a previous report:
+    python -m shared.loadtest ... --compare loadtest-results/<commit>.json
+
+Needs the socket.io client that ships with Chainlit's dependencies
+(python-socketio) plus aiohttp for its asyncio transport.
+"""
+import argparse
+import asyncio
+import datetime
+import json
+import os
+import subprocess
+import sys
+import time
+import uuid
+
+from shared.stats import summarize
+
+# Scripted conversations. "say" sends a chat message; "answer" replies to the
+# next AskUserMessage prompt (ex2 asks for destination, dates and budget).
+# ex1-ch2 asks for the name with a plain message, so it is a "say".
+SCRIPTS = {
+    "ex1-s2": [
+        {"say": "We're at an IBM event in Barcelona. What should I see in my free time?"},
+        {"say": "Which of those can I do in two hours?"},
+        {"say": "thanks"},
+    ],
+    "ex1-ch2": [
+        {"say": "Maria"},
+        {"say": "What should I see in Barcelona?"},
+        {"say": "/info"},
+        {"say": "And where can I eat tapas nearby?"},
+    ],
+    "ex2-travel": [
+        {"answer": "Barcelona"},
+        {"answer": "Next month"},
+        {"answer": "$1000-2000"},
+        {"say": "What are the must-see attractions?"},
+        {"say": "/trip-info"},
+        {"say": "How do I get from the airport to the city?"},
+    ],
+}
+
+RESULTS_DIR = "loadtest-results"
+
+
+# 1. Server resource sampling
+# ---------------------------------------------------------------------
+
+class ProcessSampler:
+    """Samples CPU % and RSS of a process every interval seconds (psutil, or /proc on Linux)."""
+
+    def __init__(self, pid, interval=0.5):
+        self.pid = pid
+        self.interval = interval
+        self.cpu = []
+        self.rss_mb = []
+        self._task = None
+        try:
+            import psutil
+
+            self._process = psutil.Process(pid)
+        except Exception:
+            self._process = None
+
+    def _proc_times(self):
+        with open(f"/proc/{self.pid}/stat", "r") as f:
+            fields = f.read().rsplit(")", 1)[1].split()
+        ticks = os.sysconf("SC_CLK_TCK")
+        cpu_seconds = (int(fields[11]) + int(fields[12])) / ticks
+        rss_mb = int(fields[21]) * os.sysconf("SC_PAGE_SIZE") / (1024 * 1024)
+        return cpu_seconds, rss_mb
+
+    async def _loop(self):
+        last_cpu, last_time = None, None
+        while True:
+            try:
+                if self._process is not None:
+                    self.cpu.append(self._process.cpu_percent(None))
+                    self.rss_mb.append(self._process.memory_info().rss / (1024 * 1024))
+                else:
+                    cpu_seconds, rss_mb = self._proc_times()
+                    now = time.perf_counter()
+                    if last_cpu is not None:
+                        self.cpu.append(100.0 * (cpu_seconds - last_cpu) / (now - last_time))
+                    last_cpu, last_time = cpu_seconds, now
+                    self.rss_mb.append(rss_mb)
+            except Exception:
+                # Process exited or is not readable: stop sampling
+                return
+            await asyncio.sleep(self.interval)
+
+    def start(self):
+        if self.pid:
+            self._task = asyncio.create_task(self._loop())
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+
+    def report(self):
+        return {"cpu_percent": summarize(self.cpu), "rss_mb": summarize(self.rss_mb)}
+
+
+# 2. One simulated user
+# ---------------------------------------------------------------------
+
+class SessionResult:
+    def __init__(self):
+        self.ttft = []
+        self.latency = []
+        self.turns = 0
+        self.errors = []
+
+
+class ChainlitSession:
+    """A single Chainlit websocket session that replays a script."""
+
+    def __init__(self, url, script, turn_timeout=120.0):
+        self.url = url.rstrip("/")
+        self.script = list(script)
+        self.turn_timeout = turn_timeout
+        self.session_id = str(uuid.uuid4())
+        self.result = SessionResult()
+        self._answers = [step["answer"] for step in self.script if "answer" in step]
+        self._first_token = None
+        self._turn_done = None
+        self._sent_at = None
+
+    def _reset_turn(self):
+        loop = asyncio.get_running_loop()
+        self._first_token = loop.create_future()
+        self._turn_done = loop.create_future()
+        self._sent_at = time.perf_counter()
+
+    def _mark_token(self):
+        if self._first_token is not None and not self._first_token.done():
+            self._first_token.set_result(time.perf_counter())
+
+    def _bind(self, sio):
+        @sio.on("stream_token")
+        async def on_token(data):
+            self._mark_token()
+
+        @sio.on("new_message")
+        async def on_message(data):
+            if data.get("type") == "assistant_message" and data.get("output"):
+                self._mark_token()
+            if data.get("name") == "System" and str(data.get("output", "")).startswith("❌"):
+                self.result.errors.append(data.get("output")[:200])
+
+        @sio.on("task_end")
+        async def on_task_end(*_):
+            if self._turn_done is not None and not self._turn_done.done():
+                self._turn_done.set_result(time.perf_counter())
+
+        @sio.on("ask")
+        async def on_ask(data):
+            # The prompt ends one turn; answering starts the next one within
+            # the same Chainlit task. Chainlit uses the return value as the answer.
+            now = time.perf_counter()
+            self._record_turn(now)
+            self._sent_at = now
+            self._first_token = asyncio.get_running_loop().create_future()
+            answer = self._answers.pop(0) if self._answers else "Not specified"
+            return {"id": str(uuid.uuid4()), "output": answer, "type": "user_message", "name": "User"}
+
+    def _record_turn(self, finished):
+        first = self._first_token.result() if self._first_token and self._first_token.done() else finished
+        self.result.ttft.append(first - self._sent_at)
+        self.result.latency.append(finished - self._sent_at)
+        self.result.turns += 1
+
+    async def _wait_turn(self):
+        try:
+            finished = await asyncio.wait_for(asyncio.shield(self._turn_done), self.turn_timeout)
+        except asyncio.TimeoutError:
+            self.result.errors.append("turn timeout")
+            return False
+        self._record_turn(finished)
+        return True
+
+    async def run(self):
+        import socketio
+
+        sio = socketio.AsyncClient(reconnection=False)
+        self._bind(sio)
+        auth = {
+            "clientType": "webapp",
+            "sessionId": self.session_id,
+            "threadId": "",
+            "userEnv": "{}",
+            "chatProfile": None,
+        }
+        try:
+            self._reset_turn()
+            await sio.connect(self.url, socketio_path="/ws/socket.io", transports=["websocket"], auth=auth)
+            await sio.emit("connection_successful")
+            # on_chat_start counts as the first turn (welcome message / asks)
+            await self._wait_turn()
+            for step in self.script:
+                if "say" not in step:
+                    continue
+                self._reset_turn()
+                await sio.emit("client_message", {
+                    "message": {
+                        "id": str(uuid.uuid4()),
+                        "threadId": "",
+                        "name": "User",
+                        "type": "user_message",
+                        "output": step["say"],
+                        "createdAt": datetime.datetime.now(datetime.timezone.utc).isoformat(),
+                    },
+                    "fileReferences": [],
+                })
+                if not await self._wait_turn():
+                    break
+        except Exception as e:
+            self.result.errors.append(f"{type(e).__name__}: {e}")
+        finally:
+            try:
+                await sio.disconnect()
+            except Exception:
+                pass
+        return self.result
+
+
+# 3. Test run and report
+# ---------------------------------------------------------------------
+
+def git_commit():
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], text=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+async def run_load(url, script, sessions, ramp_up=0.0, server_pid=None, turn_timeout=120.0):
+    """url / server_pid may be lists (one per worker); sessions are assigned round-robin."""
+    urls = url if isinstance(url, list) else [url]
+    pids = server_pid if isinstance(server_pid, list) else [server_pid]
+    samplers = [ProcessSampler(pid) for pid in pids]
+    for sampler in samplers:
+        sampler.start()
+    started = time.perf_counter()
+
+    async def one(i):
+        if ramp_up:
+            await asyncio.sleep(ramp_up * i / max(1, sessions))
+        return await ChainlitSession(urls[i % len(urls)], script, turn_timeout).run()
+
+    results = await asyncio.gather(*(one(i) for i in range(sessions)))
+    elapsed = time.perf_counter() - started
+    for sampler in samplers:
+        await sampler.stop()
+
+    ttft = [v for r in results for v in r.ttft]
+    latency = [v for r in results for v in r.latency]
+    turns = sum(r.turns for r in results)
+    errors = [e for r in results for e in r.errors]
+    return {
+        "commit": git_commit(),
+        "timestamp": datetime.datetime.now(datetime.timezone.utc).isoformat(),
+        "url": urls[0] if len(urls) == 1 else urls,
+        "workers": len(urls),
+        "sessions": sessions,
+        "elapsed_s": elapsed,
+        "turns": turns,
+        "turns_per_s": turns / elapsed if elapsed else 0.0,
+        "errors": len(errors),
+        "error_rate": len(errors) / max(1, turns + len(errors)),
+        "error_samples": errors[:10],
+        "ttft_s": summarize(ttft),
+        "latency_s": summarize(latency),
+        "server": samplers[0].report(),
+        "worker_servers": [sampler.report() for sampler in samplers] if len(samplers) > 1 else [],
+    }
+
+
+def compare(report, baseline):
+    """Prints p50/p95 deltas against a baseline report."""
+    print(f"\n📈 Compared with {baseline.get('commit')}:")
+    for metric in ("ttft_s", "latency_s"):
+        for q in ("p50", "p95", "p99"):
+            old, new = baseline[metric][q], report[metric][q]
+            change = ((new - old) / old * 100) if old else 0.0
+            print(f"  {metric:<10} {q}: {old:.3f}s -> {new:.3f}s ({change:+.1f}%)")
+    print(f"  error_rate: {baseline['error_rate']:.2%} -> {report['error_rate']:.2%}")
+    print(f"  turns/s:    {baseline['turns_per_s']:.2f} -> {report['turns_per_s']:.2f}")
+
+
+def print_report(report):
+    print("\n" + "=" * 50)
+    print(f"🚀 Load test @ {report['commit']} - {report['sessions']} sessions on {report.get('workers', 1)} worker(s), "
+          f"{report['turns']} turns in {report['elapsed_s']:.1f}s ({report['turns_per_s']:.2f} turns/s)")
+    print("=" * 50)
+    for metric in ("ttft_s", "latency_s"):
+        s = report[metric]
+        print(f"{metric:<10} p50={s['p50']:.3f} p95={s['p95']:.3f} p99={s['p99']:.3f} max={s['max']:.3f}")
+    print(f"errors     {report['errors']} ({report['error_rate']:.2%})")
+    cpu, rss = report["server"]["cpu_percent"], report["server"]["rss_mb"]
+    if cpu["count"]:
+        print(f"server     cpu mean={cpu['mean']:.0f}% max={cpu['max']:.0f}% | rss max={rss['max']:.0f} MB")
+
+
+def wait_for_port(url, timeout=60.0):
+    import urllib.request
+
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            urllib.request.urlopen(url, timeout=1)
+            return True
+        except Exception:
+            time.sleep(0.5)
+    return False
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load test a Chainlit app over websockets")
+    parser.add_argument("--url", default="http://localhost:8000")
+    parser.add_argument("--app", help="Chainlit app to start (chainlit run <app>) for the duration of the test")
+    parser.add_argument("--mock", action="store_true", help="point the started app at an in-process mock backend")
+    parser.add_argument("--mock-config", help="JSON file with mock backend settings")
+    parser.add_argument("--workers", type=int, default=1, help="Chainlit processes to start on consecutive ports (with --app)")
+    parser.add_argument("--script", default="ex1-s2", choices=sorted(SCRIPTS))
+    parser.add_argument("--sessions", type=int, default=10)
+    parser.add_argument("--ramp-up", type=float, default=2.0, help="seconds over which sessions are started")
+    parser.add_argument("--turn-timeout", type=float, default=120.0)
+    parser.add_argument("--server-pid", type=int, help="pid of an already running Chainlit server to sample")
+    parser.add_argument("--out", help="report path (default loadtest-results/<commit>-<script>.json)")
+    parser.add_argument("--compare", help="previous report to compare against")
+    args = parser.parse_args()
+
+    backend = None
+    servers = []
+    urls = [args.url]
+    server_pid = args.server_pid
+    try:
+        if args.app:
+            env = dict(os.environ)
+            if args.mock:
+                from shared.mock_backend import MockBackend
+
+                mock_config = {}
+                if args.mock_config:
+                    with open(args.mock_config, "r") as f:
+                        mock_config = json.load(f)
+                backend = MockBackend(mock_config).start()
+                env.update({
+                    "AZURE_OPENAI_ENDPOINT": backend.url,
+                    "AZURE_OPENAI_API_KEY": "mock",
+                    "AZURE_OPENAI_API_VERSION": "2024-10-21",
+                    "AZURE_OPENAI_DEPLOYMENT_NAME": env.get("AZURE_OPENAI_DEPLOYMENT_NAME", "mock-deployment"),
+                    "AI_FOUNDRY_ENDPOINT": backend.url + "api/projects/mock",
+                    "AI_FOUNDRY_DEPLOYMENT_NAME": env.get("AI_FOUNDRY_DEPLOYMENT_NAME", "mock-deployment"),
+                    # The EX2 apps then build their project client with mock_project_client:
+                    # a mock token over http instead of Entra ID credentials
+                    "AI_FOUNDRY_MOCK": "1",
+                })
+            if args.workers > 1:
+                # Workers only share conversations through an out-of-process session backend
+                env.setdefault("SESSION_BACKEND", "sqlite")
+            base, port = args.url.rstrip("/").rsplit(":", 1)
+            urls = [f"{base}:{int(port) + i}" for i in range(args.workers)]
+            app_dir = os.path.dirname(os.path.abspath(args.app))
+            for url in urls:
+                servers.append(subprocess.Popen(
+                    [sys.executable, "-m", "chainlit", "run", os.path.basename(args.app), "--headless",
+                     "--port", url.rsplit(":", 1)[-1]],
+                    cwd=app_dir,
+                    env=env,
+                ))
+            server_pid = [server.pid for server in servers]
+            for url in urls:
+                if not wait_for_port(url):
+                    print(f"❌ {args.app} did not start on {url}")
+                    return 1
+
+        report = asyncio.run(run_load(
+            urls, SCRIPTS[args.script], args.sessions, args.ramp_up, server_pid, args.turn_timeout
+        ))
+        report["script"] = args.script
+        if backend is not None:
+            report["mock_stats"] = dict(backend.state.stats)
+        print_report(report)
+
+        out = args.out or os.path.join(RESULTS_DIR, f"{report['commit']}-{args.script}.json")
+        os.makedirs(os.path.dirname(out) or ".", exist_ok=True)
+        with open(out, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"\n💾 Report saved to {out}")
+
+        if args.compare:
+            with open(args.compare, "r") as f:
+                compare(report, json.load(f))
+        return 0
+    finally:
+        for server in servers:
+            server.terminate()
+            server.wait(timeout=10)
+        if backend is not None:
+            backend.stop()
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,799 @@
+"""
+Offline mock backend for Azure OpenAI and Azure AI Foundry Agents
+-----------------------------------------------------------------
+A local stand-in server so the samples, load tests and benchmarks run without
+Azure. Responses are deterministic for a given seed and prompt.
+
+Implemented endpoints (any path prefix is accepted, so both the AzureOpenAI
+client and the OpenAI client with a base_url work):
+
+- POST .../chat/completions                 streaming (SSE) and non-streaming
+- POST .../embeddings                       deterministic vectors, one or many inputs
+- POST .../assistants, GET/POST/DELETE .../assistants/{id}
+- POST .../threads, GET/DELETE .../threads/{id}
+- POST/GET .../threads/{id}/messages
+- POST/GET .../threads/{id}/runs, GET .../threads/{id}/runs/{run_id}
+- POST .../threads/{id}/runs/{run_id}/submit_tool_outputs and /cancel
+- GET .../threads/{id}/runs/{run_id}/steps
+- GET /mock/stats, POST /mock/config, POST /mock/reset
+
+Behaviour knobs (see DEFAULT_CONFIG): latency distribution, time to first
+token, tokens per second, straggler injection, 429 injection with
+Retry-After, scripted tool calls and a simulated prompt-prefix cache.
+Random draws come from a generator seeded per request (seed, request hash and
+how often that request was seen): the nth identical request always gets the
+same latency, straggler and 429 draws, whatever the thread interleaving.
+Lists (`order=asc|desc`) are ordered by creation, also within one second.
+
+The server speaks plain http. The azure SDKs refuse bearer tokens over http,
+so agent clients are built with `mock_project_client()`, which sends a
+`MockCredential` token with the SDK's `enforce_https` check turned off.
+
+Run it:
+    python -m shared.mock_backend --port 8089 --config mock.json
+Point the samples at it:
+    AZURE_OPENAI_ENDPOINT=http://127.0.0.1:8089/
+    AZURE_OPENAI_API_KEY=mock
+    AI_FOUNDRY_ENDPOINT=http://127.0.0.1:8089/api/projects/mock
+Or in-process:
+    with MockBackend({"ttft": {"dist": "fixed", "value": 0.05}}) as backend:
+        client = AzureOpenAI(azure_endpoint=backend.url, api_key="mock", api_version="2024-10-21")
+        project = mock_project_client(backend.url + "api/projects/mock")
+Check an AIProjectClient round-trip (agent, thread, message, run) against it:
+    python -m shared.mock_backend --check
+"""
+import argparse
+import copy
+import hashlib
+import itertools
+import json
+import math
+import random
+import re
+import sys
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+DEFAULT_CONFIG = {
+    "seed": 1234,
+    # Time to first token, seconds. dist: fixed | uniform | lognormal
+    "ttft": {"dist": "lognormal", "median": 0.25, "sigma": 0.3},
+    # Generation speed
+    "tokens_per_sec": 60.0,
+    # Completion length when the request does not cap it lower
+    "completion_tokens": {"min": 30, "max": 120},
+    # Share of requests that are slowed down by straggler_factor
+    "straggler_rate": 0.0,
+    "straggler_factor": 8.0,
+    # Share of requests rejected with HTTP 429
+    "rate_limit_rate": 0.0,
+    "retry_after": 1,
+    # Embeddings: request latency (grows by embedding_seconds_per_input per input), vector size, inputs per request
+    "embedding_latency": {"dist": "lognormal", "median": 0.04, "sigma": 0.2},
+    "embedding_seconds_per_input": 0.0002,
+    "embedding_dim": 256,
+    "embedding_max_inputs": 2048,
+    # Agents control plane: latency of each create/get/update/delete agent and thread create
+    "agents_api_seconds": 0.0,
+    # Agent runs: seconds spent in "queued" and "in_progress"
+    "run_queue_seconds": 0.05,
+    "run_seconds": 0.3,
+    # Scripted tool calls: when the last user message matches "match" (regex),
+    # the model calls "name" with "arguments" before answering
+    "tool_calls": [
+        {"match": "(?i)weather", "name": "fetch_weather", "arguments": {"location": "Barcelona"}},
+    ],
+    # Simulated prompt caching: prompts sharing a prefix of at least
+    # cache_min_tokens report cached tokens in blocks of cache_block_tokens
+    "cache_min_tokens": 1024,
+    "cache_block_tokens": 128,
+}
+
+WORDS = (
+    "barcelona sagrada familia park guell gothic quarter tapas beach museum walk metro "
+    "azure agent model token stream thread run tool deployment latency cache answer "
+    "visit local market architecture gaudi evening sunset plan budget ticket tour"
+).split()
+
+
+def estimate_tokens(text):
+    """Rough token count (about 4 characters per token)."""
+    return max(1, math.ceil(len(text) / 4)) if text else 0
+
+
+def _now():
+    return int(time.time())
+
+
+# Creation order of agents, threads, messages and run steps; breaks created_at ties
+_sequence = itertools.count()
+
+
+def _new_id(prefix):
+    return f"{prefix}_{uuid.uuid4().hex[:24]}"
+
+
+def _message_text(content):
+    if isinstance(content, str):
+        return content
+    if isinstance(content, list):
+        parts = []
+        for part in content:
+            if isinstance(part, dict):
+                text = part.get("text")
+                parts.append(text.get("value", "") if isinstance(text, dict) else (text or ""))
+        return "".join(parts)
+    return ""
+
+
+# 1. Simulation state
+# ---------------------------------------------------------------------
+
+class MockState:
+    def __init__(self, config=None):
+        # Re-entrant: the agent handlers hold it while they count and draw
+        self.lock = threading.RLock()
+        self.configure(config or {})
+
+    def configure(self, config):
+        with self.lock:
+            merged = copy.deepcopy(DEFAULT_CONFIG)
+            merged.update(config)
+            self.config = merged
+            self.seen = {}      # {request hash: times seen}, for per-request generators
+            self.assistants = {}
+            self.threads = {}
+            self.messages = {}  # {thread_id: [message]}
+            self.runs = {}      # {run_id: run}
+            self.prefix_blocks = set()
+            self.stats = {"requests": 0, "chat": 0, "streams": 0, "embeddings": 0, "embedding_inputs": 0, "rate_limited": 0, "agent_runs": 0, "in_flight": 0, "max_in_flight": 0}
+
+    def request_rng(self, method, path, body):
+        """Generator for one request, seeded from the seed, the request and how often it was seen."""
+        canonical = json.dumps([method, path, body], sort_keys=True, separators=(",", ":"), default=str)
+        key = hashlib.sha1(canonical.encode("utf-8")).hexdigest()
+        with self.lock:
+            seen = self.seen[key] = self.seen.get(key, 0) + 1
+        return random.Random(f"{self.config['seed']}:{key}:{seen}")
+
+    @staticmethod
+    def sample(spec, rng):
+        dist = spec.get("dist", "fixed")
+        if dist == "uniform":
+            return rng.uniform(spec["low"], spec["high"])
+        if dist == "lognormal":
+            return spec["median"] * math.exp(rng.gauss(0, spec.get("sigma", 0.3)))
+        return spec.get("value", 0.0)
+
+    @staticmethod
+    def chance(rate, rng):
+        return rate > 0 and rng.random() < rate
+
+    def count(self, key, delta=1):
+        with self.lock:
+            self.stats[key] += delta
+            if key == "in_flight":
+                self.stats["max_in_flight"] = max(self.stats["max_in_flight"], self.stats["in_flight"])
+
+    def cached_tokens(self, prompt_text):
+        """Longest previously seen prefix, in whole cache blocks (like provider prompt caching)."""
+        block_chars = self.config["cache_block_tokens"] * 4
+        blocks = len(prompt_text) // block_chars
+        cached = 0
+        with self.lock:
+            digest = hashlib.sha1()
+            for i in range(blocks):
+                digest.update(prompt_text[i * block_chars:(i + 1) * block_chars].encode("utf-8"))
+                key = digest.copy().hexdigest()
+                if key in self.prefix_blocks and cached == i:
+                    cached = i + 1
+                self.prefix_blocks.add(key)
+        tokens = cached * self.config["cache_block_tokens"]
+        return tokens if tokens >= self.config["cache_min_tokens"] else 0
+
+    def completion_words(self, prompt_text, limit=None):
+        bounds = self.config["completion_tokens"]
+        local = random.Random(f"{self.config['seed']}:{prompt_text}")
+        count = local.randint(bounds["min"], bounds["max"])
+        if limit:
+            count = min(count, int(limit))
+        return [local.choice(WORDS) for _ in range(count)]
+
+    def scripted_tool_call(self, text):
+        for rule in self.config.get("tool_calls", []):
+            if re.search(rule["match"], text or ""):
+                return rule
+        return None
+
+
+# 2. Chat completions and embeddings
+# ---------------------------------------------------------------------
+
+def _chat_tool_call(state, messages):
+    """A scripted tool call when the last message is a matching user message."""
+    if not messages or messages[-1].get("role") != "user":
+        return None
+    return state.scripted_tool_call(_message_text(messages[-1].get("content")))
+
+
+def _chat_timing(state, rng):
+    ttft = state.sample(state.config["ttft"], rng)
+    tps = max(1.0, float(state.config["tokens_per_sec"]))
+    if state.chance(state.config["straggler_rate"], rng):
+        ttft *= state.config["straggler_factor"]
+        tps /= state.config["straggler_factor"]
+    return ttft, tps
+
+
+def handle_chat(handler, state, body, deployment):
+    messages = body.get("messages", [])
+    prompt_text = json.dumps(messages, separators=(",", ":"))
+    prompt_tokens = estimate_tokens(prompt_text)
+    cached = state.cached_tokens(prompt_text)
+    limit = body.get("max_completion_tokens") or body.get("max_tokens")
+    model = body.get("model") or deployment or "mock-model"
+    completion_id = _new_id("chatcmpl")
+    tool_rule = _chat_tool_call(state, messages) if body.get("tools") else None
+    words = [] if tool_rule else state.completion_words(prompt_text, limit)
+    usage = {
+        "prompt_tokens": prompt_tokens,
+        "completion_tokens": len(words) or 10,
+        "total_tokens": prompt_tokens + (len(words) or 10),
+        "prompt_tokens_details": {"cached_tokens": cached},
+    }
+    ttft, tps = _chat_timing(state, handler.rng)
+    state.count("chat")
+
+    tool_calls = None
+    if tool_rule:
+        tool_calls = [{
+            "id": _new_id("call"),
+            "type": "function",
+            "function": {"name": tool_rule["name"], "arguments": json.dumps(tool_rule.get("arguments", {}))},
+        }]
+
+    if not body.get("stream"):
+        time.sleep(ttft + len(words) / tps)
+        message = {"role": "assistant", "content": None if tool_calls else " ".join(words)}
+        if tool_calls:
+            message["tool_calls"] = tool_calls
+        handler.send_json(200, {
+            "id": completion_id,
+            "object": "chat.completion",
+            "created": _now(),
+            "model": model,
+            "choices": [{"index": 0, "message": message, "finish_reason": "tool_calls" if tool_calls else "stop"}],
+            "usage": usage,
+        })
+        return
+
+    state.count("streams")
+    handler.start_sse()
+
+    def chunk(delta, finish_reason=None, with_usage=False):
+        payload = {
+            "id": completion_id,
+            "object": "chat.completion.chunk",
+            "created": _now(),
+            "model": model,
+            "choices": [{"index": 0, "delta": delta, "finish_reason": finish_reason}],
+        }
+        if with_usage:
+            payload["choices"] = []
+            payload["usage"] = usage
+        handler.send_sse(payload)
+
+    time.sleep(ttft)
+    chunk({"role": "assistant", "content": ""})
+    if tool_calls:
+        call = dict(tool_calls[0], index=0)
+        chunk({"tool_calls": [call]})
+        chunk({}, "tool_calls")
+    else:
+        for i, word in enumerate(words):
+            chunk({"content": word if i == 0 else " " + word})
+            time.sleep(1 / tps)
+        chunk({}, "stop")
+    if (body.get("stream_options") or {}).get("include_usage"):
+        chunk({}, with_usage=True)
+    handler.send_sse_done()
+
+
+def _embedding(text, dim):
+    """Unit vector derived from the text's hash (same text, same vector)."""
+    vector = [b - 127.5 for b in hashlib.shake_256(text.encode("utf-8")).digest(dim)]
+    norm = math.sqrt(sum(v * v for v in vector))
+    return [round(v / norm, 5) for v in vector]
+
+
+def handle_embeddings(handler, state, body, deployment):
+    inputs = body.get("input", [])
+    inputs = [inputs] if isinstance(inputs, str) else list(inputs)
+    config = state.config
+    if not inputs or len(inputs) > config["embedding_max_inputs"]:
+        return handler.send_json(400, _error(f"input must have 1 to {config['embedding_max_inputs']} items", "invalid_request"))
+    dim = int(body.get("dimensions") or config["embedding_dim"])
+    state.count("embeddings")
+    state.count("embedding_inputs", len(inputs))
+    time.sleep(state.sample(config["embedding_latency"], handler.rng) + config["embedding_seconds_per_input"] * len(inputs))
+    tokens = sum(estimate_tokens(text) for text in inputs)
+    handler.send_json(200, {
+        "object": "list",
+        "data": [{"object": "embedding", "index": i, "embedding": _embedding(text, dim)} for i, text in enumerate(inputs)],
+        "model": body.get("model") or deployment or "mock-embedding",
+        "usage": {"prompt_tokens": tokens, "total_tokens": tokens},
+    })
+
+
+# 3. Agents (assistants / threads / messages / runs / run steps)
+# ---------------------------------------------------------------------
+
+def _agent_message(thread_id, role, text, assistant_id=None, run_id=None):
+    return {
+        "id": _new_id("msg"),
+        "object": "thread.message",
+        "created_at": _now(),
+        "_seq": next(_sequence),
+        "thread_id": thread_id,
+        "role": role,
+        "content": [{"type": "text", "text": {"value": text, "annotations": []}}],
+        "assistant_id": assistant_id,
+        "run_id": run_id,
+        "attachments": [],
+        "metadata": {},
+        "status": "completed",
+    }
+
+
+def _list_page(items, query):
+    order = (query.get("order") or ["desc"])[0]
+    items = sorted(items, key=lambda item: (item["created_at"], item["_seq"]), reverse=(order == "desc"))
+    limit = int((query.get("limit") or ["20"])[0])
+    after = (query.get("after") or [None])[0]
+    if after:
+        ids = [item["id"] for item in items]
+        if after in ids:
+            items = items[ids.index(after) + 1:]
+    page = [_public(item) for item in items[:limit]]
+    return {
+        "object": "list",
+        "data": page,
+        "first_id": page[0]["id"] if page else None,
+        "last_id": page[-1]["id"] if page else None,
+        "has_more": len(items) > limit,
+    }
+
+
+def _advance_run(state, run):
+    """Moves a run along its lifecycle based on elapsed time."""
+    if run["status"] in ("completed", "failed", "cancelled", "expired", "requires_action"):
+        return run
+    elapsed = time.time() - run["_started"]
+    config = state.config
+    if elapsed < config["run_queue_seconds"]:
+        run["status"] = "queued"
+        return run
+    if elapsed < config["run_queue_seconds"] + run["_duration"]:
+        run["status"] = "in_progress"
+        return run
+    thread_messages = state.messages.get(run["thread_id"], [])
+    last_user = next((m for m in reversed(thread_messages) if m["role"] == "user"), None)
+    rule = state.scripted_tool_call(_message_text(last_user["content"]) if last_user else "")
+    if rule and not run["_tool_outputs"] and run["tools"]:
+        call_id = _new_id("call")
+        run["status"] = "requires_action"
+        run["required_action"] = {
+            "type": "submit_tool_outputs",
+            "submit_tool_outputs": {"tool_calls": [{
+                "id": call_id,
+                "type": "function",
+                "function": {"name": rule["name"], "arguments": json.dumps(rule.get("arguments", {}))},
+            }]},
+        }
+        run["_steps"].append(_run_step(run, "tool_calls", {"type": "tool_calls", "tool_calls": [
+            {"id": call_id, "type": "function", "function": {"name": rule["name"], "arguments": json.dumps(rule.get("arguments", {})), "output": None}}
+        ]}))
+        return run
+    prompt = json.dumps([_message_text(m["content"]) for m in thread_messages] + run["_tool_outputs"])
+    text = " ".join(state.completion_words(prompt))
+    message = _agent_message(run["thread_id"], "assistant", text, run["assistant_id"], run["id"])
+    thread_messages.append(message)
+    run["_steps"].append(_run_step(run, "message_creation", {"type": "message_creation", "message_creation": {"message_id": message["id"]}}))
+    run["status"] = "completed"
+    run["completed_at"] = _now()
+    prompt_tokens = estimate_tokens(prompt)
+    run["usage"] = {"prompt_tokens": prompt_tokens, "completion_tokens": estimate_tokens(text), "total_tokens": prompt_tokens + estimate_tokens(text)}
+    return run
+
+
+def _run_step(run, step_type, details):
+    return {
+        "id": _new_id("step"),
+        "object": "thread.run.step",
+        "created_at": _now(),
+        "_seq": next(_sequence),
+        "run_id": run["id"],
+        "assistant_id": run["assistant_id"],
+        "thread_id": run["thread_id"],
+        "type": step_type,
+        "status": "completed",
+        "step_details": details,
+    }
+
+
+def _public(run):
+    return {k: v for k, v in run.items() if not k.startswith("_")}
+
+
+def handle_agents(handler, state, method, parts, query, body):
+    """Dispatches agent endpoints; parts is the path split after the last 'assistants'/'threads'."""
+    if parts[0] == "assistants" or parts == ["threads"]:
+        time.sleep(state.config["agents_api_seconds"])
+    # Agents, threads, messages and runs are shared by the server threads: change them under the lock
+    with state.lock:
+        status, payload = _agents_response(state, method, parts, query, body, handler.rng)
+    handler.send_json(status, payload)
+
+
+def _agents_response(state, method, parts, query, body, rng):
+    """(status, payload) of an agents request; called with state.lock held."""
+    kind = parts[0]
+    if kind == "assistants":
+        if method == "POST" and len(parts) == 1:
+            agent = {
+                "id": _new_id("asst"),
+                "object": "assistant",
+                "created_at": _now(),
+                "_seq": next(_sequence),
+                "name": body.get("name"),
+                "model": body.get("model"),
+                "instructions": body.get("instructions"),
+                "tools": body.get("tools") or [],
+                "metadata": body.get("metadata") or {},
+            }
+            state.assistants[agent["id"]] = agent
+            return 200, _public(agent)
+        if method == "GET" and len(parts) == 1:
+            return 200, _list_page(list(state.assistants.values()), query)
+        agent_id = parts[1]
+        if method == "GET":
+            return (200, _public(state.assistants[agent_id])) if agent_id in state.assistants else (404, _error("agent not found"))
+        if method == "POST":
+            if agent_id not in state.assistants:
+                return 404, _error("agent not found")
+            agent = state.assistants[agent_id]
+            for field in ("name", "model", "instructions", "tools", "metadata"):
+                if field in body:
+                    agent[field] = body[field]
+            return 200, _public(agent)
+        if method == "DELETE":
+            state.assistants.pop(agent_id, None)
+            return 200, {"id": agent_id, "object": "assistant.deleted", "deleted": True}
+
+    if kind == "threads":
+        if method == "POST" and len(parts) == 1:
+            thread = {"id": _new_id("thread"), "object": "thread", "created_at": _now(), "_seq": next(_sequence), "metadata": body.get("metadata") or {}}
+            state.threads[thread["id"]] = thread
+            state.messages[thread["id"]] = []
+            for item in body.get("messages") or []:
+                state.messages[thread["id"]].append(_agent_message(thread["id"], item.get("role", "user"), _message_text(item.get("content"))))
+            return 200, _public(thread)
+        thread_id = parts[1]
+        if thread_id not in state.threads:
+            return 404, _error("thread not found")
+        if len(parts) == 2:
+            if method == "DELETE":
+                state.threads.pop(thread_id, None)
+                state.messages.pop(thread_id, None)
+                return 200, {"id": thread_id, "object": "thread.deleted", "deleted": True}
+            return 200, _public(state.threads[thread_id])
+        if parts[2] == "messages":
+            if method == "POST":
+                message = _agent_message(thread_id, body.get("role", "user"), _message_text(body.get("content")))
+                state.messages[thread_id].append(message)
+                return 200, _public(message)
+            return 200, _list_page(state.messages[thread_id], query)
+        if parts[2] == "runs":
+            if method == "GET" and len(parts) == 3:
+                runs = [_advance_run(state, run) for run in state.runs.values() if run["thread_id"] == thread_id]
+                return 200, _list_page(runs, query)
+            if method == "POST" and len(parts) == 3:
+                agent = state.assistants.get(body.get("assistant_id"), {})
+                ttft, tps = _chat_timing(state, rng)
+                run = {
+                    "id": _new_id("run"),
+                    "object": "thread.run",
+                    "created_at": _now(),
+                    "_seq": next(_sequence),
+                    "thread_id": thread_id,
+                    "assistant_id": body.get("assistant_id"),
+                    "status": "queued",
+                    "model": body.get("model") or agent.get("model"),
+                    "instructions": body.get("instructions") or agent.get("instructions"),
+                    "additional_instructions": body.get("additional_instructions"),
+                    "tools": body.get("tools") or agent.get("tools") or [],
+                    "required_action": None,
+                    "last_error": None,
+                    "metadata": body.get("metadata") or {},
+                    "_started": time.time(),
+                    "_duration": max(state.config["run_seconds"], ttft),
+                    "_tool_outputs": [],
+                    "_steps": [],
+                }
+                for item in body.get("additional_messages") or []:
+                    state.messages[thread_id].append(_agent_message(thread_id, item.get("role", "user"), _message_text(item.get("content"))))
+                state.runs[run["id"]] = run
+                state.count("agent_runs")
+                return 200, _public(run)
+            if len(parts) == 3:
+                return 405, _error(f"{method} is not supported on /threads/{thread_id}/runs", "MethodNotAllowed")
+            run = state.runs.get(parts[3])
+            if run is None:
+                return 404, _error("run not found")
+            if len(parts) == 4:
+                return 200, _public(_advance_run(state, run))
+            action = parts[4]
+            if action == "submit_tool_outputs":
+                run["_tool_outputs"].extend(o.get("output", "") for o in body.get("tool_outputs") or [])
+                run["_tool_outputs"].extend(json.dumps(a) for a in body.get("tool_approvals") or [])
+                run["status"] = "in_progress"
+                run["required_action"] = None
+                run["_started"] = time.time() - state.config["run_queue_seconds"]
+                return 200, _public(run)
+            if action == "cancel":
+                run["status"] = "cancelled"
+                return 200, _public(run)
+            if action == "steps":
+                _advance_run(state, run)
+                return 200, _list_page(run["_steps"], query)
+    return 404, _error(f"unsupported agents path /{'/'.join(parts)}")
+
+
+def _error(message, code="NotFound"):
+    return {"error": {"code": code, "message": message}}
+
+
+# 4. HTTP plumbing
+# ---------------------------------------------------------------------
+
+class MockHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    server_version = "MockAzureOpenAI/1.0"
+
+    @property
+    def state(self):
+        return self.server.state
+
+    def log_message(self, format, *args):
+        if self.server.verbose:
+            super().log_message(format, *args)
+
+    def send_json(self, status, payload, headers=None):
+        data = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        for key, value in (headers or {}).items():
+            self.send_header(key, value)
+        self.end_headers()
+        self.wfile.write(data)
+
+    def start_sse(self):
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Cache-Control", "no-cache")
+        self.send_header("Connection", "close")
+        self.end_headers()
+        self.close_connection = True
+
+    def send_sse(self, payload):
+        self.wfile.write(b"data: " + json.dumps(payload, separators=(",", ":")).encode("utf-8") + b"\n\n")
+        self.wfile.flush()
+
+    def send_sse_done(self):
+        self.wfile.write(b"data: [DONE]\n\n")
+        self.wfile.flush()
+
+    def _body(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        if not length:
+            return {}
+        try:
+            return json.loads(self.rfile.read(length) or b"{}")
+        except ValueError:
+            return {}
+
+    def _dispatch(self, method):
+        state = self.state
+        url = urlparse(self.path)
+        query = parse_qs(url.query)
+        parts = [p for p in url.path.split("/") if p]
+        body = self._body() if method in ("POST", "PUT") else {}
+        state.count("requests")
+        state.count("in_flight")
+        try:
+            if parts[:1] == ["mock"]:
+                return self._control(method, parts[1:], body)
+            # Every random draw for this request comes from its own generator
+            self.rng = state.request_rng(method, url.path, body)
+            if state.chance(state.config["rate_limit_rate"], self.rng):
+                state.count("rate_limited")
+                retry_after = str(state.config["retry_after"])
+                return self.send_json(429, _error("Rate limit is exceeded. Try again later.", "429"), {"Retry-After": retry_after})
+            if parts[-2:] == ["chat", "completions"]:
+                deployment = parts[parts.index("deployments") + 1] if "deployments" in parts else None
+                return handle_chat(self, state, body, deployment)
+            if parts[-1:] == ["embeddings"] and method == "POST":
+                deployment = parts[parts.index("deployments") + 1] if "deployments" in parts else None
+                return handle_embeddings(self, state, body, deployment)
+            for anchor in ("threads", "assistants"):
+                if anchor in parts:
+                    return handle_agents(self, state, method, parts[parts.index(anchor):], query, body)
+            return self.send_json(404, _error(f"unknown path {url.path}"))
+        except (BrokenPipeError, ConnectionResetError):
+            # Client went away mid-stream (e.g. a cancelled hedge request)
+            self.close_connection = True
+        finally:
+            state.count("in_flight", -1)
+
+    def _control(self, method, parts, body):
+        if parts == ["stats"]:
+            return self.send_json(200, self.state.stats)
+        if parts == ["config"] and method == "POST":
+            self.state.configure(body)
+            return self.send_json(200, self.state.config)
+        if parts == ["config"]:
+            return self.send_json(200, self.state.config)
+        if parts == ["reset"]:
+            self.state.configure(self.state.config)
+            return self.send_json(200, {"reset": True})
+        return self.send_json(404, _error("unknown control path"))
+
+    def do_GET(self):
+        self._dispatch("GET")
+
+    def do_POST(self):
+        self._dispatch("POST")
+
+    def do_PUT(self):
+        self._dispatch("PUT")
+
+    def do_DELETE(self):
+        self._dispatch("DELETE")
+
+
+class MockServer(ThreadingHTTPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+    # Many concurrent callers (load tests, per-text embeddings) overflow the default backlog of 5
+    request_queue_size = 128
+
+    def __init__(self, address, config=None, verbose=False):
+        super().__init__(address, MockHandler)
+        self.state = MockState(config)
+        self.verbose = verbose
+
+
+class MockBackend:
+    """Runs the mock server on a background thread; usable as a context manager."""
+
+    def __init__(self, config=None, host="127.0.0.1", port=0, verbose=False):
+        self.server = MockServer((host, port), config, verbose)
+        self.thread = None
+
+    @property
+    def url(self):
+        host, port = self.server.server_address[:2]
+        return f"http://{host}:{port}/"
+
+    @property
+    def state(self):
+        return self.server.state
+
+    def start(self):
+        self.thread = threading.Thread(target=self.server.serve_forever, name="mock-backend", daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+
+# 5. Azure SDK clients for the mock
+# ---------------------------------------------------------------------
+
+class MockCredential:
+    """Token credential for the mock backend, which accepts any bearer token."""
+
+    def get_token(self, *scopes, **kwargs):
+        from azure.core.credentials import AccessToken
+
+        return AccessToken("mock", int(time.time()) + 3600)
+
+
+def mock_project_client(endpoint, **kwargs):
+    """
+    AIProjectClient for the mock backend at endpoint (".../api/projects/mock").
+    Its bearer policy turns off the SDK's https-only check for these requests,
+    so the token travels over the mock's plain http; `project.agents` inherits it.
+    """
+    from azure.ai.projects import AIProjectClient
+    from azure.core.pipeline.policies import BearerTokenCredentialPolicy
+
+    class HttpBearerTokenPolicy(BearerTokenCredentialPolicy):
+        def on_request(self, request):
+            request.context["enforce_https"] = False
+            return super().on_request(request)
+
+    credential = MockCredential()
+    kwargs.setdefault("authentication_policy", HttpBearerTokenPolicy(credential, "https://ai.azure.com/.default"))
+    return AIProjectClient(endpoint=endpoint, credential=credential, **kwargs)
+
+
+def check():
+    """One AIProjectClient round-trip against an in-process mock: agent, thread, messages, run."""
+    from azure.ai.agents.models import ListSortOrder
+
+    config = {"ttft": {"dist": "fixed", "value": 0.01}, "run_queue_seconds": 0.01, "run_seconds": 0.05}
+    with MockBackend(config) as backend:
+        project = mock_project_client(backend.url + "api/projects/mock")
+        agent = project.agents.create_agent(model="mock-deployment", name="mock-check", instructions="Be brief.")
+        thread = project.agents.threads.create()
+        for text in ("first question", "second question"):
+            project.agents.messages.create(thread_id=thread.id, role="user", content=text)
+        run = project.agents.runs.create_and_process(thread_id=thread.id, agent_id=agent.id)
+        newest = list(project.agents.messages.list(thread_id=thread.id, order=ListSortOrder.DESCENDING))
+        oldest = list(project.agents.messages.list(thread_id=thread.id, order=ListSortOrder.ASCENDING))
+        project.agents.threads.delete(thread.id)
+        project.agents.delete_agent(agent.id)
+
+    roles = [str(message.role.value) for message in newest]
+    ok = (
+        run.status == "completed"
+        and roles[:1] == ["assistant"]
+        and [m.id for m in oldest] == [m.id for m in reversed(newest)]
+        and oldest[0].text_messages[0].text.value == "first question"
+    )
+    print(f"{'✅' if ok else '❌'} AIProjectClient round-trip: run {run.status.value}, {len(newest)} messages, newest first: {roles}")
+    return 0 if ok else 1
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Offline mock of Azure OpenAI chat completions and Foundry Agents")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8089)
+    parser.add_argument("--config", help="JSON file overriding DEFAULT_CONFIG")
+    parser.add_argument("--verbose", action="store_true", help="log every request")
+    parser.add_argument("--check", action="store_true", help="run an AIProjectClient round-trip against an in-process mock and exit")
+    args = parser.parse_args()
+    if args.check:
+        return check()
+
+    config = {}
+    if args.config:
+        with open(args.config, "r") as f:
+            config = json.load(f)
+    server = MockServer((args.host, args.port), config, args.verbose)
+    print(f"🧪 Mock backend listening on http://{args.host}:{args.port}/")
+    print(f"   AZURE_OPENAI_ENDPOINT=http://{args.host}:{args.port}/")
+    print(f"   AI_FOUNDRY_ENDPOINT=http://{args.host}:{args.port}/api/projects/mock")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    sys.exit(main())
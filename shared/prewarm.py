@@ -0,0 +1,50 @@
+"""
+Speculative pre-warming of blocking setup work
+----------------------------------------------
+Session setup (creating agents, threads, clients) is a chain of blocking SDK
+calls. `Prewarm` starts such work in a worker thread as early as possible, for
+example while the user is still reading or answering a question, and only
+awaits it when the result is needed:
+
+    setup = Prewarm("agent+thread", create_agent_and_thread)
+    destination = await cl.AskUserMessage(...).send()     # user think time
+    agent_id, thread_id = await setup.result()            # usually already done
+    print(setup.report())                                 # "agent+thread: 1.84s, waited 0.00s (1.84s hidden)"
+"""
+import asyncio
+import time
+
+
+class Prewarm:
+    """Runs fn(*args, **kwargs) in a thread right away; await result() when needed."""
+
+    def __init__(self, name, fn, *args, **kwargs):
+        self.name = name
+        self.started = time.perf_counter()
+        self.finished = None
+        self.waited = 0.0
+        self.task = asyncio.create_task(self._run(fn, args, kwargs))
+
+    async def _run(self, fn, args, kwargs):
+        try:
+            return await asyncio.to_thread(fn, *args, **kwargs)
+        finally:
+            self.finished = time.perf_counter()
+
+    def done(self):
+        return self.task.done()
+
+    async def result(self):
+        """The function's return value (re-raises its exception)."""
+        started = time.perf_counter()
+        try:
+            return await self.task
+        finally:
+            self.waited += time.perf_counter() - started
+
+    def duration(self):
+        return ((self.finished or time.perf_counter()) - self.started)
+
+    def report(self):
+        duration = self.duration()
+        return f"{self.name}: {duration:.2f}s, waited {self.waited:.2f}s ({max(0.0, duration - self.waited):.2f}s hidden)"
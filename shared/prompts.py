@@ -0,0 +1,101 @@
+"""
+Cache-friendly prompt assembly
+------------------------------
+Azure OpenAI caches the longest identical prompt prefix it has seen recently
+(from 1024 tokens, in 128-token steps) and bills cached tokens at a discount with a
+lower time to first token. A system prompt that starts with the user's name
+("You are talking to Maria...") is different from the first tokens on, so
+no request can reuse another user's prefix.
+
+- `PromptTemplate` keeps the static instructions first and appends the
+  per-user variables as a short block at the very end
+- `PromptCacheStats` reads `usage.prompt_tokens_details.cached_tokens` from
+  each response and reports the cache hit rate per template
+
+Usage:
+    ASSISTANT_PROMPT = PromptTemplate(
+        "assistant",
+        "You are a helpful assistant. Keep answers clear and concise.",
+        "You are talking to {name}.",
+    )
+    messages = [{"role": "system", "content": ASSISTANT_PROMPT.render(name=user_name)}, ...]
+    cache_stats.record(ASSISTANT_PROMPT.name, resp.usage)
+    print(cache_stats.summary())
+"""
+import hashlib
+import string
+
+
+class PromptTemplate:
+    """
+    :param name: Template name used in the cache report.
+    :param static: Instructions shared by every user (no placeholders).
+    :param dynamic: Format string with the per-user variables, appended last.
+    """
+
+    def __init__(self, name, static, dynamic=""):
+        placeholders = [field for _, field, _, _ in string.Formatter().parse(static) if field is not None]
+        if placeholders:
+            raise ValueError(f"Static part of '{name}' must not contain placeholders: {placeholders}")
+        self.name = name
+        self.static = static.strip()
+        self.dynamic = dynamic.strip()
+        self.prefix_hash = hashlib.sha1(self.static.encode("utf-8")).hexdigest()[:12]
+
+    def render(self, **values):
+        if not self.dynamic:
+            return self.static
+        return f"{self.static}\n\n{self.dynamic.format(**values)}"
+
+    def system_message(self, **values):
+        return {"role": "system", "content": self.render(**values)}
+
+
+def _field(obj, name, default=None):
+    if obj is None:
+        return default
+    if isinstance(obj, dict):
+        return obj.get(name, default)
+    return getattr(obj, name, default)
+
+
+def cached_tokens(usage):
+    """usage.prompt_tokens_details.cached_tokens, or 0 when the service does not report it."""
+    return _field(_field(usage, "prompt_tokens_details"), "cached_tokens", 0) or 0
+
+
+class PromptCacheStats:
+    """Prompt and cached token counts per template."""
+
+    def __init__(self):
+        self.templates = {}  # {name: {"requests", "hits", "prompt_tokens", "cached_tokens"}}
+
+    def record(self, template_name, usage):
+        if usage is None:
+            return
+        entry = self.templates.setdefault(
+            template_name, {"requests": 0, "hits": 0, "prompt_tokens": 0, "cached_tokens": 0}
+        )
+        cached = cached_tokens(usage)
+        entry["requests"] += 1
+        entry["hits"] += 1 if cached else 0
+        entry["prompt_tokens"] += _field(usage, "prompt_tokens", 0) or 0
+        entry["cached_tokens"] += cached
+
+    def hit_rate(self, template_name):
+        """Share of prompt tokens served from the cache."""
+        entry = self.templates.get(template_name)
+        if not entry or not entry["prompt_tokens"]:
+            return 0.0
+        return entry["cached_tokens"] / entry["prompt_tokens"]
+
+    def summary(self):
+        if not self.templates:
+            return "no requests"
+        parts = []
+        for name, entry in self.templates.items():
+            parts.append(
+                f"{name}: {self.hit_rate(name):.0%} of {entry['prompt_tokens']} prompt tokens cached "
+                f"({entry['hits']}/{entry['requests']} requests hit)"
+            )
+        return " | ".join(parts)
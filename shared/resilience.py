@@ -0,0 +1,239 @@
+"""
+Circuit breakers and failover between OpenAI SDK paths
+------------------------------------------------------
+The samples reach the same Azure resource in two ways: `AzureOpenAI`
+(ex1-s1-aoai.py) and `OpenAI` with a deployment `base_url` (ex1-s1-oai.py).
+Until now every failure went through the SDK's own retries (2 by default, with backoff)
+and ended in a generic `except Exception`. This module adds:
+
+- `CircuitBreaker`: per-endpoint rolling window of outcomes. Errors and calls slower than
+  `slow_call_seconds` count as failures. When the failure rate crosses the
+  threshold the breaker opens and calls fail fast. After `open_seconds` it lets
+  one probe through (half-open): success closes it, failure re-opens it for twice as long.
+- `FailoverChat`: tries routes in order and skips any route whose breaker is open,
+  so a failing endpoint stops costing a timeout plus retries on every turn.
+  Client errors (400/422) are returned to the caller and do not trip the breaker.
+
+Usage:
+    chat = failover_from_env()      # AzureOpenAI first, OpenAI(base_url=...) second
+    resp = chat.create(messages=messages, max_completion_tokens=1000)
+    print(chat.summary())
+
+A different secondary resource or deployment can be set with AZURE_OPENAI_FALLBACK_ENDPOINT,
+AZURE_OPENAI_FALLBACK_DEPLOYMENT and AZURE_OPENAI_FALLBACK_API_KEY.
+"""
+import os
+import threading
+import time
+from collections import deque
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+# Errors caused by the request itself: another endpoint would reject it too
+CALLER_ERROR_STATUS = {400, 422}
+
+
+class CircuitOpen(Exception):
+    """Raised when every route is unavailable because its breaker is open."""
+
+
+# 1. Circuit breaker
+# ---------------------------------------------------------------------
+
+class CircuitBreaker:
+    """
+    :param failure_rate: Share of failures in the window that opens the breaker.
+    :param window: Number of recent calls considered.
+    :param min_calls: Calls needed in the window before the rate is trusted.
+    :param open_seconds: First open period; doubles on every failed probe up to max_open_seconds.
+    :param slow_call_seconds: Calls slower than this count as failures (None = ignore latency).
+    """
+
+    def __init__(self, name, failure_rate=0.5, window=20, min_calls=5, open_seconds=15.0,
+                 max_open_seconds=300.0, slow_call_seconds=None, clock=time.monotonic):
+        self.name = name
+        self.failure_rate = failure_rate
+        self.outcomes = deque(maxlen=window)  # True = success
+        self.min_calls = min_calls
+        self.base_open_seconds = open_seconds
+        self.open_seconds = open_seconds
+        self.max_open_seconds = max_open_seconds
+        self.slow_call_seconds = slow_call_seconds
+        self.clock = clock
+        self.state = CLOSED
+        self.opened_at = 0.0
+        self.probing = False
+        self.rejected = 0
+        self.trips = 0
+        self.lock = threading.Lock()
+
+    def available(self):
+        """True when a call would be let through (no state change)."""
+        with self.lock:
+            if self.state == CLOSED:
+                return True
+            if self.state == OPEN:
+                return self.clock() - self.opened_at >= self.open_seconds
+            return not self.probing
+
+    def before_call(self):
+        """Admits a call or raises CircuitOpen; in half-open state only one probe runs at a time."""
+        with self.lock:
+            if self.state == OPEN and self.clock() - self.opened_at >= self.open_seconds:
+                self.state = HALF_OPEN
+                self.probing = False
+            if self.state == OPEN or (self.state == HALF_OPEN and self.probing):
+                self.rejected += 1
+                raise CircuitOpen(f"circuit for {self.name} is open")
+            if self.state == HALF_OPEN:
+                self.probing = True
+
+    def on_success(self, seconds=None):
+        if self.slow_call_seconds is not None and seconds is not None and seconds > self.slow_call_seconds:
+            self.on_failure()
+            return
+        with self.lock:
+            if self.state == HALF_OPEN:
+                self.state = CLOSED
+                self.outcomes.clear()
+                self.open_seconds = self.base_open_seconds
+            self.probing = False
+            self.outcomes.append(True)
+
+    def on_failure(self):
+        with self.lock:
+            self.probing = False
+            if self.state == HALF_OPEN:
+                self.open_seconds = min(self.max_open_seconds, self.open_seconds * 2)
+                self._open()
+                return
+            self.outcomes.append(False)
+            failures = self.outcomes.count(False)
+            if len(self.outcomes) >= self.min_calls and failures / len(self.outcomes) >= self.failure_rate:
+                self._open()
+
+    def on_cancel(self):
+        """The call was abandoned without a verdict (e.g. lost a hedge race)."""
+        with self.lock:
+            self.probing = False
+
+    def _open(self):
+        self.state = OPEN
+        self.opened_at = self.clock()
+        self.trips += 1
+
+
+def is_caller_error(error):
+    return getattr(error, "status_code", None) in CALLER_ERROR_STATUS
+
+
+# 2. Failover between routes
+# ---------------------------------------------------------------------
+
+class Route:
+    """A client plus the model/deployment name to pass to it, guarded by its own breaker."""
+
+    def __init__(self, name, client, model, breaker=None):
+        self.name = name
+        self.client = client
+        self.model = model
+        self.breaker = breaker or CircuitBreaker(name)
+        self.calls = 0
+        self.failures = 0
+
+
+class FailoverChat:
+    def __init__(self, routes):
+        if not routes:
+            raise ValueError("FailoverChat needs at least one route")
+        self.routes = list(routes)
+        self.failovers = 0
+
+    def create(self, **kwargs):
+        """chat.completions.create on the first healthy route (model is filled in per route)."""
+        last_error = None
+        for position, route in enumerate(self.routes):
+            try:
+                route.breaker.before_call()
+            except CircuitOpen as e:
+                last_error = last_error or e
+                continue
+            route.calls += 1
+            started = time.perf_counter()
+            try:
+                response = route.client.chat.completions.create(model=route.model, **kwargs)
+            except Exception as e:
+                if is_caller_error(e):
+                    route.breaker.on_success()
+                    raise
+                route.failures += 1
+                route.breaker.on_failure()
+                print(f"[failover] {route.name} failed ({type(e).__name__}); trying the next route")
+                last_error = e
+                continue
+            route.breaker.on_success(time.perf_counter() - started)
+            if position > 0:
+                self.failovers += 1
+            return response
+        raise last_error
+
+    def summary(self):
+        parts = [f"{self.failovers} failovers"]
+        for route in self.routes:
+            b = route.breaker
+            parts.append(
+                f"{route.name}: {b.state}, {route.failures}/{route.calls} failed, "
+                f"{b.trips} trips, {b.rejected} fast-failed"
+            )
+        return " | ".join(parts)
+
+
+def failover_from_env(max_retries=1, timeout=60.0, slow_call_seconds=None):
+    """
+    Primary: AzureOpenAI on AZURE_OPENAI_ENDPOINT / AZURE_OPENAI_DEPLOYMENT_NAME.
+    Secondary: OpenAI with base_url on the fallback endpoint/deployment (defaults to the same ones).
+    Each SDK client retries at most max_retries times; the breaker handles the rest.
+    Raises ValueError when an endpoint or deployment is not configured.
+    """
+    from openai import AzureOpenAI, OpenAI
+
+    endpoint = os.getenv("AZURE_OPENAI_ENDPOINT")
+    key = os.getenv("AZURE_OPENAI_API_KEY")
+    deployment = os.getenv("AZURE_OPENAI_DEPLOYMENT_NAME")
+    api_version = os.getenv("AZURE_OPENAI_API_VERSION")
+    fallback_endpoint = os.getenv("AZURE_OPENAI_FALLBACK_ENDPOINT") or endpoint
+    fallback_deployment = os.getenv("AZURE_OPENAI_FALLBACK_DEPLOYMENT") or deployment
+    fallback_key = os.getenv("AZURE_OPENAI_FALLBACK_API_KEY") or key
+    missing = [
+        name for name, value in (
+            ("AZURE_OPENAI_ENDPOINT", endpoint),
+            ("AZURE_OPENAI_DEPLOYMENT_NAME", deployment),
+        ) if not value
+    ]
+    if missing:
+        raise ValueError(
+            f"failover needs {' and '.join(missing)} (the fallback route defaults to the same "
+            f"endpoint and deployment unless AZURE_OPENAI_FALLBACK_* are set)"
+        )
+
+    primary = AzureOpenAI(
+        azure_endpoint=endpoint,
+        api_version=api_version,
+        api_key=key,
+        max_retries=max_retries,
+        timeout=timeout,
+    )
+    secondary = OpenAI(
+        base_url=f"{fallback_endpoint.rstrip('/')}/openai/deployments/{fallback_deployment}",
+        api_key=fallback_key,
+        default_query={"api-version": api_version},
+        max_retries=max_retries,
+        timeout=timeout,
+    )
+    return FailoverChat([
+        Route("azure-openai", primary, deployment, CircuitBreaker("azure-openai", slow_call_seconds=slow_call_seconds)),
+        Route("openai-base-url", secondary, fallback_deployment,
+              CircuitBreaker("openai-base-url", slow_call_seconds=slow_call_seconds)),
+    ])
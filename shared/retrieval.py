@@ -0,0 +1,329 @@
+"""
+Local retrieval for grounding chats on repository documents
+-----------------------------------------------------------
+Indexes markdown/text documents (exercise READMEs, challenge descriptions,
+uploaded files) into:
+
+- An inverted index scored with BM25 (keyword match)
+- A vector index of passage embeddings (semantic match)
+
+Both scores are normalized and blended (hybrid scoring), and only the top-k
+passages are injected into the chat `messages` list.
+
+Everything works offline: the default embedder is a deterministic hashing
+stub, and any object with an `embed(texts) -> list[list[float]]` method can be
+plugged in instead. An optional Azure AI Search backend exposes the same
+`search()` interface.
+
+Usage:
+    retriever = load_or_build_index(".retrieval", default_corpus(repo_root))
+    messages = ground_messages(messages, retriever, user_question)
+"""
+import glob
+import hashlib
+import json
+import math
+import os
+import re
+from array import array
+
+DEFAULT_TOP_K = int(os.getenv("RETRIEVAL_TOP_K", "3"))
+# Weight of the keyword score in the hybrid blend (the rest goes to the vector score)
+DEFAULT_KEYWORD_WEIGHT = 0.6
+MAX_PASSAGE_CHARS = 1200
+
+BM25_K1 = 1.2
+BM25_B = 0.75
+
+TOKEN_PATTERN = re.compile(r"[a-z0-9]+")
+STOPWORDS = frozenset(
+    "a an and are as at be by can do for from has have how i if in is it its me my "
+    "of on or our so that the their then there this to was we what when where which "
+    "who will with you your".split()
+)
+
+
+def tokenize(text):
+    """Lowercase word tokens without stopwords."""
+    return [t for t in TOKEN_PATTERN.findall(text.lower()) if t not in STOPWORDS]
+
+
+# 1. Chunking
+# ---------------------------------------------------------------------
+
+def chunk_text(text, max_words=180, overlap=30):
+    """
+    Splits a document into passages of about max_words words.
+    Markdown headings start a new passage so each one stays on a single topic.
+    """
+    sections = re.split(r"\n(?=#{1,6} )", text)
+    passages = []
+    for section in sections:
+        words = section.split()
+        if not words:
+            continue
+        start = 0
+        while start < len(words):
+            passages.append(" ".join(words[start:start + max_words]))
+            if start + max_words >= len(words):
+                break
+            start += max_words - overlap
+    return passages
+
+
+# 2. Embeddings
+# ---------------------------------------------------------------------
+
+class HashingEmbedder:
+    """
+    Offline embedding stub: hashes words and character trigrams into a fixed
+    number of buckets and L2-normalizes the result. Deterministic and free,
+    good enough to catch morphological variants the keyword index misses.
+    """
+
+    def __init__(self, dim=256):
+        self.dim = dim
+
+    def _bucket(self, feature):
+        digest = hashlib.md5(feature.encode("utf-8")).digest()
+        return int.from_bytes(digest[:4], "little") % self.dim
+
+    def embed(self, texts):
+        vectors = []
+        for text in texts:
+            vector = [0.0] * self.dim
+            for token in tokenize(text):
+                vector[self._bucket(token)] += 1.0
+                padded = f"#{token}#"
+                for i in range(len(padded) - 2):
+                    vector[self._bucket(padded[i:i + 3])] += 0.5
+            norm = math.sqrt(sum(v * v for v in vector)) or 1.0
+            vectors.append([v / norm for v in vector])
+        return vectors
+
+
+class AzureOpenAIEmbedder:
+    """Embeds with an Azure OpenAI embeddings deployment (online alternative to the stub)."""
+
+    def __init__(self, client, deployment, dim=None):
+        self.client = client
+        self.deployment = deployment
+        self.dim = dim
+
+    def embed(self, texts):
+        response = self.client.embeddings.create(model=self.deployment, input=list(texts))
+        vectors = [item.embedding for item in response.data]
+        if vectors:
+            self.dim = len(vectors[0])
+        return vectors
+
+
+# 3. Local hybrid index
+# ---------------------------------------------------------------------
+
+class Passage:
+    def __init__(self, passage_id, source, text, score=0.0):
+        self.id = passage_id
+        self.source = source
+        self.text = text
+        self.score = score
+
+    def to_dict(self):
+        return {"id": self.id, "source": self.source, "text": self.text}
+
+
+class LocalIndex:
+    """In-memory BM25 + vector index that can be saved to and loaded from a folder."""
+
+    def __init__(self, embedder=None):
+        self.embedder = embedder or HashingEmbedder()
+        self.passages = []   # [Passage]
+        self.postings = {}   # {term: {passage_id: term_frequency}}
+        self.lengths = []    # tokens per passage
+        self.vectors = array("f")
+
+    @property
+    def dim(self):
+        return self.embedder.dim
+
+    def add_document(self, source, text):
+        """Chunks, tokenizes and embeds a document; returns the number of passages added."""
+        chunks = chunk_text(text)
+        if not chunks:
+            return 0
+        for chunk, vector in zip(chunks, self.embedder.embed(chunks)):
+            passage_id = len(self.passages)
+            self.passages.append(Passage(passage_id, source, chunk))
+            tokens = tokenize(chunk)
+            self.lengths.append(len(tokens))
+            for token in tokens:
+                postings = self.postings.setdefault(token, {})
+                postings[passage_id] = postings.get(passage_id, 0) + 1
+            self.vectors.extend(vector)
+        return len(chunks)
+
+    def add_file(self, path, source=None):
+        with open(path, "r", encoding="utf-8", errors="ignore") as f:
+            return self.add_document(source or path, f.read())
+
+    def _bm25(self, terms):
+        n = len(self.passages)
+        average = (sum(self.lengths) / n) if n else 0.0
+        scores = {}
+        for term in set(terms):
+            postings = self.postings.get(term)
+            if not postings:
+                continue
+            idf = math.log(1 + (n - len(postings) + 0.5) / (len(postings) + 0.5))
+            for passage_id, tf in postings.items():
+                norm = 1 - BM25_B + BM25_B * self.lengths[passage_id] / (average or 1.0)
+                scores[passage_id] = scores.get(passage_id, 0.0) + idf * tf * (BM25_K1 + 1) / (tf + BM25_K1 * norm)
+        return scores
+
+    def _cosine(self, query_vector):
+        dim = len(query_vector)
+        vectors = self.vectors
+        scores = {}
+        for passage_id in range(len(self.passages)):
+            offset = passage_id * dim
+            score = sum(q * v for q, v in zip(query_vector, vectors[offset:offset + dim]))
+            if score > 0:
+                scores[passage_id] = score
+        return scores
+
+    def search(self, query, top_k=DEFAULT_TOP_K, keyword_weight=DEFAULT_KEYWORD_WEIGHT):
+        """Returns the top_k passages by blended BM25 + cosine score."""
+        if not self.passages:
+            return []
+        keyword = self._bm25(tokenize(query))
+        semantic = self._cosine(self.embedder.embed([query])[0])
+        best_keyword = max(keyword.values(), default=0.0) or 1.0
+        combined = {}
+        for passage_id, score in keyword.items():
+            combined[passage_id] = keyword_weight * score / best_keyword
+        for passage_id, score in semantic.items():
+            combined[passage_id] = combined.get(passage_id, 0.0) + (1 - keyword_weight) * score
+        ranked = sorted(combined.items(), key=lambda item: item[1], reverse=True)[:top_k]
+        return [
+            Passage(pid, self.passages[pid].source, self.passages[pid].text, score)
+            for pid, score in ranked
+        ]
+
+    def save(self, directory):
+        os.makedirs(directory, exist_ok=True)
+        with open(os.path.join(directory, "passages.jsonl"), "w", encoding="utf-8") as f:
+            for passage in self.passages:
+                f.write(json.dumps(passage.to_dict()) + "\n")
+        with open(os.path.join(directory, "postings.json"), "w", encoding="utf-8") as f:
+            json.dump({"lengths": self.lengths, "postings": self.postings, "dim": self.dim}, f, separators=(",", ":"))
+        with open(os.path.join(directory, "vectors.f32"), "wb") as f:
+            self.vectors.tofile(f)
+
+    @classmethod
+    def load(cls, directory, embedder=None):
+        index = cls(embedder)
+        with open(os.path.join(directory, "passages.jsonl"), "r", encoding="utf-8") as f:
+            for line in f:
+                item = json.loads(line)
+                index.passages.append(Passage(item["id"], item["source"], item["text"]))
+        with open(os.path.join(directory, "postings.json"), "r", encoding="utf-8") as f:
+            data = json.load(f)
+        index.lengths = data["lengths"]
+        # JSON object keys are strings; passage ids are ints
+        index.postings = {t: {int(k): v for k, v in p.items()} for t, p in data["postings"].items()}
+        with open(os.path.join(directory, "vectors.f32"), "rb") as f:
+            index.vectors.frombytes(f.read())
+        return index
+
+
+# 4. Optional Azure AI Search backend
+# ---------------------------------------------------------------------
+
+class AzureSearchBackend:
+    """
+    Same search() interface backed by an Azure AI Search index.
+    Expects documents with "id", "source" and "content" fields.
+    """
+
+    def __init__(self, endpoint, index_name, api_key):
+        from azure.core.credentials import AzureKeyCredential
+        from azure.search.documents import SearchClient
+
+        self.client = SearchClient(endpoint=endpoint, index_name=index_name, credential=AzureKeyCredential(api_key))
+
+    def search(self, query, top_k=DEFAULT_TOP_K, **_):
+        results = self.client.search(search_text=query, top=top_k)
+        return [
+            Passage(item.get("id"), item.get("source", ""), item.get("content", ""), item.get("@search.score", 0.0))
+            for item in results
+        ]
+
+
+# 5. Corpus, loading and prompt injection
+# ---------------------------------------------------------------------
+
+def default_corpus(repo_root):
+    """Markdown documents of the exercises (READMEs and challenge descriptions)."""
+    paths = glob.glob(os.path.join(repo_root, "EX*", "**", "*.md"), recursive=True)
+    # chainlit.md files are UI welcome screens, not course content
+    return sorted(p for p in paths if os.path.basename(p) != "chainlit.md")
+
+
+def build_index(paths, embedder=None, repo_root=None):
+    index = LocalIndex(embedder)
+    for path in paths:
+        source = os.path.relpath(path, repo_root) if repo_root else path
+        index.add_file(path, source)
+    return index
+
+
+def load_or_build_index(directory, paths, embedder=None, repo_root=None):
+    """Loads a saved index from directory or builds and saves it."""
+    if os.path.exists(os.path.join(directory, "passages.jsonl")):
+        return LocalIndex.load(directory, embedder)
+    index = build_index(paths, embedder, repo_root)
+    index.save(directory)
+    return index
+
+
+def retriever_from_env(repo_root, directory=".retrieval"):
+    """
+    Picks the retrieval backend from environment variables:
+    RETRIEVAL_BACKEND=azure uses AZURE_SEARCH_ENDPOINT / AZURE_SEARCH_INDEX / AZURE_SEARCH_API_KEY,
+    anything else uses the local offline index, re-indexing only files that changed
+    (embedded with AZURE_OPENAI_EMBEDDING_DEPLOYMENT through the batcher when it is set).
+    """
+    if os.getenv("RETRIEVAL_BACKEND", "local").lower() == "azure":
+        return AzureSearchBackend(
+            os.getenv("AZURE_SEARCH_ENDPOINT"),
+            os.getenv("AZURE_SEARCH_INDEX"),
+            os.getenv("AZURE_SEARCH_API_KEY"),
+        )
+    # Imported here because the indexer and the batcher build on this module
+    from shared.embeddings import embedder_from_env
+    from shared.indexer import IncrementalIndex
+
+    index = IncrementalIndex(directory, embedder_from_env())
+    index.sync(default_corpus(repo_root), repo_root)
+    index.start_background_compaction()
+    return index
+
+
+def grounding_message(passages):
+    """Formats passages as one compact system message."""
+    lines = ["Use these excerpts from the course material if they are relevant:"]
+    for passage in passages:
+        lines.append(f"[{passage.source}] {passage.text[:MAX_PASSAGE_CHARS]}")
+    return {"role": "system", "content": "\n\n".join(lines)}
+
+
+def ground_messages(messages, retriever, query, top_k=DEFAULT_TOP_K):
+    """
+    Returns a new messages list with the top passages for query inserted right
+    after the leading system message. The input list is not modified.
+    """
+    passages = retriever.search(query, top_k=top_k) if retriever else []
+    if not passages:
+        return messages
+    position = 1 if messages and messages[0].get("role") == "system" else 0
+    return messages[:position] + [grounding_message(passages)] + messages[position:]
@@ -0,0 +1,149 @@
+"""
+Message router: answer cheap things locally, send real questions to the model
+-----------------------------------------------------------------------------
+Every chat message used to go to the deployment, including commands such as
+/help, /info or /trip-info and one-word messages like "thanks". The router
+decides first, in microseconds and without any network call:
+
+1. Command table: exact, pre-normalized lookup of slash commands (and aliases)
+2. Intent classifier: small precompiled patterns for trivial intents
+   (greeting, thanks, goodbye) answered with a canned reply
+3. Everything else goes to the LLM
+
+Each decision is recorded with the local handling time, and the latency
+saved is estimated from the moving average of real model calls.
+
+Usage:
+    router = Router()
+    router.command("/help", lambda ctx: HELP_TEXT)
+    route = router.route(user_input, context)
+    if route.kind == "llm":
+        ...call the model, then router.stats.observe_model(seconds)
+    else:
+        print(route.response)
+"""
+import re
+import time
+
+COMMAND, LOCAL, LLM = "command", "local", "llm"
+
+# Trivial intents: pattern must match the whole (normalized) message
+INTENT_PATTERNS = {
+    "greeting": r"(hi|hello|hey|hola|good (morning|afternoon|evening))( there)?",
+    "thanks": r"(thanks|thank you|thx|ty|cheers|great thanks|ok thanks)( (a lot|so much|very much))?",
+    "goodbye": r"(bye|goodbye|see you|see ya|ciao|adios)( later)?",
+}
+DEFAULT_REPLIES = {
+    "greeting": "👋 Hello! What would you like to know?",
+    "thanks": "😊 You're welcome! Anything else?",
+    "goodbye": "👋 Goodbye! Come back any time.",
+}
+# Longer messages are never treated as trivial, whatever they contain
+MAX_TRIVIAL_WORDS = 5
+
+_PUNCTUATION = re.compile(r"[^\w\s/-]+")
+_SPACES = re.compile(r"\s+")
+
+
+def normalize(text):
+    """Lowercase, strip punctuation (but keep / and -) and collapse spaces."""
+    return _SPACES.sub(" ", _PUNCTUATION.sub(" ", text.lower())).strip()
+
+
+class Route:
+    def __init__(self, kind, intent=None, response=None, confidence=1.0):
+        self.kind = kind
+        self.intent = intent
+        self.response = response
+        self.confidence = confidence
+
+    @property
+    def is_local(self):
+        return self.kind in (COMMAND, LOCAL)
+
+
+class IntentClassifier:
+    """Precompiled whole-message patterns for trivial intents."""
+
+    def __init__(self, patterns=None):
+        self.patterns = {
+            intent: re.compile(rf"^(?:{pattern})$") for intent, pattern in (patterns or INTENT_PATTERNS).items()
+        }
+
+    def classify(self, normalized):
+        """Returns (intent, confidence); intent is a trivial intent or "question"."""
+        words = normalized.split()
+        if 0 < len(words) <= MAX_TRIVIAL_WORDS:
+            for intent, pattern in self.patterns.items():
+                if pattern.match(normalized):
+                    return intent, 1.0
+        return "question", 1.0
+
+
+class RoutingStats:
+    """Counters per route kind and an estimate of model latency avoided."""
+
+    def __init__(self, default_model_latency=2.0, alpha=0.2):
+        self.counts = {COMMAND: 0, LOCAL: 0, LLM: 0}
+        self.by_intent = {}
+        self.local_seconds = 0.0
+        self.model_latency = default_model_latency
+        self.alpha = alpha
+        self.model_samples = 0
+
+    def record(self, route, elapsed):
+        self.counts[route.kind] = self.counts.get(route.kind, 0) + 1
+        key = route.intent or route.kind
+        self.by_intent[key] = self.by_intent.get(key, 0) + 1
+        if route.is_local:
+            self.local_seconds += elapsed
+
+    def observe_model(self, seconds):
+        """Feeds a measured model call duration into the moving average."""
+        if self.model_samples == 0:
+            self.model_latency = seconds
+        else:
+            self.model_latency += self.alpha * (seconds - self.model_latency)
+        self.model_samples += 1
+
+    @property
+    def local_answers(self):
+        return self.counts[COMMAND] + self.counts[LOCAL]
+
+    @property
+    def latency_saved(self):
+        return self.local_answers * self.model_latency - self.local_seconds
+
+    def summary(self):
+        return (
+            f"routed: {self.counts[COMMAND]} command, {self.counts[LOCAL]} local, {self.counts[LLM]} llm | "
+            f"~{self.latency_saved:.1f}s model latency saved"
+        )
+
+
+class Router:
+    def __init__(self, classifier=None, replies=None):
+        self.commands = {}  # {normalized command: handler(context) -> str}
+        self.classifier = classifier or IntentClassifier()
+        self.replies = dict(DEFAULT_REPLIES if replies is None else replies)
+        self.stats = RoutingStats()
+
+    def command(self, name, handler, aliases=()):
+        """Registers a command; handler(context) returns the reply text."""
+        for key in (name, *aliases):
+            self.commands[normalize(key)] = handler
+
+    def route(self, text, context=None):
+        start = time.perf_counter()
+        normalized = normalize(text)
+        handler = self.commands.get(normalized)
+        if handler is not None:
+            route = Route(COMMAND, intent=normalized, response=handler(context))
+        else:
+            intent, confidence = self.classifier.classify(normalized)
+            if intent in self.replies:
+                route = Route(LOCAL, intent=intent, response=self.replies[intent], confidence=confidence)
+            else:
+                route = Route(LLM, intent=intent, confidence=confidence)
+        self.stats.record(route, time.perf_counter() - start)
+        return route
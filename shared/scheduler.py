@@ -0,0 +1,473 @@
+"""
+Fair scheduling of model calls
+------------------------------
+All Chainlit sessions share one deployment quota. Served first come, first
+served, one user with a stream of long prompts (or a batch job) can fill every
+slot while everyone else waits. `FairScheduler` sits in front of the chat and
+agent calls and hands out a fixed number of slots (`max_concurrency`, the
+share of the quota this process may use):
+
+- Every request belongs to a requester (user or session) and a priority class
+  (`interactive`, `batch`, ...)
+- Classes share the slots by weight (weighted fair queuing), and each class can
+  have a cap on the slots it holds at once, so a batch job never takes all of them
+- Inside a class, each requester has its own queue, and requesters share the
+  class by weighted fair queuing on the request cost (prompt + completion tokens
+  for chat calls). A user with long prompts gets the same token share as the
+  others, not more slots
+- Both levels use start-time fair queuing: a request is tagged with a virtual
+  start time when queued, and the smallest tag is served first. An idle
+  requester does not build up credit
+- A request cancelled while queued just leaves its queue
+- `metrics()` / `summary()`: queue depth (now and max), slots in use, requests
+  served and wait time percentiles per class; `depth(requester)` per requester
+
+The scheduler belongs to one event loop (the Chainlit server's). Blocking
+calls (the agents SDK) go through `run()`, which runs them in a worker thread
+once a slot is granted.
+
+Usage:
+    scheduler = scheduler_from_env()    # SCHEDULER_MAX_CONCURRENCY=8, SCHEDULER_CLASSES="interactive:4,batch:1:2"
+    async with scheduler.slot(user_id, "interactive", cost=prompt_tokens + max_tokens):
+        response = await client.chat.completions.create(...)
+    run = await scheduler.run(project.agents.runs.create_and_process, thread_id=t, agent_id=a, requester=user_id)
+
+    current_requester.set(user_id)      # for calls made through ScheduledChat
+    chat = ScheduledChat(pool_from_env(), scheduler)
+
+Simulate a mixed workload (light users, one heavy user, a batch job) on the mock backend:
+    python -m shared.scheduler --duration 20
+"""
+import contextvars
+import os
+import sys
+import time
+from collections import deque
+
+from shared.stats import summarize
+
+# Who the calls made through ScheduledChat in this task are for
+current_requester = contextvars.ContextVar("current_requester", default="anonymous")
+
+
+# 1. Classes, flows and requests
+# ---------------------------------------------------------------------
+
+class PriorityClass:
+    """
+    :param name: Class name used by callers ("interactive", "batch", ...).
+    :param weight: Share of the slots against the other classes when all are busy.
+    :param cap: Most slots this class may hold at once (None: up to max_concurrency).
+    :param window: Wait times kept for the percentiles.
+    """
+
+    def __init__(self, name, weight=1.0, cap=None, window=1000):
+        self.name = name
+        self.weight = float(weight)
+        self.cap = cap
+        self.flows = {}             # {requester: _Flow}
+        self.vtime = 0.0            # start tag of the last request served in this class
+        self.last_finish = 0.0      # finish tag of this class at the top level
+        self.queued = 0
+        self.max_queued = 0
+        self.in_flight = 0
+        self.served = 0
+        self.cancelled = 0
+        self.waits = deque(maxlen=window)
+
+    def eligible(self):
+        return self.queued > 0 and (self.cap is None or self.in_flight < self.cap)
+
+
+class _Flow:
+    def __init__(self, weight):
+        self.weight = weight
+        self.queue = deque()        # [_Request] in arrival order
+        self.last_finish = 0.0
+
+
+class _Request:
+    def __init__(self, requester, klass, cost, future):
+        self.requester = requester
+        self.klass = klass
+        self.cost = cost
+        self.future = future
+        self.start = 0.0
+        self.enqueued_at = time.perf_counter()
+        self.granted = False
+
+
+# 2. Scheduler
+# ---------------------------------------------------------------------
+
+class FairScheduler:
+    """
+    :param classes: [PriorityClass]; default interactive (weight 4) and batch (weight 1, cap half the slots).
+    :param max_concurrency: Slots shared by all classes.
+    :param requester_weights: {requester: weight} for requesters that deserve a larger share (default 1).
+    """
+
+    def __init__(self, classes=None, max_concurrency=8, requester_weights=None):
+        self.max_concurrency = max(1, int(max_concurrency))
+        if classes is None:
+            classes = [
+                PriorityClass("interactive", weight=4),
+                PriorityClass("batch", weight=1, cap=max(1, self.max_concurrency // 2)),
+            ]
+        self.classes = {c.name: c for c in classes}
+        self.requester_weights = requester_weights or {}
+        self.vtime = 0.0
+        self.in_flight = 0
+
+    async def acquire(self, requester, priority="interactive", cost=1.0):
+        """Waits for a slot; returns the request to pass to release()."""
+        import asyncio
+
+        klass = self.classes.get(priority)
+        if klass is None:
+            raise ValueError(f"unknown priority class {priority!r} (known: {', '.join(self.classes)})")
+        request = _Request(requester, klass, max(float(cost), 1e-6), asyncio.get_running_loop().create_future())
+        flow = klass.flows.get(requester)
+        if flow is None:
+            flow = klass.flows[requester] = _Flow(float(self.requester_weights.get(requester, 1.0)))
+        request.start = max(klass.vtime, flow.last_finish)
+        flow.last_finish = request.start + request.cost / flow.weight
+        flow.queue.append(request)
+        klass.queued += 1
+        klass.max_queued = max(klass.max_queued, klass.queued)
+        self._dispatch()
+        try:
+            await request.future
+        except asyncio.CancelledError:
+            if request.granted:
+                self.release(request)
+            elif request in flow.queue:
+                flow.queue.remove(request)
+                klass.queued -= 1
+                klass.cancelled += 1
+            raise
+        return request
+
+    def release(self, request):
+        klass = request.klass
+        self.in_flight -= 1
+        klass.in_flight -= 1
+        klass.served += 1
+        self._dispatch()
+
+    def _dispatch(self):
+        """Grants free slots: class with the smallest top-level tag, then its flow with the smallest start tag."""
+        while self.in_flight < self.max_concurrency:
+            candidates = [c for c in self.classes.values() if c.eligible()]
+            if not candidates:
+                return
+            klass = min(candidates, key=lambda c: max(self.vtime, c.last_finish))
+            flow = min((f for f in klass.flows.values() if f.queue), key=lambda f: f.queue[0].start)
+            request = flow.queue.popleft()
+            klass.queued -= 1
+            if request.future.done():
+                # Cancelled while queued; its task has not run its cleanup yet
+                klass.cancelled += 1
+                continue
+
+            tag = max(self.vtime, klass.last_finish)
+            self.vtime = tag
+            klass.last_finish = tag + request.cost / klass.weight
+            klass.vtime = request.start
+            self.in_flight += 1
+            klass.in_flight += 1
+            klass.waits.append(time.perf_counter() - request.enqueued_at)
+            request.granted = True
+            request.future.set_result(None)
+
+            # Idle requesters with no pending virtual time are forgotten
+            for requester in [r for r, f in klass.flows.items() if not f.queue and f.last_finish <= klass.vtime]:
+                del klass.flows[requester]
+
+    def slot(self, requester, priority="interactive", cost=1.0):
+        """`async with scheduler.slot(...)`: holds one slot for the block."""
+        return _Slot(self, requester, priority, cost)
+
+    async def run(self, fn, *args, requester=None, priority="interactive", cost=1.0, **kwargs):
+        """Runs a blocking fn(*args, **kwargs) in a worker thread once a slot is granted."""
+        import asyncio
+
+        async with self.slot(requester or current_requester.get(), priority, cost):
+            worker = asyncio.ensure_future(asyncio.to_thread(fn, *args, **kwargs))
+            try:
+                return await asyncio.shield(worker)
+            except asyncio.CancelledError:
+                # The thread cannot be stopped: the call still uses quota, so keep the slot until it ends
+                await asyncio.wait({worker})
+                raise
+
+    def depth(self, requester):
+        """Requests queued for requester, across classes."""
+        return sum(len(c.flows[requester].queue) for c in self.classes.values() if requester in c.flows)
+
+    def metrics(self):
+        result = {"max_concurrency": self.max_concurrency, "in_flight": self.in_flight, "classes": {}}
+        for c in self.classes.values():
+            waits = summarize(list(c.waits))
+            result["classes"][c.name] = {
+                "weight": c.weight,
+                "cap": c.cap,
+                "queued": c.queued,
+                "max_queued": c.max_queued,
+                "in_flight": c.in_flight,
+                "served": c.served,
+                "cancelled": c.cancelled,
+                "requesters_waiting": sum(1 for f in c.flows.values() if f.queue),
+                "wait_p50": waits["p50"],
+                "wait_p95": waits["p95"],
+                "wait_max": waits["max"],
+            }
+        return result
+
+    def summary(self):
+        parts = [f"{self.in_flight}/{self.max_concurrency} slots in use"]
+        for name, m in self.metrics()["classes"].items():
+            parts.append(
+                f"{name}: {m['served']} served, {m['queued']} queued (max {m['max_queued']}), "
+                f"{m['in_flight']} running, wait p50 {m['wait_p50'] * 1000:.0f} ms / p95 {m['wait_p95'] * 1000:.0f} ms"
+            )
+        return " | ".join(parts)
+
+
+class _Slot:
+    def __init__(self, scheduler, requester, priority, cost):
+        self.scheduler = scheduler
+        self.args = (requester, priority, cost)
+        self.request = None
+
+    async def __aenter__(self):
+        self.request = await self.scheduler.acquire(*self.args)
+        return self
+
+    async def __aexit__(self, *exc):
+        self.scheduler.release(self.request)
+
+
+class ScheduledStream:
+    """
+    A streamed response that holds its scheduler slot. The slot is released once,
+    when the stream ends or fails, or on `close()` / `aclose()` / leaving an
+    `async with` block, whether or not iteration started.
+    """
+
+    def __init__(self, scheduler, request, response):
+        self._scheduler = scheduler
+        self._request = request
+        self._response = response
+        self._iterator = None
+        self._closed = False
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        if self._closed:
+            raise StopAsyncIteration
+        try:
+            if self._iterator is None:
+                self._iterator = self._response.__aiter__()
+            return await self._iterator.__anext__()
+        except BaseException:
+            # End of stream, upstream error or cancellation: give the slot back
+            await self.close()
+            raise
+
+    async def close(self):
+        if self._closed:
+            return
+        self._closed = True
+        self._scheduler.release(self._request)
+        close = getattr(self._response, "aclose", None) or getattr(self._response, "close", None)
+        if close is not None:
+            result = close()
+            if hasattr(result, "__await__"):
+                await result
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.close()
+
+    aclose = close
+
+
+class ScheduledChat:
+    """
+    A chat (async create(**kwargs), e.g. a HedgedChat) whose calls wait for a scheduler slot.
+    The requester is `current_requester` of the calling task; the cost is the prompt
+    tokens plus max_completion_tokens. A streamed response is a ScheduledStream that
+    holds its slot until the stream ends or is closed.
+
+    :param chat: The chat to schedule.
+    :param scheduler: The FairScheduler.
+    :param priority: Priority class of these calls.
+    """
+
+    def __init__(self, chat, scheduler, priority="interactive"):
+        self.chat = chat
+        self.scheduler = scheduler
+        self.priority = priority
+
+    def cost(self, kwargs):
+        from shared.tokens import get_tokenizer
+
+        completion = kwargs.get("max_completion_tokens") or kwargs.get("max_tokens") or 0
+        return get_tokenizer(kwargs.get("model")).count_messages(kwargs.get("messages", [])) + completion
+
+    async def create(self, **kwargs):
+        request = await self.scheduler.acquire(current_requester.get(), self.priority, self.cost(kwargs))
+        try:
+            response = await self.chat.create(**kwargs)
+        except BaseException:
+            self.scheduler.release(request)
+            raise
+        if not kwargs.get("stream"):
+            self.scheduler.release(request)
+            return response
+        return ScheduledStream(self.scheduler, request, response)
+
+    def summary(self):
+        return self.scheduler.summary()
+
+
+def parse_classes(spec):
+    """
+    [PriorityClass] from a "name:weight[:cap]" list. Raises ValueError on a malformed
+    entry, a repeated name or a list without "interactive" (the class ScheduledChat
+    and run() use by default).
+    """
+    classes = {}
+    for entry in [e.strip() for e in spec.split(",") if e.strip()]:
+        fields = [f.strip() for f in entry.split(":")]
+        name, weight, cap = (fields + ["", ""])[:3]
+        if not name or len(fields) > 3:
+            raise ValueError(f"SCHEDULER_CLASSES: expected name:weight[:cap], got {entry!r}")
+        if name in classes:
+            raise ValueError(f"SCHEDULER_CLASSES: class {name!r} is listed twice")
+        try:
+            weight = float(weight or 1)
+            cap = int(cap) if cap else None
+        except ValueError:
+            raise ValueError(f"SCHEDULER_CLASSES: weight and cap of {entry!r} must be numbers") from None
+        if weight <= 0 or (cap is not None and cap < 1):
+            raise ValueError(f"SCHEDULER_CLASSES: {entry!r} needs a positive weight and cap")
+        classes[name] = PriorityClass(name, weight, cap)
+    if "interactive" not in classes:
+        raise ValueError(
+            f"SCHEDULER_CLASSES={spec!r} has no 'interactive' class, which chat and agent calls use by default"
+        )
+    return list(classes.values())
+
+
+def scheduler_from_env():
+    """
+    SCHEDULER_MAX_CONCURRENCY (default 8) slots and SCHEDULER_CLASSES, comma separated
+    "name:weight[:cap]" (default "interactive:4,batch:1:<half the slots>").
+    A SCHEDULER_CLASSES value that parse_classes() rejects raises ValueError here, at startup.
+    """
+    max_concurrency = int(os.getenv("SCHEDULER_MAX_CONCURRENCY", "8"))
+    spec = os.getenv("SCHEDULER_CLASSES")
+    if not spec:
+        return FairScheduler(max_concurrency=max_concurrency)
+    return FairScheduler(parse_classes(spec), max_concurrency=max_concurrency)
+
+
+# 3. Mixed workload on the mock backend
+# ---------------------------------------------------------------------
+
+async def _simulate(scheduler, client, args, fifo):
+    """Light users, one heavy user and a batch job for args.duration seconds; {group: (waits, latencies)}."""
+    import asyncio
+    import random
+
+    from shared.mock_backend import WORDS
+
+    rng = random.Random(1)
+    loop = asyncio.get_running_loop()
+    stop_at = loop.time() + args.duration
+    results = {"light users": ([], []), "heavy user": ([], []), "batch job": ([], [])}
+
+    def prompt(words):
+        return " ".join(rng.choice(WORDS) for _ in range(words))
+
+    async def call(group, requester, priority, words, max_tokens):
+        messages = [{"role": "user", "content": prompt(words)}]
+        cost = words * 1.3 + max_tokens
+        if fifo:
+            requester, priority = "everyone", "interactive"
+        started = time.perf_counter()
+        async with scheduler.slot(requester, priority, cost):
+            granted = time.perf_counter()
+            await client.chat.completions.create(model="mock", messages=messages, max_completion_tokens=max_tokens)
+        results[group][0].append(granted - started)
+        results[group][1].append(time.perf_counter() - started)
+
+    async def light(i):
+        while loop.time() < stop_at:
+            await asyncio.sleep(rng.expovariate(1 / args.think_time))
+            await call("light users", f"user-{i}", "interactive", 30, 40)
+
+    async def heavy(_):
+        while loop.time() < stop_at:
+            await call("heavy user", "heavy", "interactive", 1500, 400)
+
+    async def batch(_):
+        while loop.time() < stop_at:
+            await call("batch job", "batch-job", "batch", 300, 200)
+
+    await asyncio.gather(
+        *(light(i) for i in range(args.users)),
+        *(heavy(i) for i in range(args.heavy_parallel)),
+        *(batch(i) for i in range(args.batch_parallel)),
+    )
+    return results
+
+
+def main():
+    import argparse
+    import asyncio
+
+    from openai import AsyncAzureOpenAI
+
+    from shared.mock_backend import MockBackend
+
+    parser = argparse.ArgumentParser(description="FIFO vs fair scheduling of a mixed workload on the mock backend")
+    parser.add_argument("--duration", type=float, default=20.0, help="seconds of traffic per mode")
+    parser.add_argument("--slots", type=int, default=8, help="max_concurrency (the shared quota)")
+    parser.add_argument("--users", type=int, default=12, help="light interactive users")
+    parser.add_argument("--think-time", type=float, default=1.0, help="mean seconds between a light user's requests")
+    parser.add_argument("--heavy-parallel", type=int, default=12, help="requests the heavy user keeps in flight")
+    parser.add_argument("--batch-parallel", type=int, default=16, help="requests the batch job keeps in flight")
+    args = parser.parse_args()
+
+    config = {
+        "ttft": {"dist": "lognormal", "median": 0.2, "sigma": 0.2},
+        "tokens_per_sec": 400,
+        "completion_tokens": {"min": 40, "max": 400},
+    }
+    print(f"\n🧪 {args.slots} slots, {args.users} light users, heavy user x{args.heavy_parallel}, "
+          f"batch job x{args.batch_parallel}, {args.duration:.0f}s per mode\n")
+    print(f"{'mode':<6} {'group':<12} {'requests':>9} {'wait p50':>9} {'wait p95':>9} {'latency p95':>12}")
+    print("-" * 62)
+    with MockBackend(config) as backend:
+        for mode in ("fifo", "fair"):
+            client = AsyncAzureOpenAI(azure_endpoint=backend.url, api_key="mock", api_version="2024-10-21", max_retries=0)
+            scheduler = FairScheduler(max_concurrency=args.slots)
+            results = asyncio.run(_simulate(scheduler, client, args, fifo=(mode == "fifo")))
+            for group, (waits, latencies) in results.items():
+                w, l = summarize(waits), summarize(latencies)
+                print(f"{mode:<6} {group:<12} {w['count']:>9} {w['p50']:>8.2f}s {w['p95']:>8.2f}s {l['p95']:>11.2f}s")
+            if mode == "fair":
+                print(f"\n📊 {scheduler.summary()}")
+        print(f"   mock backend: at most {backend.state.stats['max_in_flight']} requests in flight")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
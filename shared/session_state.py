@@ -0,0 +1,371 @@
+"""
+Shared session state for multi-worker Chainlit apps
+---------------------------------------------------
+`cl.user_session` lives in the memory of one process, so a conversation is
+tied to the worker that started it. The backends here keep per-session values
+(trip details, counters, agent/thread ids) outside the process, so any worker
+behind a load balancer can serve any turn:
+
+- `MemoryBackend`: in-process dict (single worker, tests)
+- `SqliteBackend`: one sqlite file in WAL mode, shared by workers on one host
+- `FileLockBackend`: one JSON file per session guarded by an OS file lock
+- `RedisBackend`: one Redis hash per session; works with `redis.Redis` or with
+  the in-process `LocalRedis` stand-in that implements the same commands
+
+Values must be JSON-serializable: store ids (agent.id, thread.id), not SDK objects.
+
+Usage:
+    backend = backend_from_env()                   # SESSION_BACKEND=memory|sqlite|file|redis|local-redis
+    state = SharedSession(backend, cl.context.session.thread_id)
+    state.set("destination", "Tokyo")
+    count = state.incr("question_count")
+"""
+import os
+import re
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+
+from shared.codec import get_codec
+
+codec = get_codec()
+
+
+def _encode(value):
+    return codec.dumps(value)
+
+
+def _decode(raw, default=None):
+    return default if raw is None else codec.loads(raw)
+
+
+# 1. Backends
+# ---------------------------------------------------------------------
+# All backends implement get / set / incr / get_all / delete.
+# incr is atomic across threads and (for the out-of-process backends) workers.
+
+class MemoryBackend:
+    """Per-process dict; only correct with a single worker."""
+
+    def __init__(self):
+        self.data = {}
+        self.lock = threading.Lock()
+
+    def get(self, session_id, key, default=None):
+        with self.lock:
+            return _decode(self.data.get(session_id, {}).get(key), default)
+
+    def set(self, session_id, key, value):
+        with self.lock:
+            self.data.setdefault(session_id, {})[key] = _encode(value)
+
+    def incr(self, session_id, key, amount=1):
+        with self.lock:
+            values = self.data.setdefault(session_id, {})
+            value = _decode(values.get(key), 0) + amount
+            values[key] = _encode(value)
+            return value
+
+    def get_all(self, session_id):
+        with self.lock:
+            return {k: _decode(v) for k, v in self.data.get(session_id, {}).items()}
+
+    def delete(self, session_id):
+        with self.lock:
+            self.data.pop(session_id, None)
+
+
+class SqliteBackend:
+    """
+    Key/value rows in one sqlite file. WAL mode lets readers run while one
+    worker writes; each thread gets its own connection.
+    """
+
+    def __init__(self, path, busy_timeout=5.0):
+        self.path = path
+        self.busy_timeout = busy_timeout
+        self.local = threading.local()
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        with self._connect() as db:
+            db.execute("PRAGMA journal_mode=WAL")
+            db.execute(
+                "CREATE TABLE IF NOT EXISTS session_state ("
+                "session_id TEXT NOT NULL, key TEXT NOT NULL, value TEXT NOT NULL, updated_at REAL NOT NULL, "
+                "PRIMARY KEY (session_id, key))"
+            )
+
+    def _connect(self):
+        db = getattr(self.local, "db", None)
+        if db is None:
+            db = sqlite3.connect(self.path, timeout=self.busy_timeout, isolation_level=None)
+            db.execute("PRAGMA synchronous=NORMAL")
+            self.local.db = db
+        return db
+
+    @contextmanager
+    def _transaction(self):
+        db = self._connect()
+        db.execute("BEGIN IMMEDIATE")
+        try:
+            yield db
+            db.execute("COMMIT")
+        except BaseException:
+            db.execute("ROLLBACK")
+            raise
+
+    def get(self, session_id, key, default=None):
+        row = self._connect().execute(
+            "SELECT value FROM session_state WHERE session_id = ? AND key = ?", (session_id, key)
+        ).fetchone()
+        return _decode(row[0] if row else None, default)
+
+    def set(self, session_id, key, value):
+        self._connect().execute(
+            "INSERT OR REPLACE INTO session_state VALUES (?, ?, ?, ?)",
+            (session_id, key, _encode(value), time.time()),
+        )
+
+    def incr(self, session_id, key, amount=1):
+        with self._transaction() as db:
+            row = db.execute(
+                "SELECT value FROM session_state WHERE session_id = ? AND key = ?", (session_id, key)
+            ).fetchone()
+            value = _decode(row[0] if row else None, 0) + amount
+            db.execute(
+                "INSERT OR REPLACE INTO session_state VALUES (?, ?, ?, ?)",
+                (session_id, key, _encode(value), time.time()),
+            )
+        return value
+
+    def get_all(self, session_id):
+        rows = self._connect().execute(
+            "SELECT key, value FROM session_state WHERE session_id = ?", (session_id,)
+        ).fetchall()
+        return {key: _decode(value) for key, value in rows}
+
+    def delete(self, session_id):
+        self._connect().execute("DELETE FROM session_state WHERE session_id = ?", (session_id,))
+
+
+@contextmanager
+def file_lock(path):
+    """Exclusive OS-level lock on path (fcntl on POSIX, msvcrt on Windows)."""
+    with open(path, "a+b") as f:
+        try:
+            import fcntl
+
+            fcntl.flock(f, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(f, fcntl.LOCK_UN)
+        except ImportError:
+            import msvcrt
+
+            f.seek(0)
+            msvcrt.locking(f.fileno(), msvcrt.LK_LOCK, 1)
+            try:
+                yield
+            finally:
+                f.seek(0)
+                msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
+
+
+class FileLockBackend:
+    """One JSON file per session; every read-modify-write holds the session's lock file."""
+
+    def __init__(self, directory):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, session_id):
+        return os.path.join(self.directory, re.sub(r"[^A-Za-z0-9_.-]", "_", str(session_id)) + ".json")
+
+    def _read(self, path):
+        try:
+            with open(path, "rb") as f:
+                return codec.loads(f.read())
+        except (FileNotFoundError, ValueError):
+            return {}
+
+    def _write(self, path, values):
+        with open(path + ".tmp", "wb") as f:
+            f.write(codec.dumpb(values))
+        os.replace(path + ".tmp", path)
+
+    @contextmanager
+    def _locked(self, session_id):
+        path = self._path(session_id)
+        with file_lock(path + ".lock"):
+            yield path
+
+    def get(self, session_id, key, default=None):
+        return self._read(self._path(session_id)).get(key, default)
+
+    def set(self, session_id, key, value):
+        with self._locked(session_id) as path:
+            values = self._read(path)
+            values[key] = value
+            self._write(path, values)
+
+    def incr(self, session_id, key, amount=1):
+        with self._locked(session_id) as path:
+            values = self._read(path)
+            values[key] = values.get(key, 0) + amount
+            self._write(path, values)
+            return values[key]
+
+    def get_all(self, session_id):
+        return self._read(self._path(session_id))
+
+    def delete(self, session_id):
+        with self._locked(session_id) as path:
+            if os.path.exists(path):
+                os.remove(path)
+
+
+class LocalRedis:
+    """
+    In-process stand-in for the Redis commands RedisBackend uses
+    (HGET, HSET, HINCRBY, HGETALL, DEL, EXPIRE), with decode_responses=True semantics.
+    """
+
+    def __init__(self):
+        self.hashes = {}
+        self.expiry = {}
+        self.lock = threading.Lock()
+
+    def _live(self, name):
+        deadline = self.expiry.get(name)
+        if deadline is not None and deadline <= time.time():
+            self.hashes.pop(name, None)
+            self.expiry.pop(name, None)
+        return self.hashes.get(name)
+
+    def hget(self, name, key):
+        with self.lock:
+            return (self._live(name) or {}).get(key)
+
+    def hset(self, name, key, value):
+        with self.lock:
+            values = self._live(name)
+            if values is None:
+                values = self.hashes[name] = {}
+            created = key not in values
+            values[key] = str(value)
+            return int(created)
+
+    def hincrby(self, name, key, amount=1):
+        with self.lock:
+            values = self._live(name)
+            if values is None:
+                values = self.hashes[name] = {}
+            value = int(values.get(key, 0)) + amount
+            values[key] = str(value)
+            return value
+
+    def hgetall(self, name):
+        with self.lock:
+            return dict(self._live(name) or {})
+
+    def delete(self, *names):
+        with self.lock:
+            removed = 0
+            for name in names:
+                removed += self.hashes.pop(name, None) is not None
+                self.expiry.pop(name, None)
+            return removed
+
+    def expire(self, name, seconds):
+        with self.lock:
+            if self._live(name) is None:
+                return False
+            self.expiry[name] = time.time() + seconds
+            return True
+
+
+class RedisBackend:
+    """
+    One hash per session ("session:<id>"), refreshed to a TTL on every write.
+    :param client: redis.Redis(decode_responses=True) or LocalRedis().
+    """
+
+    def __init__(self, client, ttl=24 * 3600, prefix="session:"):
+        self.client = client
+        self.ttl = ttl
+        self.prefix = prefix
+
+    @classmethod
+    def from_url(cls, url, **kwargs):
+        import redis
+
+        return cls(redis.Redis.from_url(url, decode_responses=True), **kwargs)
+
+    def _name(self, session_id):
+        return f"{self.prefix}{session_id}"
+
+    def get(self, session_id, key, default=None):
+        return _decode(self.client.hget(self._name(session_id), key), default)
+
+    def set(self, session_id, key, value):
+        name = self._name(session_id)
+        self.client.hset(name, key, _encode(value))
+        self.client.expire(name, self.ttl)
+
+    def incr(self, session_id, key, amount=1):
+        name = self._name(session_id)
+        value = self.client.hincrby(name, key, amount)
+        self.client.expire(name, self.ttl)
+        return value
+
+    def get_all(self, session_id):
+        return {k: _decode(v) for k, v in self.client.hgetall(self._name(session_id)).items()}
+
+    def delete(self, session_id):
+        self.client.delete(self._name(session_id))
+
+
+def backend_from_env(default_dir=".sessions"):
+    """
+    Picks a backend from SESSION_BACKEND (memory, sqlite, file, redis, local-redis).
+    SESSION_STORE_PATH sets the sqlite file / file folder; REDIS_URL the Redis server.
+    """
+    kind = os.getenv("SESSION_BACKEND", "memory").lower()
+    if kind == "sqlite":
+        return SqliteBackend(os.getenv("SESSION_STORE_PATH", os.path.join(default_dir, "sessions.db")))
+    if kind == "file":
+        return FileLockBackend(os.getenv("SESSION_STORE_PATH", default_dir))
+    if kind == "redis":
+        return RedisBackend.from_url(os.getenv("REDIS_URL", "redis://localhost:6379/0"))
+    if kind == "local-redis":
+        return RedisBackend(LocalRedis())
+    if kind != "memory":
+        raise ValueError(f"Unknown SESSION_BACKEND: {kind}")
+    return MemoryBackend()
+
+
+# 2. Session view
+# ---------------------------------------------------------------------
+
+class SharedSession:
+    """`cl.user_session`-like view of one session in a backend."""
+
+    def __init__(self, backend, session_id):
+        self.backend = backend
+        self.session_id = session_id
+
+    def get(self, key, default=None):
+        return self.backend.get(self.session_id, key, default)
+
+    def set(self, key, value):
+        self.backend.set(self.session_id, key, value)
+
+    def incr(self, key, amount=1):
+        return self.backend.incr(self.session_id, key, amount)
+
+    def values(self):
+        return self.backend.get_all(self.session_id)
+
+    def clear(self):
+        self.backend.delete(self.session_id)
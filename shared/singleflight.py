@@ -0,0 +1,304 @@
+"""
+Single-flight chat completions
+------------------------------
+When a talk ends, many attendees ask the same question within seconds, and
+each of them would otherwise start an identical streaming completion.
+`SingleFlight` wraps any chat with an async `create(**kwargs)` (an
+`AsyncAzureOpenAI`-style `chat.completions`, a `HedgedChat`, ...) and runs
+identical requests that overlap in time as one upstream call:
+
+- Requests are identified by a canonical key: a hash of the keyword arguments
+  (model/deployment, messages and every sampling parameter) serialized with
+  sorted keys, so dict ordering does not matter
+- The first request for a key starts the upstream call in its own task; later
+  identical requests join it while it is in flight
+- Every chunk is kept and fanned out to all subscribers as it arrives; a
+  subscriber that joins late first gets the chunks it missed, then the live ones
+- Cancellation is per session: a subscriber that stops (closed stream,
+  cancelled handler) only leaves the flight. The upstream stream is closed when
+  the last subscriber leaves, so nobody pays for tokens no one reads
+- An upstream error is raised to every subscriber of that flight; the next
+  identical request starts a new call
+- `summary()`: requests, upstream calls, requests that joined one, and
+  cancellations
+
+Only requests that are in flight at the same time are shared; nothing is
+cached once the stream ends. Non-streaming requests are coalesced the same way
+(every caller gets the same response object).
+
+Usage (async):
+    chat = SingleFlight(pool_from_env())
+    stream = await chat.create(messages=messages, max_completion_tokens=1500, stream=True)
+    async with stream:                      # leaves the flight if the handler stops early
+        async for chunk in stream:
+            ...
+    print(chat.summary())
+
+Compare independent vs single-flight calls against the mock backend:
+    python -m shared.singleflight --sessions 60 --questions 3
+"""
+import asyncio
+import hashlib
+import json
+import sys
+import time
+
+from shared.stats import summarize
+
+
+def request_key(kwargs):
+    """Canonical hash of a request: same model, messages and parameters give the same key."""
+    canonical = json.dumps(kwargs, sort_keys=True, separators=(",", ":"), ensure_ascii=False, default=str)
+    return hashlib.blake2b(canonical.encode("utf-8"), digest_size=16).hexdigest()
+
+
+# 1. One upstream call and its subscribers
+# ---------------------------------------------------------------------
+
+class _Flight:
+    def __init__(self, key, stream):
+        self.key = key
+        self.stream = stream
+        self.chunks = []            # every chunk received so far, in order
+        self.response = None        # the response of a non-streaming request
+        self.started = False        # upstream create() returned
+        self.done = False
+        self.error = None
+        self.subscribers = 0
+        self.changed = asyncio.Condition()
+        self.task = None
+
+    async def wait(self, predicate):
+        async with self.changed:
+            await self.changed.wait_for(predicate)
+
+    async def notify(self, **updates):
+        async with self.changed:
+            for name, value in updates.items():
+                setattr(self, name, value)
+            self.changed.notify_all()
+
+
+class FlightStream:
+    """
+    One subscriber's view of a streaming flight: an async iterator over the
+    chunks (replayed from the start, then live). `close()` (or leaving an
+    `async with` block) leaves the flight without affecting other subscribers.
+    """
+
+    def __init__(self, owner, flight):
+        self._owner = owner
+        self._flight = flight
+        self._position = 0
+        self._closed = False
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        flight = self._flight
+        if self._closed:
+            raise StopAsyncIteration
+        try:
+            await flight.wait(lambda: len(flight.chunks) > self._position or flight.done)
+        except BaseException:
+            # Cancelled while waiting for the next chunk: only this session stops
+            await self.close()
+            raise
+        if len(flight.chunks) > self._position:
+            chunk = flight.chunks[self._position]
+            self._position += 1
+            return chunk
+        await self.close()
+        if flight.error is not None:
+            raise flight.error
+        raise StopAsyncIteration
+
+    async def close(self):
+        if not self._closed:
+            self._closed = True
+            self._owner._leave(self._flight, cancelled=not self._flight.done)
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.close()
+
+    aclose = close
+
+
+class SingleFlight:
+    """
+    :param chat: Anything with an async create(**kwargs), e.g. client.chat.completions or a HedgedChat.
+    :param key: Function from the request kwargs to its dedup key (default: request_key).
+    """
+
+    def __init__(self, chat, key=request_key):
+        self.chat = chat
+        self.key = key
+        self.flights = {}           # {key: _Flight} in flight
+        self.requests = 0
+        self.upstream = 0
+        self.joined = 0
+        self.cancelled = 0          # subscribers that left before the end of their stream
+        self.upstream_cancelled = 0  # upstream streams closed because every subscriber left
+
+    async def create(self, **kwargs):
+        """Same arguments as the wrapped create(); a FlightStream when stream=True, else the response."""
+        self.requests += 1
+        key = self.key(kwargs)
+        flight = self.flights.get(key)
+        if flight is None:
+            flight = _Flight(key, bool(kwargs.get("stream")))
+            self.flights[key] = flight
+            self.upstream += 1
+            flight.task = asyncio.create_task(self._run(flight, kwargs))
+        else:
+            self.joined += 1
+        flight.subscribers += 1
+
+        try:
+            # Wait until the upstream call returned (or failed), like the wrapped create()
+            await flight.wait(lambda: flight.started or flight.done)
+        except BaseException:
+            self._leave(flight, cancelled=True)
+            raise
+        if not flight.stream:
+            try:
+                await flight.wait(lambda: flight.done)
+            except BaseException:
+                self._leave(flight, cancelled=True)
+                raise
+            self._leave(flight, cancelled=False)
+            if flight.error is not None:
+                raise flight.error
+            return flight.response
+        if flight.error is not None and not flight.chunks:
+            self._leave(flight, cancelled=False)
+            raise flight.error
+        return FlightStream(self, flight)
+
+    async def _run(self, flight, kwargs):
+        """Runs the upstream call in its own task, so no subscriber's cancellation reaches it."""
+        response = None
+        try:
+            response = await self.chat.create(**kwargs)
+            if not flight.stream:
+                await flight.notify(response=response, started=True)
+                return
+            await flight.notify(started=True)
+            async for chunk in response:
+                async with flight.changed:
+                    flight.chunks.append(chunk)
+                    flight.changed.notify_all()
+        except asyncio.CancelledError:
+            flight.error = asyncio.CancelledError("every subscriber left")
+        except Exception as e:
+            flight.error = e
+        finally:
+            if self.flights.get(flight.key) is flight:
+                del self.flights[flight.key]
+            close = getattr(response, "aclose", None) or getattr(response, "close", None)
+            if flight.stream and close is not None:
+                try:
+                    await close()
+                except Exception:
+                    pass
+            await flight.notify(done=True)
+
+    def _leave(self, flight, cancelled):
+        flight.subscribers -= 1
+        if cancelled:
+            self.cancelled += 1
+        if flight.subscribers <= 0 and not flight.done and flight.task is not None:
+            # Nobody reads this stream any more: stop the upstream call
+            if self.flights.get(flight.key) is flight:
+                del self.flights[flight.key]
+            self.upstream_cancelled += 1
+            flight.task.cancel()
+
+    def summary(self):
+        shared = self.joined / self.requests if self.requests else 0.0
+        return (
+            f"{self.requests} requests: {self.upstream} upstream calls, {self.joined} joined one in flight "
+            f"({shared:.0%}), {self.cancelled} left early, {self.upstream_cancelled} upstream streams closed"
+        )
+
+
+# 2. Evaluation against the mock backend
+# ---------------------------------------------------------------------
+
+async def _burst(chat, sessions, questions, spread, cancel_rate, seed=1):
+    """sessions simultaneous askers (within spread seconds) of questions distinct prompts."""
+    import random
+
+    rng = random.Random(seed)
+    first_token, total = [], []
+
+    async def one(i):
+        await asyncio.sleep(rng.uniform(0, spread))
+        cancel_after = 3 if rng.random() < cancel_rate else None
+        started = time.perf_counter()
+        stream = await chat.create(
+            messages=[{"role": "user", "content": f"Question {i % questions}: what should I see in Barcelona?"}],
+            max_completion_tokens=60,
+            stream=True,
+        )
+        received = 0
+        try:
+            async for _ in stream:
+                if received == 0:
+                    first_token.append(time.perf_counter() - started)
+                received += 1
+                if cancel_after is not None and received >= cancel_after:
+                    break
+        finally:
+            close = getattr(stream, "aclose", None) or getattr(stream, "close", None)
+            if close is not None:
+                await close()
+        if cancel_after is None:
+            total.append(time.perf_counter() - started)
+
+    await asyncio.gather(*(one(i) for i in range(sessions)))
+    return summarize(first_token), summarize(total)
+
+
+def main():
+    import argparse
+
+    from openai import AsyncAzureOpenAI
+
+    from shared.hedging import Endpoint, HedgedChat
+    from shared.mock_backend import MockBackend
+
+    parser = argparse.ArgumentParser(description="Compare independent and single-flight streaming calls on the mock backend")
+    parser.add_argument("--sessions", type=int, default=60, help="sessions asking at the same time")
+    parser.add_argument("--questions", type=int, default=3, help="distinct questions among them")
+    parser.add_argument("--spread", type=float, default=0.5, help="seconds over which the questions arrive")
+    parser.add_argument("--cancel-rate", type=float, default=0.1, help="share of sessions that stop after 3 chunks")
+    args = parser.parse_args()
+
+    config = {"ttft": {"dist": "lognormal", "median": 0.4, "sigma": 0.2}, "tokens_per_sec": 60}
+    print(f"\n🧪 {args.sessions} sessions, {args.questions} distinct questions within {args.spread}s, "
+          f"{args.cancel_rate:.0%} stop early\n")
+    print(f"{'mode':<14} {'upstream':>9} {'ttft p50':>9} {'ttft p95':>9} {'total p95':>10}")
+    print("-" * 56)
+    with MockBackend(config) as backend:
+        flight = None
+        for label in ("independent", "single-flight"):
+            client = AsyncAzureOpenAI(azure_endpoint=backend.url, api_key="mock", api_version="2024-10-21", max_retries=0)
+            pool = HedgedChat([Endpoint("mock", client, "mock")])     # one deployment: a plain call
+            chat = pool if label == "independent" else SingleFlight(pool)
+            before = backend.state.stats["streams"]
+            ttft, total = asyncio.run(_burst(chat, args.sessions, args.questions, args.spread, args.cancel_rate))
+            streams = backend.state.stats["streams"] - before
+            print(f"{label:<14} {streams:>9} {ttft['p50']:>8.3f}s {ttft['p95']:>8.3f}s {total['p95']:>9.3f}s")
+            if label == "single-flight":
+                flight = chat
+    print(f"\n🛫 {flight.summary()}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
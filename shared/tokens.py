@@ -0,0 +1,300 @@
+"""
+Pre-flight token accounting and budgets
+---------------------------------------
+The samples only learn what a request cost from `resp.usage`, after it has
+been paid for. This module counts prompt tokens locally before the call:
+
+- `Tokenizer` uses tiktoken when installed (encoding picked by model name) and a
+  ~4 characters/token estimate otherwise; counts are cached per text, so the
+  history that is re-sent every turn is tokenized once
+- `TokenAccountant.preflight()` refuses prompts that do not fit the context
+  window or the remaining per-user / per-session budget (`BudgetExceeded`) and
+  shrinks `max_completion_tokens` to what is left
+- The tokens and cost a pre-flight allows are reserved against those budgets at
+  once, so concurrent requests of one user cannot all spend the same remainder;
+  `record(..., plan=plan)` swaps the reservation for the actual usage and
+  `release(plan)` drops it when the call failed
+- `UsageCounters` aggregates actual usage per user, per session and per deployment
+
+Budgets come from USER_TOKEN_BUDGET, SESSION_TOKEN_BUDGET, USER_COST_BUDGET and
+SESSION_COST_BUDGET (unset = unlimited). Costs use PROMPT_PRICE_PER_1K and
+COMPLETION_PRICE_PER_1K (default 0: set them to your deployment's prices).
+
+Usage:
+    accountant = TokenAccountant.from_env(DEPLOYMENT)
+    plan = accountant.preflight(messages, user=user_name, session=session_id, max_completion_tokens=1000)
+    try:
+        resp = client.chat.completions.create(..., max_completion_tokens=plan.max_completion_tokens)
+        accountant.record(resp.usage, user=user_name, session=session_id, plan=plan)
+    finally:
+        accountant.release(plan)        # no-op once recorded
+"""
+import math
+import os
+import threading
+from functools import lru_cache
+
+# Tokens the chat format adds around every message and before the reply
+TOKENS_PER_MESSAGE = 3
+TOKENS_PER_REPLY = 3
+
+DEFAULT_CONTEXT_WINDOW = 128000
+CONTEXT_WINDOWS = {
+    "gpt-4o": 128000,
+    "gpt-4.1": 1047576,
+    "gpt-4": 8192,
+    "gpt-35-turbo": 16385,
+    "o1": 200000,
+    "o3": 200000,
+    "o4-mini": 200000,
+}
+
+
+class BudgetExceeded(Exception):
+    """Raised by preflight() when a request must not be sent."""
+
+
+# 1. Tokenizer
+# ---------------------------------------------------------------------
+
+class Tokenizer:
+    def __init__(self, model=None, cache_size=4096):
+        self.encoding = self._load_encoding(model)
+        self.exact = self.encoding is not None
+        self.count = lru_cache(maxsize=cache_size)(self._count)
+
+    @staticmethod
+    def _load_encoding(model):
+        try:
+            import tiktoken
+        except ImportError:
+            return None
+        try:
+            return tiktoken.encoding_for_model(model or "gpt-4o")
+        except KeyError:
+            return tiktoken.get_encoding("o200k_base")
+
+    def _count(self, text):
+        if not text:
+            return 0
+        if self.encoding is not None:
+            return len(self.encoding.encode(text))
+        return math.ceil(len(text) / 4)
+
+    def count_messages(self, messages):
+        total = TOKENS_PER_REPLY
+        for message in messages:
+            content = message.get("content") or ""
+            if not isinstance(content, str):
+                content = str(content)
+            total += TOKENS_PER_MESSAGE + self.count(message.get("role", "")) + self.count(content)
+        return total
+
+
+@lru_cache(maxsize=None)
+def get_tokenizer(model=None):
+    """One shared Tokenizer per model (loading an encoding takes a while)."""
+    return Tokenizer(model)
+
+
+def context_window(model):
+    """Context window for a model or deployment name (MODEL_CONTEXT_WINDOW overrides)."""
+    override = os.getenv("MODEL_CONTEXT_WINDOW")
+    if override:
+        return int(override)
+    name = (model or "").lower()
+    for prefix in sorted(CONTEXT_WINDOWS, key=len, reverse=True):
+        if name.startswith(prefix):
+            return CONTEXT_WINDOWS[prefix]
+    return DEFAULT_CONTEXT_WINDOW
+
+
+# 2. Usage counters
+# ---------------------------------------------------------------------
+
+class UsageCounters:
+    """
+    [prompt_tokens, completion_tokens, cost, requests] per (scope, key); scope is user/session/deployment.
+    `reserved` holds [tokens, cost] promised to requests still in flight.
+    """
+
+    def __init__(self):
+        self.values = {}
+        self.reserved = {}
+        # Re-entrant: preflight holds it across its budget checks and the reservation
+        self.lock = threading.RLock()
+
+    def add(self, scopes, prompt_tokens, completion_tokens, cost):
+        with self.lock:
+            for scope in scopes:
+                entry = self.values.get(scope)
+                if entry is None:
+                    entry = self.values[scope] = [0, 0, 0.0, 0]
+                entry[0] += prompt_tokens
+                entry[1] += completion_tokens
+                entry[2] += cost
+                entry[3] += 1
+
+    def reserve(self, scopes, tokens, cost):
+        """Adds (or, with negative amounts, takes back) a reservation in each scope."""
+        with self.lock:
+            for scope in scopes:
+                entry = self.reserved.setdefault(scope, [0, 0.0])
+                entry[0] += tokens
+                entry[1] += cost
+                if entry[0] <= 0 and entry[1] <= 1e-12:
+                    del self.reserved[scope]
+
+    def get(self, scope, key):
+        prompt, completion, cost, requests = self.values.get((scope, key), (0, 0, 0.0, 0))
+        reserved_tokens, reserved_cost = self.reserved.get((scope, key), (0, 0.0))
+        return {"prompt_tokens": prompt, "completion_tokens": completion,
+                "total_tokens": prompt + completion, "cost": cost, "requests": requests,
+                "reserved_tokens": reserved_tokens, "reserved_cost": reserved_cost}
+
+    def snapshot(self, scope=None):
+        """{scope: {key: totals}}, or {key: totals} for one scope."""
+        result = {}
+        for entry_scope, key in list(self.values):
+            result.setdefault(entry_scope, {})[key] = self.get(entry_scope, key)
+        return result.get(scope, {}) if scope else result
+
+
+# 3. Budgets and pre-flight checks
+# ---------------------------------------------------------------------
+
+class Budget:
+    """Token and/or cost ceiling; None means unlimited. Reservations count as spent."""
+
+    def __init__(self, max_tokens=None, max_cost=None):
+        self.max_tokens = max_tokens
+        self.max_cost = max_cost
+
+    def remaining_tokens(self, used):
+        return None if self.max_tokens is None else self.max_tokens - used["total_tokens"] - used["reserved_tokens"]
+
+    def remaining_cost(self, used):
+        return None if self.max_cost is None else self.max_cost - used["cost"] - used["reserved_cost"]
+
+
+class Preflight:
+    """Limits for one request; `scopes` hold its reservation until record() or release()."""
+
+    def __init__(self, prompt_tokens, max_completion_tokens, estimated_cost, scopes=()):
+        self.prompt_tokens = prompt_tokens
+        self.max_completion_tokens = max_completion_tokens
+        self.estimated_cost = estimated_cost
+        self.scopes = list(scopes)
+
+    @property
+    def reserved_tokens(self):
+        return self.prompt_tokens + self.max_completion_tokens
+
+
+class TokenAccountant:
+    """
+    :param deployment: Deployment name, used for the per-deployment counters.
+    :param model: Model name for the tokenizer and context window (defaults to deployment).
+    :param min_completion_tokens: Smallest useful answer; less room than this is refused.
+    """
+
+    def __init__(self, deployment, model=None, user_budget=None, session_budget=None,
+                 prompt_price_per_1k=0.0, completion_price_per_1k=0.0, min_completion_tokens=64,
+                 counters=None):
+        self.deployment = deployment
+        self.model = model or deployment
+        self.tokenizer = get_tokenizer(self.model)
+        self.context_window = context_window(self.model)
+        self.user_budget = user_budget or Budget()
+        self.session_budget = session_budget or Budget()
+        self.prompt_price = prompt_price_per_1k / 1000.0
+        self.completion_price = completion_price_per_1k / 1000.0
+        self.min_completion_tokens = min_completion_tokens
+        self.counters = counters or UsageCounters()
+
+    @classmethod
+    def from_env(cls, deployment, model=None):
+        def number(name, kind=float):
+            value = os.getenv(name)
+            return kind(value) if value else None
+
+        return cls(
+            deployment,
+            model=model or os.getenv("AZURE_OPENAI_MODEL_NAME"),
+            user_budget=Budget(number("USER_TOKEN_BUDGET", int), number("USER_COST_BUDGET")),
+            session_budget=Budget(number("SESSION_TOKEN_BUDGET", int), number("SESSION_COST_BUDGET")),
+            prompt_price_per_1k=number("PROMPT_PRICE_PER_1K") or 0.0,
+            completion_price_per_1k=number("COMPLETION_PRICE_PER_1K") or 0.0,
+        )
+
+    def cost(self, prompt_tokens, completion_tokens):
+        return prompt_tokens * self.prompt_price + completion_tokens * self.completion_price
+
+    def preflight(self, messages, user=None, session=None, max_completion_tokens=1000):
+        """
+        Counts the prompt, checks the budgets and returns the completion limit to send.
+        The prompt plus that limit is reserved in the user and session budgets until
+        record(..., plan=plan) or release(plan).
+        """
+        prompt_tokens = self.tokenizer.count_messages(messages)
+        limit = min(max_completion_tokens, self.context_window - prompt_tokens)
+        if limit < self.min_completion_tokens:
+            raise BudgetExceeded(
+                f"prompt has {prompt_tokens} tokens; the {self.context_window}-token context leaves no room for an answer"
+            )
+
+        scopes = [(label, key) for label, key in (("user", user), ("session", session)) if key is not None]
+        # Check and reserve in one step: a concurrent preflight sees this reservation
+        with self.counters.lock:
+            for label, budget, key in (("user", self.user_budget, user), ("session", self.session_budget, session)):
+                used = self.counters.get(label, key)
+                tokens_left = budget.remaining_tokens(used)
+                if tokens_left is not None:
+                    limit = min(limit, tokens_left - prompt_tokens)
+                cost_left = budget.remaining_cost(used)
+                if cost_left is not None and self.completion_price:
+                    affordable = (cost_left - prompt_tokens * self.prompt_price) / self.completion_price
+                    limit = min(limit, int(affordable))
+                if limit < self.min_completion_tokens:
+                    raise BudgetExceeded(
+                        f"{label} budget exhausted ({used['total_tokens']} tokens, cost {used['cost']:.4f} used, "
+                        f"{used['reserved_tokens']} reserved by requests in flight)"
+                    )
+            plan = Preflight(prompt_tokens, limit, self.cost(prompt_tokens, limit), scopes)
+            self.counters.reserve(plan.scopes, plan.reserved_tokens, plan.estimated_cost)
+        return plan
+
+    def release(self, plan):
+        """Gives back what preflight() reserved for plan; does nothing once recorded or released."""
+        if plan is None or not plan.scopes:
+            return
+        with self.counters.lock:
+            self.counters.reserve(plan.scopes, -plan.reserved_tokens, -plan.estimated_cost)
+            plan.scopes = []
+
+    def record(self, usage, user=None, session=None, plan=None):
+        """
+        Adds the actual usage of a response to the user, session and deployment counters,
+        replacing the reservation of plan (the preflight of this request) when given.
+        """
+        if usage is None:
+            return
+        prompt_tokens = getattr(usage, "prompt_tokens", None) or 0
+        completion_tokens = getattr(usage, "completion_tokens", None) or 0
+        scopes = [("deployment", self.deployment)]
+        if user is not None:
+            scopes.append(("user", user))
+        if session is not None:
+            scopes.append(("session", session))
+        with self.counters.lock:
+            self.release(plan)
+            self.counters.add(scopes, prompt_tokens, completion_tokens, self.cost(prompt_tokens, completion_tokens))
+
+    def summary(self):
+        used = self.counters.get("deployment", self.deployment)
+        counting = "tiktoken" if self.tokenizer.exact else "estimated"
+        return (
+            f"{self.deployment}: {used['requests']} requests, {used['total_tokens']} tokens "
+            f"(prompt {used['prompt_tokens']}, completion {used['completion_tokens']}), cost {used['cost']:.4f} "
+            f"[{counting} pre-flight counts]"
+        )
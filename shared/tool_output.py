@@ -0,0 +1,291 @@
+"""
+Token-lean tool outputs
+-----------------------
+Tool outputs become part of the run's context. Every later step of the run
+bills them again as prompt tokens. The EX3 tools returned `json.dumps(...)`
+with the default separators, and list endpoints such as
+`get_all_inventory_inventory_get` repeat every key of every item. The
+`ToolOutputCompactor` post-processes a tool's output before it is submitted:
+
+- Schema-aware field selection: only properties declared in the function or
+  OpenAPI response schema are kept (optionally a narrower `fields` list),
+  and empty optional values are dropped
+- Compact JSON: no whitespace after separators, non-ASCII text kept as-is
+  (`25°C` instead of `25\\u00b0C`)
+- Columnar encoding for lists of objects: `{"cols": [...], "rows": [[...], ...]}`,
+  so each key appears once instead of once per item
+- Size caps: `max_items` per list, `max_string` per value and `max_chars` for the
+  whole output (rows are dropped from the end and the count of omitted rows is reported)
+- `report()`: per-tool tokens before and after
+
+Usage:
+    compactor = ToolOutputCompactor()
+    compactor.register("fetch_weather", {"type": "object", "properties": {"weather": {"type": "string"}}})
+    compactor.register_openapi(spec, max_items=50)                  # every operation's 200 response schema
+    output = compactor.encode(tool_call.function.name, fetch_weather("Barcelona"))
+    print(compactor.report())
+
+Compare raw and compact encodings of sample payloads for an OpenAPI spec:
+    python -m shared.tool_output EX3-AgentWithTools/samples/openApiDef/InventoryAPI.json --items 40
+"""
+import json
+import random
+import sys
+import threading
+
+from shared.codec import get_codec
+from shared.tokens import get_tokenizer
+
+DEFAULT_MAX_ITEMS = 100
+DEFAULT_MAX_STRING = 500
+DEFAULT_MAX_CHARS = 16000
+# Lists shorter than this stay as plain objects (the column header would not pay off)
+MIN_COLUMNAR_ROWS = 2
+
+codec = get_codec()
+
+
+# 1. Schemas
+# ---------------------------------------------------------------------
+
+def resolve_refs(schema, root, depth=0):
+    """Inlines local "$ref"s ("#/components/schemas/X"); specs loaded with jsonref are already resolved."""
+    if depth > 20 or not isinstance(schema, dict):
+        return schema
+    if "$ref" in schema and isinstance(schema["$ref"], str) and schema["$ref"].startswith("#/"):
+        target = root
+        for part in schema["$ref"][2:].split("/"):
+            target = target.get(part, {})
+        return resolve_refs(target, root, depth + 1)
+    resolved = dict(schema)
+    if "items" in resolved:
+        resolved["items"] = resolve_refs(resolved["items"], root, depth + 1)
+    if "properties" in resolved:
+        resolved["properties"] = {k: resolve_refs(v, root, depth + 1) for k, v in resolved["properties"].items()}
+    for key in ("allOf", "anyOf", "oneOf"):
+        if key in resolved:
+            resolved[key] = [resolve_refs(s, root, depth + 1) for s in resolved[key]]
+    return resolved
+
+
+def response_schemas(spec):
+    """{operationId: resolved JSON schema of the 200/201 application/json response}."""
+    schemas = {}
+    for operations in spec.get("paths", {}).values():
+        for operation in operations.values():
+            if not isinstance(operation, dict) or "operationId" not in operation:
+                continue
+            responses = operation.get("responses", {})
+            response = responses.get("200") or responses.get("201") or {}
+            schema = response.get("content", {}).get("application/json", {}).get("schema")
+            if schema:
+                schemas[operation["operationId"]] = resolve_refs(schema, spec)
+    return schemas
+
+
+class ToolSpec:
+    """
+    :param schema: JSON schema of the tool's output (empty = keep everything).
+    :param fields: Property names to keep from objects (default: all declared properties).
+    :param max_items: Longest list kept; the rest is summarized as a count.
+    :param max_string: Longest string value kept, in characters.
+    :param max_chars: Budget for the whole encoded output.
+    """
+
+    def __init__(self, name, schema=None, fields=None, max_items=DEFAULT_MAX_ITEMS,
+                 max_string=DEFAULT_MAX_STRING, max_chars=DEFAULT_MAX_CHARS):
+        self.name = name
+        self.schema = schema or {}
+        self.fields = set(fields) if fields else None
+        self.max_items = max_items
+        self.max_string = max_string
+        self.max_chars = max_chars
+
+
+# 2. Compaction
+# ---------------------------------------------------------------------
+
+def _object_schema(schema):
+    """The object schema describing dict values (looks through allOf/anyOf/oneOf)."""
+    if not isinstance(schema, dict):
+        return {}
+    if "properties" in schema:
+        return schema
+    for key in ("allOf", "anyOf", "oneOf"):
+        for option in schema.get(key, ()):
+            if isinstance(option, dict) and "properties" in option:
+                return option
+    return {}
+
+
+def prune(value, schema, spec, select=None):
+    """
+    Drops undeclared properties and empty optional values and truncates long strings.
+    select (spec.fields) applies to the record level: the top-level object or the items of a top-level list.
+    """
+    if isinstance(value, dict):
+        object_schema = _object_schema(schema)
+        properties = object_schema.get("properties")
+        required = set(object_schema.get("required", ()))
+        result = {}
+        for key, item in value.items():
+            if properties is not None and key not in properties:
+                continue
+            if select is not None and key not in select:
+                continue
+            if item in (None, "", [], {}) and key not in required:
+                continue
+            result[key] = prune(item, (properties or {}).get(key, {}), spec)
+        return result
+    if isinstance(value, list):
+        item_schema = schema.get("items", {}) if isinstance(schema, dict) else {}
+        return [prune(item, item_schema, spec, select) for item in value]
+    if isinstance(value, str) and len(value) > spec.max_string:
+        return value[:spec.max_string] + "…"
+    return value
+
+
+def columnar(rows):
+    """{"cols": [...], "rows": [[...]]} for a list of dicts; columns that are empty in every row are left out."""
+    columns = []
+    for row in rows:
+        for key in row:
+            if key not in columns:
+                columns.append(key)
+    columns = [c for c in columns if any(row.get(c) not in (None, "") for row in rows)]
+    return {"cols": columns, "rows": [[row.get(c) for c in columns] for row in rows]}
+
+
+def _encode_lists(value, max_items):
+    """Applies max_items and columnar encoding to lists of objects, recursively."""
+    if isinstance(value, dict):
+        return {k: _encode_lists(v, max_items) for k, v in value.items()}
+    if isinstance(value, list):
+        omitted = max(0, len(value) - max_items)
+        items = [_encode_lists(v, max_items) for v in value[:max_items]]
+        if len(items) >= MIN_COLUMNAR_ROWS and all(isinstance(v, dict) for v in items):
+            encoded = columnar(items)
+        else:
+            encoded = items
+        if omitted:
+            if isinstance(encoded, dict):
+                encoded["omitted"] = omitted
+            else:
+                encoded = {"items": encoded, "omitted": omitted}
+        return encoded
+    return value
+
+
+def compact(value, spec):
+    """The compact JSON text for value under spec's schema, field selection and caps."""
+    pruned = prune(value, spec.schema, spec, spec.fields)
+    max_items = spec.max_items
+    while True:
+        text = codec.dumps(_encode_lists(pruned, max_items))
+        if len(text) <= spec.max_chars or max_items <= 1:
+            return text[:spec.max_chars] if len(text) > spec.max_chars else text
+        # Over budget: keep proportionally fewer rows and try again
+        max_items = max(1, int(max_items * spec.max_chars / len(text) * 0.9))
+
+
+# 3. Compactor and report
+# ---------------------------------------------------------------------
+
+class ToolOutputCompactor:
+    def __init__(self, tokenizer=None, **defaults):
+        self.specs = {}
+        self.defaults = defaults            # max_items / max_string / max_chars for unregistered tools
+        self.tokenizer = tokenizer or get_tokenizer()
+        self.usage = {}                     # {tool: [calls, tokens_before, tokens_after]}
+        self.lock = threading.Lock()
+
+    def register(self, name, schema=None, fields=None, **caps):
+        self.specs[name] = ToolSpec(name, schema, fields, **{**self.defaults, **caps})
+
+    def register_openapi(self, spec, fields=None, **caps):
+        """Registers every operation of an OpenAPI spec by operationId; fields maps operationId -> names."""
+        for operation_id, schema in response_schemas(spec).items():
+            self.register(operation_id, schema, (fields or {}).get(operation_id), **caps)
+
+    def encode(self, name, output):
+        """Compact text for a tool's output (a JSON string or a Python value); non-JSON text passes through."""
+        raw = output if isinstance(output, str) else json.dumps(output)
+        try:
+            value = codec.loads(raw) if isinstance(output, str) else output
+        except ValueError:
+            return output
+        spec = self.specs.get(name) or ToolSpec(name, **self.defaults)
+        text = compact(value, spec)
+        before, after = self.tokenizer.count(raw), self.tokenizer.count(text)
+        with self.lock:
+            entry = self.usage.setdefault(name, [0, 0, 0])
+            entry[0] += 1
+            entry[1] += before
+            entry[2] += after
+        return text
+
+    def report(self):
+        """One line per tool: calls, tokens before -> after and the share saved."""
+        lines = []
+        for name, (calls, before, after) in sorted(self.usage.items()):
+            saved = before - after
+            share = saved / before if before else 0.0
+            lines.append(f"{name}: {calls} calls, {before} -> {after} tokens ({saved} saved, {share:.0%})")
+        return "\n".join(lines) or "no tool outputs encoded"
+
+
+# 4. Sample payloads for OpenAPI specs
+# ---------------------------------------------------------------------
+
+def sample_value(schema, name="", rng=None, index=0):
+    """A plausible value for a schema (used to measure savings without calling the API)."""
+    rng = rng or random.Random(0)
+    schema = _object_schema(schema) or schema or {}
+    kind = schema.get("type")
+    if "enum" in schema:
+        return rng.choice(schema["enum"])
+    if kind == "object" or "properties" in schema:
+        return {key: sample_value(sub, key, rng, index) for key, sub in schema.get("properties", {}).items()}
+    if kind == "array":
+        return [sample_value(schema.get("items", {}), name, rng, i) for i in range(3)]
+    if kind == "integer":
+        return rng.randint(0, 500)
+    if kind == "number":
+        return round(rng.uniform(1, 900), 2)
+    if kind == "boolean":
+        return rng.random() < 0.5
+    if name.endswith("_id"):
+        return f"{name[:-3].upper()}-{index + 1:04d}"
+    if "date" in name or "updated" in name or name.endswith("_at"):
+        return f"2025-0{rng.randint(1, 9)}-{rng.randint(10, 28)}T08:30:00"
+    return f"{name.replace('_', ' ')} {rng.randint(1, 99)}"
+
+
+def main():
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Tokens of raw vs compact tool outputs for an OpenAPI spec")
+    parser.add_argument("spec", help="OpenAPI JSON file")
+    parser.add_argument("--items", type=int, default=40, help="items in list responses")
+    parser.add_argument("--max-items", type=int, default=DEFAULT_MAX_ITEMS)
+    args = parser.parse_args()
+
+    with open(args.spec, encoding="utf-8") as f:
+        spec = json.load(f)
+    compactor = ToolOutputCompactor(max_items=args.max_items)
+    compactor.register_openapi(spec)
+    rng = random.Random(1)
+    for operation_id, schema in response_schemas(spec).items():
+        if schema.get("type") == "array":
+            payload = [sample_value(schema.get("items", {}), "", rng, i) for i in range(args.items)]
+        else:
+            payload = sample_value(schema, "", rng)
+        compactor.encode(operation_id, json.dumps(payload))
+    counting = "tiktoken" if compactor.tokenizer.exact else "estimated"
+    print(f"\n🧮 Tool output tokens ({counting}), list responses with {args.items} items\n")
+    print(compactor.report())
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,89 @@
+"""
+Stdlib clients for the mock backend, so the tests run without the openai package.
+
+`MockChat` has the async `create(**kwargs)` of `client.chat.completions`:
+a dict for non-streaming calls and an async iterator of chunk dicts (with
+`aclose()`) when stream=True. Requests run in worker threads.
+"""
+import asyncio
+import json
+import os
+import sys
+import urllib.error
+import urllib.request
+
+REPO_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+if REPO_ROOT not in sys.path:
+    sys.path.insert(0, REPO_ROOT)
+
+# Fast, deterministic mock: answers in a few milliseconds
+FAST_CONFIG = {
+    "ttft": {"dist": "fixed", "value": 0.005},
+    "tokens_per_sec": 5000,
+    "completion_tokens": {"min": 3, "max": 5},
+    "embedding_latency": {"dist": "fixed", "value": 0.0},
+    "run_queue_seconds": 0.0,
+    "run_seconds": 0.02,
+}
+
+
+def post_json(url, payload):
+    """(status, body) of a JSON POST; HTTP errors are returned, not raised."""
+    request = urllib.request.Request(url, data=json.dumps(payload).encode("utf-8"),
+                                     headers={"Content-Type": "application/json"})
+    try:
+        with urllib.request.urlopen(request, timeout=30) as response:
+            return response.status, json.loads(response.read())
+    except urllib.error.HTTPError as e:
+        return e.code, json.loads(e.read() or b"{}")
+
+
+def get_json(url):
+    try:
+        with urllib.request.urlopen(url, timeout=30) as response:
+            return response.status, json.loads(response.read())
+    except urllib.error.HTTPError as e:
+        return e.code, json.loads(e.read() or b"{}")
+
+
+class SseStream:
+    """Chunks of a streamed chat completion, read line by line in a worker thread."""
+
+    def __init__(self, response):
+        self.response = response
+        self.closed = False
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        while not self.closed:
+            line = await asyncio.to_thread(self.response.readline)
+            if not line or line.strip() == b"data: [DONE]":
+                break
+            if line.startswith(b"data: "):
+                return json.loads(line[len(b"data: "):])
+        raise StopAsyncIteration
+
+    async def aclose(self):
+        if not self.closed:
+            self.closed = True
+            self.response.close()
+
+
+class MockChat:
+    def __init__(self, base_url, deployment="mock"):
+        self.url = f"{base_url}openai/deployments/{deployment}/chat/completions?api-version=2024-10-21"
+        self.calls = 0
+
+    async def create(self, **kwargs):
+        self.calls += 1
+        if not kwargs.get("stream"):
+            status, body = await asyncio.to_thread(post_json, self.url, kwargs)
+            if status != 200:
+                raise RuntimeError(f"mock returned {status}: {body}")
+            return body
+        request = urllib.request.Request(self.url, data=json.dumps(kwargs).encode("utf-8"),
+                                         headers={"Content-Type": "application/json"})
+        response = await asyncio.to_thread(urllib.request.urlopen, request, None, 30)
+        return SseStream(response)
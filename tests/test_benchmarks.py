@@ -0,0 +1,37 @@
+"""
+Fails when a hot-path micro-benchmark is slower than benchmarks/baseline.json
+by more than the runner's default tolerance.
+
+Run from the repository root:
+    python -m pytest tests/test_benchmarks.py
+"""
+import os
+import sys
+import unittest
+
+REPO_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+sys.path.insert(0, os.path.join(REPO_ROOT, "benchmarks"))
+import run_benchmarks
+
+TOLERANCE = 0.5
+REPEATS = 5
+
+
+class BenchmarkRegressionTests(unittest.TestCase):
+    def test_every_benchmark_has_a_baseline(self):
+        self.assertEqual(sorted(run_benchmarks.BENCHMARKS), sorted(run_benchmarks.load_baseline()))
+
+    def test_no_regression_against_the_baseline(self):
+        baseline = run_benchmarks.load_baseline()
+        _, results = run_benchmarks.run(list(run_benchmarks.BENCHMARKS), REPEATS)
+        ratios, regressions = run_benchmarks.compare(results, baseline, TOLERANCE)
+        if regressions:
+            # One busy moment on a shared runner is not a regression: measure those again
+            _, retried = run_benchmarks.run(regressions, REPEATS)
+            ratios.update(run_benchmarks.compare(retried, baseline, TOLERANCE)[0])
+            regressions = [name for name in regressions if ratios[name] > 1 + TOLERANCE]
+        self.assertEqual(regressions, [], {name: f"{(ratios[name] - 1) * 100:+.1f}%" for name in regressions})
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,151 @@
+"""
+Tests for the JSON codecs and ArgumentsDecoder: the stdlib checks on tool
+arguments, and the same results from the msgspec Struct when it is installed.
+
+Run from the repository root:
+    python -m pytest tests/test_codec.py
+"""
+import importlib.util
+import os
+import sys
+import unittest
+from unittest import mock
+
+REPO_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+sys.path.insert(0, REPO_ROOT)
+from shared.codec import ArgumentsDecoder, available_codecs, decoders_from_definitions, get_codec
+
+HAS_MSGSPEC = importlib.util.find_spec("msgspec") is not None
+
+WEATHER = {
+    "type": "object",
+    "properties": {
+        "location": {"type": "string"},
+        "days": {"type": "integer", "default": 1},
+        "units": {"type": "string", "enum": ["metric", "imperial"]},
+        "max_temp": {"type": "number"},
+        "alerts": {"type": "boolean"},
+        "stops": {"type": "array"},
+        "options": {"type": "object"},
+    },
+    "required": ["location"],
+}
+
+VALID = [
+    '{"location": "Barcelona"}',
+    '{"location": "Tokyo", "days": 3, "units": "metric"}',
+    '{"location": "Lisbon", "max_temp": 25.5, "alerts": true}',
+    '{"location": "Lisbon", "max_temp": 25}',
+    '{"location": "Kyoto", "stops": ["Osaka", "Nara"], "options": {"lang": "en"}}',
+    '{"location": "Paris", "units": null, "extra": "ignored"}',
+    '{"location": "Café ☕"}',
+]
+
+INVALID = [
+    "",
+    "not json",
+    '["Barcelona"]',
+    '{"days": 3}',
+    '{"location": 42}',
+    '{"location": "Tokyo", "days": "3"}',
+    '{"location": "Tokyo", "days": true}',
+    '{"location": "Tokyo", "max_temp": "hot"}',
+    '{"location": "Tokyo", "alerts": "yes"}',
+    '{"location": "Tokyo", "stops": "Osaka"}',
+]
+
+
+def stdlib_decoder(name, schema):
+    """An ArgumentsDecoder built as if msgspec were not installed."""
+    with mock.patch.dict(sys.modules, {"msgspec": None}):
+        return ArgumentsDecoder(name, schema, get_codec("stdlib"))
+
+
+class CodecTests(unittest.TestCase):
+    def test_every_codec_writes_the_same_bytes(self):
+        value = {"weather": "Sunny, 25°C", "days": [1, 2], "ok": True, "none": None}
+        expected = '{"weather":"Sunny, 25°C","days":[1,2],"ok":true,"none":null}'
+        for name in available_codecs():
+            with self.subTest(codec=name):
+                codec = get_codec(name)
+                self.assertEqual(codec.dumps(value), expected)
+                self.assertEqual(codec.dumpb(value), expected.encode("utf-8"))
+                self.assertEqual(codec.dumps({"b": 1, "a": 2}, sort_keys=True), '{"a":2,"b":1}')
+                self.assertEqual(codec.loads(expected), value)
+                self.assertEqual(codec.loads(expected.encode("utf-8")), value)
+
+    def test_decoding_errors_are_value_errors(self):
+        for name in available_codecs():
+            with self.subTest(codec=name), self.assertRaises(ValueError):
+                get_codec(name).loads("{not json")
+
+    def test_unknown_codec_is_rejected(self):
+        with self.assertRaises(ValueError):
+            get_codec("simplejson")
+        self.assertIn("stdlib", available_codecs())
+
+
+class StdlibArgumentsTests(unittest.TestCase):
+    def setUp(self):
+        self.decoder = stdlib_decoder("fetch_weather", WEATHER)
+
+    def test_msgspec_is_not_used(self):
+        self.assertIsNone(self.decoder.struct)
+
+    def test_declared_fields_and_schema_defaults(self):
+        self.assertEqual(self.decoder.decode('{"location": "Barcelona"}'), {"location": "Barcelona", "days": 1})
+        self.assertEqual(
+            self.decoder.decode('{"location": "Tokyo", "days": 3, "extra": "ignored"}'),
+            {"location": "Tokyo", "days": 3},
+        )
+
+    def test_invalid_arguments_raise_value_error(self):
+        for arguments in INVALID:
+            with self.subTest(arguments=arguments), self.assertRaises(ValueError):
+                self.decoder.decode(arguments)
+
+    def test_errors_name_the_tool_and_the_argument(self):
+        with self.assertRaises(ValueError) as raised:
+            self.decoder.decode('{"days": 3}')
+        self.assertIn("fetch_weather", str(raised.exception))
+        self.assertIn("location", str(raised.exception))
+        with self.assertRaises(ValueError) as raised:
+            self.decoder.decode('{"location": "Tokyo", "days": "3"}')
+        self.assertIn("'days'", str(raised.exception))
+
+    def test_schema_without_properties_passes_the_object_through(self):
+        decoder = stdlib_decoder("get_time", {"type": "object", "properties": {}})
+        self.assertEqual(decoder.decode(""), {})
+        self.assertEqual(decoder.decode('{"zone": "CET"}'), {"zone": "CET"})
+
+    def test_decoders_from_definitions(self):
+        definitions = [{"type": "function", "function": {"name": "fetch_weather", "parameters": WEATHER}}]
+        decoders = decoders_from_definitions(definitions)
+        self.assertEqual(list(decoders), ["fetch_weather"])
+        self.assertEqual(decoders["fetch_weather"].decode('{"location": "Rome"}')["location"], "Rome")
+
+
+@unittest.skipUnless(HAS_MSGSPEC, "msgspec is not installed")
+class MsgspecParityTests(unittest.TestCase):
+    def setUp(self):
+        self.stdlib = stdlib_decoder("fetch_weather", WEATHER)
+        self.msgspec = ArgumentsDecoder("fetch_weather", WEATHER)
+
+    def test_msgspec_struct_is_used(self):
+        self.assertIsNotNone(self.msgspec.struct)
+
+    def test_valid_arguments_decode_the_same(self):
+        for arguments in VALID:
+            with self.subTest(arguments=arguments):
+                self.assertEqual(self.msgspec.decode(arguments), self.stdlib.decode(arguments))
+
+    def test_invalid_arguments_are_rejected_by_both(self):
+        for arguments in INVALID:
+            with self.subTest(arguments=arguments):
+                for decoder in (self.stdlib, self.msgspec):
+                    with self.assertRaises(ValueError):
+                        decoder.decode(arguments)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,199 @@
+"""
+Tests for the append-only conversation store: resume, torn tails, paging, workers and compaction.
+
+Run from the repository root:
+    python -m pytest tests/test_conversation_store.py
+"""
+import multiprocessing
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+from unittest import mock
+
+REPO_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+sys.path.insert(0, REPO_ROOT)
+import shared.conversation_store as conversation_store
+from shared.conversation_store import ConversationStore, encode_record, valid_length
+
+
+def append_many(directory, session_id, prefix, count):
+    """One worker process appending count messages."""
+    store = ConversationStore(directory)
+    for i in range(count):
+        store.append_message(session_id, "user", f"{prefix}-{i}")
+
+
+def compact_many(directory, session_id, count):
+    store = ConversationStore(directory, retain_messages=100000)
+    for _ in range(count):
+        store.compact(session_id)
+
+
+class StoreTestCase(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory, True)
+
+    def store(self, **kwargs):
+        return ConversationStore(self.directory, **kwargs)
+
+    def contents(self, session):
+        return [m["content"] for m in session.history()]
+
+
+class ResumeTests(StoreTestCase):
+    def test_resume_reads_back_to_the_checkpoint_only(self):
+        writer = self.store(checkpoint_every=5)
+        writer.set("t", "user_name", "Maria")
+        for i in range(12):
+            writer.append_message("t", "user", f"m{i}")
+        writer.set("t", "message_count", 12)
+
+        records_read = []
+        original = conversation_store.iter_records_backward
+
+        def counting(f, end=None):
+            for item in original(f, end):
+                records_read.append(item)
+                yield item
+
+        with mock.patch.object(conversation_store, "iter_records_backward", counting):
+            session = self.store(checkpoint_every=5, recent_messages=3).get("t")
+
+        self.assertEqual(session.vars, {"user_name": "Maria", "message_count": 12})
+        self.assertEqual(self.contents(session), ["m9", "m10", "m11"])
+        self.assertFalse(session.complete)
+        # 12 messages + 2 sets + 2 checkpoints on disk; the resume stops at the newest checkpoint
+        self.assertLess(len(records_read), 8)
+
+    def test_clear_history_is_respected(self):
+        writer = self.store()
+        writer.append_message("t", "user", "before")
+        writer.clear_history("t")
+        writer.append_message("t", "user", "after")
+
+        session = self.store().get("t")
+        self.assertEqual(self.contents(session), ["after"])
+        self.assertTrue(session.complete)
+
+    def test_load_older_pages_in_order(self):
+        writer = self.store()
+        writer.append_message("t", "user", "cleared")
+        writer.clear_history("t")
+        for i in range(10):
+            writer.append_message("t", "user", f"m{i}")
+
+        reader = self.store(recent_messages=3)
+        self.assertEqual(self.contents(reader.get("t")), ["m7", "m8", "m9"])
+        self.assertEqual(reader.load_older("t", 4), 4)
+        self.assertEqual(self.contents(reader.get("t")), [f"m{i}" for i in range(3, 10)])
+        self.assertEqual(reader.load_older("t", 10), 3)
+        # The clear stops paging: the message before it is never loaded
+        self.assertEqual(reader.load_older("t", 10), 0)
+        session = reader.get("t")
+        self.assertTrue(session.complete)
+        self.assertEqual(self.contents(session), [f"m{i}" for i in range(10)])
+
+
+class TornTailTests(StoreTestCase):
+    def write_messages(self, count):
+        writer = self.store()
+        for i in range(count):
+            writer.append_message("t", "user", f"m{i}")
+        writer.set("t", "user_name", "Maria")
+        return writer._path("t")
+
+    def test_torn_record_is_cut_off_on_resume(self):
+        path = self.write_messages(5)
+        good_size = os.path.getsize(path)
+        torn = encode_record({"k": "m", "r": "user", "c": "half written"})[:-7]
+        with open(path, "ab") as f:
+            f.write(torn)
+
+        session = self.store().get("t")
+        self.assertEqual(self.contents(session), [f"m{i}" for i in range(5)])
+        self.assertEqual(session.get("user_name"), "Maria")
+        self.assertEqual(os.path.getsize(path), good_size)
+
+        # The log keeps working after the repair
+        self.store().append_message("t", "assistant", "next")
+        self.assertEqual(self.contents(self.store().get("t"))[-2:], ["m4", "next"])
+
+    def test_mismatched_trailer_is_detected(self):
+        path = self.write_messages(3)
+        good_size = os.path.getsize(path)
+        with open(path, "ab") as f:
+            f.write(b"\x00\x00\x00\x05")        # a lone length with nothing in front of it
+
+        self.assertEqual(len(self.store().get("t").history()), 3)
+        with open(path, "rb") as f:
+            self.assertEqual(valid_length(f), good_size)
+
+    def test_repair_keeps_an_intact_log(self):
+        path = self.write_messages(3)
+        self.assertFalse(self.store()._repair(path))
+        self.assertEqual(len(self.store().get("t").history()), 3)
+
+
+class WorkerTests(StoreTestCase):
+    def test_append_catches_up_with_another_worker(self):
+        first, second = self.store(), self.store()
+        first.append_message("t", "user", "from first")
+        second.get("t")
+        first.append_message("t", "user", "first again")
+        first.set("t", "user_name", "Maria")
+
+        # first wrote right after second checked its copy was current: the append must catch up
+        with mock.patch.object(second, "_is_current", return_value=True):
+            session = second.append_message("t", "assistant", "from second")
+        self.assertEqual(self.contents(session), ["from first", "first again", "from second"])
+        self.assertEqual(session.get("user_name"), "Maria")
+        self.assertEqual(self.contents(first.get("t")), ["from first", "first again", "from second"])
+
+    def test_set_after_another_worker_changed_the_value(self):
+        first, second = self.store(), self.store()
+        first.set("t", "user_name", "Maria")
+        second.get("t")
+        first.set("t", "user_name", "Jordi")
+
+        with mock.patch.object(second, "_is_current", return_value=True):
+            second.set("t", "user_name", "Maria")
+        self.assertEqual(self.store().get("t").get("user_name"), "Maria")
+
+    def test_compaction_keeps_appends_from_other_processes(self):
+        store = self.store()
+        store.append_message("race", "user", "start")
+        context = multiprocessing.get_context("spawn" if sys.platform == "win32" else "fork")
+        workers = [
+            context.Process(target=append_many, args=(self.directory, "race", f"w{n}", 100)) for n in range(3)
+        ] + [context.Process(target=compact_many, args=(self.directory, "race", 60))]
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join(60)
+            self.assertEqual(worker.exitcode, 0)
+
+        session = self.store(recent_messages=1000).get("race")
+        self.assertEqual(len(session.history()), 301)
+        for n in range(3):
+            mine = [c for c in self.contents(session) if c.startswith(f"w{n}-")]
+            self.assertEqual(mine, [f"w{n}-{i}" for i in range(100)])
+
+    def test_compact_keeps_variables_and_recent_messages(self):
+        store = self.store(retain_messages=3)
+        store.set("t", "user_name", "Maria")
+        for i in range(6):
+            store.append_message("t", "user", f"m{i}")
+        size = os.path.getsize(store._path("t"))
+
+        store.compact("t")
+        self.assertLess(os.path.getsize(store._path("t")), size)
+        session = self.store().get("t")
+        self.assertEqual(self.contents(session), ["m3", "m4", "m5"])
+        self.assertEqual(session.get("user_name"), "Maria")
+
+
+if __name__ == "__main__":
+    unittest.main()
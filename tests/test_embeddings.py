@@ -0,0 +1,178 @@
+"""
+Tests for the EmbeddingBatcher: LRU hits and eviction, texts from several
+threads sent as one request, batch size and wait limits, and errors.
+
+Run from the repository root:
+    python -m pytest tests/test_embeddings.py
+"""
+import asyncio
+import os
+import sys
+import threading
+import time
+import unittest
+
+REPO_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+sys.path.insert(0, REPO_ROOT)
+from shared.embeddings import EmbeddingBatcher
+
+
+class RecordingEmbedder:
+    """Records each request; a text's vector is [len(text), request number]."""
+
+    dim = 2
+
+    def __init__(self, gate=None, error=None):
+        self.requests = []
+        self.gate = gate
+        self.error = error
+
+    def embed(self, texts):
+        if self.gate is not None:
+            self.gate.wait(10)
+        self.requests.append(list(texts))
+        if self.error is not None:
+            raise self.error
+        return [[float(len(text)), float(len(self.requests))] for text in texts]
+
+
+class BatcherTestCase(unittest.TestCase):
+    def batcher(self, embedder, **kwargs):
+        kwargs.setdefault("max_wait_ms", 1)
+        batcher = EmbeddingBatcher(embedder, **kwargs)
+        self.addCleanup(batcher.close)
+        return batcher
+
+
+class CacheTests(BatcherTestCase):
+    def test_repeated_text_is_served_from_the_cache(self):
+        embedder = RecordingEmbedder()
+        batcher = self.batcher(embedder)
+        first = batcher.embed(["tapas in barcelona"])
+        second = batcher.embed(["tapas in barcelona", "tapas in barcelona"])
+
+        self.assertEqual(second, first * 2)
+        self.assertEqual(embedder.requests, [["tapas in barcelona"]])
+        self.assertEqual((batcher.stats.texts, batcher.stats.hits), (3, 2))
+        self.assertIn("2 from cache (67%)", batcher.summary())
+
+    def test_least_recently_used_text_is_evicted(self):
+        embedder = RecordingEmbedder()
+        batcher = self.batcher(embedder, cache_size=2)
+        batcher.embed(["beach"])
+        batcher.embed(["museum"])
+        batcher.embed(["beach"])            # hit: museum is now the least recently used
+        batcher.embed(["hike"])             # evicts museum
+        self.assertEqual(len(batcher.cache), 2)
+
+        batcher.embed(["beach", "hike"])
+        self.assertEqual(embedder.requests, [["beach"], ["museum"], ["hike"]])
+        batcher.embed(["museum"])
+        self.assertEqual(embedder.requests[-1], ["museum"])
+
+    def test_cache_size_zero_disables_memoization(self):
+        embedder = RecordingEmbedder()
+        batcher = self.batcher(embedder, cache_size=0)
+        batcher.embed(["beach"])
+        batcher.embed(["beach"])
+        self.assertEqual(embedder.requests, [["beach"], ["beach"]])
+        self.assertEqual(batcher.cache, {})
+
+    def test_identical_text_in_flight_shares_one_request(self):
+        gate = threading.Event()
+        embedder = RecordingEmbedder(gate)
+        batcher = self.batcher(embedder, workers=1)
+        first = batcher.submit(["paella"])
+        second = batcher.submit(["paella"])
+        self.assertIs(first[0], second[0])
+        gate.set()
+
+        self.assertEqual(second[0].result(10), [6.0, 1.0])
+        self.assertEqual(embedder.requests, [["paella"]])
+        self.assertEqual(batcher.stats.coalesced, 1)
+        self.assertEqual(batcher.pending, {})
+
+
+class BatchingTests(BatcherTestCase):
+    def test_texts_from_several_threads_go_in_one_request(self):
+        embedder = RecordingEmbedder()
+        # A long wait: only a full batch is sent, so all eight texts must share it
+        batcher = self.batcher(embedder, max_batch=8, max_wait_ms=5000, workers=1)
+        start = threading.Barrier(8)
+        results = {}
+
+        def caller(i):
+            start.wait()
+            results[i] = batcher.embed(["x" * i])[0]
+
+        threads = [threading.Thread(target=caller, args=(i,)) for i in range(1, 9)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join(10)
+
+        self.assertEqual(len(embedder.requests), 1)
+        self.assertEqual(sorted(embedder.requests[0]), sorted("x" * i for i in range(1, 9)))
+        # Each caller gets its own row back
+        self.assertEqual(results, {i: [float(i), 1.0] for i in range(1, 9)})
+        self.assertIn("8 embedded in 1 requests (mean batch 8.0", batcher.summary())
+
+    def test_requests_hold_at_most_max_batch_texts(self):
+        embedder = RecordingEmbedder()
+        batcher = self.batcher(embedder, max_batch=4, workers=1)
+        texts = [f"text {i}" for i in range(10)]
+        vectors = batcher.embed(texts)
+
+        self.assertEqual([len(request) for request in embedder.requests], [4, 4, 2])
+        self.assertEqual([text for request in embedder.requests for text in request], texts)
+        self.assertEqual([vector[0] for vector in vectors], [6.0] * 10)
+
+    def test_a_lone_text_is_sent_after_max_wait(self):
+        embedder = RecordingEmbedder()
+        batcher = self.batcher(embedder, max_batch=64, max_wait_ms=50)
+        started = time.perf_counter()
+        batcher.embed(["alone"])
+        elapsed = time.perf_counter() - started
+
+        self.assertGreaterEqual(elapsed, 0.045)
+        self.assertLess(elapsed, 2.0)
+        self.assertEqual(embedder.requests, [["alone"]])
+
+    def test_aembed_batches_concurrent_tasks(self):
+        embedder = RecordingEmbedder()
+        batcher = self.batcher(embedder, max_batch=3, max_wait_ms=5000, workers=1)
+
+        async def main():
+            return await asyncio.gather(*(batcher.aembed([text]) for text in ("a", "bb", "ccc")))
+
+        self.assertEqual(asyncio.run(main()), [[[1.0, 1.0]], [[2.0, 1.0]], [[3.0, 1.0]]])
+        self.assertEqual(len(embedder.requests), 1)
+        self.assertEqual(batcher.dim, 2)
+
+
+class ErrorTests(BatcherTestCase):
+    def test_embedder_error_reaches_every_caller_of_the_batch(self):
+        embedder = RecordingEmbedder(error=RuntimeError("429 Too Many Requests"))
+        batcher = self.batcher(embedder)
+        with self.assertRaises(RuntimeError):
+            batcher.embed(["beach", "museum"])
+        self.assertEqual(batcher.stats.failures, 1)
+        self.assertEqual(batcher.pending, {})
+        self.assertEqual(batcher.cache, {})
+
+        # Nothing was cached, so the next call asks again
+        embedder.error = None
+        self.assertEqual(batcher.embed(["beach"]), [[5.0, 2.0]])
+
+    def test_wrong_number_of_vectors_is_an_error(self):
+        class ShortEmbedder(RecordingEmbedder):
+            def embed(self, texts):
+                return super().embed(texts)[:-1]
+
+        batcher = self.batcher(ShortEmbedder())
+        with self.assertRaises(ValueError):
+            batcher.embed(["beach", "museum"])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,243 @@
+"""
+Tests for hedged chat completions: the hedge delay, the hedge sent after it,
+the losing request cancelled (and its stream closed), and failover on errors.
+
+Run from the repository root:
+    python -m pytest tests/test_hedging.py
+"""
+import asyncio
+import os
+import sys
+import unittest
+from types import SimpleNamespace
+
+REPO_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+sys.path.insert(0, REPO_ROOT)
+from shared.hedging import Endpoint, HedgedChat
+from shared.resilience import CLOSED, CircuitBreaker, CircuitOpen
+
+
+class ApiError(Exception):
+    def __init__(self, status_code):
+        super().__init__(f"status {status_code}")
+        self.status_code = status_code
+
+
+class FakeStream:
+    """An async stream whose first chunk arrives after `delay` seconds."""
+
+    def __init__(self, request, delay, chunks):
+        self.request = request
+        self.delay = delay
+        self.chunks = list(chunks)
+        self.closed = False
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        if self.delay:
+            delay, self.delay = self.delay, 0
+            await self.request.sleep(delay)
+        if not self.chunks:
+            raise StopAsyncIteration
+        return self.chunks.pop(0)
+
+    async def close(self):
+        self.closed = True
+
+
+class Request:
+    """One call to the fake client: which deployment, when, and how it ended."""
+
+    def __init__(self, model, started):
+        self.model = model
+        self.started = started
+        self.cancelled = False
+        self.stream = None
+
+    async def sleep(self, seconds):
+        try:
+            await asyncio.sleep(seconds)
+        except asyncio.CancelledError:
+            self.cancelled = True
+            raise
+
+
+class ScriptedClient:
+    """
+    Async client shared by every endpoint; the n-th request (whichever deployment
+    gets it) follows script[n]: (seconds to the first token, error or None).
+    """
+
+    def __init__(self, *script):
+        self.script = list(script)
+        self.requests = []
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self.create))
+
+    async def create(self, model, stream=False, **kwargs):
+        request = Request(model, asyncio.get_running_loop().time())
+        delay, error = self.script[len(self.requests)] if len(self.requests) < len(self.script) else (0, None)
+        self.requests.append(request)
+        if stream:
+            if error is not None:
+                raise error
+            request.stream = FakeStream(request, delay, [f"{model}-1", f"{model}-2"])
+            return request.stream
+        await request.sleep(delay)
+        if error is not None:
+            raise error
+        return SimpleNamespace(model=model)
+
+
+def trip(breaker):
+    while breaker.state == CLOSED:
+        breaker.before_call()
+        breaker.on_failure()
+
+
+class HedgeDelayTests(unittest.TestCase):
+    def setUp(self):
+        self.endpoints = [Endpoint(f"dep-{i}", None, f"dep-{i}") for i in range(2)]
+        self.chat = HedgedChat(self.endpoints, default_delay=1.0, min_delay=0.05, max_delay=2.0, min_samples=20)
+
+    def test_default_until_enough_samples(self):
+        for _ in range(19):
+            self.endpoints[0].observe(0.3)
+        self.assertEqual(self.chat.hedge_delay(self.endpoints[0]), 1.0)
+
+    def test_p95_of_the_endpoint_latency(self):
+        for i in range(100):
+            self.endpoints[0].observe(0.01 * (i + 1))     # 0.01 .. 1.00 s
+        self.assertAlmostEqual(self.chat.hedge_delay(self.endpoints[0]), 0.9505)
+
+    def test_new_endpoint_uses_the_pool_latency(self):
+        for _ in range(20):
+            self.endpoints[0].observe(0.3)
+        self.endpoints[1].observe(5.0)
+        self.assertAlmostEqual(self.chat.hedge_delay(self.endpoints[1]), 0.3)
+
+    def test_delay_is_clamped(self):
+        for _ in range(20):
+            self.endpoints[0].observe(0.001)
+            self.endpoints[1].observe(30.0)
+        self.assertEqual(self.chat.hedge_delay(self.endpoints[0]), 0.05)
+        self.assertEqual(self.chat.hedge_delay(self.endpoints[1]), 2.0)
+
+
+class PoolTestCase(unittest.IsolatedAsyncioTestCase):
+    DELAY = 0.05        # hedge delay: no latency is observed long enough to replace the default
+
+    def pool(self, client, count=2, **kwargs):
+        endpoints = [Endpoint(f"dep-{i}", client, f"dep-{i}", breaker=CircuitBreaker(f"dep-{i}", min_calls=4))
+                     for i in range(count)]
+        return HedgedChat(endpoints, default_delay=self.DELAY, seed=1, **kwargs)
+
+
+class HedgingTests(PoolTestCase):
+    async def test_fast_primary_is_not_hedged(self):
+        client = ScriptedClient((0.001, None))
+        chat = self.pool(client)
+        response = await chat.create(messages=[])
+
+        self.assertEqual(len(client.requests), 1)
+        self.assertEqual(response.model, client.requests[0].model)
+        self.assertEqual((chat.hedges, chat.hedge_wins), (0, 0))
+
+    async def test_slow_primary_is_hedged_after_the_delay_and_cancelled(self):
+        client = ScriptedClient((1.0, None), (0.001, None))
+        chat = self.pool(client)
+        started = asyncio.get_running_loop().time()
+        response = await chat.create(messages=[])
+        elapsed = asyncio.get_running_loop().time() - started
+
+        primary, hedge = client.requests
+        self.assertNotEqual(primary.model, hedge.model)
+        self.assertEqual(response.model, hedge.model)
+        # The hedge went out after the delay, long before the primary would have answered
+        self.assertGreaterEqual(hedge.started - primary.started, self.DELAY * 0.9)
+        self.assertLess(elapsed, 0.5)
+        self.assertTrue(primary.cancelled)
+        self.assertEqual((chat.hedges, chat.hedge_wins), (1, 1))
+        self.assertIn("1 hedged (1 won by the hedge)", chat.summary())
+
+    async def test_losing_stream_is_closed(self):
+        client = ScriptedClient((1.0, None), (0.001, None))
+        chat = self.pool(client)
+        stream = await chat.create(messages=[], stream=True)
+
+        primary, hedge = client.requests
+        self.assertTrue(primary.cancelled)
+        self.assertTrue(primary.stream.closed)
+        self.assertEqual([chunk async for chunk in stream], [f"{hedge.model}-1", f"{hedge.model}-2"])
+        self.assertTrue(hedge.stream.closed)
+
+    async def test_primary_that_answers_first_cancels_the_hedge(self):
+        client = ScriptedClient((0.1, None), (1.0, None))
+        chat = self.pool(client)
+        response = await chat.create(messages=[])
+
+        primary, hedge = client.requests
+        self.assertEqual(response.model, primary.model)
+        self.assertTrue(hedge.cancelled)
+        self.assertEqual((chat.hedges, chat.hedge_wins), (1, 0))
+
+    async def test_max_attempts_limits_the_hedges(self):
+        client = ScriptedClient((0.3, None), (0.3, None), (0.3, None))
+        chat = self.pool(client, count=3, max_attempts=2)
+        await chat.create(messages=[])
+        self.assertEqual(len(client.requests), 2)
+
+
+class FailoverTests(PoolTestCase):
+    DELAY = 5.0
+
+    async def test_error_fails_over_without_waiting_for_the_delay(self):
+        client = ScriptedClient((0, ApiError(503)), (0.001, None))
+        chat = self.pool(client)
+        started = asyncio.get_running_loop().time()
+        response = await chat.create(messages=[])
+
+        self.assertLess(asyncio.get_running_loop().time() - started, 1.0)
+        self.assertEqual(response.model, client.requests[1].model)
+        failed = next(e for e in chat.endpoints if e.deployment == client.requests[0].model)
+        self.assertEqual(failed.failures, 1)
+        self.assertLess(failed.health, 1.0)
+        self.assertEqual(chat.hedges, 0)
+
+    async def test_caller_error_is_raised_without_failover(self):
+        client = ScriptedClient((0, ApiError(400)))
+        chat = self.pool(client)
+        with self.assertRaises(ApiError):
+            await chat.create(messages=[])
+        self.assertEqual(len(client.requests), 1)
+        self.assertEqual(sum(e.failures for e in chat.endpoints), 0)
+
+    async def test_last_error_is_raised_when_every_deployment_fails(self):
+        client = ScriptedClient((0, ApiError(503)), (0, ApiError(500)))
+        chat = self.pool(client)
+        with self.assertRaises(ApiError) as raised:
+            await chat.create(messages=[])
+        self.assertEqual(raised.exception.status_code, 500)
+
+    async def test_open_breakers_are_skipped(self):
+        client = ScriptedClient()
+        chat = self.pool(client)
+        closed, opened = chat.endpoints
+        trip(opened.breaker)
+
+        for _ in range(5):
+            await chat.create(messages=[])
+        self.assertEqual({request.model for request in client.requests}, {closed.deployment})
+
+        trip(closed.breaker)
+        with self.assertRaises(CircuitOpen):
+            await chat.create(messages=[])
+
+    def test_empty_pool_is_rejected(self):
+        with self.assertRaises(ValueError):
+            HedgedChat([])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,58 @@
+"""
+Keeps the app entry points within their import-time budget (benchmarks/import_budget.json).
+
+Run from the repository root:
+    python -m pytest tests/test_import_budget.py
+"""
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import unittest
+
+REPO_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+sys.path.insert(0, os.path.join(REPO_ROOT, "benchmarks"))
+import import_budget
+
+
+class ImportBudgetTests(unittest.TestCase):
+    def check(self):
+        # A fresh interpreter, so imports already made by the test run are not free
+        return subprocess.run(
+            [sys.executable, os.path.join(REPO_ROOT, "benchmarks", "import_budget.py")],
+            capture_output=True, text=True, cwd=REPO_ROOT, timeout=300,
+        )
+
+    def test_entry_points_stay_within_budget(self):
+        result = self.check()
+        if result.returncode != 0 and " builds " not in result.stdout:
+            # Over budget only: a busy machine slows every run, so measure once more before failing
+            result = self.check()
+        self.assertEqual(result.returncode, 0, result.stdout + result.stderr)
+        self.assertIn("All entry points within budget", result.stdout)
+
+    def test_every_entry_point_has_a_budget(self):
+        with open(import_budget.BUDGET_PATH, "r") as f:
+            budgets = json.load(f)["budgets_ms"]
+        self.assertEqual(sorted(budgets), sorted(import_budget.ENTRY_POINTS))
+
+    def test_module_level_clients_are_flagged(self):
+        source = (
+            "from openai import AzureOpenAI\n"
+            "from shared.lazy import Deferred\n"
+            "client = AzureOpenAI(api_key='x')\n"
+            "deferred = Deferred(lambda: AzureOpenAI(api_key='x'))\n"
+            "def build():\n"
+            "    return AzureOpenAI(api_key='x')\n"
+        )
+        with tempfile.NamedTemporaryFile("w", suffix=".py", delete=False) as f:
+            f.write(source)
+        self.addCleanup(os.remove, f.name)
+
+        self.assertEqual(import_budget.eager_clients(f.name), [(3, "AzureOpenAI")])
+        self.assertEqual(len(import_budget.module_imports(f.name)), 2)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,247 @@
+"""
+Tests for the incremental retrieval index: sync of changed, deleted and re-added
+files, tombstones, compaction and reloading the memory-mapped segments.
+
+Run from the repository root:
+    python -m pytest tests/test_indexer.py
+"""
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+from unittest import mock
+
+REPO_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+sys.path.insert(0, REPO_ROOT)
+import shared.indexer as indexer
+from shared.indexer import IncrementalIndex
+from shared.retrieval import HashingEmbedder
+
+BEACH = "Barceloneta beach is by the sea, with paella restaurants along the promenade."
+HIKE = "Montserrat is a mountain monastery reached by rack railway from Plaça Espanya."
+MUSEUM = "The Picasso museum in El Born shows his early years in Barcelona."
+
+
+class CountingEmbedder(HashingEmbedder):
+    def __init__(self, dim=64):
+        super().__init__(dim)
+        self.embedded = []
+
+    def embed(self, texts):
+        self.embedded.extend(texts)
+        return super().embed(texts)
+
+
+class IndexTestCase(unittest.TestCase):
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.root, True)
+        self.docs = os.path.join(self.root, "docs")
+        self.directory = os.path.join(self.root, "index")
+        os.makedirs(self.docs)
+        self.mtime_ns = 1_700_000_000 * 10**9
+        self.embedder = CountingEmbedder()
+        self.index = self.open()
+
+    def open(self, embedder=None):
+        index = IncrementalIndex(self.directory, embedder or self.embedder)
+        self.addCleanup(index.close)
+        return index
+
+    def write(self, name, text):
+        """Writes a document with a new mtime, so a rewrite of the same size is still seen."""
+        path = os.path.join(self.docs, name)
+        with open(path, "w", encoding="utf-8") as f:
+            f.write(text)
+        self.mtime_ns += 10**9
+        os.utime(path, ns=(self.mtime_ns, self.mtime_ns))
+        return path
+
+    def sync(self, *names, index=None):
+        return (index or self.index).sync([os.path.join(self.docs, name) for name in names], self.docs)
+
+    def sources(self, query, index=None):
+        return [passage.source for passage in (index or self.index).search(query, top_k=5)]
+
+    def segment_files(self):
+        return sorted(name for name in os.listdir(self.directory) if name.startswith("seg-"))
+
+
+class SyncTests(IndexTestCase):
+    def test_first_sync_indexes_every_file(self):
+        self.write("beach.md", BEACH)
+        self.write("hike.md", HIKE)
+
+        stats = self.sync("beach.md", "hike.md")
+        self.assertEqual(stats, {"files_changed": 2, "chunks_added": 2, "chunks_removed": 0})
+        self.assertEqual(len(self.index.segments), 1)
+        self.assertEqual(self.sources("paella")[0], "beach.md")
+        self.assertEqual(self.sources("monastery railway")[0], "hike.md")
+
+    def test_unchanged_files_are_not_read(self):
+        self.write("beach.md", BEACH)
+        self.sync("beach.md")
+
+        with mock.patch.object(indexer, "file_hash", side_effect=AssertionError("hashed an unchanged file")):
+            stats = self.sync("beach.md")
+        self.assertEqual(stats, {"files_changed": 0, "chunks_added": 0, "chunks_removed": 0})
+        self.assertEqual(len(self.index.segments), 1)
+
+    def test_touched_file_is_hashed_but_not_reindexed(self):
+        path = self.write("beach.md", BEACH)
+        self.sync("beach.md")
+        self.mtime_ns += 10**9
+        os.utime(path, ns=(self.mtime_ns, self.mtime_ns))
+        embedded = len(self.embedder.embedded)
+
+        self.assertEqual(self.sync("beach.md")["chunks_added"], 0)
+        self.assertEqual(len(self.embedder.embedded), embedded)
+        self.assertEqual(self.index.files["beach.md"]["mtime_ns"], self.mtime_ns)
+
+    def test_changed_file_adds_a_segment_and_tombstones_the_old_chunk(self):
+        self.write("beach.md", BEACH)
+        self.write("hike.md", HIKE)
+        self.sync("beach.md", "hike.md")
+        self.embedder.embedded.clear()
+
+        self.write("beach.md", MUSEUM)
+        stats = self.sync("beach.md", "hike.md")
+        self.assertEqual(stats, {"files_changed": 1, "chunks_added": 1, "chunks_removed": 1})
+        # Only the new chunk was embedded; the old one stays stored but hidden
+        self.assertEqual(self.embedder.embedded, [MUSEUM])
+        self.assertEqual(len(self.index.segments), 2)
+        self.assertEqual(len(self.index.tombstones), 1)
+        self.assertNotIn(BEACH, [p.text for p in self.index.search("paella promenade", top_k=5)])
+        self.assertEqual(self.sources("picasso museum")[0], "beach.md")
+
+    def test_deleted_file_is_hidden_from_search(self):
+        self.write("beach.md", BEACH)
+        self.write("hike.md", HIKE)
+        self.sync("beach.md", "hike.md")
+
+        stats = self.sync("hike.md")
+        self.assertEqual(stats, {"files_changed": 1, "chunks_added": 0, "chunks_removed": 1})
+        self.assertEqual(len(self.index.segments), 1)
+        self.assertNotIn("beach.md", self.index.files)
+        self.assertNotIn("beach.md", self.sources("paella beach"))
+
+    def test_re_added_file_is_revived_without_embedding(self):
+        self.write("beach.md", BEACH)
+        self.write("hike.md", HIKE)
+        self.sync("beach.md", "hike.md")
+        self.sync("hike.md")
+        self.embedder.embedded.clear()
+
+        stats = self.sync("beach.md", "hike.md")
+        self.assertEqual(stats["chunks_added"], 0)
+        self.assertEqual(self.embedder.embedded, [])
+        self.assertEqual(self.index.tombstones, set())
+        self.assertEqual(len(self.index.segments), 1)
+        self.assertEqual(self.sources("paella beach")[0], "beach.md")
+
+
+class CompactionTests(IndexTestCase):
+    def build_history(self):
+        """Three segments and two tombstoned chunks."""
+        self.write("beach.md", BEACH)
+        self.sync("beach.md")
+        self.write("hike.md", HIKE)
+        self.sync("beach.md", "hike.md")
+        self.write("hike.md", MUSEUM)
+        self.sync("beach.md", "hike.md")
+        self.sync("hike.md")
+        self.assertEqual(len(self.index.segments), 3)
+        self.assertEqual(len(self.index.tombstones), 2)
+
+    def test_compact_merges_into_one_segment_and_drops_tombstones(self):
+        self.build_history()
+        self.assertTrue(self.index.needs_compaction())
+        before = self.index.search("museum picasso mountain paella", top_k=5)
+        self.embedder.embedded.clear()
+
+        self.index.compact()
+        # Vectors are copied from the old segments, not embedded again
+        self.assertEqual(self.embedder.embedded, [])
+        self.assertEqual(len(self.index.segments), 1)
+        self.assertEqual(self.index.tombstones, set())
+        self.assertFalse(self.index.needs_compaction())
+        after = self.index.search("museum picasso mountain paella", top_k=5)
+        self.assertEqual([(p.source, p.text) for p in after], [(p.source, p.text) for p in before])
+        self.assertEqual(len(self.segment_files()), 3)      # .vec, .meta.jsonl, .post.json
+
+    def test_old_segment_files_stay_while_a_search_reads_them(self):
+        self.build_history()
+        in_flight, _ = self.index._snapshot()
+
+        self.index.compact()
+        self.assertEqual(len(self.segment_files()), 4 * 3)
+        self.index._release(in_flight)
+        self.assertEqual(len(self.segment_files()), 3)
+
+    def test_chunk_revived_during_the_merge_is_kept(self):
+        self.write("beach.md", BEACH)
+        self.write("hike.md", HIKE)
+        self.sync("beach.md", "hike.md")
+        self.sync("hike.md")                # beach.md tombstoned
+        original = IncrementalIndex._live_passages
+        calls = []
+
+        def merge_with_a_sync_in_between(segments, keep):
+            if not calls:
+                # A sync re-adds beach.md after the compactor took its snapshot
+                self.sync("beach.md", "hike.md")
+            calls.append(keep)
+            return original(segments, keep)
+
+        with mock.patch.object(self.index, "_live_passages", merge_with_a_sync_in_between):
+            self.index.compact()
+        self.assertEqual(len(calls), 2)     # the merge, then the revived chunks
+        self.assertEqual(self.index.tombstones, set())
+        self.assertEqual(len(self.index.segments), 1)
+        self.assertEqual(self.sources("paella beach")[0], "beach.md")
+
+
+class ReloadTests(IndexTestCase):
+    def test_reload_reads_only_the_manifest_until_searched(self):
+        self.write("beach.md", BEACH)
+        self.write("hike.md", HIKE)
+        self.sync("beach.md", "hike.md")
+        self.write("beach.md", MUSEUM)
+        self.sync("beach.md", "hike.md")
+        expected = [(p.source, round(p.score, 5)) for p in self.index.search("museum mountain", top_k=5)]
+
+        reloaded = self.open(CountingEmbedder())
+        self.assertEqual([s.name for s in reloaded.segments], [s.name for s in self.index.segments])
+        self.assertEqual(reloaded.tombstones, self.index.tombstones)
+        self.assertTrue(all(s._meta is None and s._vectors is None for s in reloaded.segments))
+
+        self.assertEqual([(p.source, round(p.score, 5)) for p in reloaded.search("museum mountain", top_k=5)], expected)
+        self.assertTrue(all(s._mmap is not None for s in reloaded.segments))
+        self.assertEqual(self.sync("beach.md", "hike.md", index=reloaded)["files_changed"], 0)
+        self.assertEqual(reloaded.embedder.embedded, ["museum mountain"])
+
+    def test_compacted_index_reloads(self):
+        self.write("beach.md", BEACH)
+        self.write("hike.md", HIKE)
+        self.sync("beach.md", "hike.md")
+        self.sync("hike.md")
+        self.index.compact()
+
+        reloaded = self.open()
+        self.assertEqual(len(reloaded.segments), 1)
+        self.assertEqual(self.sources("monastery", index=reloaded), ["hike.md"])
+        self.assertEqual(self.sync("beach.md", "hike.md", index=reloaded)["chunks_added"], 1)
+
+    def test_other_embedder_dimension_starts_over(self):
+        self.write("beach.md", BEACH)
+        self.sync("beach.md")
+
+        reloaded = self.open(CountingEmbedder(dim=32))
+        self.assertEqual((reloaded.segments, reloaded.files), ([], {}))
+        self.assertEqual(self.sync("beach.md", index=reloaded)["chunks_added"], 1)
+        self.assertEqual(self.sources("paella", index=reloaded), ["beach.md"])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,161 @@
+"""
+Tests for the streaming CSV ingestion: chunked reading, type widening across
+chunks, encoding fallbacks and the lifetime of the on-disk stores.
+
+Run from the repository root:
+    python -m pytest tests/test_ingest.py
+"""
+import os
+import shutil
+import sys
+import tempfile
+import time
+import unittest
+
+REPO_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+sys.path.insert(0, REPO_ROOT)
+from shared.ingest import (
+    ColumnStore, CsvIngestJob, detect_encoding, expire_stores, ingest_csv, iter_csv_chunks, remove_store, store_dir_for,
+)
+
+
+class IngestTestCase(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory, True)
+
+    def write_csv(self, lines, encoding="utf-8", name="data.csv"):
+        path = os.path.join(self.directory, name)
+        with open(path, "w", encoding=encoding, newline="") as f:
+            f.write("\r\n".join(lines) + "\r\n")
+        return path
+
+    def store_dir(self, path):
+        return store_dir_for(path, os.path.join(self.directory, "stores"))
+
+
+class ChunkedReadingTests(IngestTestCase):
+    def test_rows_arrive_in_chunks_of_at_most_chunk_rows(self):
+        path = self.write_csv(["id,name"] + [f"{i},item {i}" for i in range(23)])
+
+        chunks = list(iter_csv_chunks(path, chunk_rows=5))
+        self.assertEqual([len(rows) for _, rows, _ in chunks], [5, 5, 5, 5, 3])
+        self.assertTrue(all(header == ["id", "name"] for header, _, _ in chunks))
+        offsets = [bytes_read for _, _, bytes_read in chunks]
+        self.assertEqual(offsets, sorted(offsets))
+        self.assertEqual(offsets[-1], os.path.getsize(path))
+
+    def test_job_writes_one_segment_per_chunk_and_reports_progress(self):
+        path = self.write_csv(["id,city,price"] + [f"{i},{['BCN', 'MAD'][i % 2]},{i}.5" for i in range(10)])
+        job = CsvIngestJob(path, self.store_dir(path), chunk_rows=4)
+
+        progress = list(job.run())
+        self.assertEqual([p.rows for p in progress], [4, 8, 10])
+        self.assertEqual(progress[-1].percent, 100.0)
+        self.assertEqual(job.schema, {"id": "int", "city": "str", "price": "float"})
+
+        store = ColumnStore.open(job.store.directory)
+        self.assertEqual([segment["rows"] for segment in store.segments], [4, 4, 2])
+        self.assertEqual(store.segments[1]["stats"]["id"], [4, 7])
+        self.assertEqual(list(store.iter_column("id", min_value=8)), [8, 9])
+        self.assertEqual([row["id"] for row in store.rows(store.lookup("city", "MAD"))], [1, 3, 5, 7, 9])
+
+    def test_blank_lines_and_short_rows(self):
+        path = self.write_csv(["a,b", "1,x", "", "2"])
+        store = ingest_csv(path, self.store_dir(path), chunk_rows=10)
+        self.assertEqual(store.rows([0, 1]), [{"a": 1, "b": "x"}, {"a": 2, "b": None}])
+
+
+class WideningTests(IngestTestCase):
+    def test_text_in_a_later_chunk_retypes_the_written_segments(self):
+        lines = ["code,qty"] + [f"{100 + i},{i}" for i in range(6)] + ["ACC,6", "107,7"]
+        path = self.write_csv(lines)
+        job = CsvIngestJob(path, self.store_dir(path), chunk_rows=3)
+        list(job.run())
+
+        self.assertEqual(job.schema, {"code": "str", "qty": "int"})
+        store = ColumnStore.open(job.store.directory)
+        values = list(store.iter_column("code"))
+        self.assertEqual(values, ["100", "101", "102", "103", "104", "105", "ACC", "107"])
+        # Min/max no longer apply to a text column; the numeric one keeps them
+        self.assertTrue(all("code" not in segment["stats"] for segment in store.segments))
+        self.assertEqual(store.segments[0]["stats"]["qty"], [0, 2])
+        # Widened columns are indexed like the text columns found in the first chunk
+        self.assertEqual(store.lookup("code", "ACC"), [6])
+        self.assertEqual(store.lookup("code", "101"), [1])
+
+    def test_widening_inside_the_first_chunk(self):
+        path = self.write_csv(["value", "1", "2.5", "n/a"])
+        job = CsvIngestJob(path, self.store_dir(path), chunk_rows=10)
+        list(job.run())
+        self.assertEqual(job.schema, {"value": "str"})
+        self.assertEqual(list(job.store.iter_column("value")), ["1", "2.5", "n/a"])
+
+    def test_percent_column_widened_to_text_keeps_the_sign(self):
+        path = self.write_csv(["change", "1.5%", "-2%", "flat"])
+        job = CsvIngestJob(path, self.store_dir(path), chunk_rows=2)
+        list(job.run())
+        self.assertEqual(list(job.store.iter_column("change")), ["1.5%", "-2%", "flat"])
+
+
+class EncodingTests(IngestTestCase):
+    def test_utf8_with_bom(self):
+        path = self.write_csv(["name,city", "José,Córdoba"], encoding="utf-8-sig")
+        self.assertEqual(detect_encoding(path), "utf-8-sig")
+        store = ingest_csv(path, self.store_dir(path))
+        self.assertEqual(store.columns, ["name", "city"])
+        self.assertEqual(store.rows([0]), [{"name": "José", "city": "Córdoba"}])
+
+    def test_cp1252_fallback(self):
+        path = self.write_csv(["product,price", "Café,3 €"], encoding="cp1252")
+        self.assertEqual(detect_encoding(path), "cp1252")
+        self.assertEqual(ingest_csv(path, self.store_dir(path)).rows([0]), [{"product": "Café", "price": "3 €"}])
+
+    def test_latin1_as_last_resort(self):
+        path = os.path.join(self.directory, "raw.csv")
+        with open(path, "wb") as f:
+            f.write(b"code\r\nA\x81B\r\n")      # 0x81 is undefined in cp1252
+        self.assertEqual(detect_encoding(path), "latin-1")
+        self.assertEqual(list(ingest_csv(path, self.store_dir(path)).iter_column("code")), ["A\x81B"])
+
+    def test_detection_reads_past_the_first_block(self):
+        path = self.write_csv(["text"] + ["plain ascii"] * 100 + ["naïve"], encoding="cp1252")
+        self.assertEqual(detect_encoding(path, block_size=64), "cp1252")
+
+    def test_repeated_and_empty_header_names(self):
+        path = self.write_csv(["price,price, ,price", "1,2,3,4"])
+        header, _, _ = next(iter_csv_chunks(path))
+        self.assertEqual(header, ["price", "price_2", "column_3", "price_3"])
+
+
+class StoreLifetimeTests(IngestTestCase):
+    def test_store_dir_is_under_the_given_root(self):
+        path = self.write_csv(["a", "1"], name="sales 2024.csv")
+        root = os.path.join(self.directory, "stores")
+        store_dir = store_dir_for(path, root)
+        self.assertEqual(os.path.dirname(store_dir), root)
+        self.assertTrue(os.path.basename(store_dir).startswith("sales 2024-"))
+        self.assertEqual(store_dir, store_dir_for(path, root))
+
+    def test_remove_and_expire(self):
+        root = os.path.join(self.directory, "stores")
+        old = self.write_csv(["a", "1"], name="old.csv")
+        new = self.write_csv(["a", "1"], name="new.csv")
+        old_store = ingest_csv(old, store_dir_for(old, root)).directory
+        new_store = ingest_csv(new, store_dir_for(new, root)).directory
+        hour_ago = time.time() - 3600
+        for name in [old_store] + [os.path.join(old_store, f) for f in os.listdir(old_store)]:
+            os.utime(name, (hour_ago, hour_ago))
+
+        self.assertEqual(expire_stores(root, max_age_seconds=600), 1)
+        self.assertFalse(os.path.exists(old_store))
+        self.assertTrue(os.path.exists(new_store))
+
+        remove_store(new_store)
+        remove_store(new_store)             # already gone
+        self.assertEqual(os.listdir(root), [])
+        self.assertEqual(expire_stores(os.path.join(self.directory, "missing")), 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,171 @@
+"""
+Smoke tests for the offline mock backend: chat, embeddings and the agents endpoints,
+over plain http and, when they are installed, through the openai and azure SDK clients.
+
+Run from the repository root:
+    python -m pytest tests/test_mock_backend.py
+"""
+import importlib.util
+import threading
+import time
+import unittest
+
+from mock_clients import FAST_CONFIG, get_json, post_json
+from shared.mock_backend import MockBackend, mock_project_client
+
+
+def installed(name):
+    try:
+        return importlib.util.find_spec(name) is not None
+    except ImportError:                     # a missing parent package
+        return False
+
+
+QUESTION = "What should I see in Barcelona?"
+
+
+class MockBackendTestCase(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.backend = MockBackend(FAST_CONFIG).start()
+        cls.project = cls.backend.url + "api/projects/mock/"
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.backend.stop()
+
+    def post(self, path, payload):
+        status, body = post_json(self.project + path, payload)
+        self.assertEqual(status, 200, body)
+        return body
+
+    def get(self, path):
+        status, body = get_json(self.project + path)
+        self.assertEqual(status, 200, body)
+        return body
+
+    def wait_for_run(self, thread_id, run_id):
+        for _ in range(200):
+            run = self.get(f"threads/{thread_id}/runs/{run_id}")
+            if run["status"] not in ("queued", "in_progress"):
+                return run
+            time.sleep(0.01)
+        self.fail(f"run {run_id} did not finish")
+
+
+class HttpTests(MockBackendTestCase):
+    def test_chat_and_embeddings(self):
+        url = self.backend.url + "openai/deployments/mock/"
+        status, body = post_json(url + "chat/completions?api-version=2024-10-21",
+                                 {"messages": [{"role": "user", "content": QUESTION}], "max_completion_tokens": 5})
+        self.assertEqual(status, 200, body)
+        self.assertEqual(body["object"], "chat.completion")
+        self.assertTrue(body["choices"][0]["message"]["content"])
+
+        status, body = post_json(url + "embeddings?api-version=2024-10-21", {"input": ["a", "b"]})
+        self.assertEqual(status, 200, body)
+        self.assertEqual(len(body["data"]), 2)
+
+    def test_agent_run_round_trip(self):
+        agent = self.post("assistants", {"model": "mock", "name": "smoke", "instructions": "Be brief."})
+        thread = self.post("threads", {})
+        self.post(f"threads/{thread['id']}/messages", {"role": "user", "content": QUESTION})
+        run = self.post(f"threads/{thread['id']}/runs", {"assistant_id": agent["id"]})
+
+        self.assertEqual(self.wait_for_run(thread["id"], run["id"])["status"], "completed")
+        messages = self.get(f"threads/{thread['id']}/messages?order=asc")["data"]
+        self.assertEqual([m["role"] for m in messages], ["user", "assistant"])
+        self.assertFalse(any(key.startswith("_") for key in messages[0]))
+
+    def test_list_runs_of_a_thread(self):
+        agent = self.post("assistants", {"model": "mock"})
+        thread = self.post("threads", {})
+        other = self.post("threads", {})
+        first = self.post(f"threads/{thread['id']}/runs", {"assistant_id": agent["id"]})
+        second = self.post(f"threads/{thread['id']}/runs", {"assistant_id": agent["id"]})
+        self.post(f"threads/{other['id']}/runs", {"assistant_id": agent["id"]})
+
+        page = self.get(f"threads/{thread['id']}/runs")
+        self.assertEqual(page["object"], "list")
+        self.assertEqual([r["id"] for r in page["data"]], [second["id"], first["id"]])
+        self.assertEqual(self.get(f"threads/{thread['id']}/runs?order=asc")["first_id"], first["id"])
+
+    def test_unknown_paths_answer_with_json_errors(self):
+        thread = self.post("threads", {})
+        status, body = post_json(self.project + f"threads/{thread['id']}/runs/run_missing", {})
+        self.assertEqual(status, 404)
+        self.assertIn("error", body)
+        status, body = get_json(self.project + "threads/thread_missing/runs")
+        self.assertEqual(status, 404)
+        self.assertIn("error", body)
+
+    def test_concurrent_runs_on_one_thread(self):
+        agent = self.post("assistants", {"model": "mock"})
+        thread = self.post("threads", {})
+        self.post(f"threads/{thread['id']}/messages", {"role": "user", "content": QUESTION})
+        errors = []
+
+        def start_and_poll():
+            try:
+                run = self.post(f"threads/{thread['id']}/runs", {"assistant_id": agent["id"]})
+                self.wait_for_run(thread["id"], run["id"])
+                self.get(f"threads/{thread['id']}/runs?limit=100")
+            except Exception as e:
+                errors.append(e)
+
+        workers = [threading.Thread(target=start_and_poll) for _ in range(8)]
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join(30)
+
+        self.assertEqual(errors, [])
+        runs = self.get(f"threads/{thread['id']}/runs?limit=100")["data"]
+        self.assertEqual(len(runs), 8)
+        self.assertTrue(all(run["status"] == "completed" for run in runs))
+        messages = self.get(f"threads/{thread['id']}/messages?limit=100")["data"]
+        self.assertEqual(sum(m["role"] == "assistant" for m in messages), 8)
+
+
+@unittest.skipUnless(installed("openai"), "openai is not installed")
+class OpenAIClientTests(MockBackendTestCase):
+    def test_chat_completion_and_stream(self):
+        from openai import AzureOpenAI
+
+        client = AzureOpenAI(azure_endpoint=self.backend.url, api_key="mock", api_version="2024-10-21")
+        messages = [{"role": "user", "content": QUESTION}]
+        response = client.chat.completions.create(model="mock", messages=messages, max_completion_tokens=5)
+        self.assertTrue(response.choices[0].message.content)
+
+        stream = client.chat.completions.create(model="mock", messages=messages, max_completion_tokens=5, stream=True)
+        text = "".join(chunk.choices[0].delta.content or "" for chunk in stream if chunk.choices)
+        self.assertTrue(text)
+
+        embeddings = client.embeddings.create(model="mock", input=["a", "b"])
+        self.assertEqual(len(embeddings.data), 2)
+
+
+@unittest.skipUnless(installed("azure.ai.projects"), "azure-ai-projects is not installed")
+class ProjectClientTests(MockBackendTestCase):
+    def test_agent_round_trip(self):
+        from azure.ai.agents.models import ListSortOrder
+
+        project = mock_project_client(self.project.rstrip("/"))
+        agent = project.agents.create_agent(model="mock", name="smoke", instructions="Be brief.")
+        thread = project.agents.threads.create()
+        project.agents.messages.create(thread_id=thread.id, role="user", content=QUESTION)
+        run = project.agents.runs.create_and_process(thread_id=thread.id, agent_id=agent.id, polling_interval=0.01)
+        self.assertEqual(run.status, "completed")
+
+        runs = list(project.agents.runs.list(thread_id=thread.id))
+        self.assertEqual([r.id for r in runs], [run.id])
+        messages = list(project.agents.messages.list(thread_id=thread.id, order=ListSortOrder.ASCENDING))
+        self.assertEqual([str(m.role.value) for m in messages], ["user", "assistant"])
+        self.assertEqual(messages[0].text_messages[0].text.value, QUESTION)
+
+        project.agents.threads.delete(thread.id)
+        project.agents.delete_agent(agent.id)
+
+
+if __name__ == "__main__":
+    unittest.main()
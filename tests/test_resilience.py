@@ -0,0 +1,251 @@
+"""
+Tests for the circuit breaker (open, half-open probe, doubling open period)
+and for failover between routes.
+
+Run from the repository root:
+    python -m pytest tests/test_resilience.py
+"""
+import io
+import os
+import sys
+import unittest
+from contextlib import redirect_stdout
+from types import SimpleNamespace
+from unittest import mock
+
+REPO_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+sys.path.insert(0, REPO_ROOT)
+from shared.resilience import CLOSED, HALF_OPEN, OPEN, CircuitBreaker, CircuitOpen, FailoverChat, Route, failover_from_env
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+    def advance(self, seconds):
+        self.now += seconds
+
+
+class ApiError(Exception):
+    def __init__(self, status_code):
+        super().__init__(f"status {status_code}")
+        self.status_code = status_code
+
+
+class FakeClient:
+    """Has chat.completions.create; each call pops the next outcome (an exception is raised)."""
+
+    def __init__(self, *outcomes):
+        self.outcomes = list(outcomes)
+        self.models = []
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self.create))
+
+    def create(self, model, **kwargs):
+        self.models.append(model)
+        outcome = self.outcomes.pop(0) if self.outcomes else "ok"
+        if isinstance(outcome, Exception):
+            raise outcome
+        return outcome
+
+
+class BreakerTestCase(unittest.TestCase):
+    def setUp(self):
+        self.clock = FakeClock()
+
+    def breaker(self, **kwargs):
+        kwargs.setdefault("min_calls", 4)
+        kwargs.setdefault("open_seconds", 10.0)
+        return CircuitBreaker("primary", clock=self.clock, **kwargs)
+
+    def call(self, breaker, ok=True):
+        breaker.before_call()
+        if ok:
+            breaker.on_success()
+        else:
+            breaker.on_failure()
+
+    def trip(self, breaker):
+        while breaker.state == CLOSED:
+            self.call(breaker, ok=False)
+        self.assertEqual(breaker.state, OPEN)
+
+
+class OpenTests(BreakerTestCase):
+    def test_opens_when_the_failure_rate_crosses_the_threshold(self):
+        breaker = self.breaker(failure_rate=0.5)
+        self.call(breaker, ok=True)
+        self.call(breaker, ok=False)
+        self.call(breaker, ok=True)
+        self.assertEqual(breaker.state, CLOSED)
+        self.call(breaker, ok=False)            # 2 of 4 failed
+        self.assertEqual(breaker.state, OPEN)
+        self.assertEqual(breaker.trips, 1)
+
+    def test_few_calls_do_not_open_it(self):
+        breaker = self.breaker()
+        for _ in range(breaker.min_calls - 1):
+            self.call(breaker, ok=False)
+        self.assertEqual(breaker.state, CLOSED)
+
+    def test_old_outcomes_leave_the_window(self):
+        breaker = self.breaker(window=4, failure_rate=0.75)
+        for ok in (False, False, True, True, True, True, False, False):
+            self.call(breaker, ok=ok)
+        self.assertEqual(breaker.state, CLOSED)     # only the last 4 count: 2 of 4
+
+    def test_open_breaker_fails_fast(self):
+        breaker = self.breaker()
+        self.trip(breaker)
+        self.assertFalse(breaker.available())
+        with self.assertRaises(CircuitOpen):
+            breaker.before_call()
+        self.assertEqual(breaker.rejected, 1)
+
+    def test_slow_calls_count_as_failures(self):
+        breaker = self.breaker(slow_call_seconds=2.0)
+        for _ in range(4):
+            breaker.before_call()
+            breaker.on_success(seconds=3.0)
+        self.assertEqual(breaker.state, OPEN)
+
+
+class HalfOpenTests(BreakerTestCase):
+    def test_one_probe_after_the_open_period(self):
+        breaker = self.breaker()
+        self.trip(breaker)
+        self.clock.advance(9.9)
+        self.assertFalse(breaker.available())
+        self.clock.advance(0.1)
+        self.assertTrue(breaker.available())
+
+        breaker.before_call()
+        self.assertEqual(breaker.state, HALF_OPEN)
+        # Only one probe at a time
+        self.assertFalse(breaker.available())
+        with self.assertRaises(CircuitOpen):
+            breaker.before_call()
+
+    def test_successful_probe_closes_and_resets(self):
+        breaker = self.breaker()
+        self.trip(breaker)
+        self.clock.advance(10)
+        self.call(breaker, ok=True)
+        self.assertEqual(breaker.state, CLOSED)
+        # Earlier failures are forgotten: the window starts again from the probe
+        self.assertEqual(list(breaker.outcomes), [True])
+        self.call(breaker, ok=False)
+        self.call(breaker, ok=False)
+        self.assertEqual(breaker.state, CLOSED)
+
+    def test_cancelled_probe_lets_the_next_one_through(self):
+        breaker = self.breaker()
+        self.trip(breaker)
+        self.clock.advance(10)
+        breaker.before_call()
+        breaker.on_cancel()
+        self.assertEqual(breaker.state, HALF_OPEN)
+        self.call(breaker, ok=True)
+        self.assertEqual(breaker.state, CLOSED)
+
+
+class DoublingTests(BreakerTestCase):
+    def test_failed_probes_double_the_open_period_up_to_the_maximum(self):
+        breaker = self.breaker(open_seconds=10.0, max_open_seconds=35.0)
+        self.trip(breaker)
+        periods = []
+        for _ in range(4):
+            self.clock.advance(breaker.open_seconds)
+            self.call(breaker, ok=False)        # the probe fails
+            self.assertEqual(breaker.state, OPEN)
+            periods.append(breaker.open_seconds)
+        self.assertEqual(periods, [20.0, 35.0, 35.0, 35.0])
+        self.assertEqual(breaker.trips, 5)
+
+        # Still open just before the doubled period ends
+        self.clock.advance(34.9)
+        with self.assertRaises(CircuitOpen):
+            breaker.before_call()
+
+    def test_successful_probe_restores_the_first_period(self):
+        breaker = self.breaker(open_seconds=10.0)
+        self.trip(breaker)
+        self.clock.advance(10)
+        self.call(breaker, ok=False)
+        self.assertEqual(breaker.open_seconds, 20.0)
+        self.clock.advance(20)
+        self.call(breaker, ok=True)
+        self.assertEqual(breaker.open_seconds, 10.0)
+
+        self.trip(breaker)
+        self.clock.advance(10)
+        self.assertTrue(breaker.available())
+
+
+class FailoverTests(BreakerTestCase):
+    def routes(self, primary, secondary):
+        return [
+            Route("primary", primary, "dep-a", self.breaker()),
+            Route("secondary", secondary, "dep-b", self.breaker()),
+        ]
+
+    def create(self, chat):
+        with redirect_stdout(io.StringIO()):
+            return chat.create(messages=[{"role": "user", "content": "hi"}])
+
+    def test_fails_over_and_stops_trying_an_open_route(self):
+        primary = FakeClient(*[ApiError(500)] * 4)
+        secondary = FakeClient()
+        chat = FailoverChat(self.routes(primary, secondary))
+
+        for _ in range(6):
+            self.assertEqual(self.create(chat), "ok")
+        # The primary was tried until its breaker opened, then skipped
+        self.assertEqual(len(primary.models), 4)
+        self.assertEqual(secondary.models, ["dep-b"] * 6)
+        self.assertEqual(chat.failovers, 6)
+        self.assertIn("primary: open", chat.summary())
+
+        self.clock.advance(10)
+        self.assertEqual(self.create(chat), "ok")
+        self.assertEqual(primary.models[-1], "dep-a")
+        self.assertEqual(chat.routes[0].breaker.state, CLOSED)
+
+    def test_caller_errors_are_raised_without_failover(self):
+        primary = FakeClient(ApiError(400))
+        secondary = FakeClient()
+        chat = FailoverChat(self.routes(primary, secondary))
+        with self.assertRaises(ApiError):
+            self.create(chat)
+        self.assertEqual(secondary.models, [])
+        self.assertEqual(list(chat.routes[0].breaker.outcomes), [True])
+
+    def test_all_routes_open_raises_circuit_open(self):
+        chat = FailoverChat(self.routes(FakeClient(), FakeClient()))
+        for route in chat.routes:
+            self.trip(route.breaker)
+        with self.assertRaises(CircuitOpen):
+            self.create(chat)
+
+    def test_last_error_is_raised_when_every_route_fails(self):
+        chat = FailoverChat(self.routes(FakeClient(ApiError(503)), FakeClient(ApiError(500))))
+        with self.assertRaises(ApiError) as raised:
+            self.create(chat)
+        self.assertEqual(raised.exception.status_code, 500)
+
+    def test_configuration(self):
+        with self.assertRaises(ValueError):
+            FailoverChat([])
+        with mock.patch.dict(os.environ, {"AZURE_OPENAI_ENDPOINT": "", "AZURE_OPENAI_DEPLOYMENT_NAME": ""}):
+            try:
+                import openai  # noqa: F401
+            except ImportError:
+                self.skipTest("openai is not installed")
+            with self.assertRaises(ValueError):
+                failover_from_env()
+
+
+if __name__ == "__main__":
+    unittest.main()
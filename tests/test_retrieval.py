@@ -0,0 +1,141 @@
+"""
+Tests for the local hybrid retrieval: BM25 + vector score fusion and where
+ground_messages() puts the excerpts.
+
+Run from the repository root:
+    python -m pytest tests/test_retrieval.py
+"""
+import math
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+
+REPO_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+sys.path.insert(0, REPO_ROOT)
+from shared.retrieval import MAX_PASSAGE_CHARS, LocalIndex, ground_messages, grounding_message
+
+
+class AxisEmbedder:
+    """Two-dimensional vectors: texts mentioning "sea" point one way, "mountain" the other."""
+
+    dim = 2
+
+    def embed(self, texts):
+        vectors = []
+        for text in texts:
+            vector = [1.0 if "sea" in text else 0.0, 1.0 if "mountain" in text else 0.0]
+            norm = math.sqrt(sum(v * v for v in vector)) or 1.0
+            vectors.append([v / norm for v in vector])
+        return vectors
+
+
+class StaticRetriever:
+    def __init__(self, index):
+        self.index = index
+        self.queries = []
+
+    def search(self, query, top_k=3):
+        self.queries.append((query, top_k))
+        return self.index.search(query, top_k=top_k)
+
+
+def make_index():
+    index = LocalIndex(AxisEmbedder())
+    index.add_document("beach.md", "Barceloneta beach is by the sea, with paella restaurants along the promenade")
+    index.add_document("hike.md", "Montserrat is a mountain monastery reached by rack railway")
+    index.add_document("paella.md", "Paella paella paella: where to eat paella in the old town")
+    return index
+
+
+class FusionTests(unittest.TestCase):
+    def test_keyword_match_ranks_first(self):
+        results = make_index().search("paella", top_k=3)
+        self.assertEqual(results[0].source, "paella.md")
+        self.assertEqual(results[1].source, "beach.md")
+        self.assertEqual(len(results), 2)       # the hike matches neither score
+
+    def test_vector_match_without_shared_words_is_found(self):
+        results = make_index().search("sea views", top_k=3)
+        # "sea" is in beach.md only, and the vector agrees
+        self.assertEqual([p.source for p in results], ["beach.md"])
+        results = make_index().search("climbing a mountain", top_k=3)
+        self.assertEqual(results[0].source, "hike.md")
+
+    def test_scores_blend_normalized_keyword_and_cosine(self):
+        index = make_index()
+        weight = 0.6
+        results = {p.source: p.score for p in index.search("paella by the sea", top_k=3, keyword_weight=weight)}
+        bm25 = index._bm25(["paella", "sea"])
+        best = max(bm25.values())
+        # beach.md: both words and the same direction as the query; paella.md: keyword only
+        self.assertAlmostEqual(results["beach.md"], weight * bm25[0] / best + (1 - weight) * 1.0, places=5)
+        self.assertAlmostEqual(results["paella.md"], weight * bm25[2] / best, places=5)
+
+    def test_keyword_weight_moves_the_ranking(self):
+        index = make_index()
+        # Only "paella" is an indexed word: paella.md has the higher BM25 score, beach.md the higher cosine
+        keyword_only = index.search("paella seaside", top_k=2, keyword_weight=1.0)
+        vector_only = index.search("paella seaside", top_k=2, keyword_weight=0.0)
+        self.assertEqual(keyword_only[0].source, "paella.md")
+        self.assertEqual(vector_only[0].source, "beach.md")
+
+    def test_top_k_and_empty_index(self):
+        self.assertEqual(len(make_index().search("paella sea mountain", top_k=1)), 1)
+        self.assertEqual(LocalIndex(AxisEmbedder()).search("anything"), [])
+
+    def test_saved_index_ranks_the_same(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory, True)
+        index = make_index()
+        index.save(directory)
+        loaded = LocalIndex.load(directory, AxisEmbedder())
+        for query in ("paella", "sea views", "mountain railway"):
+            self.assertEqual(
+                [(p.source, round(p.score, 5)) for p in loaded.search(query)],
+                [(p.source, round(p.score, 5)) for p in index.search(query)],
+            )
+
+
+class GroundMessagesTests(unittest.TestCase):
+    def setUp(self):
+        self.retriever = StaticRetriever(make_index())
+
+    def test_excerpts_go_right_after_the_system_message(self):
+        messages = [
+            {"role": "system", "content": "You are a helpful assistant."},
+            {"role": "user", "content": "Hi"},
+            {"role": "assistant", "content": "Hello!"},
+            {"role": "user", "content": "Where can I eat paella?"},
+        ]
+        grounded = ground_messages(messages, self.retriever, "Where can I eat paella?", top_k=2)
+
+        self.assertEqual([m["role"] for m in grounded], ["system", "system", "user", "assistant", "user"])
+        self.assertEqual(grounded[0], messages[0])
+        self.assertEqual(grounded[2:], messages[1:])
+        excerpt = grounded[1]["content"]
+        self.assertLess(excerpt.index("[paella.md]"), excerpt.index("[beach.md]"))
+        self.assertEqual(self.retriever.queries, [("Where can I eat paella?", 2)])
+        self.assertEqual(len(messages), 4)      # the input list is left alone
+
+    def test_without_a_system_message_excerpts_come_first(self):
+        messages = [{"role": "user", "content": "paella"}]
+        grounded = ground_messages(messages, self.retriever, "paella")
+        self.assertEqual([m["role"] for m in grounded], ["system", "user"])
+
+    def test_nothing_found_or_no_retriever_keeps_the_messages(self):
+        messages = [{"role": "system", "content": "s"}, {"role": "user", "content": "opera tickets"}]
+        self.assertIs(ground_messages(messages, self.retriever, "opera tickets"), messages)
+        self.assertIs(ground_messages(messages, None, "paella"), messages)
+
+    def test_long_passages_are_cut(self):
+        index = LocalIndex(AxisEmbedder())
+        index.add_document("long.md", "paella " + "arroz-negre-with-allioli " * 100)
+        content = grounding_message(index.search("paella", top_k=1))["content"]
+        excerpt = content.split("[long.md] ", 1)[1]
+        self.assertEqual(len(excerpt), MAX_PASSAGE_CHARS)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,229 @@
+"""
+Tests for the fair scheduler, with chat calls served by the in-process mock backend.
+
+Run from the repository root:
+    python -m pytest tests/test_scheduler.py
+"""
+import asyncio
+import os
+import threading
+import time
+import unittest
+from unittest import mock
+
+from mock_clients import FAST_CONFIG, MockChat
+from shared.mock_backend import MockBackend
+from shared.scheduler import FairScheduler, PriorityClass, ScheduledChat, current_requester, parse_classes, scheduler_from_env
+
+MESSAGES = [{"role": "user", "content": "What should I see in Barcelona?"}]
+
+
+class SchedulerTestCase(unittest.IsolatedAsyncioTestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.backend = MockBackend(FAST_CONFIG).start()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.backend.stop()
+
+    def setUp(self):
+        self.chat = MockChat(self.backend.url)
+
+    async def call(self, scheduler, requester, priority="interactive", cost=1.0, grants=None, running=None):
+        """One scheduled chat call; appends the requester to grants when its slot is granted."""
+        async with scheduler.slot(requester, priority, cost):
+            if grants is not None:
+                grants.append(requester)
+            if running is not None:
+                for key in (priority, "total"):
+                    running[key] = running.get(key, 0) + 1
+                    running["max_" + key] = max(running.get("max_" + key, 0), running[key])
+            try:
+                await self.chat.create(messages=MESSAGES, max_completion_tokens=5)
+            finally:
+                if running is not None:
+                    running[priority] -= 1
+                    running["total"] -= 1
+
+
+class FairnessTests(SchedulerTestCase):
+    async def queue_behind_holder(self, scheduler, requests):
+        """Queues requests [(requester, cost)] while one slot is held, then lets them run; grant order."""
+        grants = []
+        holder = await scheduler.acquire("holder")
+        tasks = []
+        for requester, cost in requests:
+            tasks.append(asyncio.create_task(self.call(scheduler, requester, cost=cost, grants=grants)))
+            await asyncio.sleep(0)          # queued in this order
+        scheduler.release(holder)
+        await asyncio.gather(*tasks)
+        return grants
+
+    async def test_light_requester_is_not_stuck_behind_a_heavy_one(self):
+        scheduler = FairScheduler(max_concurrency=1)
+        # The heavy requester queued 8 calls before the light one asked anything
+        grants = await self.queue_behind_holder(scheduler, [("heavy", 100)] * 8 + [("light", 100)] * 4)
+
+        # FIFO would serve all 8 heavy calls first; fair queuing alternates
+        self.assertEqual(grants[:8], ["heavy", "light"] * 4)
+        self.assertEqual(grants[8:], ["heavy"] * 4)
+
+    async def test_cost_weights_the_share(self):
+        scheduler = FairScheduler(max_concurrency=1)
+        # Same number of calls, but each heavy call costs 4 light ones
+        grants = await self.queue_behind_holder(scheduler, [("heavy", 400)] * 4 + [("light", 100)] * 8)
+
+        self.assertEqual(grants[:5].count("light"), 4)
+        self.assertEqual(grants[:10].count("light"), 8)
+
+    async def test_requester_weights(self):
+        scheduler = FairScheduler(max_concurrency=1, requester_weights={"vip": 3})
+        grants = await self.queue_behind_holder(scheduler, [("other", 100)] * 6 + [("vip", 100)] * 6)
+
+        # vip gets three calls for each of the other requester's
+        self.assertEqual(grants[:8].count("vip"), 6)
+
+
+class CapTests(SchedulerTestCase):
+    async def test_class_cap_holds_while_other_classes_use_the_slots(self):
+        scheduler = FairScheduler(
+            [PriorityClass("interactive", weight=4), PriorityClass("batch", weight=1, cap=1)],
+            max_concurrency=4,
+        )
+        running = {}
+        await asyncio.gather(
+            *(self.call(scheduler, "batch-job", "batch", running=running) for _ in range(6)),
+            *(self.call(scheduler, f"user-{i}", "interactive", running=running) for i in range(6)),
+        )
+
+        self.assertEqual(running["max_batch"], 1)
+        self.assertGreaterEqual(running["max_interactive"], 2)
+        metrics = scheduler.metrics()
+        self.assertEqual(metrics["classes"]["batch"]["served"], 6)
+        self.assertEqual(metrics["in_flight"], 0)
+        # Counted around the calls: the mock's own in-flight count lags behind its responses
+        self.assertLessEqual(running["max_total"], 4)
+
+    async def test_unknown_class_is_rejected(self):
+        with self.assertRaises(ValueError):
+            await FairScheduler().acquire("user", "realtime")
+
+
+class CancellationTests(SchedulerTestCase):
+    async def test_cancel_while_queued_leaves_the_queue(self):
+        scheduler = FairScheduler(max_concurrency=1)
+        holder = await scheduler.acquire("holder")
+        queued = asyncio.create_task(self.call(scheduler, "impatient"))
+        await asyncio.sleep(0)
+        self.assertEqual(scheduler.depth("impatient"), 1)
+
+        queued.cancel()
+        with self.assertRaises(asyncio.CancelledError):
+            await queued
+        self.assertEqual(scheduler.depth("impatient"), 0)
+
+        scheduler.release(holder)
+        await self.call(scheduler, "next")
+        metrics = scheduler.metrics()["classes"]["interactive"]
+        self.assertEqual(metrics["cancelled"], 1)
+        self.assertEqual(metrics["queued"], 0)
+        self.assertEqual(scheduler.in_flight, 0)
+
+    async def test_cancel_after_grant_releases_the_slot(self):
+        scheduler = FairScheduler(max_concurrency=1)
+
+        async def slow():
+            async with scheduler.slot("user"):
+                await asyncio.sleep(10)
+
+        task = asyncio.create_task(slow())
+        await asyncio.sleep(0.01)
+        self.assertEqual(scheduler.in_flight, 1)
+        task.cancel()
+        with self.assertRaises(asyncio.CancelledError):
+            await task
+        self.assertEqual(scheduler.in_flight, 0)
+
+
+class SlotReleaseTests(SchedulerTestCase):
+    def scheduled_chat(self, scheduler):
+        current_requester.set("user")
+        return ScheduledChat(self.chat, scheduler)
+
+    async def test_stream_closed_before_iteration_releases_once(self):
+        scheduler = FairScheduler(max_concurrency=1)
+        chat = self.scheduled_chat(scheduler)
+
+        stream = await chat.create(messages=MESSAGES, max_completion_tokens=5, stream=True)
+        self.assertEqual(scheduler.in_flight, 1)
+        await stream.aclose()
+        await stream.close()                # idempotent
+        self.assertEqual(scheduler.in_flight, 0)
+        self.assertEqual(scheduler.metrics()["classes"]["interactive"]["served"], 1)
+
+        # The slot is really free: the next call does not wait
+        response = await asyncio.wait_for(chat.create(messages=MESSAGES, max_completion_tokens=5), 5)
+        self.assertEqual(response["object"], "chat.completion")
+
+    async def test_stream_releases_at_end_and_on_early_exit(self):
+        scheduler = FairScheduler(max_concurrency=1)
+        chat = self.scheduled_chat(scheduler)
+
+        stream = await chat.create(messages=MESSAGES, max_completion_tokens=5, stream=True)
+        chunks = [chunk async for chunk in stream]
+        self.assertTrue(chunks)
+        self.assertEqual(scheduler.in_flight, 0)
+
+        async with await chat.create(messages=MESSAGES, max_completion_tokens=5, stream=True) as stream:
+            async for _ in stream:
+                break
+            self.assertEqual(scheduler.in_flight, 1)
+        self.assertEqual(scheduler.in_flight, 0)
+
+    async def test_run_holds_the_slot_until_the_thread_ends(self):
+        scheduler = FairScheduler(max_concurrency=1)
+        finished = threading.Event()
+
+        def blocking_call():
+            time.sleep(0.3)
+            finished.set()
+            return "done"
+
+        task = asyncio.create_task(scheduler.run(blocking_call, requester="user"))
+        await asyncio.sleep(0.05)
+        task.cancel()
+        await asyncio.sleep(0.05)
+        # Cancelled, but the thread still calls the service: the slot stays taken
+        self.assertFalse(finished.is_set())
+        self.assertEqual(scheduler.in_flight, 1)
+        with self.assertRaises(asyncio.CancelledError):
+            await task
+        self.assertTrue(finished.is_set())
+        self.assertEqual(scheduler.in_flight, 0)
+
+        self.assertEqual(await scheduler.run(lambda: "ok", requester="user"), "ok")
+        self.assertEqual(scheduler.in_flight, 0)
+
+
+class ConfigurationTests(unittest.TestCase):
+    def test_parse_classes(self):
+        classes = parse_classes("interactive:4, batch:1:2")
+        self.assertEqual([(c.name, c.weight, c.cap) for c in classes], [("interactive", 4.0, None), ("batch", 1.0, 2)])
+
+    def test_invalid_specs_fail_at_startup(self):
+        for spec in ("batch:1:2", "interactive:x", "interactive:4,interactive:2", ":3", "interactive:0", "interactive:1:2:3"):
+            with self.subTest(spec=spec), mock.patch.dict(os.environ, {"SCHEDULER_CLASSES": spec}):
+                with self.assertRaises(ValueError):
+                    scheduler_from_env()
+
+    def test_default_classes(self):
+        with mock.patch.dict(os.environ, {"SCHEDULER_MAX_CONCURRENCY": "6"}):
+            os.environ.pop("SCHEDULER_CLASSES", None)
+            scheduler = scheduler_from_env()
+        self.assertEqual(scheduler.max_concurrency, 6)
+        self.assertEqual(scheduler.classes["batch"].cap, 3)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,206 @@
+"""
+Tests for the shared session backends: get/set/incr round-trips on every
+backend, atomic increments across threads and processes, and TTL expiry.
+
+Run from the repository root:
+    python -m pytest tests/test_session_state.py
+"""
+import multiprocessing
+import os
+import shutil
+import sys
+import tempfile
+import threading
+import time
+import unittest
+from unittest import mock
+
+REPO_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+sys.path.insert(0, REPO_ROOT)
+from shared.session_state import (
+    FileLockBackend, LocalRedis, MemoryBackend, RedisBackend, SharedSession, SqliteBackend, backend_from_env,
+)
+
+
+def increment_many(kind, location, count):
+    """One worker process incrementing the same counter."""
+    backend = SqliteBackend(location) if kind == "sqlite" else FileLockBackend(location)
+    for _ in range(count):
+        backend.incr("shared", "questions")
+
+
+class BackendContract:
+    """Tests every backend must pass; subclasses provide make_backend()."""
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory, True)
+        self.backend = self.make_backend()
+
+    def test_set_and_get_round_trip(self):
+        values = {
+            "destination": "Tokyo",
+            "nights": 4,
+            "budget": 1250.5,
+            "trip": {"from": "Barcelona", "stops": ["Kyoto", "Osaka"], "confirmed": False},
+            "note": "Café con leche ☕",
+        }
+        for key, value in values.items():
+            self.backend.set("s1", key, value)
+        for key, value in values.items():
+            self.assertEqual(self.backend.get("s1", key), value)
+        self.assertEqual(self.backend.get_all("s1"), values)
+
+    def test_missing_values_return_the_default(self):
+        self.assertIsNone(self.backend.get("s1", "agent_id"))
+        self.assertEqual(self.backend.get("s1", "agent_id", "none yet"), "none yet")
+        self.assertEqual(self.backend.get_all("unknown"), {})
+
+    def test_set_overwrites(self):
+        self.backend.set("s1", "destination", "Tokyo")
+        self.backend.set("s1", "destination", "Lisbon")
+        self.assertEqual(self.backend.get("s1", "destination"), "Lisbon")
+
+    def test_incr_starts_from_zero_and_returns_the_new_value(self):
+        self.assertEqual(self.backend.incr("s1", "questions"), 1)
+        self.assertEqual(self.backend.incr("s1", "questions"), 2)
+        self.assertEqual(self.backend.incr("s1", "questions", 5), 7)
+        self.assertEqual(self.backend.get("s1", "questions"), 7)
+
+    def test_incr_after_set(self):
+        self.backend.set("s1", "questions", 10)
+        self.assertEqual(self.backend.incr("s1", "questions"), 11)
+        self.assertEqual(self.backend.get_all("s1"), {"questions": 11})
+
+    def test_sessions_are_separate_and_delete_clears_one(self):
+        self.backend.set("s1", "destination", "Tokyo")
+        self.backend.set("s2", "destination", "Lisbon")
+        self.backend.incr("s2", "questions")
+
+        self.backend.delete("s1")
+        self.assertEqual(self.backend.get_all("s1"), {})
+        self.assertEqual(self.backend.get_all("s2"), {"destination": "Lisbon", "questions": 1})
+        self.backend.delete("s1")           # already gone
+
+    def test_concurrent_increments_are_not_lost(self):
+        def work():
+            for _ in range(50):
+                self.backend.incr("s1", "questions")
+
+        threads = [threading.Thread(target=work) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join(30)
+        self.assertEqual(self.backend.get("s1", "questions"), 200)
+
+    def test_shared_session_view(self):
+        state = SharedSession(self.backend, "thread-1")
+        state.set("destination", "Tokyo")
+        self.assertEqual(state.incr("questions"), 1)
+        # Another worker's view of the same session sees the same values
+        other = SharedSession(self.make_backend(), "thread-1")
+        self.assertEqual(other.values(), {"destination": "Tokyo", "questions": 1})
+        self.assertEqual(other.get("destination"), "Tokyo")
+        other.clear()
+        self.assertEqual(state.values(), {})
+
+
+class MemoryBackendTests(BackendContract, unittest.TestCase):
+    def setUp(self):
+        self.shared = MemoryBackend()
+        super().setUp()
+
+    def make_backend(self):
+        return self.shared
+
+
+class SqliteBackendTests(BackendContract, unittest.TestCase):
+    def make_backend(self):
+        return SqliteBackend(os.path.join(self.directory, "sessions.db"))
+
+
+class FileLockBackendTests(BackendContract, unittest.TestCase):
+    def make_backend(self):
+        return FileLockBackend(os.path.join(self.directory, "sessions"))
+
+    def test_session_ids_are_safe_file_names(self):
+        self.backend.set("../../etc/passwd", "k", "v")
+        self.assertEqual(self.backend.get("../../etc/passwd", "k"), "v")
+        self.assertEqual(os.listdir(self.directory), ["sessions"])
+
+
+class LocalRedisBackendTests(BackendContract, unittest.TestCase):
+    def setUp(self):
+        self.client = LocalRedis()
+        super().setUp()
+
+    def make_backend(self):
+        return RedisBackend(self.client)
+
+    def test_sessions_expire_after_the_ttl(self):
+        backend = RedisBackend(self.client, ttl=0.05)
+        backend.set("s1", "destination", "Tokyo")
+        backend.incr("s1", "questions")
+        self.assertEqual(len(backend.get_all("s1")), 2)
+        time.sleep(0.1)
+        self.assertEqual(backend.get_all("s1"), {})
+        self.assertEqual(backend.incr("s1", "questions"), 1)
+
+    def test_every_write_refreshes_the_ttl(self):
+        backend = RedisBackend(self.client, ttl=0.5)
+        backend.set("s1", "destination", "Tokyo")
+        for _ in range(3):
+            time.sleep(0.2)                 # 0.6s in total, longer than the TTL
+            backend.incr("s1", "questions")
+        self.assertEqual(backend.get("s1", "destination"), "Tokyo")
+
+
+class MultiProcessTests(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory, True)
+
+    def run_workers(self, kind, location):
+        context = multiprocessing.get_context("spawn" if sys.platform == "win32" else "fork")
+        workers = [context.Process(target=increment_many, args=(kind, location, 50)) for _ in range(4)]
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join(60)
+            self.assertEqual(worker.exitcode, 0)
+
+    def test_sqlite_increments_across_processes(self):
+        path = os.path.join(self.directory, "sessions.db")
+        SqliteBackend(path)
+        self.run_workers("sqlite", path)
+        self.assertEqual(SqliteBackend(path).get("shared", "questions"), 200)
+
+    def test_file_lock_increments_across_processes(self):
+        self.run_workers("file", self.directory)
+        self.assertEqual(FileLockBackend(self.directory).get("shared", "questions"), 200)
+
+
+class BackendFromEnvTests(unittest.TestCase):
+    def test_kinds(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory, True)
+        cases = {
+            "memory": MemoryBackend,
+            "sqlite": SqliteBackend,
+            "file": FileLockBackend,
+            "local-redis": RedisBackend,
+        }
+        for kind, expected in cases.items():
+            store = os.path.join(directory, kind, "sessions.db" if kind == "sqlite" else "")
+            with self.subTest(kind=kind), mock.patch.dict(os.environ, {"SESSION_BACKEND": kind, "SESSION_STORE_PATH": store}):
+                self.assertIsInstance(backend_from_env(), expected)
+
+    def test_unknown_backend_is_rejected(self):
+        with mock.patch.dict(os.environ, {"SESSION_BACKEND": "memcached"}):
+            with self.assertRaises(ValueError):
+                backend_from_env()
+
+
+if __name__ == "__main__":
+    unittest.main()
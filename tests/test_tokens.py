@@ -0,0 +1,159 @@
+"""
+Tests for the pre-flight token accounting: capping max_completion_tokens,
+refusing over-budget prompts, and reserving budget for requests in flight.
+
+Run from the repository root:
+    python -m pytest tests/test_tokens.py
+"""
+import os
+import sys
+import threading
+import unittest
+from types import SimpleNamespace
+from unittest import mock
+
+REPO_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+sys.path.insert(0, REPO_ROOT)
+from shared.tokens import Budget, BudgetExceeded, TokenAccountant, context_window
+
+MESSAGES = [
+    {"role": "system", "content": "You are a helpful assistant."},
+    {"role": "user", "content": "What should I see in Barcelona during my free time?"},
+]
+
+
+def usage(prompt_tokens, completion_tokens):
+    return SimpleNamespace(prompt_tokens=prompt_tokens, completion_tokens=completion_tokens)
+
+
+class AccountantTestCase(unittest.TestCase):
+    def accountant(self, **kwargs):
+        kwargs.setdefault("min_completion_tokens", 10)
+        return TokenAccountant("gpt-4o", **kwargs)
+
+    def prompt_tokens(self, accountant):
+        return accountant.tokenizer.count_messages(MESSAGES)
+
+
+class CapTests(AccountantTestCase):
+    def test_no_budget_keeps_the_requested_limit(self):
+        plan = self.accountant().preflight(MESSAGES, user="maria", max_completion_tokens=1000)
+        self.assertEqual(plan.max_completion_tokens, 1000)
+        self.assertGreater(plan.prompt_tokens, 0)
+
+    def test_limit_shrinks_to_the_context_window(self):
+        with mock.patch.dict(os.environ, {"MODEL_CONTEXT_WINDOW": "100"}):
+            accountant = self.accountant()
+        plan = accountant.preflight(MESSAGES, max_completion_tokens=1000)
+        self.assertEqual(plan.max_completion_tokens, 100 - plan.prompt_tokens)
+
+    def test_full_context_is_refused(self):
+        with mock.patch.dict(os.environ, {"MODEL_CONTEXT_WINDOW": "40"}):
+            accountant = self.accountant()
+        with self.assertRaises(BudgetExceeded):
+            accountant.preflight(MESSAGES)
+
+    def test_limit_shrinks_to_the_remaining_token_budget(self):
+        accountant = self.accountant(user_budget=Budget(max_tokens=500))
+        accountant.record(usage(200, 100), user="maria")
+        plan = accountant.preflight(MESSAGES, user="maria", max_completion_tokens=1000)
+        self.assertEqual(plan.max_completion_tokens, 500 - 300 - plan.prompt_tokens)
+
+    def test_limit_shrinks_to_the_remaining_cost_budget(self):
+        accountant = self.accountant(session_budget=Budget(max_cost=0.1),
+                                     prompt_price_per_1k=1.0, completion_price_per_1k=2.0)
+        plan = accountant.preflight(MESSAGES, session="s1", max_completion_tokens=1000)
+        # Whatever is left after the prompt buys completion tokens at 0.002 each
+        self.assertEqual(plan.max_completion_tokens, int((0.1 - plan.prompt_tokens * 0.001) / 0.002))
+        self.assertLessEqual(plan.estimated_cost, 0.1)
+
+    def test_exhausted_budget_is_refused(self):
+        accountant = self.accountant(user_budget=Budget(max_tokens=300))
+        accountant.record(usage(200, 90), user="maria")
+        with self.assertRaises(BudgetExceeded) as raised:
+            accountant.preflight(MESSAGES, user="maria")
+        self.assertIn("user budget exhausted", str(raised.exception))
+        # Other users are not affected
+        accountant.preflight(MESSAGES, user="jordi")
+
+    def test_context_window_by_model_prefix(self):
+        with mock.patch.dict(os.environ):
+            os.environ.pop("MODEL_CONTEXT_WINDOW", None)
+            self.assertEqual(context_window("gpt-4o-mini"), 128000)
+            self.assertEqual(context_window("gpt-4-0613"), 8192)
+            self.assertEqual(context_window("my-deployment"), 128000)
+
+
+class ReservationTests(AccountantTestCase):
+    def test_preflight_reserves_until_recorded(self):
+        accountant = self.accountant(user_budget=Budget(max_tokens=1000))
+        plan = accountant.preflight(MESSAGES, user="maria", max_completion_tokens=200)
+        reserved = plan.prompt_tokens + 200
+        self.assertEqual(accountant.counters.get("user", "maria")["reserved_tokens"], reserved)
+
+        # A second request in flight only gets what the first one left
+        second = accountant.preflight(MESSAGES, user="maria", max_completion_tokens=1000)
+        self.assertEqual(second.max_completion_tokens, 1000 - reserved - second.prompt_tokens)
+
+        accountant.record(usage(plan.prompt_tokens, 20), user="maria", plan=plan)
+        accountant.release(second)
+        used = accountant.counters.get("user", "maria")
+        self.assertEqual(used["reserved_tokens"], 0)
+        self.assertEqual(used["total_tokens"], plan.prompt_tokens + 20)
+
+    def test_record_settles_the_difference(self):
+        accountant = self.accountant(user_budget=Budget(max_tokens=1000))
+        plan = accountant.preflight(MESSAGES, user="maria", max_completion_tokens=500)
+        accountant.record(usage(plan.prompt_tokens, 50), user="maria", plan=plan)
+
+        # The unused part of the reservation is available again
+        after = accountant.preflight(MESSAGES, user="maria", max_completion_tokens=1000)
+        self.assertEqual(after.max_completion_tokens, 1000 - (plan.prompt_tokens + 50) - after.prompt_tokens)
+
+    def test_concurrent_requests_cannot_overspend(self):
+        accountant = self.accountant(user_budget=Budget(max_tokens=1000))
+        per_request = self.prompt_tokens(accountant) + 200
+        granted, refused = [], []
+        start = threading.Barrier(10)
+
+        def request():
+            start.wait()
+            try:
+                granted.append(accountant.preflight(MESSAGES, user="maria", max_completion_tokens=200))
+            except BudgetExceeded:
+                refused.append(True)
+
+        threads = [threading.Thread(target=request) for _ in range(10)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join(10)
+
+        self.assertEqual(len(granted) + len(refused), 10)
+        self.assertLessEqual(sum(plan.reserved_tokens for plan in granted), 1000)
+        self.assertGreaterEqual(len(granted), 1000 // per_request)
+        self.assertTrue(refused)
+
+    def test_release_is_idempotent_and_frees_the_budget(self):
+        accountant = self.accountant(user_budget=Budget(max_tokens=400), session_budget=Budget(max_tokens=400))
+        plan = accountant.preflight(MESSAGES, user="maria", session="s1", max_completion_tokens=1000)
+        with self.assertRaises(BudgetExceeded):
+            accountant.preflight(MESSAGES, user="maria", session="s1")
+
+        accountant.release(plan)
+        accountant.release(plan)
+        accountant.record(usage(10, 10), user="maria", session="s1", plan=plan)
+        for scope, key in (("user", "maria"), ("session", "s1")):
+            used = accountant.counters.get(scope, key)
+            self.assertEqual((used["reserved_tokens"], used["total_tokens"]), (0, 20))
+        accountant.preflight(MESSAGES, user="maria", session="s1")
+
+    def test_deployment_counters_are_not_reserved(self):
+        accountant = self.accountant()
+        accountant.preflight(MESSAGES, user="maria")
+        self.assertEqual(accountant.counters.get("deployment", "gpt-4o")["reserved_tokens"], 0)
+        self.assertIn("0 requests", accountant.summary())
+
+
+if __name__ == "__main__":
+    unittest.main()